@@ -57,7 +57,10 @@ setup(
     install_requires=[
         'ftrack-connect >= 1.0, < 2'
     ],
-    tests_require=['pytest >= 2.3.5'],
+    tests_require=[
+        'pytest >= 2.3.5',
+        'pytest-benchmark >= 3, < 4'
+    ],
     cmdclass={
         'test': PyTest
     },
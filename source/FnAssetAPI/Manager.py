@@ -466,6 +466,113 @@ class Manager(object):
     else:
       return Entity(ref, self) if ref else None
 
+
+  @debugApiCall
+  @auditApiCall("Manager methods")
+  def getEntityMetadataMultiple(self, references, context):
+    """
+
+    Retrieves the @ref metadata for each of the supplied references, in a
+    single call to the Manager. This should be preferred over calling
+    Entity.getMetadata on many entities in turn.
+
+    @param references list(str) A list of one or more @ref entity_reference
+
+    @return list(dict) A list of metadata dicts with the same length as the
+    input list.
+
+    @exception InvalidEntityReference If any supplied reference is not
+    recognised by the Manager.
+
+    """
+    return self.__impl.getEntityMetadataMultiple(references, context)
+
+
+  @debugApiCall
+  @auditApiCall("Manager methods")
+  def setEntityMetadataMultiple(self, references, data, context, merge=True):
+    """
+
+    Sets the @ref metadata for each of the supplied references, in a single
+    call to the Manager. This allows hosts to update many entities at once,
+    and should be preferred over calling Entity.setMetadata in turn.
+
+    @param references list(str) A list of one or more @ref entity_reference
+
+    @param data list(dict) A list of metadata dicts with the same length as
+    references. Each dict is applied to the reference with the same index.
+
+    @param merge bool [True] If True, each entity's existing metadata will be
+    merged with the new data, otherwise it is replaced.
+
+    @exception InvalidEntityReference If any supplied reference is not
+    recognised by the Manager.
+
+    @exception ValueError If the number of references and metadata dicts
+    differ.
+
+    """
+    return self.__impl.setEntityMetadataMultiple(references, data, context,
+        merge=merge)
+
+
+  @debugApiCall
+  @auditApiCall("Manager methods")
+  def getEntityVersionPage(self, reference, context, pageSize, cursor=None):
+    """
+
+    Retrieves one page of the versions of the supplied reference, newest
+    first. This should be preferred over Entity.getVersions when browsing
+    long version histories.
+
+    @param reference str An @ref entity_reference
+
+    @param pageSize int The maximum number of versions in the page.
+
+    @param cursor The cursor returned with the previous page, or None for the
+    first page.
+
+    @return tuple A list of (version name, @ref entity_reference) tuples and
+    the cursor of the next page, which is None if there are no more versions.
+
+    @exception InvalidEntityReference If the reference is not recognised by
+    the Manager.
+
+    """
+    return self.__impl.getEntityVersionPage(reference, context, pageSize,
+        cursor=cursor)
+
+
+  @debugApiCall
+  @auditApiCall("Manager methods")
+  def getFinalizedEntityVersions(self, references, context,
+      overrideVersionName=None):
+    """
+
+    Retrieves the concrete version of each of the supplied references, in a
+    single call to the Manager. This should be preferred over calling
+    Entity.getFinalizedVersion on many entities in turn, for example when
+    updating the versions used by a timeline.
+
+    @param references list(str) A list of one or more @ref entity_reference
+
+    @param overrideVersionName str If supplied, then the version of each
+    referenced asset that matches the name specified here is returned, such
+    as a @ref meta_version like 'latest'.
+
+    @return list(str) A list of @ref entity_reference with the same length as
+    the input list.
+
+    @exception InvalidEntityReference If any supplied reference is not
+    recognised by the Manager.
+
+    @exception EntityResolutionError If the requested version does not exist
+    for any of the references.
+
+    """
+    return self.__impl.getFinalizedEntityVersions(references, context,
+        overrideVersionName)
+
   ## @}
 
 
@@ -1,5 +1,6 @@
 import abc
 
+from .. import constants
 from .. import exceptions
 from .. import contextManagers
 
@@ -690,6 +691,66 @@ class ManagerInterfaceBase(object):
     raise NotImplementedError
 
 
+  def getEntityMetadataMultiple(self, entityRefs, context):
+    """
+
+    Batch-retrieves @ref metadata for a list of entities, following the same
+    pattern as @ref getEntityMetadata.
+
+    @return list, A list of metadata dicts, corresponding to the source
+    reference with the same index.
+
+    This will be called by hosts when they wish to inspect many entities at
+    once, and so should be re-implemented to minimise the number of queries
+    over a standard 'for' loop.
+
+    The base class implementation simply calls getEntityMetadata repeatedly
+    for each supplied reference.
+
+    @exception python.exceptions.InvalidEntityReference If any supplied
+    reference is not recognised by the asset management system.
+
+    """
+    metadata = []
+    for r in entityRefs:
+      metadata.append(self.getEntityMetadata(r, context))
+    return metadata
+
+
+  def setEntityMetadataMultiple(self, entityRefs, data, context, merge=True):
+    """
+
+    Batch-sets @ref metadata for a list of entities, following the same
+    pattern as @ref setEntityMetadata.
+
+    @param data list(dict), A list of metadata dicts with the same length as
+    entityRefs. Each dict is applied to the reference with the same index.
+
+    @param merge, bool If true, then each entity's existing metadata will be
+    merged with the new data (the new data taking precedence). If false,
+    its metadata will entirely replaced by the new data.
+
+    This will be called by hosts when they wish to update many entities at
+    once, and so should be re-implemented to minimise the number of queries
+    and writes over a standard 'for' loop.
+
+    The base class implementation simply calls setEntityMetadata repeatedly
+    for each supplied reference.
+
+    @exception ValueError if the number of references and metadata dicts
+    differ.
+
+    @see setEntityMetadata for other exceptions, etc...
+
+    """
+    if len(entityRefs) != len(data):
+      raise ValueError("Mismatched references (%d) and metadata (%d)"
+          % (len(entityRefs), len(data)))
+
+    for r, d in zip(entityRefs, data):
+      self.setEntityMetadata(r, d, context, merge=merge)
+
+
   def getEntityMetadataEntry(self, entityRef, key, context, defaultValue=None):
     """
 
@@ -786,6 +847,48 @@ class ManagerInterfaceBase(object):
     return {}
 
 
+  def getEntityVersionPage(self, entityRef, context, pageSize, cursor=None):
+    """
+
+    Retrieves one page of the versions of the supplied @ref entity_reference,
+    newest first. This allows long version histories to be browsed without
+    retrieving every version at once.
+
+    @param pageSize int, The maximum number of versions in the page.
+
+    @param cursor The cursor returned with the previous page, or None for the
+    first page.
+
+    @return tuple, A list of (version name, @ref entity_reference) tuples
+    and the cursor of the next page, which is None if there are no more
+    versions.
+
+    The base class implementation pages through the result of
+    getEntityVersions, and so should be re-implemented to only retrieve the
+    requested page.
+
+    @exception python.exceptions.InvalidEntityReference If any supplied
+    reference is not recognised by the asset management system.
+
+    @see getEntityVersions()
+
+    """
+    versions = self.getEntityVersions(entityRef, context)
+    order = versions.pop(constants.kVersionDict_OrderKey, None)
+    if not order:
+      order = sorted(versions.keys())
+    order = list(reversed(order))
+
+    start = order.index(cursor) + 1 if cursor is not None else 0
+    names = order[start:start + pageSize]
+
+    nextCursor = None
+    if names and start + pageSize < len(order):
+      nextCursor = names[-1]
+
+    return [ (v, versions[v]) for v in names ], nextCursor
+
+
   def getFinalizedEntityVersion(self, entityRef, context, overrideVersionName=None):
     """
 
@@ -822,6 +925,34 @@ class ManagerInterfaceBase(object):
     """
     return entityRef
 
+
+  def getFinalizedEntityVersions(self, entityRefs, context,
+      overrideVersionName=None):
+    """
+
+    Batch-retrieves concrete versions for a list of entities, following the
+    same pattern as @ref getFinalizedEntityVersion.
+
+    @return list, A list of @ref entity_reference, corresponding to the source
+    reference with the same index.
+
+    This will be called by hosts when they wish to update many entities at
+    once, for example when conforming a timeline to the latest versions, and
+    so should be re-implemented to minimise the number of queries over a
+    standard 'for' loop.
+
+    The base class implementation simply calls getFinalizedEntityVersion
+    repeatedly for each supplied reference.
+
+    @see getFinalizedEntityVersion for exceptions, etc...
+
+    """
+    refs = []
+    for r in entityRefs:
+      refs.append(self.getFinalizedEntityVersion(r, context,
+          overrideVersionName))
+    return refs
+
   ## @}
 
 
@@ -9,6 +9,11 @@ from . import object as objectUtils
 from . import defaults as defaultsUtils
 
 
+## The number of shots updated by each call to setEntityMetadataMultiple, so
+## that progress can be reported while large sequences are updated.
+kUpdateChunkSize = 100
+
+
 def analyzeHieroShotItems(hieroShotItems, parentEntity, context=None,
     adopt=False, checkForConflicts=True):
   """
@@ -265,12 +270,23 @@ def updateEntitiesFromShotItems(shotItems, context):
   oldLocale = context.locale
   context.access = context.kWriteMultiple
 
-  with FnAssetAPI.SessionManager.currentSession().scopedActionGroup(context):
-    with ScopedProgressManager(len(shotItems)) as progress:
-      for s in shotItems:
-        with progress.step("Updating '%s'" % s.code):
-          if s.getEntity():
-            s.updateEntity(context)
+  session = FnAssetAPI.SessionManager.currentSession()
+  manager = session.currentManager()
+
+  # Update entities in chunks so the manager can batch its writes, whilst
+  # still reporting progress between them.
+  items = [s for s in shotItems if s.getEntity()]
+  chunks = [items[i:i+kUpdateChunkSize]
+      for i in range(0, len(items), kUpdateChunkSize)]
+
+  with session.scopedActionGroup(context):
+    with ScopedProgressManager(len(chunks)) as progress:
+      for chunk in chunks:
+        with progress.step("Updating '%s' to '%s'" % (chunk[0].code,
+            chunk[-1].code)):
+          refs = [s.getEntity().reference for s in chunk]
+          metadata = [s.toMetadata() for s in chunk]
+          manager.setEntityMetadataMultiple(refs, metadata, context)
 
   context.locale = oldLocale
 
@@ -0,0 +1,364 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 ftrack
+
+'''Accounting of server requests made by bridge calls.'''
+
+import time
+import inspect
+import weakref
+import functools
+import threading
+
+import FnAssetAPI.logging
+
+
+class Usage(object):
+    '''Server usage of one or more calls.
+
+    :py:attr:`queries` is the number of ftrack_api query actions and legacy
+    API requests, :py:attr:`commits` the number of session commits and
+    :py:attr:`requests` the number of round trips to the server.
+    :py:attr:`duration` is the wall time in seconds spent in the calls.
+
+    '''
+
+    def __init__(self):
+        '''Initialise usage of no calls.'''
+        super(Usage, self).__init__()
+        self.calls = 0
+        self.queries = 0
+        self.commits = 0
+        self.requests = 0
+        self.duration = 0.0
+
+    def __repr__(self):
+        '''Return representation of usage.'''
+        return (
+            '<Usage calls={0} queries={1} commits={2} requests={3} '
+            'duration={4:.3f}s>'.format(
+                self.calls, self.queries, self.commits, self.requests,
+                self.duration
+            )
+        )
+
+    def add(self, other):
+        '''Add usage of *other* to this usage.'''
+        self.calls += other.calls
+        self.queries += other.queries
+        self.commits += other.commits
+        self.requests += other.requests
+        self.duration += other.duration
+
+    def copy(self):
+        '''Return copy of usage.'''
+        usage = Usage()
+        usage.add(self)
+        return usage
+
+
+#: Guards :py:data:`_instrumented`.
+_instrumentedLock = threading.Lock()
+
+#: Mapping of instrumented objects to mappings of their wrapped method names
+#: to the original method, whether it was set on the object itself and the
+#: list of accountings recording calls of it.
+_instrumented = weakref.WeakKeyDictionary()
+
+
+def _instrument(target, name, accounting, count):
+    '''Record calls of method *name* of *target* with *accounting*.
+
+    *count* is called with the arguments of each call and returns a mapping
+    of counts to pass to :py:meth:`Accounting.record`. The method is wrapped
+    once however many accountings record it, so that accountings can stop
+    recording in any order with :py:func:`_release`.
+
+    '''
+    with _instrumentedLock:
+        methods = _instrumented.setdefault(target, {})
+        entry = methods.get(name)
+        if entry is None:
+            original = getattr(target, name)
+            accountings = []
+
+            @functools.wraps(original)
+            def wrapper(*args, **kwargs):
+                '''Call original method and record it.'''
+                counts = count(*args, **kwargs)
+                for recorder in list(accountings):
+                    recorder.record(**counts)
+
+                return original(*args, **kwargs)
+
+            entry = methods[name] = {
+                'original': original,
+                'own': name in vars(target),
+                'accountings': accountings
+            }
+            setattr(target, name, wrapper)
+
+        if accounting not in entry['accountings']:
+            entry['accountings'].append(accounting)
+
+
+def _release(target, name, accounting):
+    '''Stop recording calls of method *name* of *target* with *accounting*.
+
+    The original method is restored once no accounting records it.
+
+    '''
+    with _instrumentedLock:
+        methods = _instrumented.get(target, {})
+        entry = methods.get(name)
+        if entry is None or accounting not in entry['accountings']:
+            return
+
+        entry['accountings'].remove(accounting)
+        if entry['accountings']:
+            return
+
+        del methods[name]
+        if not methods:
+            del _instrumented[target]
+
+        if entry['own']:
+            setattr(target, name, entry['original'])
+        else:
+            delattr(target, name)
+
+
+def _countCall(data):
+    '''Return counts of a session call with operations *data*.'''
+    return {
+        'requests': 1,
+        'queries': sum(
+            1 for operation in data if operation.get('action') == 'query'
+        )
+    }
+
+
+def _countCommit(*args, **kwargs):
+    '''Return counts of a session commit.'''
+    return {'commits': 1}
+
+
+def _countLegacy(*args, **kwargs):
+    '''Return counts of a legacy API request.'''
+    return {'requests': 1, 'queries': 1}
+
+
+class Accounting(object):
+    '''Record server usage of calls per method.
+
+    A call is tracked with :py:meth:`track` and requests made on the same
+    thread while it runs are recorded against it. Calls made while another
+    is tracked on the same thread are included in the outer call only, so
+    that usage is reported for the method the host called. Threads doing
+    work for a tracked call can contribute to it with :py:meth:`attach`.
+
+    Sessions are instrumented with :py:meth:`instrumentSession` and the
+    legacy API with :py:meth:`instrumentLegacy`, which wrap their methods
+    until :py:meth:`release` is called. If the display severity of
+    :py:mod:`FnAssetAPI.logging` is :py:data:`FnAssetAPI.logging.kDebugAPI`
+    the usage of each call is logged.
+
+    An accounting that is not *enabled* records nothing and instruments
+    nothing, so that calls are made without overhead.
+
+    '''
+
+    def __init__(self, enabled=True):
+        '''Initialise with no usage recorded.'''
+        super(Accounting, self).__init__()
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._methods = {}
+        self._instrumented = weakref.WeakKeyDictionary()
+        self._legacyModules = []
+
+    def getUsage(self, method=None):
+        '''Return mapping of method names to total :py:class:`Usage`.
+
+        If *method* is specified return the total usage of that method only,
+        which has no calls if it has not been tracked.
+
+        '''
+        with self._lock:
+            if method is not None:
+                return self._methods.get(method, Usage()).copy()
+
+            return dict(
+                (name, usage.copy()) for name, usage in self._methods.items()
+            )
+
+    def reset(self):
+        '''Discard usage recorded so far.'''
+        with self._lock:
+            self._methods.clear()
+
+    def current(self):
+        '''Return usage of call tracked on the current thread or None.'''
+        return getattr(self._local, 'usage', None)
+
+    def track(self, method, function, targets=()):
+        '''Return result of calling *function* tracked as *method*.
+
+        Usage of the call is added to the total of *method* and to each
+        :py:class:`Usage` in *targets*, such as the usage of the manager
+        state the call was made with.
+
+        '''
+        if not self.enabled or self.current() is not None:
+            return function()
+
+        # Instrument the legacy API again if released since.
+        for module in self._legacyModules:
+            self.instrumentLegacy(module)
+
+        usage = self._local.usage = Usage()
+        usage.calls = 1
+        started = time.time()
+        try:
+            return function()
+
+        finally:
+            usage.duration = time.time() - started
+            self._local.usage = None
+
+            with self._lock:
+                self._methods.setdefault(method, Usage()).add(usage)
+                for target in targets:
+                    target.add(usage)
+
+            if (
+                FnAssetAPI.logging.displaySeverity
+                >= FnAssetAPI.logging.kDebugAPI
+            ):
+                FnAssetAPI.logging.log(
+                    'ftrack usage of {0}: {1!r}'.format(method, usage),
+                    FnAssetAPI.logging.kDebugAPI
+                )
+
+    def attach(self, usage, function, *args, **kwargs):
+        '''Return result of calling *function* contributing to *usage*.
+
+        *usage* should be the :py:meth:`current` usage of the thread that
+        started the work, or None to not record requests made by *function*.
+
+        '''
+        previous = self.current()
+        self._local.usage = usage
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self._local.usage = previous
+
+    def record(self, queries=0, commits=0, requests=0):
+        '''Add counts to the call tracked on the current thread.'''
+        usage = self.current()
+        if usage is None:
+            return
+
+        with self._lock:
+            usage.queries += queries
+            usage.commits += commits
+            usage.requests += requests
+
+    def instrumentSession(self, session):
+        '''Record requests made with ftrack_api *session*.
+
+        The call and commit methods of *session* are wrapped until
+        :py:meth:`release` is called.
+
+        '''
+        self._instrument(session, 'call', _countCall)
+        self._instrument(session, 'commit', _countCommit)
+
+    def instrumentLegacy(self, module):
+        '''Record requests made through legacy API *module*.
+
+        All requests of the legacy API are made through the action method of
+        its server client, which is wrapped until :py:meth:`release` is
+        called. Each request is recorded as a query.
+
+        '''
+        if not self.enabled:
+            return
+
+        if module not in self._legacyModules:
+            self._legacyModules.append(module)
+
+        server = getattr(module, 'xmlServer', None)
+        if server is not None:
+            self._instrument(server, 'action', _countLegacy)
+
+    def release(self):
+        '''Restore methods instrumented by this accounting.
+
+        Other accountings instrumenting the same methods keep recording. The
+        legacy API is instrumented again by the next tracked call.
+
+        '''
+        with self._lock:
+            instrumented = self._instrumented.items()
+            self._instrumented.clear()
+
+        for target, names in instrumented:
+            for name in names:
+                _release(target, name, self)
+
+    def _instrument(self, target, name, count):
+        '''Record calls of method *name* of *target* using *count*.'''
+        if not self.enabled:
+            return
+
+        with self._lock:
+            names = self._instrumented.setdefault(target, set())
+            if name in names:
+                return
+
+            names.add(name)
+
+        _instrument(target, name, self, count)
+
+
+def accounted(function):
+    '''Decorate bridge method *function* to track its server usage.
+
+    Calls are tracked with the accounting of the bridge, and with the usage
+    of the manager state of the context argument if there is one.
+
+    '''
+    argumentNames = inspect.getargspec(function).args
+    contextIndex = None
+    if 'context' in argumentNames:
+        # Index into positional arguments following self.
+        contextIndex = argumentNames.index('context') - 1
+
+    @functools.wraps(function)
+    def wrapper(self, *args, **kwargs):
+        '''Call wrapped function, tracking server usage.'''
+        accounting = self._accounting
+        if not accounting.enabled or accounting.current() is not None:
+            return function(self, *args, **kwargs)
+
+        context = kwargs.get('context')
+        if (
+            context is None and contextIndex is not None
+            and contextIndex < len(args)
+        ):
+            context = args[contextIndex]
+
+        targets = ()
+        state = self._getState(context)
+        if state is not None:
+            targets = (state.usage,)
+
+        return accounting.track(
+            function.__name__,
+            functools.partial(function, self, *args, **kwargs),
+            targets
+        )
+
+    return wrapper
@@ -2,31 +2,236 @@
 # :copyright: Copyright (c) 2014 ftrack
 
 import os
+import time
 import urlparse
 import itertools
+import functools
+import collections
+import threading
+import weakref
+import uuid
+import multiprocessing.pool
 
 import FnAssetAPI.implementation
 import FnAssetAPI.constants
 import FnAssetAPI.specifications
 import FnAssetAPI.exceptions
 import FnAssetAPI.logging
+import FnAssetAPI.contextManagers
 import ftrack
+import ftrack_api
 
 import ftrack_connect.session
 import ftrack_connect_foundry.event
 import ftrack_connect_foundry.proxy
 import ftrack_connect_foundry.constant
 import ftrack_connect_foundry.locker
+import ftrack_connect_foundry.cache
+import ftrack_connect_foundry.state
+import ftrack_connect_foundry.transaction
+import ftrack_connect_foundry.resolve_cache
+import ftrack_connect_foundry.hierarchy
+import ftrack_connect_foundry.schema
+import ftrack_connect_foundry.thumbnail
+import ftrack_connect_foundry.single_flight
+import ftrack_connect_foundry.snapshot
+import ftrack_connect_foundry.replica
+import ftrack_connect_foundry.accounting
+import ftrack_connect_foundry.event_source
 
 
 class Bridge(object):
     '''Bridging functionality between core API's.'''
 
-    def __init__(self):
-        '''Initialise bridge.'''
+    #: Index of entity identifier to reference entity type, such as 'task',
+    #: shared by all bridges in the process. The type of an entity never
+    #: changes so entries remain valid until evicted.
+    _entityTypeIndex = ftrack_connect_foundry.cache.Cache(
+        maximumSize=(
+            ftrack_connect_foundry.constant.ENTITY_TYPE_INDEX_MAXIMUM_SIZE
+        )
+    )
+
+    #: Serialises legacy API calls made by related reference lookups on
+    #: worker threads, as the legacy API is shared by the whole process and
+    #: is not thread safe.
+    _legacyLock = threading.RLock()
+
+    def __init__(self, session=None, cache=None, resolveCache=None,
+                 sessionFactory=None, relatedReferenceWorkers=None,
+                 replica=None, eventSource=None, accounting=None):
+        '''Initialise bridge.
+
+        *session* may be a :py:class:`ftrack_api.Session` to use for queries
+        made on the main thread. If not specified the shared session from
+        :py:mod:`ftrack_connect` will be used.
+
+        *sessionFactory* may be a callable returning a new
+        :py:class:`ftrack_api.Session`. It is used to create a session for
+        each other thread that calls the bridge as sessions must not be
+        shared between threads. If not specified sessions are created with
+        the server and credentials of *session*, or from the environment if
+        *session* is not specified either.
+
+        *cache* may be a :py:class:`ftrack_connect_foundry.cache.Cache` to
+        store entity data in. If not specified a cache bounded to
+        :py:data:`~ftrack_connect_foundry.constant.CACHE_MAXIMUM_SIZE` entries
+        will be used.
+
+        *resolveCache* may be a
+        :py:class:`ftrack_connect_foundry.resolve_cache.ResolveCache` to
+        persist resolved component paths in so that other processes can reuse
+        them. If not specified one is created in the directory named by the
+        :envvar:`FTRACK_CONNECT_FOUNDRY_RESOLVE_CACHE` environment variable,
+        if set.
+
+        *relatedReferenceWorkers* is the number of threads used by
+        :py:meth:`getRelatedReferences` to look up many references at once. If
+        not specified the value of the
+        :envvar:`FTRACK_CONNECT_FOUNDRY_RELATED_WORKERS` environment variable
+        or :py:data:`~ftrack_connect_foundry.constant.
+        RELATED_REFERENCE_WORKERS` is used.
+
+        *replica* may be a :py:class:`ftrack_connect_foundry.replica.Replica`
+        to serve references, names, versions and related references of the
+        entities it contains from instead of the server. If not specified the
+        replica at the path named by the
+        :envvar:`FTRACK_CONNECT_FOUNDRY_REPLICA` environment variable is
+        used, if set.
+
+        *eventSource* may be a
+        :py:class:`ftrack_connect_foundry.event_source.EventSource` to receive
+        the update and location events used to discard stale cached data
+        from. If not specified the event hub of the main thread session is
+        used, which only delivers events from the server if it is connected
+        and processed by the host (see
+        :py:class:`~ftrack_connect_foundry.event_source.SessionEventSource`).
+
+        *accounting* may be True to record the server usage of calls, as
+        reported by :py:meth:`getUsage`. Sessions and the legacy API are
+        instrumented to do so until :py:meth:`close` is called. If not
+        specified accounting is enabled when the
+        :envvar:`FTRACK_CONNECT_FOUNDRY_ACCOUNTING` environment variable is
+        set to a value other than '0'.
+
+        '''
         super(Bridge, self).__init__()
         self._initialized = False
-        self._memoiser = ftrack.cache.Memoiser()
+        self._session = session
+        self._subscribedSession = None
+        self._eventSource = eventSource
+
+        if sessionFactory is None:
+            options = {'auto_connect_event_hub': False}
+            if session is not None:
+                options.update(
+                    server_url=session.server_url,
+                    api_key=session.api_key,
+                    api_user=session.api_user
+                )
+
+            sessionFactory = functools.partial(ftrack_api.Session, **options)
+
+        self._sessionFactory = sessionFactory
+        self._threadSessions = threading.local()
+
+        if relatedReferenceWorkers is None:
+            relatedReferenceWorkers = int(
+                os.environ.get(
+                    ftrack_connect_foundry.constant
+                    .RELATED_REFERENCE_WORKERS_ENV,
+                    ftrack_connect_foundry.constant.RELATED_REFERENCE_WORKERS
+                )
+            )
+
+        self._relatedReferenceWorkers = max(relatedReferenceWorkers, 1)
+        self._relatedReferencePool = None
+        self._relatedReferencePoolLock = threading.Lock()
+
+        # Locations with an accessor, per session as location entities are
+        # bound to the session that loaded them.
+        self._locations = weakref.WeakKeyDictionary()
+        self._locationsLock = threading.Lock()
+
+        if cache is None:
+            cache = ftrack_connect_foundry.cache.Cache(
+                maximumSize=ftrack_connect_foundry.constant.CACHE_MAXIMUM_SIZE
+            )
+
+        self._cache = cache
+
+        if resolveCache is None:
+            directory = os.environ.get(
+                ftrack_connect_foundry.constant.RESOLVE_CACHE_DIRECTORY_ENV
+            )
+            if directory:
+                resolveCache = (
+                    ftrack_connect_foundry.resolve_cache.ResolveCache(
+                        directory,
+                        maximumAge=ftrack_connect_foundry.constant
+                        .RESOLVE_CACHE_MAXIMUM_AGE
+                    )
+                )
+
+        self._resolveCache = resolveCache
+
+        if replica is None:
+            path = os.environ.get(
+                ftrack_connect_foundry.constant.REPLICA_PATH_ENV
+            )
+            if path:
+                replica = ftrack_connect_foundry.replica.Replica(path)
+
+        self._replica = replica
+
+        if accounting is None:
+            accounting = os.environ.get(
+                ftrack_connect_foundry.constant.ACCOUNTING_ENV, '0'
+            ) not in ('', '0')
+
+        self._accounting = ftrack_connect_foundry.accounting.Accounting(
+            enabled=accounting
+        )
+        self._accounting.instrumentLegacy(ftrack)
+
+        if eventSource is not None:
+            self._subscribe(eventSource)
+
+        # Names and parents of entities used to build display names and paths
+        # without walking parents on the server.
+        self._hierarchy = ftrack_connect_foundry.hierarchy.Hierarchy()
+
+        self._schema = ftrack_connect_foundry.schema.getSharedSchema()
+
+        # Identical lookups made by several threads at once, keyed by
+        # (operation, identifier), share a single request.
+        self._singleFlight = ftrack_connect_foundry.single_flight.SingleFlight()
+
+        # Guards updates to the meta-version index. The generation changes
+        # whenever a version is registered so that entries loaded before the
+        # registration committed are not stored over newer ones.
+        self._metaVersionLock = threading.Lock()
+        self._metaVersionGeneration = 0
+
+        self._thumbnailQueue = ftrack_connect_foundry.thumbnail.ThumbnailQueue(
+            self._uploadThumbnail,
+            workers=ftrack_connect_foundry.constant.THUMBNAIL_UPLOAD_WORKERS,
+            retries=ftrack_connect_foundry.constant.THUMBNAIL_UPLOAD_RETRIES,
+            maximumSize=(
+                ftrack_connect_foundry.constant.THUMBNAIL_QUEUE_MAXIMUM_SIZE
+            ),
+            putTimeout=(
+                ftrack_connect_foundry.constant.THUMBNAIL_QUEUE_PUT_TIMEOUT
+            ),
+            uploadedMaximumSize=(
+                ftrack_connect_foundry.constant.THUMBNAIL_UPLOADED_MAXIMUM_SIZE
+            )
+        )
+
+        # Manager states created by this bridge. Held weakly so that their
+        # lifetime is determined by the contexts that own them.
+        self._states = weakref.WeakSet()
+        self._statesLock = threading.Lock()
 
         self._metamap = {
             'fullname': FnAssetAPI.constants.kField_DisplayName,
@@ -47,9 +252,68 @@ class Bridge(object):
 
         self.ftrackMetaKeys = []
 
+        # Mapping of reference entity types to the legacy class name used to
+        # look up metadata keys and the ftrack_api schema used to load many
+        # entities of that type at once.
+        self._legacyTypes = {
+            'component': 'Component',
+            'asset_version': 'AssetVersion',
+            'asset': 'Asset',
+            'show': 'Project',
+            'task': 'Task',
+            'tasktype': 'TaskType'
+        }
+
+        self._schemaTypes = {
+            'component': 'Component',
+            'asset_version': 'AssetVersion',
+            'asset': 'Asset',
+            'show': 'Project',
+            'task': 'TypedContext',
+            'tasktype': 'Type'
+        }
+
+        # Attributes required to resolve, name and return metadata for each
+        # reference entity type.
+        self._projections = {
+            'component': [
+                'name', 'metadata', 'version_id',
+                'component_locations.location_id',
+                'component_locations.resource_identifier'
+            ],
+            'asset_version': [
+                'version', 'comment', 'metadata', 'asset_id', 'task_id'
+            ],
+            'asset': ['name', 'metadata', 'context_id'],
+            'show': [
+                'name', 'full_name', 'start_date', 'end_date', 'metadata'
+            ],
+            'task': [
+                'name', 'metadata', 'parent_id', 'object_type.name',
+                'custom_attributes'
+            ],
+            'tasktype': ['name']
+        }
+
+        # Cache namespaces included in frozen states, most important first.
+        # Their values must be serialisable as JSON.
+        self._snapshotNamespaces = (
+            'path', 'versiontarget', 'metaversion', 'name', 'context'
+        )
+
+        # Mapping of legacy metadata keys to ftrack_api attributes. Keys not
+        # present are looked up as custom attributes.
+        self._schemaMetakeys = {
+            'fullname': 'full_name',
+            'startdate': 'start_date',
+            'enddate': 'end_date',
+            'comment': 'comment'
+        }
+
     # Standard interface to fulfil FnAssetAPI requirements.
     #
 
+    @ftrack_connect_foundry.accounting.accounted
     def initialize(self):
         '''Prepare for interaction with the current host.'''
         if not self._initialized:
@@ -70,6 +334,7 @@ class Bridge(object):
         '''Return human readable name.'''
         return 'ftrack'
 
+    @ftrack_connect_foundry.accounting.accounted
     def getInfo(self):
         '''Return dictionary of additional useful information.'''
         return {
@@ -80,17 +345,184 @@ class Bridge(object):
             )
         }
 
+    @ftrack_connect_foundry.accounting.accounted
     def managementPolicy(self, specification, context, entityRef=None):
         '''Return level of management this interface provides.'''
         # TODO: Inspect specification and set ignored on the types that are
         # not manageable.
         # TODO: Set path management flag when locations is merged in.
-        policy = 0
+        policy = FnAssetAPI.constants.kSupportsBatchOperations
         return policy ^ FnAssetAPI.constants.kManaged
 
     def flushCaches(self):
         '''Clear any internal caches.'''
-        self._memoiser.cache.clear()
+        self._cache.clear()
+        self._hierarchy.clear()
+
+        for state in self._getStates():
+            state.cache.clear()
+
+    def cacheStats(self):
+        '''Return dictionary of statistics for the entity cache.
+
+        See :py:meth:`ftrack_connect_foundry.cache.Cache.stats` for the keys
+        included.
+
+        '''
+        return self._cache.stats()
+
+    @ftrack_connect_foundry.accounting.accounted
+    def prefetch(self, entityRefs, context):
+        '''Load data for *entityRefs* ahead of subsequent queries.
+
+        References are grouped by their entity type and each group is loaded
+        with a single query (per :py:data:`~ftrack_connect_foundry.constant.
+        QUERY_BATCH_SIZE` references) projecting the attributes needed to
+        resolve, name and return metadata for the entities. The results are
+        stored in the bridge cache.
+
+        The types of references without an entity type are looked up with
+        :py:meth:`getEntityReferenceTypes`. Unrecognised references and
+        references already present in the cache are ignored.
+
+        '''
+        entityRefs = [
+            entityRef for entityRef in entityRefs
+            if entityRef and self.isEntityReference(entityRef, context)
+        ]
+
+        # Look up types of references without one in a single request.
+        untyped = []
+        for entityRef in entityRefs:
+            identifier, entityType = self._parseEntityReference(entityRef)
+            if entityType is None:
+                untyped.append(identifier)
+
+        entityTypes = self.getEntityReferenceTypes(untyped)
+
+        grouped = collections.OrderedDict()
+        for entityRef in entityRefs:
+            identifier, entityType = self._parseEntityReference(entityRef)
+            if entityType is None:
+                entityType = entityTypes.get(identifier)
+
+            if entityType not in self._schemaTypes:
+                continue
+
+            if self._isCached(entityType, identifier):
+                continue
+
+            identifiers = grouped.setdefault(entityType, [])
+            if identifier not in identifiers:
+                identifiers.append(identifier)
+
+        for entityType, identifiers in grouped.items():
+            loaded = time.time()
+            entities = self._queryByIds(
+                self._schemaTypes[entityType], identifiers,
+                self._projections[entityType]
+            )
+
+            for entity in entities:
+                self._seedCache(entityType, entity)
+
+            if entityType == 'component' and entities:
+                paths = self._getComponentPaths(entities)
+                for identifier, (location, path) in paths.items():
+                    self._setComponentPath(identifier, location, path, loaded)
+
+    def _isCached(self, entityType, identifier):
+        '''Return whether data for *identifier* of *entityType* is cached.'''
+        namespaces = ['name']
+        if 'metadata' in self._projections[entityType]:
+            namespaces.append('metadata')
+
+        if entityType == 'component':
+            namespaces.append('path')
+
+        for namespace in namespaces:
+            try:
+                self._cache.get(self._cacheKey(namespace, identifier))
+            except KeyError:
+                return False
+
+        return True
+
+    def _queryByIds(self, schemaType, identifiers, projections,
+                    attribute='id'):
+        '''Return entities of *schemaType* matching *identifiers*.
+
+        *projections* is a list of attributes to load for each entity. Queries
+        are issued in batches of
+        :py:data:`~ftrack_connect_foundry.constant.QUERY_BATCH_SIZE`
+        identifiers.
+
+        *attribute* is the attribute compared against *identifiers*, such as
+        'parent_id' to load the children of several entities at once.
+
+        '''
+        session = self._getSession()
+        batchSize = ftrack_connect_foundry.constant.QUERY_BATCH_SIZE
+
+        entities = []
+        for index in range(0, len(identifiers), batchSize):
+            batch = identifiers[index:index + batchSize]
+            query = 'select {0} from {1} where {2} in ({3})'.format(
+                ', '.join(projections), schemaType, attribute,
+                ', '.join('"{0}"'.format(identifier) for identifier in batch)
+            )
+            entities.extend(session.query(query).all())
+
+        return entities
+
+    def _seedCache(self, entityType, entity):
+        '''Store name and metadata of ftrack_api *entity* in the cache.
+
+        *entityType* is the reference entity type of *entity*, such as
+        'component' or 'task'.
+
+        '''
+        identifier = entity['id']
+        self._entityTypeIndex.set(identifier, entityType)
+
+        if entityType == 'asset_version':
+            name = 'v' + str(entity['version']).zfill(3)
+        else:
+            name = entity['name']
+
+        self._cache.set(
+            self._cacheKey('name', identifier), name, category=entityType
+        )
+
+        if 'metadata' in self._projections[entityType]:
+            self._cache.set(
+                self._cacheKey('metadata', identifier),
+                self._getSchemaMetadata(entityType, entity),
+                category=entityType
+            )
+
+    def _getSchemaMetadata(self, entityType, entity):
+        '''Return metadata for ftrack_api *entity* of *entityType*.
+
+        Mapped properties are included in the same way as
+        :py:meth:`getEntityMetadata` does for legacy entities.
+
+        '''
+        metadata = dict(entity['metadata'])
+
+        legacyType = self._legacyTypes.get(entityType)
+        for key in self._metakeys.get(legacyType, []):
+            attribute = self._schemaMetakeys.get(key)
+            if attribute is not None:
+                value = entity[attribute]
+            else:
+                value = entity['custom_attributes'].get(key)
+
+            # Convert arrow instances to the datetime the legacy API returns.
+            value = getattr(value, 'datetime', value)
+            metadata[self._metamap.get(key, key)] = value
+
+        return metadata
 
     def isEntityReference(self, token, context):
         '''Return whether *token* appears to be an entity reference.
@@ -113,12 +545,50 @@ class Bridge(object):
         '''Return default entity reference for *specification* and *context*.'''
         return ''
 
+    @ftrack_connect_foundry.accounting.accounted
     def resolveEntityReference(self, entityRef, context):
         '''Resolve *entityRef* to a finalized string of data.'''
-        entity = self.getEntityById(entityRef)
+        identifier, entityType = self._parseEntityReference(entityRef)
+        if entityType is None:
+            entityType = self._getIndexedEntityType(identifier)
+
         resolved = None
+        if entityType in (None, 'component'):
+            resolved = self._getComponentPath(identifier)
+
+        if resolved is not None:
+            # Only component paths are cached so prevent writing to asset.
+            if context and context.isForWrite():
+                raise FnAssetAPI.exceptions.InvalidEntityReference(
+                    'Cannot overwrite an existing asset.', entityRef
+                )
+
+            return resolved
+
+        registration = self._getPendingRegistration(identifier, context)
+        if registration is not None:
+            if context.isForWrite():
+                raise FnAssetAPI.exceptions.InvalidEntityReference(
+                    'Cannot overwrite an existing asset.', entityRef
+                )
+
+            return self._conformPath(registration['path'])
+
+        if self._replica is not None:
+            resolved = self._resolveFromReplica(identifier, entityRef, context)
+            if resolved is not None:
+                return resolved
+
+        if entityType is not None and entityType != 'component':
+            try:
+                return self._cache.get(
+                    self._cacheKey('name', identifier)
+                )
+            except KeyError:
+                pass
 
-        session = ftrack_connect.session.get_shared_session()
+        entity = self.getEntityById(entityRef)
+        resolved = None
 
         if isinstance(entity, ftrack.Component):
             # Prevent writing to asset.
@@ -128,17 +598,11 @@ class Bridge(object):
                     'Cannot overwrite an existing asset.', entityRef
                 )
 
-            component = session.get(
-                'Component', entity.getId()
-            )
-
-            location = session.pick_location(
-                component
+            resolved = self._singleFlight.do(
+                ('resolve', entity.getId()), self._resolveComponent,
+                entity.getId()
             )
 
-            importPath = location.get_filesystem_path(component)
-            resolved = self._conformPath(importPath)
-
         else:
             try:
                 resolved = self.getEntityName(entity.getEntityRef())
@@ -152,10 +616,365 @@ class Bridge(object):
 
         return resolved
 
+    def _resolveFromReplica(self, identifier, entityRef, context):
+        '''Return *entityRef* resolved from the replica or None.
+
+        None is returned if the entity is not present in the replica or is a
+        component without a path in an accessible location.
+
+        '''
+        entityType = self._replica.getEntityType(identifier)
+        if entityType is None:
+            return None
+
+        self._entityTypeIndex.set(identifier, entityType)
+        if entityType != 'component':
+            return self.getEntityName(entityRef)
+
+        if context and context.isForWrite():
+            raise FnAssetAPI.exceptions.InvalidEntityReference(
+                'Cannot overwrite an existing asset.', entityRef
+            )
+
+        self._loadReplicaComponentPaths([identifier])
+        return self._getComponentPath(identifier)
+
+    def _loadReplicaComponentPaths(self, identifiers):
+        '''Cache paths of components *identifiers* present in the replica.'''
+        components = self._replica.getComponents(identifiers)
+        paths = self._getComponentPaths(components)
+        for identifier, (location, path) in paths.items():
+            self._entityTypeIndex.set(identifier, 'component')
+            self._setComponentPath(identifier, location, path)
+
+    def _resolveComponent(self, identifier):
+        '''Return path of component *identifier* in the best location.'''
+        # Another thread may have resolved the component while waiting.
+        resolved = self._getComponentPath(identifier)
+        if resolved is not None:
+            return resolved
+
+        loaded = time.time()
+        session = self._getSession()
+        component = session.get('Component', identifier)
+        location = session.pick_location(component)
+
+        importPath = location.get_filesystem_path(component)
+        resolved = self._conformPath(importPath)
+
+        self._setComponentPath(identifier, location, resolved, loaded)
+        return resolved
+
     def _conformPath(self, path):
         '''Return *path* processed for use by current host.'''
         return path
 
+    @ftrack_connect_foundry.accounting.accounted
+    def resolveEntityReferences(self, entityRefs, context):
+        '''Resolve *entityRefs* to a list of finalized strings of data.
+
+        Data for all *entityRefs* is loaded up front using :py:meth:`prefetch`
+        so that components are fetched with a single query and their paths
+        computed without further server calls. Components with a cached path
+        or present in the replica are not loaded.
+
+        '''
+        if self._replica is not None:
+            self._loadReplicaComponentPaths([
+                identifier for identifier in (
+                    self._parseEntityReference(entityRef)[0]
+                    for entityRef in entityRefs
+                )
+                if self._getComponentPath(identifier) is None
+            ])
+
+        self.prefetch(
+            [
+                entityRef for entityRef in entityRefs
+                if self._getComponentPath(
+                    self._parseEntityReference(entityRef)[0]
+                ) is None
+            ],
+            context
+        )
+
+        return [
+            self.resolveEntityReference(entityRef, context)
+            for entityRef in entityRefs
+        ]
+
+    def _getComponentPaths(self, components):
+        '''Return mapping of component id to (location, path) for *components*.
+
+        *components* must have been loaded with their component locations
+        projected. A location is picked once per unique set of locations the
+        components are present in and paths are then computed from the loaded
+        resource identifiers without further server calls. Components not
+        present in a location with an accessor are omitted.
+
+        '''
+        locations = self._getLocations()
+
+        picked = {}
+        paths = {}
+        for component in components:
+            resourceIdentifiers = dict(
+                (
+                    componentLocation['location_id'],
+                    componentLocation['resource_identifier']
+                )
+                for componentLocation in component['component_locations']
+            )
+
+            locationSet = frozenset(resourceIdentifiers.keys())
+            if locationSet not in picked:
+                picked[locationSet] = None
+                for location in locations:
+                    if location['id'] in locationSet:
+                        picked[locationSet] = location
+                        break
+
+            location = picked[locationSet]
+            if location is None:
+                continue
+
+            resourceIdentifier = resourceIdentifiers[location['id']]
+            if location.resource_identifier_transformer:
+                resourceIdentifier = (
+                    location.resource_identifier_transformer.decode(
+                        resourceIdentifier, context={'component': component}
+                    )
+                )
+
+            try:
+                path = location.accessor.get_filesystem_path(
+                    resourceIdentifier
+                )
+            except ftrack_api.exception.Error, error:
+                FnAssetAPI.logging.debug(
+                    'Unable to get path for {0} from {1}: {2}'.format(
+                        component['id'], location['name'], error
+                    )
+                )
+                continue
+
+            paths[component['id']] = (location, self._conformPath(path))
+
+        return paths
+
+    def _getComponentPath(self, identifier):
+        '''Return cached path of component *identifier* or None.
+
+        The persistent resolve cache is consulted when the path is not held
+        in memory.
+
+        '''
+        key = self._cacheKey('path', identifier)
+        try:
+            return self._cache.get(key)
+        except KeyError:
+            pass
+
+        if self._resolveCache is None:
+            return None
+
+        path = self._resolveCache.get(
+            identifier, scope=self._getResolveCacheScope()
+        )
+        if path is not None:
+            self._cache.set(key, path, category='component')
+
+        return path
+
+    def _setComponentPath(self, identifier, location, path, loaded=None):
+        '''Cache *path* of component *identifier* in *location*.
+
+        *loaded* is the time the path was loaded from the server, used to
+        store it in the persistent resolve cache. Paths not loaded from the
+        server, such as those of the replica, are only held in memory.
+
+        '''
+        self._cache.set(
+            self._cacheKey('path', identifier), path, category='component'
+        )
+
+        if self._resolveCache is not None and loaded is not None:
+            self._resolveCache.set(
+                identifier, location['id'], location.priority, path,
+                scope=self._getResolveCacheScope(), loaded=loaded
+            )
+
+    def _getResolveCacheScope(self):
+        '''Return scope of paths in the persistent resolve cache.
+
+        Paths are shared by processes using the same server and user only,
+        as other users may not be able to access the same locations.
+
+        '''
+        session = self._getSession()
+        return '{0}@{1}'.format(
+            getattr(session, 'api_user', ''),
+            getattr(session, 'server_url', '')
+        )
+
+    def _onComponentLocationChanged(self, event):
+        '''Discard cached paths of component in location changed *event*.'''
+        identifier = event['data'].get('component_id')
+        if not identifier:
+            return
+
+        self._discardCache('path', identifier)
+        if self._resolveCache is not None:
+            self._resolveCache.invalidate(identifier)
+
+    def _onEntitiesUpdated(self, event):
+        '''Discard cached data of entities changed in update *event*.
+
+        Only data of the changed entities is removed, together with the
+        relationship results that depend on them or their parents and the
+        version lists of affected assets. Cached data of other entities is
+        kept.
+
+        '''
+        for entity in event['data'].get('entities', []):
+            identifiers = entity.get('entityId')
+            if not isinstance(identifiers, list):
+                identifiers = [identifiers]
+
+            identifiers = [
+                identifier for identifier in identifiers if identifier
+            ]
+            if not identifiers:
+                continue
+
+            entityType = entity.get('entityType') or ''
+            if entityType == 'location':
+                with self._locationsLock:
+                    self._locations.clear()
+
+                continue
+
+            parentIds = set(
+                parent.get('entityId')
+                for parent in entity.get('parents') or []
+            )
+            parentIds.add(entity.get('parentId'))
+            parentIds.difference_update(identifiers)
+            parentIds.discard(None)
+
+            if (
+                entityType in ('asset', 'assetversion')
+                or entityType.endswith('component')
+            ):
+                self._invalidateVersionLists(
+                    identifiers, entityType, entity, parentIds
+                )
+
+            for identifier in identifiers:
+                for namespace in (
+                    'entity', 'name', 'metadata', 'context', 'path'
+                ):
+                    self._discardCache(namespace, identifier)
+
+                self._hierarchy.remove(identifier)
+                self._invalidateRelated(identifier)
+
+                if (
+                    entityType.endswith('component')
+                    and self._resolveCache is not None
+                ):
+                    self._resolveCache.invalidate(identifier)
+
+            for parentId in parentIds:
+                self._invalidateRelated(parentId)
+
+    def _invalidateVersionLists(self, identifiers, entityType, entity,
+                                parentIds):
+        '''Discard meta-version entries affected by change to *identifiers*.
+
+        *entity* is the changed entity entry of an update event and
+        *parentIds* the identifiers of its parents. The affected assets are
+        found from the event and the cached version targets. If none can be
+        found all meta-version entries are discarded.
+
+        '''
+        assetIds = set(
+            parent.get('entityId')
+            for parent in entity.get('parents') or []
+            if parent.get('entityType') == 'asset'
+        )
+
+        if entityType == 'asset':
+            assetIds.update(identifiers)
+
+        change = (entity.get('changes') or {}).get('asset_id') or {}
+        assetIds.update([change.get('new'), change.get('old')])
+
+        for identifier in list(identifiers) + list(parentIds):
+            try:
+                assetId, _ = self._cache.get(
+                    self._cacheKey('versiontarget', identifier)
+                )
+            except KeyError:
+                continue
+
+            assetIds.add(assetId)
+
+        for identifier in identifiers:
+            self._discardCache('versiontarget', identifier)
+
+        assetIds.discard(None)
+
+        # Prevent lists loaded before the change from being stored.
+        with self._metaVersionLock:
+            self._metaVersionGeneration += 1
+
+        if assetIds:
+            for assetId in assetIds:
+                self._discardCache('metaversion', assetId)
+
+        else:
+            prefix = self._cacheKey('metaversion', '')
+            self._cache.removeMatching(
+                lambda key, value: key.startswith(prefix)
+            )
+
+    def _getLocations(self):
+        '''Return locations that have an accessor ordered by priority.
+
+        Locations are loaded once for each session. Those stored in the
+        replica are got from the session by identifier, which needs no
+        request for the locations the session was configured with.
+
+        '''
+        session = self._getSession()
+        with self._locationsLock:
+            locations = self._locations.get(session)
+
+        if locations is not None:
+            return locations
+
+        locations = []
+        if self._replica is not None:
+            locations = [
+                session.get('Location', identifier)
+                for identifier in self._replica.getLocationIds()
+            ]
+
+        if not locations:
+            locations = session.query('Location').all()
+
+        locations = [
+            location for location in locations
+            if location is not None and location.accessor
+        ]
+        locations.sort(key=lambda location: location.priority)
+
+        with self._locationsLock:
+            self._locations[session] = locations
+
+        return locations
+
     def containsEntityReference(self, string, context):
         '''Return whether *string* contains an entity reference.
 
@@ -168,6 +987,7 @@ class Bridge(object):
         '''Return copy of input *string* with all references resolved.'''
         return string
 
+    @ftrack_connect_foundry.accounting.accounted
     def getRelatedReferences(self, entityReferences, specifications, context,
                              resultSpec=None):
         '''Return related entity references, based on specification
@@ -184,28 +1004,100 @@ class Bridge(object):
             If the number of entries in each list do not match then the last
             entry will be repeated in the shorter list.
 
+        Results are cached for the lifetime of the manager state of *context*
+        (see :py:meth:`createState`) and invalidated when registrations affect
+        them. Without a manager state results are only reused within this call.
+
         '''
-        self.flushCaches()
+        cache = self._getStateCache(context)
+        if cache is None:
+            cache = ftrack_connect_foundry.cache.Cache()
 
         if len(entityReferences) > len(specifications):
             filler = specifications[-1]
         else:
             filler = entityReferences[-1]
 
-        related = []
-        for entityReference, specification in itertools.izip_longest(
+        pairs = list(
+            itertools.izip_longest(
                 entityReferences, specifications, fillvalue=filler
-        ):
-            related.append(
-                self._getRelatedReferences(
-                    entityReference, specification, context, resultSpec
-                )
             )
+        )
 
-        return related
+        self._prefetchWorkflowReferences(pairs, cache)
+
+        usage = self._accounting.current()
+
+        def lookup(pair):
+            '''Return related references for *pair*.'''
+            entityReference, specification = pair
+            return self._accounting.attach(
+                usage, self._getRelatedReferences, entityReference,
+                specification, context, resultSpec, cache
+            )
+
+        # Without the replica, only workflow lookups are made with
+        # ftrack_api. Others hold _legacyLock throughout, so running them on
+        # the pool would serialise them and only add overhead.
+        concurrent = self._replica is not None or any(
+            specification.isOfType('workflow')
+            for _, specification in pairs
+        )
+
+        pool = None
+        if concurrent and len(pairs) > 1 and not self._isPoolThread():
+            pool = self._getRelatedReferencePool()
+
+        if pool is None:
+            return [lookup(pair) for pair in pairs]
+
+        # Results are returned in the order of pairs.
+        return pool.map(lookup, pairs, chunksize=1)
+
+    def _getRelatedReferencePool(self):
+        '''Return thread pool for related reference lookups or None.
+
+        None is returned if concurrent lookups are disabled. The pool is
+        created on first use and closed by :py:meth:`close` or once the
+        bridge is garbage collected.
+
+        '''
+        if self._relatedReferenceWorkers <= 1:
+            return None
+
+        with self._relatedReferencePoolLock:
+            if self._relatedReferencePool is None:
+                # Workers must not reference the bridge so that it can be
+                # collected while the pool is running.
+                self._relatedReferencePool = multiprocessing.pool.ThreadPool(
+                    self._relatedReferenceWorkers,
+                    initializer=_initialisePoolThread,
+                    initargs=(self._threadSessions,)
+                )
+                _closePoolOnCollect(self, self._relatedReferencePool)
+
+            return self._relatedReferencePool
+
+    def close(self):
+        '''Stop worker threads used for related reference lookups.
+
+        Methods instrumented to record server usage are restored. The bridge
+        remains usable, starting new workers and instrumenting methods again
+        when needed.
+
+        '''
+        with self._relatedReferencePoolLock:
+            pool = self._relatedReferencePool
+            self._relatedReferencePool = None
+
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+        self._accounting.release()
 
     def _getRelatedReferences(self, entityReference, specification, context,
-                              resultSpecification):
+                              resultSpecification, cache):
         '''Return related references for *entityReference* and *specification*.
 
         The following specification types are supported:
@@ -214,29 +1106,177 @@ class Bridge(object):
             * workflow
             * grouping.parent
 
+        Results are stored in *cache* together with the identifiers of the
+        entities they depend on so that they can be selectively invalidated.
+        Entities present in the replica are looked up with
+        :py:meth:`_getReplicaRelatedReferences`. Otherwise legacy API calls
+        are made holding :py:attr:`_legacyLock` so that concurrent lookups
+        only share ftrack_api work.
+
         '''
-        entity = self.getEntityById(entityReference)
-        related = []
+        identifier, _ = self._parseEntityReference(entityReference)
 
-        if specification.isOfType('group.shot'):
-            related = self._getRelatedShotReferences(
-                entity, specification, context, resultSpecification
+        key = self._cacheKey(
+            'related', '{0}:{1}'.format(
+                identifier, self._specificationKey(specification)
             )
+        )
+        try:
+            _, related = cache.get(key)
+        except KeyError:
+            pass
+        else:
+            return list(related)
 
-        elif specification.isOfType('workflow'):
-            related = self._getRelatedWorkflowReferences(
-                entity, specification, context, resultSpecification
+        dependencies = set([identifier])
+        related = None
+
+        if self._replica is not None:
+            related = self._getReplicaRelatedReferences(
+                identifier, specification, cache, dependencies
+            )
+
+        if related is not None:
+            pass
+
+        elif specification.isOfType('group.shot'):
+            with self._legacyLock:
+                entity = self.getEntityById(entityReference)
+                related = self._getRelatedShotReferences(
+                    entity, specification, context, resultSpecification,
+                    cache=cache, dependencies=dependencies
+                )
+
+        elif specification.isOfType('workflow'):
+            _, entityType = self._parseEntityReference(entityReference)
+            if entityType is None:
+                entityType = self._getIndexedEntityType(identifier)
+
+            if entityType is None:
+                with self._legacyLock:
+                    entity = self.getEntityById(entityReference)
+
+                _, entityType = self._parseEntityReference(
+                    entity.getEntityRef()
+                )
+
+            related = self._getRelatedWorkflowReferences(
+                identifier, entityType, specification, context,
+                resultSpecification, cache=cache, dependencies=dependencies
             )
 
         elif specification.isOfType('grouping.parent', includeDerived=False):
-            related = self._getRelatedParentReferences(
-                entity, specification, context, resultSpecification
+            with self._legacyLock:
+                entity = self.getEntityById(entityReference)
+                related = self._getRelatedParentReferences(
+                    entity, specification, context, resultSpecification
+                )
+
+        else:
+            related = []
+
+        cache.set(key, (dependencies, list(related)))
+        return related
+
+    def _getReplicaRelatedReferences(self, identifier, specification, cache,
+                                     dependencies):
+        '''Return related references of *identifier* from the replica.
+
+        Relationships are followed in the same way as
+        :py:meth:`_getRelatedShotReferences`,
+        :py:meth:`_getRelatedWorkflowReferences` and
+        :py:meth:`_getRelatedParentReferences` do on the server. Return None
+        if *identifier* is not present in the replica.
+
+        '''
+        entityType = self._replica.getEntityType(identifier)
+        if entityType is None:
+            return None
+
+        if entityType == 'task':
+            context = self._replica.getContext(identifier)
+        elif entityType == 'show':
+            context = None
+        else:
+            context = self._replica.getContext(
+                self._replica.getAssetContextId(identifier)
+            )
+
+        related = []
+
+        if specification.isOfType('group.shot'):
+            nameHint = specification.getField(
+                FnAssetAPI.constants.kField_HintName, None
+            )
+
+            if entityType == 'task' and context['object_type'] == 'Sequence':
+                for child in self._replica.getChildren(identifier):
+                    if not nameHint or child['name'] == nameHint:
+                        related.append(
+                            'ftrack://{0}?entityType=task'.format(child['id'])
+                        )
+                        if nameHint:
+                            break
+
+            elif entityType in ('asset', 'asset_version', 'component'):
+                shot = context
+                while shot and shot['object_type'] not in ('Shot', 'Project'):
+                    shot = self._replica.getContext(shot['parent_id'])
+
+                if shot and shot['object_type'] == 'Shot':
+                    dependencies.add(shot['id'])
+                    if not nameHint or nameHint == shot['name']:
+                        related.append(
+                            'ftrack://{0}?entityType=task'.format(shot['id'])
+                        )
+
+        elif specification.isOfType('workflow'):
+            version, taskTypeId, preferNukeScript = (
+                self._parseWorkflowCriteria(specification)
+            )
+
+            if entityType == 'task':
+                contextId = identifier
+
+            elif entityType == 'component':
+                contextId = context['id']
+                dependencies.add(contextId)
+
+            else:
+                return []
+
+            related = self._getWorkflowCandidates(
+                contextId, version, taskTypeId, preferNukeScript, cache
             )
 
+        elif specification.isOfType('grouping.parent', includeDerived=False):
+            if context is None:
+                return []
+
+            parentTypes = ['Task']
+            if entityType == 'task':
+                parentTypes.extend(['Shot', 'Sequence'])
+
+            if context['object_type'] in parentTypes:
+                context = self._replica.getContext(context['parent_id'])
+
+            if context and context['object_type'] != 'Project':
+                related.append(
+                    'ftrack://{0}?entityType=task'.format(context['id'])
+                )
+
         return related
 
+    def _specificationKey(self, specification):
+        '''Return string uniquely identifying *specification* for caching.'''
+        return '{0}{1}'.format(
+            specification.getSchema(),
+            sorted(specification.getData(copy=False).items())
+        )
+
     def _getRelatedShotReferences(self, entity, specification, context,
-                                  resultSpecification):
+                                  resultSpecification, cache=None,
+                                  dependencies=None):
         '''Return related shot references for *entity* and *specification*.
 
         If the entity is a Sequence then all child shots of the entity will be
@@ -247,7 +1287,17 @@ class Bridge(object):
         it will be used to restrict the related shots to those that match the
         name hint.
 
+        If *cache* is specified it will be used to store the children of a
+        Sequence. The identifiers of entities the result depends on are added
+        to *dependencies* if specified.
+
         '''
+        if cache is None:
+            cache = ftrack_connect_foundry.cache.Cache()
+
+        if dependencies is None:
+            dependencies = set()
+
         nameHint = specification.getField(
             FnAssetAPI.constants.kField_HintName, None
         )
@@ -256,7 +1306,12 @@ class Bridge(object):
         related = []
 
         if entityType == 'Sequence':
-            children = self._memoiser.call(entity.getChildren)
+            childrenKey = self._cacheKey('children', entity.getId())
+            try:
+                _, children = cache.get(childrenKey)
+            except KeyError:
+                children = entity.getChildren()
+                cache.set(childrenKey, (set([entity.getId()]), children))
 
             if nameHint:
                 # Find a shot with a specific name.
@@ -290,6 +1345,7 @@ class Bridge(object):
 
             if parentEntityType == 'Shot':
                 shot = parent
+                dependencies.add(shot.getId())
 
             requestedName = nameHint
 
@@ -299,13 +1355,84 @@ class Bridge(object):
 
         return related
 
-    def _getRelatedWorkflowReferences(self, entity, specification, context,
-                                      resultSpecification):
-        '''Return related task references for *entity* and *specification*.
+    def _getRelatedWorkflowReferences(self, identifier, entityType,
+                                      specification, context,
+                                      resultSpecification, cache=None,
+                                      dependencies=None):
+        '''Return related task references for *identifier* of *entityType*.
+
+        *entityType* is the entity type of references to the entity, such as
+        'task' or 'component'. No entity needs to be loaded to look up its
+        relationships. Raise
+        :py:exc:`FnAssetAPI.exceptions.InvalidEntityReference` if a component
+        does not exist.
 
         Raise :py:exc:`ValueError` if the *specification* does not define a
         'criteria' field with which to determine the version and task type.
 
+        Candidates are loaded with :py:meth:`_loadWorkflowReferences` unless
+        already present in *cache*. The identifier of the shot the result
+        depends on is added to *dependencies* if specified.
+
+        '''
+        if cache is None:
+            cache = ftrack_connect_foundry.cache.Cache()
+
+        if dependencies is None:
+            dependencies = set()
+
+        version, taskTypeId, preferNukeScript = self._parseWorkflowCriteria(
+            specification
+        )
+
+        if entityType == 'task':
+            contextId = identifier
+
+        elif entityType == 'component':
+            contextId = self._getComponentContextId(identifier)
+            if contextId is None:
+                raise FnAssetAPI.exceptions.InvalidEntityReference(
+                    entityReference=identifier
+                )
+
+            dependencies.add(contextId)
+
+        else:
+            return []
+
+        return self._getWorkflowCandidates(
+            contextId, version, taskTypeId, preferNukeScript, cache
+        )
+
+    def _getWorkflowCandidates(self, contextId, version, taskTypeId,
+                               preferNukeScript, cache):
+        '''Return workflow candidates of *contextId* from *cache*.
+
+        Candidates are loaded with :py:meth:`_loadWorkflowReferences` if not
+        present in *cache*. Nuke scripts are returned if *preferNukeScript* is
+        True and there are any, otherwise clips.
+
+        '''
+        key = self._workflowKey(contextId, version, taskTypeId)
+        try:
+            _, (relatedClips, relatedNukeScripts) = cache.get(key)
+        except KeyError:
+            self._loadWorkflowReferences(
+                [contextId], version, taskTypeId, cache
+            )
+            _, (relatedClips, relatedNukeScripts) = cache.get(key)
+
+        if preferNukeScript and relatedNukeScripts:
+            return list(relatedNukeScripts)
+
+        return list(relatedClips)
+
+    def _parseWorkflowCriteria(self, specification):
+        '''Return (version, taskTypeId, preferNukeScript) of *specification*.
+
+        Raise :py:exc:`ValueError` if the *specification* does not define a
+        'criteria' field.
+
         '''
         criteria = specification.getField('criteria')
         if not criteria:
@@ -319,59 +1446,227 @@ class Bridge(object):
         )
         splitCriteria = criteria.split(',')
         version = splitCriteria[0]
-        taskType = self.getEntityById(splitCriteria[1])
-        prefeNukeScript = splitCriteria[2] == 'True'
+        taskTypeId, _ = self._parseEntityReference(splitCriteria[1])
+        preferNukeScript = splitCriteria[2] == 'True'
 
         FnAssetAPI.logging.debug(
-            'Criterias: version={0}, taskType={1}, prefeNukeScript={2}'.format(
-                version, taskType, prefeNukeScript
-            )
+            'Criterias: version={0}, taskType={1}, preferNukeScript={2}'
+            .format(version, taskTypeId, preferNukeScript)
         )
 
-        if isinstance(entity, ftrack.Task):
-            tasks = entity.getTasks(taskTypes=[taskType])
+        return version, taskTypeId, preferNukeScript
 
-        elif isinstance(entity, ftrack.Component):
-            shot = entity.getVersion().getAsset().getParent()
-            tasks = shot.getTasks(taskTypes=[taskType])
+    def _workflowKey(self, contextId, version, taskTypeId):
+        '''Return cache key of workflow candidates for *contextId*.'''
+        return self._cacheKey(
+            'workflow', '{0}:{1}:{2}'.format(contextId, version, taskTypeId)
+        )
 
-        else:
-            tasks = []
+    def _getComponentContextId(self, identifier):
+        '''Return identifier of the context of the asset of component.'''
+        key = self._cacheKey('context', identifier)
+        try:
+            return self._cache.get(key)
+        except KeyError:
+            pass
+
+        components = self._queryByIds(
+            'Component', [identifier], ['version.asset.context_id']
+        )
+        if not components:
+            return None
+
+        contextId = components[0]['version']['asset']['context_id']
+        self._cache.set(key, contextId, category='component')
+        return contextId
+
+    def _prefetchWorkflowReferences(self, pairs, cache):
+        '''Load workflow candidates for all workflow *pairs* into *cache*.
+
+        *pairs* is a list of (entityReference, specification) tuples. The
+        contexts of component references are loaded with a single query and
+        candidates for all contexts sharing the same criteria are then loaded
+        together with :py:meth:`_loadWorkflowReferences`.
+
+        '''
+        grouped = collections.OrderedDict()
+        components = []
+        for entityReference, specification in pairs:
+            if (
+                not specification.isOfType('workflow')
+                or not specification.getField('criteria')
+            ):
+                continue
+
+            identifier, entityType = self._parseEntityReference(
+                entityReference
+            )
+            if entityType is None:
+                entityType = self._getIndexedEntityType(identifier)
+
+            if entityType not in ('task', 'component'):
+                continue
+
+            if entityType == 'component':
+                components.append(identifier)
+
+            version, taskTypeId, _ = self._parseWorkflowCriteria(
+                specification
+            )
+            sources = grouped.setdefault((version, taskTypeId), [])
+            sources.append((identifier, entityType))
 
-        relatedClips = []
-        relatedNukeScripts = []
-        for task in tasks:
-            assets = task.getAssets(assetTypes=['img', 'comp'])
+        contextIds = {}
+        unknown = []
+        for identifier in components:
+            try:
+                contextIds[identifier] = self._cache.get(
+                    self._cacheKey('context', identifier)
+                )
+            except KeyError:
+                contextId = None
+                if self._replica is not None:
+                    contextId = self._replica.getAssetContextId(identifier)
+
+                if contextId is None:
+                    unknown.append(identifier)
+                else:
+                    contextIds[identifier] = contextId
 
-            for asset in assets:
-                assetVersions = asset.getVersions()
+        for component in self._queryByIds(
+            'Component', unknown, ['version.asset.context_id']
+        ):
+            contextId = component['version']['asset']['context_id']
+            contextIds[component['id']] = contextId
+            self._cache.set(
+                self._cacheKey('context', component['id']), contextId,
+                category='component'
+            )
 
-                if len(assetVersions) > 0:
+        for (version, taskTypeId), sources in grouped.items():
+            missing = []
+            for identifier, entityType in sources:
+                if entityType == 'component':
+                    identifier = contextIds.get(identifier)
+                    if identifier is None:
+                        continue
+
+                try:
+                    cache.get(
+                        self._workflowKey(identifier, version, taskTypeId)
+                    )
+                except KeyError:
+                    if identifier not in missing:
+                        missing.append(identifier)
 
-                    if version == 'latest':
-                        targetVersion = assetVersions[-1]
+            if missing:
+                self._loadWorkflowReferences(
+                    missing, version, taskTypeId, cache
+                )
 
-                    elif version == 'latestapproved':
-                        for version in reversed(assetVersions):
-                            if version.getStatus().getName() == 'Approved':
-                                targetVersion = version
-                                break
+    def _loadWorkflowReferences(self, contextIds, version, taskTypeId,
+                                cache):
+        '''Load workflow candidates for *contextIds* into *cache*.
 
-                    components = targetVersion.getComponents()
+        For each context, the tasks of type *taskTypeId* directly below it are
+        considered. Every 'img' or 'comp' asset with a version published from
+        one of those tasks contributes the components of its target version,
+        which is either the 'latest' or 'latestapproved' version of the asset
+        depending on *version*. Components with an 'img_main' metadata entry
+        are candidate clips and those with a '.nk' file type candidate Nuke
+        scripts.
 
-                    for component in components:
-                        if component.get('filetype') == '.nk':
-                            relatedNukeScripts.append(component.getEntityRef())
+        Tasks, assets, versions and components for
+        :py:data:`~ftrack_connect_foundry.constant.QUERY_BATCH_SIZE` contexts
+        are loaded with a single query, or from the replica if all the
+        contexts are present in it. Results are stored in *cache* as
+        (clips, nukeScripts) tuples keyed by :py:meth:`_workflowKey`.
 
-                    for component in components:
-                        imgMain = component.getMeta('img_main')
-                        if imgMain:
-                            relatedClips.append(component.getEntityRef())
+        '''
+        session = self._getSession()
+        batchSize = ftrack_connect_foundry.constant.QUERY_BATCH_SIZE
 
-        if prefeNukeScript and relatedNukeScripts:
-            return relatedNukeScripts
+        for index in range(0, len(contextIds), batchSize):
+            batch = contextIds[index:index + batchSize]
+            condition = ', '.join(
+                '"{0}"'.format(contextId) for contextId in batch
+            )
+            if (
+                self._replica is not None
+                and self._replica.hasContexts(batch)
+            ):
+                versions = self._replica.getWorkflowVersions(
+                    batch, taskTypeId
+                )
 
-        return relatedClips
+            else:
+                versions = session.query(
+                    'select version, asset_id, task_id, task.parent_id, '
+                    'task.type_id, status.name, components.name, '
+                    'components.file_type, components.metadata '
+                    'from AssetVersion where asset.type.short in '
+                    '("img", "comp") and asset.versions any ('
+                    'task.parent_id in ({0}) and task.type_id is "{1}")'
+                    .format(condition, taskTypeId)
+                ).all()
+
+            assetVersions = collections.OrderedDict()
+            for assetVersion in versions:
+                assetVersions.setdefault(
+                    assetVersion['asset_id'], []
+                ).append(assetVersion)
+
+            results = dict((contextId, ([], [])) for contextId in batch)
+            for assetId, candidates in assetVersions.items():
+                candidates.sort(key=lambda candidate: candidate['version'])
+
+                targetVersion = None
+                if version == 'latest':
+                    targetVersion = candidates[-1]
+
+                elif version == 'latestapproved':
+                    for candidate in reversed(candidates):
+                        status = candidate['status']
+                        if status and status['name'] == 'Approved':
+                            targetVersion = candidate
+                            break
+
+                if targetVersion is None:
+                    continue
+
+                clips = []
+                nukeScripts = []
+                for component in targetVersion['components']:
+                    reference = 'ftrack://{0}?entityType=component'.format(
+                        component['id']
+                    )
+                    if component['file_type'] == '.nk':
+                        nukeScripts.append(reference)
+
+                    if component['metadata'].get('img_main'):
+                        clips.append(reference)
+
+                # Contribute once per matching task as an asset can have
+                # versions published from several tasks of a context.
+                sources = collections.OrderedDict()
+                for candidate in candidates:
+                    task = candidate['task']
+                    if (
+                        task
+                        and task['parent_id'] in results
+                        and task['type_id'] == taskTypeId
+                    ):
+                        sources[candidate['task_id']] = task['parent_id']
+
+                for contextId in sources.values():
+                    results[contextId][0].extend(clips)
+                    results[contextId][1].extend(nukeScripts)
+
+            for contextId, result in results.items():
+                cache.set(
+                    self._workflowKey(contextId, version, taskTypeId),
+                    (set([contextId]), result)
+                )
 
     def _getRelatedParentReferences(self, entity, specification, context,
                                     resultSpecification):
@@ -424,13 +1719,23 @@ class Bridge(object):
         '''Create a new relationship between the referenced entities.'''
         pass
 
+    @ftrack_connect_foundry.accounting.accounted
     def entityExists(self, entityRef, context):
-        '''Return whether the entity referenced by *entityRef* exists.'''
+        '''Return whether the entity referenced by *entityRef* exists.
+
+        Components registered in an open transaction are considered to exist.
+
+        '''
+        identifier, _ = self._parseEntityReference(entityRef)
+        if self._getPendingRegistration(identifier, context) is not None:
+            return True
+
         if self.getEntityById(entityRef, False):
             return True
         else:
             return False
 
+    @ftrack_connect_foundry.accounting.accounted
     def getEntityName(self, entityRef, context=None):
         '''Return entity name for *entityRef*.
 
@@ -439,23 +1744,46 @@ class Bridge(object):
             Do not include hierarchical or contextual information.
 
         '''
+        identifier, entityType = self._parseEntityReference(entityRef)
+        try:
+            return self._cache.get(self._cacheKey('name', identifier))
+        except KeyError:
+            pass
+
+        if self._replica is not None:
+            name = self._replica.getName(identifier)
+            if name is not None:
+                self._cache.set(
+                    self._cacheKey('name', identifier), name,
+                    category=entityType
+                )
+                return name
+
         entity = self.getEntityById(entityRef)
 
         if hasattr(entity, 'getName'):
-            return entity.getName()
+            name = entity.getName()
 
         elif hasattr(entity, 'getVersion'):
-            return 'v' + str(entity.getVersion()).zfill(3)
+            name = 'v' + str(entity.getVersion()).zfill(3)
 
         else:
             return 'unknown'
 
+        self._cache.set(
+            self._cacheKey('name', identifier), name, category=entityType
+        )
+        return name
+
+    @ftrack_connect_foundry.accounting.accounted
     def getEntityDisplayName(self, entityRef, context):
         '''Return human readable name for entity referenced by *entityRef*.'''
-        entity = self.getEntityById(entityRef)
-
         # Return the hierarchy path to this entity.
-        # TODO: Will this be horrendously slow?
+        ancestry = self._getAncestry(entityRef)
+        if ancestry is not None:
+            return ' / '.join(str(node['name']) for node in ancestry)
+
+        entity = self.getEntityById(entityRef)
         nameParts = [str(self.getEntityName(entity.getEntityRef()))]
 
         parents = entity.getParents()
@@ -468,52 +1796,420 @@ class Bridge(object):
 
         return name
 
+    @ftrack_connect_foundry.accounting.accounted
     def getEntityVersionName(self, entityRef, context):
         '''Return version name for entity pointed to by *entityRef*.'''
         entity = self.getEntityById(entityRef)
         version = self._getVersionName(entity)
         return str(version)
 
+    @ftrack_connect_foundry.accounting.accounted
     def getEntityVersions(self, entityRef, context, includeMetaVersions=False,
                           maxResults=-1):
-        '''Return mapping of version names to entity references.'''
+        '''Return mapping of version names to entity references.
+
+        If *maxResults* is positive only the most recent *maxResults* versions
+        are loaded. If *includeMetaVersions* is True the 'latest' and
+        'latestapproved' meta-versions are included when they exist.
+
+        Versions of entities present in the replica are listed from it.
+
+        '''
+        if self._replica is not None:
+            identifier, _ = self._parseEntityReference(entityRef)
+            replicated = self._replica.getVersions(identifier)
+            if replicated is not None:
+                return self._getReplicaVersions(
+                    replicated, includeMetaVersions, maxResults
+                )
+
         entity = self.getEntityById(entityRef)
 
+        # Limit to most recent up to maxResults.
+        limit = None
+        if maxResults > 0:
+            limit = maxResults
+
         try:
-            versionEntities = self._getVersions(entity)
+            versionEntities = self._getVersions(entity, limit=limit)
         except Exception, error:
             raise FnAssetAPI.exceptions.EntityResolutionError(error)
 
-        # Limit to most recent up to maxResults.
-        versionCount = len(versionEntities)
-        if 0 < maxResults < versionCount:
-            versionEntities = versionEntities[versionCount - maxResults:]
+        versions = {}
+        for versionName, reference in versionEntities:
+            versions[str(versionName)] = reference
+
+        if includeMetaVersions:
+            for metaVersion in ('latest', 'latestapproved'):
+                reference = self._getMetaVersionReferences(
+                    [entityRef], metaVersion
+                )[0]
+                if reference is not None:
+                    versions[metaVersion] = reference
+
+        return versions
+
+    def _getReplicaVersions(self, replicated, includeMetaVersions,
+                            maxResults):
+        '''Return mapping of version names to references for *replicated*.
+
+        *replicated* is a list of versions returned by
+        :py:meth:`ftrack_connect_foundry.replica.Replica.getVersions`.
+        *includeMetaVersions* and *maxResults* are interpreted as by
+        :py:meth:`getEntityVersions`.
+
+        '''
+        reference = 'ftrack://{0}?entityType=component'
+
+        available = [
+            (versionName, componentId)
+            for versionName, componentId, _ in replicated
+            if componentId is not None
+        ]
+        if maxResults > 0:
+            available = available[-maxResults:]
 
         versions = {}
-        for version in versionEntities:
-            versionName = str(self._getVersionName(version))
-            versions[versionName] = version.getEntityRef()
+        for versionName, componentId in available:
+            self._entityTypeIndex.set(componentId, 'component')
+            versions[str(versionName)] = reference.format(componentId)
+
+        if includeMetaVersions and replicated:
+            componentId = replicated[-1][1]
+            if componentId is not None:
+                versions['latest'] = reference.format(componentId)
+
+            for _, componentId, status in reversed(replicated):
+                if status and self._normaliseStatusName(status) == 'approved':
+                    if componentId is not None:
+                        versions['latestapproved'] = reference.format(
+                            componentId
+                        )
+                    break
 
         return versions
 
-    def getFinalizedEntityVersion(self, entityRef, context, version=None):
-        '''Return concrete entity reference for supplied *entityRef*.'''
+    @ftrack_connect_foundry.accounting.accounted
+    def getFinalizedEntityVersions(self, entityRefs, context, version=None):
+        '''Return concrete entity references for *entityRefs* at *version*.
+
+        *version* may be a meta-version, 'latest' for the most recent version
+        or 'latest' followed by a status name in lower case without spaces,
+        such as 'latestapproved', for the most recent version with that
+        status. The same component as each reference, or the 'main'
+        component, is returned from the version. If *version* is not a
+        meta-version each reference is finalized with
+        :py:meth:`getFinalizedEntityVersion`.
+
+        Meta-versions of all assets that are not indexed yet are loaded with
+        a single query per batch of assets and then resolved in memory.
+
+        Raise :py:exc:`FnAssetAPI.exceptions.EntityResolutionError` if a
+        reference has no such version.
+
+        '''
+        if not self._isMetaVersion(version):
+            return [
+                self.getFinalizedEntityVersion(
+                    entityRef, context, version=version
+                )
+                for entityRef in entityRefs
+            ]
+
+        references = self._getMetaVersionReferences(entityRefs, version)
+        for entityRef, reference in zip(entityRefs, references):
+            if reference is None:
+                raise FnAssetAPI.exceptions.EntityResolutionError(
+                    'Unable to find a version matching "{0}" for "{1}"'
+                    .format(
+                        version, self.getEntityDisplayName(entityRef, context)
+                    ),
+                    entityRef
+                )
+
+        return references
+
+    def _isMetaVersion(self, version):
+        '''Return whether *version* names a meta-version.'''
+        return str(version).startswith('latest')
+
+    def _getMetaVersionReferences(self, entityRefs, metaVersion):
+        '''Return list of references for *entityRefs* at *metaVersion*.
+
+        An entry is None if the entity is not found or has no matching
+        version.
+
+        '''
+        identifiers = []
+        entityTypes = {}
+        targets = {}
+        for entityRef in entityRefs:
+            identifier, entityType = self._parseEntityReference(entityRef)
+            identifiers.append(identifier)
+
+            try:
+                targets[identifier] = self._cache.get(
+                    self._cacheKey('versiontarget', identifier)
+                )
+            except KeyError:
+                if entityType is not None:
+                    entityTypes[identifier] = entityType
+
+        entityTypes.update(
+            self.getEntityReferenceTypes([
+                identifier for identifier in identifiers
+                if identifier not in entityTypes and identifier not in targets
+            ])
+        )
+
+        # Find the asset and component name for each reference not yet
+        # known.
+        loaded = {}
+        for entityType, projections in (
+            ('component', ['name', 'version.asset_id']),
+            ('asset_version', ['asset_id'])
+        ):
+            for entity in self._queryByIds(
+                self._schemaTypes[entityType],
+                [
+                    identifier for identifier in identifiers
+                    if entityTypes.get(identifier) == entityType
+                ],
+                projections
+            ):
+                if entityType == 'component':
+                    loaded[entity['id']] = (
+                        entity['version']['asset_id'], entity['name']
+                    )
+                else:
+                    loaded[entity['id']] = (entity['asset_id'], 'main')
+
+        for identifier in identifiers:
+            if entityTypes.get(identifier) == 'asset':
+                loaded[identifier] = (identifier, 'main')
+
+        for identifier, target in loaded.items():
+            self._cache.set(
+                self._cacheKey('versiontarget', identifier), target,
+                category=entityTypes.get(identifier)
+            )
+
+        targets.update(loaded)
+
+        assetIds = []
+        for assetId, _ in targets.values():
+            if assetId not in assetIds:
+                assetIds.append(assetId)
+
+        index = self._getMetaVersions(assetIds, metaVersion != 'latest')
+
+        status = metaVersion[len('latest'):]
+        references = []
+        for identifier in identifiers:
+            reference = None
+            if identifier in targets:
+                assetId, componentName = targets[identifier]
+                entry = index.get(assetId)
+                item = None
+                if entry is not None:
+                    if status:
+                        item = entry['statuses'].get(status)
+                    else:
+                        item = entry['latest']
+
+                if item is not None and componentName in item['components']:
+                    reference = 'ftrack://{0}?entityType=component'.format(
+                        item['components'][componentName]
+                    )
+
+            references.append(reference)
+
+        return references
+
+    def _getMetaVersions(self, assetIds, includeStatuses=False):
+        '''Return mapping of *assetIds* to their meta-version index entry.
+
+        Each entry is a dictionary with a 'latest' key for the most recent
+        version and a 'statuses' key mapping normalised status names to the
+        most recent version with that status. Versions are dictionaries with
+        'version', 'taskId' and 'components' keys, the latter mapping
+        component names to identifiers.
+
+        Assets not yet indexed, or without statuses indexed when
+        *includeStatuses* is True, are loaded with a single query per
+        :py:data:`~ftrack_connect_foundry.constant.QUERY_BATCH_SIZE` assets.
+
+        '''
+        index = {}
+        missing = []
+        for assetId in assetIds:
+            try:
+                entry = self._cache.get(self._cacheKey('metaversion', assetId))
+            except KeyError:
+                missing.append(assetId)
+                continue
+
+            if includeStatuses and entry['statuses'] is None:
+                missing.append(assetId)
+            else:
+                index[assetId] = entry
+
+        if not missing:
+            return index
+
+        with self._metaVersionLock:
+            generation = self._metaVersionGeneration
+
+        for assetId in missing:
+            index[assetId] = {'latest': None, 'statuses': {}}
+
+        for assetVersion in self._queryByIds(
+            'AssetVersion', missing,
+            [
+                'version', 'asset_id', 'task_id', 'status.name',
+                'components.name'
+            ],
+            attribute='asset_id'
+        ):
+            entry = index[assetVersion['asset_id']]
+            item = {
+                'version': assetVersion['version'],
+                'taskId': assetVersion['task_id'],
+                'components': dict(
+                    (component['name'], component['id'])
+                    for component in assetVersion['components']
+                )
+            }
+
+            latest = entry['latest']
+            if latest is None or item['version'] > latest['version']:
+                entry['latest'] = item
+
+            if assetVersion['status']:
+                status = self._normaliseStatusName(
+                    assetVersion['status']['name']
+                )
+                latest = entry['statuses'].get(status)
+                if latest is None or item['version'] > latest['version']:
+                    entry['statuses'][status] = item
+
+        with self._metaVersionLock:
+            if generation == self._metaVersionGeneration:
+                for assetId in missing:
+                    self._cache.set(
+                        self._cacheKey('metaversion', assetId),
+                        index[assetId], category='asset'
+                    )
+
+        return index
+
+    def _normaliseStatusName(self, name):
+        '''Return status *name* as used in meta-version names.'''
+        return name.lower().replace(' ', '')
+
+    def _updateMetaVersions(self, assetId, version, componentName,
+                            componentId):
+        '''Record newly registered *version* in meta-version index.
+
+        Only assets already indexed are updated. As the status of the new
+        version is not known, the statuses of the asset are marked to be
+        reloaded when next requested.
+
+        '''
+        key = self._cacheKey('metaversion', assetId)
+        with self._metaVersionLock:
+            self._metaVersionGeneration += 1
+
+            try:
+                entry = self._cache.get(key)
+            except KeyError:
+                return
+
+            # Entries may be read by other threads so replace rather than
+            # modify them.
+            latest = entry['latest']
+            if (
+                latest is not None
+                and latest['version'] == version['version']
+            ):
+                components = dict(latest['components'])
+                components[componentName] = componentId
+                latest = dict(latest, components=components)
+
+            elif latest is None or version['version'] > latest['version']:
+                latest = {
+                    'version': version['version'],
+                    'taskId': version['task_id'],
+                    'components': {componentName: componentId}
+                }
+
+            self._cache.set(
+                key, {'latest': latest, 'statuses': None}, category='asset'
+            )
+
+    @ftrack_connect_foundry.accounting.accounted
+    def getEntityVersionPage(self, entityRef, context, pageSize, cursor=None):
+        '''Return page of versions for *entityRef*, most recent first.
+
+        Return a tuple of (versions, nextCursor) where versions is a list of
+        up to *pageSize* (version name, entity reference) tuples. Pass
+        nextCursor as *cursor* to retrieve the following page. nextCursor is
+        None when there are no more versions.
+
+        Only the requested page is loaded from the server.
+
+        '''
         entity = self.getEntityById(entityRef)
-        versionName = self.getEntityVersionName(entityRef, context)
 
+        try:
+            versionEntities = self._getVersions(
+                entity, limit=pageSize + 1, before=cursor
+            )
+        except Exception, error:
+            raise FnAssetAPI.exceptions.EntityResolutionError(error)
+
+        versionEntities.reverse()
+
+        nextCursor = None
+        if len(versionEntities) > pageSize:
+            versionEntities = versionEntities[:pageSize]
+            nextCursor = versionEntities[-1][0]
+
+        versions = [
+            (str(versionName), reference)
+            for versionName, reference in versionEntities
+        ]
+
+        return versions, nextCursor
+
+    @ftrack_connect_foundry.accounting.accounted
+    def getFinalizedEntityVersion(self, entityRef, context, version=None):
+        '''Return concrete entity reference for supplied *entityRef*.
+
+        *version* may be a meta-version such as 'latest' or 'latestapproved'
+        (see :py:meth:`getFinalizedEntityVersions`).
+
+        '''
         if not version:
             # For now just assume when no version is specified that the input
             # reference should be returned.
-            # TODO: Implement support for 'latest' etc.
             return entityRef
 
+        if self._isMetaVersion(version):
+            return self.getFinalizedEntityVersions(
+                [entityRef], context, version
+            )[0]
+
+        entity = self.getEntityById(entityRef)
+        versionName = self.getEntityVersionName(entityRef, context)
+
         if versionName == version:
             return entityRef
 
         versions = self._getVersions(entity)
         versionsMapping = {}
-        for version in versions:
-            versionsMapping[str(self._getVersionName(version))] = version
+        for versionName, reference in versions:
+            versionsMapping[str(versionName)] = reference
 
         matchingVersion = versionsMapping.get(version, None)
         if not matchingVersion:
@@ -523,40 +2219,78 @@ class Bridge(object):
             )
 
         if matchingVersion:
-            return matchingVersion.getEntityRef()
+            return matchingVersion
         else:
             raise FnAssetAPI.exceptions.EntityResolutionError(
                 'Unable to resolve the version "{0}" for "{1}"'
                 .format(version, self.getEntityDisplayName(entityRef, context))
             )
 
-    def _getVersions(self, entity):
-        '''Return list of versions relevant to *entity*.'''
-        versionEntities = []
-        versions = []
+    def _getVersions(self, entity, limit=None, before=None):
+        '''Return list of versions relevant to *entity*.
+
+        Each version is returned as a (version number, component reference)
+        tuple for the component with the same name as *entity* if it is a
+        Component, otherwise the 'main' component. Versions without such a
+        component are omitted and the list is ordered by version number.
+
+        If *limit* is specified only the most recent *limit* versions are
+        returned. If *before* is specified only versions with a lower version
+        number are returned. Both are applied by the server.
+
+        The components of all versions are loaded with a single query.
 
+        '''
         # Default to main component.
         name = 'main'
+        assetId = None
 
         if isinstance(entity, ftrack.Component):
             # Keep track of the component name.
             name = entity.getName()
-            versions = entity.getVersion().getParent().getVersions()
+            components = self._queryByIds(
+                'Component', [entity.getId()], ['version.asset_id']
+            )
+            if components:
+                assetId = components[0]['version']['asset_id']
 
         elif isinstance(entity, ftrack.AssetVersion):
-            versions = entity.getParent().getVersions()
+            versions = self._queryByIds(
+                'AssetVersion', [entity.getId()], ['asset_id']
+            )
+            if versions:
+                assetId = versions[0]['asset_id']
 
         elif isinstance(entity, ftrack.Asset):
-            versions = entity.getVersions()
+            assetId = entity.getId()
 
-        for version in versions:
-            try:
-                component = version.getComponent(name=name)
-            except ftrack.FTrackError:
-                continue
+        if assetId is None:
+            return []
+
+        query = (
+            'select id, version.version from Component where name is "{0}" '
+            'and version.asset_id is "{1}"'.format(name, assetId)
+        )
+
+        if before is not None:
+            query += ' and version.version < {0}'.format(int(before))
+
+        query += ' order by version.version descending'
+
+        if limit is not None:
+            query += ' limit {0}'.format(int(limit))
 
-            versionEntities.append(component)
+        components = self._getSession().query(query).all()
 
+        versionEntities = []
+        for component in components:
+            self._entityTypeIndex.set(component['id'], 'component')
+            versionEntities.append((
+                component['version']['version'],
+                'ftrack://{0}?entityType=component'.format(component['id'])
+            ))
+
+        versionEntities.sort(key=lambda versionEntity: versionEntity[0])
         return versionEntities
 
     def _getVersionName(self, entity):
@@ -570,13 +2304,36 @@ class Bridge(object):
             name = entity.getVersion()
 
         elif isinstance(entity, ftrack.Asset):
-            entity = entity.getVersions()[-1]
-            name = entity.getVersion()
+            latest = self._getLatestVersion(entity.getId())
+            if latest is not None:
+                name = latest['version']
 
         return name
 
+    def _getLatestVersion(self, assetId):
+        '''Return latest version of *assetId* from the meta-version index.
+
+        The version is a dictionary as described by
+        :py:meth:`_getMetaVersions` or None if the asset has no versions.
+
+        '''
+        return self._getMetaVersions([assetId])[assetId]['latest']
+
+    @ftrack_connect_foundry.accounting.accounted
     def getEntityMetadata(self, entityRef, context):
         '''Return metadata for entity referenced by *entityRef*.'''
+        identifier, _ = self._parseEntityReference(entityRef)
+
+        registration = self._getPendingRegistration(identifier, context)
+        if registration is not None:
+            return dict(registration['metadata'])
+        try:
+            return dict(
+                self._cache.get(self._cacheKey('metadata', identifier))
+            )
+        except KeyError:
+            pass
+
         entity = self.getEntityById(entityRef)
         metadata = entity.getMeta()
 
@@ -591,9 +2348,25 @@ class Bridge(object):
 
         return dict(metadata)
 
+    @ftrack_connect_foundry.accounting.accounted
     def setEntityMetadata(self, entityRef, data, context, merge=True):
-        '''Set metadata for entity referenced by *entityRef*.'''
+        '''Set metadata for entity referenced by *entityRef*.
+
+        Metadata for components registered in an open transaction is buffered
+        and set when the transaction is committed.
+
+        '''
+        identifier, _ = self._parseEntityReference(entityRef)
+        registration = self._getPendingRegistration(identifier, context)
+        if registration is not None:
+            if not merge:
+                registration['metadata'].clear()
+
+            registration['metadata'].update(data)
+            return
+
         entity = self.getEntityById(entityRef)
+        self._discardCache('metadata', entity.getId())
 
         if (
             data.get(FnAssetAPI.constants.kField_FrameIn, None)
@@ -628,6 +2401,168 @@ class Bridge(object):
 
         entity.setMeta(data)
 
+    @ftrack_connect_foundry.accounting.accounted
+    def getEntityMetadataMultiple(self, entityRefs, context):
+        '''Return list of metadata for entities referenced by *entityRefs*.
+
+        Entities not yet cached are loaded with :py:meth:`prefetch` so that
+        each entity type is fetched with a single query.
+
+        '''
+        self.prefetch(entityRefs, context)
+        return [
+            self.getEntityMetadata(entityRef, context)
+            for entityRef in entityRefs
+        ]
+
+    @ftrack_connect_foundry.accounting.accounted
+    def setEntityMetadataMultiple(self, entityRefs, data, context,
+                                  merge=True):
+        '''Set metadata for entities referenced by *entityRefs*.
+
+        *data* should be a list of metadata dictionaries with the same length
+        as *entityRefs*. Entities are loaded with a single query per entity
+        type and all changes are persisted with one commit. Metadata for
+        components registered in an open transaction is buffered as with
+        :py:meth:`setEntityMetadata`.
+
+        Raise :py:exc:`FnAssetAPI.exceptions.InvalidEntityReference` without
+        changing any entity if a reference cannot be found.
+
+        '''
+        if len(entityRefs) != len(data):
+            raise ValueError(
+                'Mismatched references ({0}) and metadata ({1}).'.format(
+                    len(entityRefs), len(data)
+                )
+            )
+
+        untyped = []
+        for entityRef in entityRefs:
+            identifier, entityType = self._parseEntityReference(entityRef)
+            if entityType is None:
+                untyped.append(identifier)
+
+        entityTypes = self.getEntityReferenceTypes(untyped)
+
+        grouped = collections.OrderedDict()
+        serial = []
+        for entityRef, values in zip(entityRefs, data):
+            identifier, entityType = self._parseEntityReference(entityRef)
+
+            registration = self._getPendingRegistration(identifier, context)
+            if registration is not None:
+                if not merge:
+                    registration['metadata'].clear()
+
+                registration['metadata'].update(values)
+                continue
+
+            if entityType is None:
+                entityType = entityTypes.get(identifier)
+
+            # Handles are only stored as a custom attribute on tasks so leave
+            # other entities setting them to the legacy implementation.
+            hasHandles = (
+                values.get(FnAssetAPI.constants.kField_FrameIn, None)
+                and values.get(FnAssetAPI.constants.kField_FrameStart, None)
+            )
+
+            if (
+                entityType not in self._schemaTypes
+                or entityType == 'tasktype'
+                or (hasHandles and entityType != 'task')
+            ):
+                serial.append((entityRef, values))
+                continue
+
+            # Setting metadata keeps existing keys whether merging or not, so
+            # values for repeated references accumulate.
+            pending = grouped.setdefault(entityType, collections.OrderedDict())
+            pending.setdefault(identifier, {}).update(values)
+
+        if grouped:
+            loaded = []
+            for entityType, pending in grouped.items():
+                entities = self._queryByIds(
+                    self._schemaTypes[entityType], pending.keys(),
+                    self._projections[entityType]
+                )
+
+                found = set(entity['id'] for entity in entities)
+                for identifier in pending:
+                    if identifier not in found:
+                        raise FnAssetAPI.exceptions.InvalidEntityReference(
+                            entityReference=identifier
+                        )
+
+                for entity in entities:
+                    loaded.append((entityType, entity))
+
+            session = self._getSession()
+            try:
+                for entityType, entity in loaded:
+                    self._setSchemaMetadata(
+                        entityType, entity, grouped[entityType][entity['id']]
+                    )
+
+                session.commit()
+
+            except Exception:
+                session.rollback()
+                raise
+
+            for entityType, entity in loaded:
+                self._seedCache(entityType, entity)
+
+        for entityRef, values in serial:
+            self.setEntityMetadata(
+                entityRef, dict(values), context, merge=merge
+            )
+
+    def _setSchemaMetadata(self, entityType, entity, data):
+        '''Set metadata *data* on ftrack_api *entity* of *entityType*.
+
+        Mapped properties and metadata are set in the same way as
+        :py:meth:`setEntityMetadata` does for legacy entities. Changes are
+        not committed.
+
+        '''
+        data = dict(data)
+
+        frameStart = data.get(FnAssetAPI.constants.kField_FrameStart, None)
+        frameIn = data.get(FnAssetAPI.constants.kField_FrameIn, None)
+        if frameIn and frameStart:
+            entity['custom_attributes']['handles'] = (
+                int(frameIn) - int(frameStart)
+            )
+
+        legacyType = self._legacyTypes.get(entityType)
+        for key in self._metakeys.get(legacyType, []):
+            mappedKey = self._metamap.get(key, key)
+            if mappedKey not in data:
+                continue
+
+            value = self._preProcessMeta(key, data.pop(mappedKey))
+            attribute = self._schemaMetakeys.get(key)
+            if attribute is not None:
+                entity[attribute] = value
+            else:
+                entity['custom_attributes'][key] = value
+
+        # As with the legacy API, keys not in *data* are kept and values are
+        # stored as strings.
+        metadata = entity['metadata']
+        for key, value in data.items():
+            metadata[key] = self._serialiseMetadataValue(value)
+
+    def _serialiseMetadataValue(self, value):
+        '''Return metadata *value* in the string form stored by the server.'''
+        if isinstance(value, basestring):
+            return value
+
+        return str(value)
+
     def _preProcessMeta(self, key, value):
         '''Pre-process metadata *key* and *value* to strong types.
 
@@ -637,16 +2572,13 @@ class Bridge(object):
         '''
         if key == 'status':
             value = str(value)
-            nativeStatus = None
-            available = []
-
-            for status in ftrack.getTaskStatuses():
-                available.append(status.getName())
-                if status.getName() == status:
-                    nativeStatus = status
-                    break
+            nativeStatus = self._schema.getTaskStatus(value)
 
             if not nativeStatus:
+                available = [
+                    status.getName()
+                    for status in self._schema.getTaskStatuses()
+                ]
                 raise ValueError(
                     'Unable to find the status "{0}" in {1}'
                     .format(value, available)
@@ -656,6 +2588,7 @@ class Bridge(object):
 
         return value
 
+    @ftrack_connect_foundry.accounting.accounted
     def getEntityMetadataEntry(self, entityRef, key, context):
         '''Return the value for the specified metadata *key*.'''
         entity = self.getEntityById(entityRef)
@@ -674,9 +2607,11 @@ class Bridge(object):
 
         return value
 
+    @ftrack_connect_foundry.accounting.accounted
     def setEntityMetadataEntry(self, entityRef, key, value, context):
         '''Set metadata *key* to *value*.'''
         entity = self.getEntityById(entityRef)
+        self._discardCache('metadata', entity.getId())
         try:
             mapkey = entity.__class__.__name__
             keys = self._metakeys.get(mapkey, [])
@@ -688,6 +2623,7 @@ class Bridge(object):
         except AttributeError:
             entity.setMeta(mappedKey, value)
 
+    @ftrack_connect_foundry.accounting.accounted
     def preflight(self, targetEntityRef, entitySpec, context):
         '''Prepare for work to be done to the referenced entity.
 
@@ -710,6 +2646,36 @@ class Bridge(object):
 
         return targetEntityRef
 
+    @ftrack_connect_foundry.accounting.accounted
+    def preflightMultiple(self, targetEntityRefs, entitySpecs, context):
+        '''Prepare for work to be done to each of *targetEntityRefs*.
+
+        Existence of the targets is checked with one query per entity type
+        rather than one request per target. Raise
+        :py:exc:`FnAssetAPI.exceptions.PreflightError` for the first target
+        that does not exist.
+
+        '''
+        self.prefetch(targetEntityRefs, context)
+
+        result = []
+        for targetEntityRef, entitySpec in zip(targetEntityRefs, entitySpecs):
+            identifier, entityType = self._parseEntityReference(
+                targetEntityRef
+            )
+            if (
+                entityType in self._schemaTypes
+                and self._isCached(entityType, identifier)
+            ):
+                result.append(targetEntityRef)
+            else:
+                result.append(
+                    self.preflight(targetEntityRef, entitySpec, context)
+                )
+
+        return result
+
+    @ftrack_connect_foundry.accounting.accounted
     def register(self, stringData, targetEntityRef, entitySpec, context):
         '''Register entity with asset management system (a publish).'''
         try:
@@ -761,256 +2727,1247 @@ class Bridge(object):
                     targetEntityRef
                 )
 
-        except ftrack.FTrackError, error:
-            raise FnAssetAPI.exceptions.RegistrationError(
-                error, targetEntityRef
+        except ftrack.FTrackError, error:
+            raise FnAssetAPI.exceptions.RegistrationError(
+                error, targetEntityRef
+            )
+
+    @ftrack_connect_foundry.accounting.accounted
+    def registerMultiple(self, strings, targetEntityRefs, entitySpecs,
+                         context):
+        '''Register each of *strings* against matching *targetEntityRefs*.
+
+        Tasks and assets under the targets are looked up with a single query
+        each beforehand and all resulting versions and components are created
+        with one commit at the end, unless a transaction is already open for
+        *context* in which case they are committed with it. A state is
+        created for the call if *context* holds none. Groupings such as
+        shots are created together with :py:meth:`_registerGroupings`.
+
+        '''
+        groupings = [
+            index for index, entitySpec in enumerate(entitySpecs)
+            if entitySpec.isOfType(
+                FnAssetAPI.specifications.GroupingSpecification
+            )
+        ]
+        if groupings:
+            result = [None] * len(entitySpecs)
+            references = self._registerGroupings(
+                [strings[index] for index in groupings],
+                [targetEntityRefs[index] for index in groupings],
+                [entitySpecs[index] for index in groupings],
+                context
+            )
+            for index, reference in zip(groupings, references):
+                result[index] = reference
+
+            remaining = sorted(
+                set(range(len(entitySpecs))).difference(groupings)
+            )
+            if remaining:
+                references = self.registerMultiple(
+                    [strings[index] for index in remaining],
+                    [targetEntityRefs[index] for index in remaining],
+                    [entitySpecs[index] for index in remaining],
+                    context
+                )
+                for index, reference in zip(remaining, references):
+                    result[index] = reference
+
+            return result
+
+        state = self._getState(context)
+        if state is None:
+            # Use a state of its own so that registrations are still prepared
+            # beforehand and committed together.
+            state = self.createState()
+            context = FnAssetAPI.Context(
+                access=getattr(
+                    context, 'access', FnAssetAPI.Context.kWriteMultiple
+                ),
+                retention=getattr(
+                    context, 'retention', FnAssetAPI.Context.kTransient
+                ),
+                locale=getattr(context, 'locale', None),
+                managerOptions=getattr(context, 'managerOptions', None),
+                managerState=state
+            )
+
+        self._prepareRegistrationTargets(targetEntityRefs, context)
+
+        with state.lock:
+            ownTransaction = state.transaction is None
+            if ownTransaction:
+                self.startTransaction(state)
+
+        result = []
+        try:
+            with FnAssetAPI.contextManagers.ScopedProgressManager(
+                len(targetEntityRefs)
+            ) as progress:
+                for stringData, targetEntityRef, entitySpec in zip(
+                    strings, targetEntityRefs, entitySpecs
+                ):
+                    with progress.step():
+                        result.append(
+                            self.register(
+                                stringData, targetEntityRef, entitySpec,
+                                context
+                            )
+                        )
+
+            if ownTransaction:
+                with state.lock:
+                    self._commitRegistrations(
+                        state.transaction.getRegistrations()
+                    )
+                    state.transaction = None
+
+        except Exception:
+            if ownTransaction:
+                self.cancelTransaction(state)
+            raise
+
+        return result
+
+    def _prepareRegistrationTargets(self, targetEntityRefs, context):
+        '''Load what registering against *targetEntityRefs* needs.
+
+        The result is stored in the state cache of *context* for each target
+        so that :py:meth:`_register` can find or reuse tasks and assets
+        without a request per registration:
+
+            * Shots and sequences have their tasks stored by task type and
+              their assets by asset type and name.
+            * Tasks have the assets of their parent stored.
+            * Assets and components have the task of their latest version
+              stored, components also their name.
+
+        Each kind of entity is loaded with a single query per
+        :py:data:`~ftrack_connect_foundry.constant.QUERY_BATCH_SIZE`
+        identifiers.
+
+        '''
+        cache = self._getStateCache(context)
+        if cache is None:
+            return
+
+        grouped = {'task': [], 'asset': [], 'component': []}
+        untyped = []
+        for targetEntityRef in targetEntityRefs:
+            if (
+                not targetEntityRef
+                or not self.isEntityReference(targetEntityRef, context)
+            ):
+                continue
+
+            identifier, entityType = self._parseEntityReference(
+                targetEntityRef
+            )
+            if entityType is None:
+                untyped.append(identifier)
+            elif (
+                entityType in grouped
+                and identifier not in grouped[entityType]
+            ):
+                grouped[entityType].append(identifier)
+
+        if untyped:
+            for identifier, entityType in (
+                self.getEntityReferenceTypes(untyped).items()
+            ):
+                if (
+                    entityType in grouped
+                    and identifier not in grouped[entityType]
+                ):
+                    grouped[entityType].append(identifier)
+
+        prepared = {}
+
+        # Shots, sequences and tasks.
+        contexts = []
+        if grouped['task']:
+            contexts = self._queryByIds(
+                'TypedContext', grouped['task'],
+                ['id', 'parent_id', 'project_id', 'object_type.name']
+            )
+
+        shotIds = []
+        for entity in contexts:
+            objectType = entity['object_type']['name']
+            if objectType in ('Shot', 'Sequence'):
+                shotIds.append(entity['id'])
+                prepared[entity['id']] = {
+                    'contextId': entity['id'], 'tasks': {}
+                }
+
+            elif (
+                objectType == 'Task'
+                and entity['parent_id'] != entity['project_id']
+            ):
+                prepared[entity['id']] = {
+                    'contextId': entity['parent_id'], 'taskId': entity['id']
+                }
+
+        if shotIds:
+            for task in self._queryByIds(
+                'Task', shotIds, ['id', 'parent_id', 'type.name'],
+                attribute='parent_id'
+            ):
+                prepared[task['parent_id']]['tasks'].setdefault(
+                    task['type']['name'], task['id']
+                )
+
+        contextIds = sorted(
+            set(entry['contextId'] for entry in prepared.values())
+        )
+        assets = dict((contextId, {}) for contextId in contextIds)
+        if contextIds:
+            for asset in self._queryByIds(
+                'Asset', contextIds,
+                ['id', 'name', 'context_id', 'type.short'],
+                attribute='context_id'
+            ):
+                assets[asset['context_id']].setdefault(
+                    (asset['type']['short'], asset['name']), asset['id']
+                )
+
+        for entry in prepared.values():
+            entry['assets'] = assets[entry['contextId']]
+
+        # Assets and components.
+        components = {}
+        if grouped['component']:
+            for component in self._queryByIds(
+                'Component', grouped['component'],
+                ['id', 'name', 'version.asset_id']
+            ):
+                components[component['id']] = component
+
+        assetIds = list(grouped['asset'])
+        for component in components.values():
+            assetId = component['version']['asset_id']
+            if assetId not in assetIds:
+                assetIds.append(assetId)
+
+        parents = {}
+        if assetIds:
+            for asset in self._queryByIds(
+                'Asset', assetIds, ['id', 'context_id']
+            ):
+                parents[asset['id']] = asset['context_id']
+
+            index = self._getMetaVersions(parents.keys())
+
+        for assetId, contextId in parents.items():
+            latest = index[assetId]['latest']
+            prepared[assetId] = {
+                'contextId': contextId,
+                'assetId': assetId,
+                'taskId': latest['taskId'] if latest is not None else None
+            }
+
+        for componentId, component in components.items():
+            assetId = component['version']['asset_id']
+            if assetId not in parents:
+                continue
+
+            prepared[componentId] = dict(
+                prepared[assetId], componentName=component['name']
+            )
+
+        for identifier, entry in prepared.items():
+            cache.set(
+                self._cacheKey('registration', identifier),
+                (set([identifier, entry['contextId']]), entry)
+            )
+
+    def _getPreparedRegistration(self, identifier, context):
+        '''Return prepared registration target *identifier* or None.
+
+        The prepared target is a dictionary as stored by
+        :py:meth:`_prepareRegistrationTargets` with a 'contextId' key and
+        'tasks' and 'assets' keys for shots and sequences, 'taskId' and
+        'assets' keys for tasks and 'taskId' and 'assetId' keys for assets
+        and components.
+
+        '''
+        cache = self._getStateCache(context)
+        if cache is None:
+            return None
+
+        try:
+            _, prepared = cache.get(self._cacheKey('registration', identifier))
+        except KeyError:
+            return None
+
+        return prepared
+
+    def _registerProject(self, shortName, targetReference, specification,
+                         context):
+        '''Register a project with *shortName*.
+
+        .. note::
+
+            *targetReference* is ignored as a project is always a top-level
+            item.
+
+        '''
+        schemes = ftrack.getProjectSchemes()
+        scheme = None
+        if schemes:
+            scheme = schemes[0]
+
+        project = ftrack.createProject(shortName, shortName, scheme)
+        return project.getEntityRef()
+
+    def _registerGrouping(self, shortName, targetReference, specification,
+                          context):
+        '''Register a grouping entity with *shortName*.
+
+        A grouping entity could be a Sequence, Shot etc.
+
+        '''
+        return self._registerGroupings(
+            [shortName], [targetReference], [specification], context
+        )[0]
+
+    def _registerGroupings(self, shortNames, targetReferences, specifications,
+                           context):
+        '''Register grouping entities with *shortNames* and return references.
+
+        Sequences are created under project targets and shots under sequence
+        targets. Parents are loaded with a single query per entity type and
+        all groupings, along with their default tasks, are created with one
+        commit. Thumbnails are queued for upload once the commit has
+        succeeded.
+
+        '''
+        # TODO: if targetReference == getRootEntityReference() then make a
+        # project
+        wrongDestinationMsg = ('Groupings can only be created under a Project '
+                               'or a Sequence.')
+
+        parsed = [
+            self._parseEntityReference(targetReference)
+            for targetReference in targetReferences
+        ]
+        entityTypes = self.getEntityReferenceTypes([
+            identifier for identifier, entityType in parsed
+            if entityType is None
+        ])
+
+        grouped = {'show': [], 'task': []}
+        for identifier, entityType in parsed:
+            entityType = entityType or entityTypes.get(identifier)
+            if entityType in grouped and identifier not in grouped[entityType]:
+                grouped[entityType].append(identifier)
+
+        parents = {}
+        for entity in self._queryByIds('Project', grouped['show'], ['name']):
+            parents[entity['id']] = (entity, 'Sequence')
+
+        for entity in self._queryByIds(
+            'TypedContext', grouped['task'], ['name', 'object_type.name']
+        ):
+            if entity['object_type']['name'] == 'Sequence':
+                parents[entity['id']] = (entity, 'Shot')
+
+        for (identifier, _), targetReference in zip(parsed, targetReferences):
+            if identifier not in parents:
+                raise FnAssetAPI.exceptions.RegistrationError(
+                    wrongDestinationMsg, targetReference
+                )
+
+        # Ensure correct tasks are created as well.
+        # TODO: Make this configurable, possbily using task templates.
+        taskTypes = [
+            (
+                ftrack_connect_foundry.constant.COMPOSITING_TASK_NAME,
+                self._getTaskType(
+                    ftrack_connect_foundry.constant.COMPOSITING_TASK_TYPE
+                ).getId()
+            ),
+            (
+                ftrack_connect_foundry.constant.EDIT_TASK_NAME,
+                self._getTaskType(
+                    ftrack_connect_foundry.constant.EDIT_TASK_TYPE
+                ).getId()
+            )
+        ]
+
+        session = self._getSession()
+        created = []
+        try:
+            for shortName, (identifier, _), specification in zip(
+                shortNames, parsed, specifications
+            ):
+                parent, objectType = parents[identifier]
+
+                # For a grouping, the 'resolved string' is to be considered
+                # the name if not overriden by a name hint.
+
+                # TODO: Store the shortName somewhere as it is needed to pass
+                # back to resolve later. Currently resolving using the name.
+                name = specification.getField(
+                    FnAssetAPI.constants.kField_HintName, shortName
+                )
+                grouping = session.create(
+                    objectType, {'name': name, 'parent': parent}
+                )
+
+                tasks = []
+                for taskName, taskTypeId in taskTypes:
+                    task = session.create('Task', {
+                        'name': taskName,
+                        'parent': grouping,
+                        'type_id': taskTypeId
+                    })
+                    tasks.append((taskName, task))
+
+                created.append((identifier, name, grouping, tasks))
+
+            session.commit()
+
+        except Exception, error:
+            session.rollback()
+            # A failed commit cannot be attributed to a single target.
+            targetReference = None
+            if len(set(targetReferences)) == 1:
+                targetReference = targetReferences[0]
+
+            raise FnAssetAPI.exceptions.RegistrationError(
+                error, targetReference
+            )
+
+        result = []
+        for (parentId, name, grouping, tasks), specification in zip(
+            created, specifications
+        ):
+            self._invalidateRelated(parentId)
+
+            groupingId = grouping['id']
+            self._entityTypeIndex.set(groupingId, 'task')
+
+            # Keep the hierarchy of an already loaded project up to date.
+            if self._hierarchy.get(parentId) is not None:
+                self._hierarchy.add(groupingId, name, parentId, 'task')
+                for taskName, task in tasks:
+                    self._hierarchy.add(
+                        task['id'], taskName, groupingId, 'task'
+                    )
+
+            # Upload thumbnail if provided.
+            thumbnailPath = specification.getField('thumbnailPath', None)
+            if thumbnailPath:
+                self._thumbnailQueue.put(
+                    thumbnailPath, grouping.entity_type, groupingId
+                )
+
+            # Return grouping reference as currently don't know which task is
+            # applicable. That is determined at registration when the
+            # host/specification is known.
+            result.append(
+                'ftrack://{0}?entityType=task'.format(groupingId)
+            )
+
+        return result
+
+    def _registerNukeScript(self, path, targetReference, specification,
+                            context):
+        '''Register a Nuke script with *path*.'''
+        return self._register(
+            path, targetReference, specification, context, 'comp',
+            defaultName='nukeScript', component='nukescript'
+        )
+
+    def _registerImageFile(self, path, targetReference, specification, context):
+        '''Register an image file with *path*.'''
+        return self._register(
+            path, targetReference, specification, context, 'img',
+            defaultName='imageAsset'
+        )
+
+    def _registerHieroProject(self, path, targetReference, specification,
+                              context):
+        '''Register a Hiero project with *path*.'''
+        return self._register(
+            path, targetReference, specification, context, 'edit',
+            defaultName='hieroProject', component='hieroproject'
+        )
+
+    def _registerGenericFile(self, path, targetReference, specification,
+                             context):
+        '''Register a generic file with *path*.'''
+        return self._register(
+            path, targetReference, specification, context,
+            specification.getType(), 'asset'
+        )
+
+    def _register(self, path, targetReference, specification, context,
+                  assetType, component='main', defaultName='file',
+                  readOnly=True):
+        '''Register component with *path*.
+
+        Try to find an asset using the following rules:
+
+            #. When *targetReference* is a Task, look for/create an asset with
+               matching name.
+            #. When *targetReference* is an Asset, use it directly.
+            #. When *targetReference* is an AssetVersion get its parent Asset.
+
+        When *targetReference* is a Shot or Sequence, its task of the type
+        returned by :py:meth:`getTaskTypeAndName` is used as the Task.
+
+        Then create a new AssetVersion with a component under that asset. A
+        missing asset or task is created along with the version, so is not
+        created if the transaction holding the registration is cancelled.
+
+        '''
+        name = specification.getField(
+            FnAssetAPI.constants.kField_HintName, defaultName
+        )
+
+        # Check for asset name.
+        assetName = None
+        url = urlparse.urlparse(targetReference)
+        query = urlparse.parse_qs(url.query)
+        if 'assetName' in query:
+            assetName = query.get('assetName')[0]
+
+        if assetName:
+            name = assetName
+
+        # Use tasks and assets prepared by registerMultiple when available.
+        targetId, _ = self._parseEntityReference(targetReference)
+        prepared = self._getPreparedRegistration(targetId, context)
+        if prepared is not None:
+            contextId = prepared['contextId']
+            taskId = prepared.get('taskId')
+            task = None
+            if 'tasks' in prepared:
+                taskType, taskName = self.getTaskTypeAndName(
+                    specification, None, context
+                )
+                taskId = prepared['tasks'].get(taskType)
+                if taskId is None:
+                    task = self._reserveTask(
+                        taskName, taskType, contextId, context
+                    )
+                    taskId = task['id']
+
+            component = prepared.get('componentName', component)
+            assetId = prepared.get('assetId')
+            asset = None
+            if assetId is None:
+                assetId = prepared['assets'].get((assetType, name))
+
+            if assetId is None:
+                asset = self._reserveAsset(
+                    name, assetType, contextId, context, targetReference
+                )
+                assetId = asset['id']
+
+            return self._addRegistration(
+                path, specification, context, assetType, component,
+                readOnly, assetId=assetId, contextId=contextId,
+                taskId=taskId, asset=asset, task=task
+            )
+
+        entity = self.getEntityById(targetReference)
+        taskId, task = self._getTaskId(entity, specification, context)
+
+        parentShot = None
+        if taskId is not None:
+            parentShot = entity
+
+        elif (
+            isinstance(entity, ftrack.Task)
+            and entity.getObjectType() == 'Task'
+        ):
+            taskId = entity.getId()
+            parentShot = entity.getParent()
+
+            if parentShot.get('entityType') == 'show':
+                raise FnAssetAPI.exceptions.RegistrationError(
+                    'Can not publish on a task directly below a project.'
+                )
+
+        asset = None
+        reserved = None
+        if parentShot is not None:
+            existing = parentShot.getAssets(
+                assetTypes=[assetType], names=[name]
+            )
+
+            if existing:
+                asset = existing[0]
+            else:
+                reserved = self._reserveAsset(
+                    name, assetType, parentShot.getId(), context,
+                    targetReference
+                )
+
+        elif isinstance(entity, (ftrack.Asset, ftrack.Component)):
+            if isinstance(entity, ftrack.Component):
+                asset = entity.getVersion().getAsset()
+                component = entity.getName()
+            else:
+                asset = entity
+
+            # Register against the task of the latest version.
+            latest = self._getLatestVersion(asset.getId())
+            if latest is not None:
+                taskId = latest['taskId']
+
+        if reserved is not None:
+            return self._addRegistration(
+                path, specification, context, assetType, component, readOnly,
+                assetId=reserved['id'], contextId=reserved['contextId'],
+                taskId=taskId, asset=reserved, task=task
+            )
+
+        if not asset:
+            raise FnAssetAPI.exceptions.RegistrationError(
+                'Unable to find a suitable asset relating to {0}.'
+                .format(entity),
+                targetReference
+            )
+
+        return self._addRegistration(
+            path, specification, context, assetType, component, readOnly,
+            assetId=asset.getId(), contextId=asset.getParent().getId(),
+            taskId=taskId, task=task
+        )
+
+    def _reserveAsset(self, name, assetType, contextId, context,
+                      targetReference):
+        '''Return asset called *name* to create under *contextId*.
+
+        The asset is a dictionary with an 'id' reserved for it and is created
+        when the registration using it is committed. Assets reserved in the
+        open transaction of *context* are reused so that registrations of
+        the same name share one asset.
+
+        Raise :py:exc:`FnAssetAPI.exceptions.RegistrationError` for
+        *targetReference* if *assetType* is not known to the server. The
+        cached asset types are reloaded once before failing in case the type
+        was added since they were loaded.
+
+        '''
+        transaction = self._getTransaction(context)
+        if transaction is not None:
+            asset = transaction.getAsset(contextId, assetType, name)
+            if asset is not None:
+                return asset
+
+        assetTypeEntity = self._schema.getAssetType(assetType)
+        if assetTypeEntity is None:
+            self._schema.refresh()
+            assetTypeEntity = self._schema.getAssetType(assetType)
+
+        if assetTypeEntity is None:
+            raise FnAssetAPI.exceptions.RegistrationError(
+                'Unknown asset type "{0}".'.format(assetType), targetReference
+            )
+
+        asset = {
+            'id': str(uuid.uuid4()),
+            'name': name,
+            'assetType': assetType,
+            'typeId': assetTypeEntity.getId(),
+            'contextId': contextId
+        }
+
+        if transaction is not None:
+            transaction.addAsset(asset)
+
+        return asset
+
+    def _reserveTask(self, name, taskType, contextId, context):
+        '''Return task called *name* of *taskType* to create under *contextId*.
+
+        The task is a dictionary with an 'id' reserved for it and is created
+        when the registration using it is committed. Tasks reserved in the
+        open transaction of *context* are reused so that registrations
+        against the same context share one task.
+
+        '''
+        transaction = self._getTransaction(context)
+        if transaction is not None:
+            task = transaction.getTask(contextId, taskType)
+            if task is not None:
+                return task
+
+        task = {
+            'id': str(uuid.uuid4()),
+            'name': name,
+            'taskType': taskType,
+            'typeId': self._getTaskType(taskType).getId(),
+            'contextId': contextId
+        }
+
+        if transaction is not None:
+            transaction.addTask(task)
+
+        return task
+
+    def _addRegistration(self, path, specification, context, assetType,
+                         component, readOnly, assetId, contextId, taskId,
+                         asset=None, task=None):
+        '''Register component with *path* under asset *assetId*.
+
+        *asset* should be the asset returned by :py:meth:`_reserveAsset` if
+        *assetId* does not exist yet, and *task* the task returned by
+        :py:meth:`_reserveTask` if *taskId* does not exist yet.
+
+        The registration is buffered in the open transaction of *context* if
+        there is one, otherwise committed immediately. Return a reference to
+        the component.
+
+        '''
+        registration = {
+            'componentId': str(uuid.uuid4()),
+            'componentName': component,
+            'path': path,
+            'assetId': assetId,
+            'assetType': assetType,
+            'contextId': contextId,
+            'taskId': taskId,
+            'thumbnailPath': specification.getField('thumbnailPath', None),
+            'metadata': {},
+            'readOnly': readOnly,
+            'asset': asset,
+            'task': task
+        }
+
+        if assetType == 'img':
+            registration['metadata']['img_main'] = True
+
+        self._entityTypeIndex.set(registration['componentId'], 'component')
+
+        transaction = self._getTransaction(context)
+        if transaction is not None:
+            transaction.addRegistration(registration)
+        else:
+            self._commitRegistrations([registration])
+
+        # Return a reference to the main component as it is a unique address
+        # when an asset contains multiple components.
+        return (
+            'ftrack://{0}?entityType=component'.format(
+                registration['componentId']
+            )
+        )
+
+    def _commitRegistrations(self, registrations):
+        '''Create versions and components for *registrations* and commit.
+
+        Each registration is a dictionary as built by :py:meth:`_register`.
+        Reserved tasks and assets, versions and components are created in the
+        session, then added to the location with a single call. Adding them
+        commits the session, so everything is created with one commit or, on
+        failure, not at all. The session is rolled back and
+        :py:exc:`FnAssetAPI.exceptions.RegistrationError` raised on failure.
+
+        '''
+        if not registrations:
+            return
+
+        session = self._getSession()
+        location = session.pick_location()
+        origin = session.get('Location', ftrack_api.symbol.ORIGIN_LOCATION_ID)
+
+        versions = []
+        components = []
+        tasks = collections.OrderedDict()
+        assetIds = set()
+        try:
+            for registration in registrations:
+                task = registration.get('task')
+                if task is None or task['id'] in tasks:
+                    continue
+
+                session.create('Task', {
+                    'id': task['id'],
+                    'name': task['name'],
+                    'parent_id': task['contextId'],
+                    'type_id': task['typeId']
+                })
+                tasks[task['id']] = task
+
+            for registration in registrations:
+                asset = registration.get('asset')
+                if asset is None or asset['id'] in assetIds:
+                    continue
+
+                session.create('Asset', {
+                    'id': asset['id'],
+                    'name': asset['name'],
+                    'context_id': asset['contextId'],
+                    'type_id': asset['typeId']
+                })
+                assetIds.add(asset['id'])
+
+            for registration in registrations:
+                versions.append(
+                    session.create('AssetVersion', {
+                        'asset_id': registration['assetId'],
+                        'task_id': registration['taskId']
+                    })
+                )
+
+            for registration, version in zip(registrations, versions):
+                component = version.create_component(
+                    registration['path'],
+                    data={
+                        'id': registration['componentId'],
+                        'name': registration['componentName']
+                    },
+                    location=None
+                )
+
+                for key, value in registration['metadata'].items():
+                    component['metadata'][key] = (
+                        self._serialiseMetadataValue(value)
+                    )
+
+                components.append(component)
+
+            if location is not None:
+                location.add_components(components, origin)
+            else:
+                session.commit()
+
+        except Exception, error:
+            session.rollback()
+            raise FnAssetAPI.exceptions.RegistrationError(error, None)
+
+        for task in tasks.values():
+            self._entityTypeIndex.set(task['id'], 'task')
+            if self._hierarchy.get(task['contextId']) is not None:
+                self._hierarchy.add(
+                    task['id'], task['name'], task['contextId'], 'task'
+                )
+
+        for assetId in assetIds:
+            self._entityTypeIndex.set(assetId, 'asset')
+
+        for registration, version in zip(registrations, versions):
+            # Relationships of the asset's context may now include the
+            # version.
+            self._invalidateRelated(registration['contextId'])
+            self._updateMetaVersions(
+                registration['assetId'], version,
+                registration['componentName'], registration['componentId']
+            )
+
+            if registration['thumbnailPath']:
+                self._thumbnailQueue.put(
+                    registration['thumbnailPath'], version.entity_type,
+                    version['id']
+                )
+
+            # Make readOnly so that it cannot be overwritten by anyone else.
+            path = registration['path']
+            if registration['readOnly'] and os.path.isfile(path):
+                # TODO: Re-consider this when locations is merged. This is here
+                # for now to stop accidents.
+                ftrack_connect_foundry.locker.lockFile(path)
+
+    def _getTaskId(self, entity, specification, context):
+        '''Return (taskId, task) to register against for target *entity*.
+
+        When *entity* is a Shot or Sequence return the identifier of its task
+        of the type returned by :py:meth:`getTaskTypeAndName`. If it has no
+        such task one is reserved with :py:meth:`_reserveTask` and returned
+        as *task*, otherwise *task* is None. Return (None, None) for other
+        entities.
+
+        '''
+        if (
+            not hasattr(entity, 'getObjectType')
+            or entity.getObjectType() not in ['Shot', 'Sequence']
+        ):
+            return None, None
+
+        taskType, taskName = self.getTaskTypeAndName(
+            specification, entity, context
+        )
+
+        ftrackTasks = entity.getTasks(taskTypes=[taskType, ])
+        if len(ftrackTasks) > 0:
+            return ftrackTasks[0].getId(), None
+
+        task = self._reserveTask(taskName, taskType, entity.getId(), context)
+        return task['id'], task
+
+    def _getTaskType(self, name):
+        '''Return legacy task type called *name*.'''
+        taskType = self._schema.getTaskType(name)
+        if taskType is None:
+            taskType = ftrack.TaskType(name)
+
+        return taskType
+
+    def createState(self, parentState=None):
+        '''Return new manager state, optionally derived from *parentState*.
+
+        Relationship results are cached against the returned state so that
+        their validity is scoped to the context holding it.
+
+        '''
+        if not isinstance(parentState, ftrack_connect_foundry.state.State):
+            parentState = None
+
+        state = ftrack_connect_foundry.state.State(parent=parentState)
+
+        with self._statesLock:
+            self._states.add(state)
+
+        return state
+
+    def _getStates(self):
+        '''Return list of live manager states created by this bridge.'''
+        with self._statesLock:
+            return list(self._states)
+
+    def _getState(self, context):
+        '''Return manager state held by *context* or None.'''
+        state = getattr(context, 'managerInterfaceState', None)
+        if isinstance(state, ftrack_connect_foundry.state.State):
+            return state
+
+        return None
+
+    def _getStateCache(self, context):
+        '''Return cache of manager state held by *context* or None.'''
+        state = self._getState(context)
+        if state is not None:
+            return state.cache
+
+        return None
+
+    def _getTransaction(self, context):
+        '''Return open transaction of manager state held by *context*.
+
+        Return None if there is no open transaction.
+
+        '''
+        state = self._getState(context)
+        if state is not None:
+            return state.transaction
+
+        return None
+
+    def _getPendingRegistration(self, identifier, context):
+        '''Return pending registration of component *identifier* or None.'''
+        transaction = self._getTransaction(context)
+        if transaction is not None:
+            return transaction.getRegistration(identifier)
+
+        return None
+
+    @ftrack_connect_foundry.accounting.accounted
+    def startTransaction(self, state):
+        '''Start buffering registrations made with *state*.
+
+        Raise :py:exc:`FnAssetAPI.exceptions.StateError` if a transaction is
+        already open for *state*.
+
+        '''
+        if not isinstance(state, ftrack_connect_foundry.state.State):
+            return
+
+        with state.lock:
+            if state.transaction is not None:
+                raise FnAssetAPI.exceptions.StateError(
+                    'A transaction is already open for this state.'
+                )
+
+            state.transaction = (
+                ftrack_connect_foundry.transaction.Transaction()
             )
 
-    def _registerProject(self, shortName, targetReference, specification,
-                         context):
-        '''Register a project with *shortName*.
+    @ftrack_connect_foundry.accounting.accounted
+    def finishTransaction(self, state):
+        '''Commit registrations buffered in *state* with a single commit.
 
-        .. note::
+        Thumbnails of the registrations continue to upload in the background
+        after returning. Use :py:meth:`flushThumbnails` to wait for them.
 
-            *targetReference* is ignored as a project is always a top-level
-            item.
+        Raise :py:exc:`FnAssetAPI.exceptions.StateError` if no transaction is
+        open for *state* or the commit fails, in which case the transaction
+        remains open so that it can be retried or cancelled.
 
         '''
-        schemes = ftrack.getProjectSchemes()
-        scheme = None
-        if schemes:
-            scheme = schemes[0]
+        if not isinstance(state, ftrack_connect_foundry.state.State):
+            return
+
+        with state.lock:
+            transaction = state.transaction
+            if transaction is None:
+                raise FnAssetAPI.exceptions.StateError(
+                    'No transaction has been started for this state.'
+                )
 
-        project = ftrack.createProject(shortName, shortName, scheme)
-        return project.getEntityRef()
+            try:
+                self._commitRegistrations(transaction.getRegistrations())
+            except Exception, error:
+                raise FnAssetAPI.exceptions.StateError(
+                    'Unable to commit transaction: {0}'.format(error)
+                )
 
-    def _registerGrouping(self, shortName, targetReference, specification,
-                          context):
-        '''Register a grouping entity with *shortName*.
+            state.transaction = None
 
-        A grouping entity could be a Sequence, Shot etc.
+    @ftrack_connect_foundry.accounting.accounted
+    def cancelTransaction(self, state):
+        '''Discard registrations buffered in *state*.
 
-        '''
-        # TODO: if targetReference == getRootEntityReference() then make a
-        # project
+        Return whether a transaction was open and has been discarded.
 
-        entity = self.getEntityById(targetReference)
-        wrongDestinationMsg = ('Groupings can only be created under a Project '
-                               'or a Sequence.')
+        '''
+        if not isinstance(state, ftrack_connect_foundry.state.State):
+            return False
 
-        createFunction = None
-        if isinstance(entity, ftrack.Project):
-            createFunction = entity.createSequence
+        with state.lock:
+            transaction = state.transaction
+            if transaction is None:
+                return False
 
-        elif (
-            isinstance(entity, ftrack.Task)
-            and entity.getObjectType() == 'Sequence'
-        ):
-            createFunction = entity.createShot
+            state.transaction = None
 
-        if createFunction is None:
-            raise FnAssetAPI.exceptions.RegistrationError(
-                wrongDestinationMsg, targetReference
-            )
+        transaction.clear()
+        return True
 
-        # For a grouping, the 'resolved string' is to be considered the name
-        # if not overriden by a name hint.
+    @ftrack_connect_foundry.accounting.accounted
+    def freezeState(self, state):
+        '''Return token encapsulating *state* and data cached so far.
 
-        # TODO: Store the shortName somewhere as it is needed to pass back to
-        # resolve later. Currently resolving using the name.
-        name = specification.getField(
-            FnAssetAPI.constants.kField_HintName, shortName
-        )
-        grouping = createFunction(name=name)
+        The token includes a snapshot of resolved component paths, version
+        lookups, entity names and the entity hierarchy, most recently used
+        first, so that processes thawing it with :py:meth:`thawState` avoid
+        repeating queries made by this process.
 
-        # Upload thumbnail if provided.
-        thumbnailPath = specification.getField('thumbnailPath', None)
-        if thumbnailPath:
-            grouping.createThumbnail(thumbnailPath)
+        Registrations pending in an open transaction are included so that
+        the thawed state continues the transaction and their references
+        resolve before it is committed. Only one of the frozen and thawed
+        states should then finish the transaction.
 
-        # Ensure correct tasks are created as well.
-        # TODO: Make this configurable, possbily using task templates.
-        compositingTaskType = ftrack.TaskType(
-            ftrack_connect_foundry.constant.COMPOSITING_TASK_TYPE
-        )
-        grouping.createTask(
-            ftrack_connect_foundry.constant.COMPOSITING_TASK_NAME,
-            compositingTaskType
-        )
+        The snapshot is compressed and reduced to fit in
+        :py:data:`~ftrack_connect_foundry.constant.
+        STATE_SNAPSHOT_MAXIMUM_SIZE` bytes. Raise
+        :py:exc:`FnAssetAPI.exceptions.StateError` if the pending
+        registrations alone do not fit.
 
-        editingTaskType = ftrack.TaskType(
-            ftrack_connect_foundry.constant.EDIT_TASK_TYPE
-        )
-        grouping.createTask(
-            ftrack_connect_foundry.constant.EDIT_TASK_NAME, editingTaskType
-        )
+        '''
+        if not isinstance(state, ftrack_connect_foundry.state.State):
+            return ''
+
+        entries = []
+
+        data = {'transaction': None}
+        transaction = state.transaction
+        if transaction is not None:
+            data['transaction'] = transaction.getRegistrations()
+            for registration in data['transaction']:
+                entries.append((
+                    self._cacheKey('path', registration['componentId']),
+                    self._conformPath(registration['path'])
+                ))
+
+        cached = collections.defaultdict(list)
+        for key, value in reversed(self._cache.items()):
+            namespace = key.partition(':')[0]
+            if namespace in self._snapshotNamespaces:
+                cached[namespace].append((key, value))
+
+        for namespace in self._snapshotNamespaces:
+            entries.extend(cached[namespace])
+
+        for node in self._hierarchy.getNodes():
+            entries.append((self._cacheKey('hierarchy', node['id']), node))
+
+        identifiers = set(key.partition(':')[2] for key, _ in entries)
+        for identifier, entityType in self._entityTypeIndex.items():
+            if identifier in identifiers:
+                entries.append(
+                    (self._cacheKey('type', identifier), entityType)
+                )
 
-        # Return grouping id as currently don't know which task is applicable.
-        # That is determined at registration when the host/specification is
-        # known.
-        return grouping.getEntityRef()
+        try:
+            return ftrack_connect_foundry.snapshot.encode(
+                data, entries,
+                maximumSize=(
+                    ftrack_connect_foundry.constant.STATE_SNAPSHOT_MAXIMUM_SIZE
+                )
+            )
+        except ValueError, error:
+            raise FnAssetAPI.exceptions.StateError(
+                'Unable to freeze state: {0}'.format(error)
+            )
 
-    def _registerNukeScript(self, path, targetReference, specification,
-                            context):
-        '''Register a Nuke script with *path*.'''
-        return self._register(
-            path, targetReference, specification, context, 'comp',
-            defaultName='nukeScript', component='nukescript'
-        )
+    @ftrack_connect_foundry.accounting.accounted
+    def thawState(self, token):
+        '''Return new manager state restored from *token*.
 
-    def _registerImageFile(self, path, targetReference, specification, context):
-        '''Register an image file with *path*.'''
-        return self._register(
-            path, targetReference, specification, context, 'img',
-            defaultName='imageAsset'
-        )
+        *token* should have been returned by :py:meth:`freezeState`. Data
+        included in it is added to the bridge cache. If a transaction was
+        open when freezing, it is opened again with the registrations that
+        were pending. Tokens from an incompatible version of the bridge are
+        ignored.
 
-    def _registerHieroProject(self, path, targetReference, specification,
-                              context):
-        '''Register a Hiero project with *path*.'''
-        return self._register(
-            path, targetReference, specification, context, 'edit',
-            defaultName='hieroProject', component='hieroproject'
-        )
+        Raise :py:exc:`FnAssetAPI.exceptions.StateError` if *token* is not
+        valid.
 
-    def _registerGenericFile(self, path, targetReference, specification,
-                             context):
-        '''Register a generic file with *path*.'''
-        return self._register(
-            path, targetReference, specification, context,
-            specification.getType(), 'asset'
-        )
+        '''
+        state = self.createState()
+        if not token:
+            return state
 
-    def _register(self, path, targetReference, specification, context,
-                  assetType, component='main', defaultName='file',
-                  readOnly=True):
-        '''Register component with *path*.
+        try:
+            decoded = ftrack_connect_foundry.snapshot.decode(token)
+        except ValueError, error:
+            raise FnAssetAPI.exceptions.StateError(
+                'Unable to thaw state: {0}'.format(error)
+            )
 
-        Try to find an asset using the following rules:
+        if decoded is None:
+            FnAssetAPI.logging.debug(
+                'Ignoring cached data of frozen state from incompatible '
+                'version.'
+            )
+            return state
+
+        data, entries = decoded
+
+        entityTypes = {}
+        for key, value in entries:
+            namespace, _, identifier = key.partition(':')
+            if namespace == 'type':
+                entityTypes[identifier] = value
+                self._entityTypeIndex.set(identifier, value)
+
+        categories = {'path': 'component', 'metaversion': 'asset'}
+        for key, value in entries:
+            namespace, _, identifier = key.partition(':')
+            if namespace == 'hierarchy':
+                self._hierarchy.add(
+                    identifier, value['name'], value['parentId'],
+                    value['entityType'], value['assetType']
+                )
 
-            #. When *targetReference* is a Task, look for/create an asset with
-               matching name.
-            #. When *targetReference* is an Asset, use it directly.
-            #. When *targetReference* is an AssetVersion get its parent Asset.
+            elif namespace in self._snapshotNamespaces:
+                if namespace == 'versiontarget':
+                    value = tuple(value)
 
-        Then create a new AssetVersion with a component under that asset
+                self._cache.set(
+                    key, value,
+                    category=(
+                        categories.get(namespace)
+                        or entityTypes.get(identifier)
+                    )
+                )
 
-        '''
-        name = specification.getField(
-            FnAssetAPI.constants.kField_HintName, defaultName
-        )
+        registrations = data.get('transaction')
+        if registrations is not None:
+            self.startTransaction(state)
+            for registration in registrations:
+                state.transaction.addRegistration(registration)
+                if registration.get('asset') is not None:
+                    state.transaction.addAsset(registration['asset'])
 
-        # Check for asset name.
-        assetName = None
-        url = urlparse.urlparse(targetReference)
-        query = urlparse.parse_qs(url.query)
-        if 'assetName' in query:
-            assetName = query.get('assetName')[0]
+                if registration.get('task') is not None:
+                    state.transaction.addTask(registration['task'])
 
-        if assetName:
-            name = assetName
+                self._entityTypeIndex.set(
+                    registration['componentId'], 'component'
+                )
 
-        entity = self.getEntityById(targetReference)
-        targetReference = self._getTaskId(entity, specification, context)
-        entity = self.getEntityById(targetReference)
+        return state
 
-        asset = None
-        if isinstance(entity, ftrack.Task):
-            if entity.getObjectType() == 'Task':
-                taskId = entity.getId()
-                parentShot = entity.getParent()
+    def _invalidateRelated(self, identifier):
+        '''Remove state cached results that depend on *identifier*.'''
+        for state in self._getStates():
+            state.cache.removeMatching(
+                lambda key, value: identifier in value[0]
+            )
 
-                if parentShot.get('entityType') == 'show':
-                    raise FnAssetAPI.exceptions.RegistrationError(
-                        'Can not publish on a task directly below a project.'
-                    )
+    @ftrack_connect_foundry.accounting.accounted
+    def syncReplica(self, projectId, full=False):
+        '''Update the replica with data of project *projectId*.
 
-                existing = parentShot.getAssets(
-                    assetTypes=[assetType], names=[name]
-                )
+        Raise :py:exc:`ValueError` if no replica is configured. See
+        :py:meth:`ftrack_connect_foundry.replica.Replica.sync` for the
+        meaning of *full*. Return the number of versions loaded.
 
-                if existing:
-                    asset = existing[0]
-                else:
-                    asset = parentShot.createAsset(name, assetType)
+        '''
+        if self._replica is None:
+            raise ValueError('No replica configured.')
 
-        elif isinstance(entity, ftrack.Asset):
-            asset = entity
-            taskId = asset.getVersions()[-1].get('taskid')
+        return self._replica.sync(self._getSession(), projectId, full=full)
 
-        elif isinstance(entity, ftrack.Component):
-            asset = entity.getVersion().getAsset()
-            component = entity.getName()
-            taskId = asset.getVersions()[-1].get('taskid')
+    def getUsage(self, method=None):
+        '''Return mapping of bridge method names to their server usage.
 
-        if not asset:
-            raise FnAssetAPI.exceptions.RegistrationError(
-                'Unable to find a suitable asset relating to {0}.'
-                .format(entity),
-                targetReference
-            )
-        session = ftrack_connect.session.get_shared_session()
+        Each :py:class:`~ftrack_connect_foundry.accounting.Usage` totals the
+        queries, commits, requests, response bytes and wall time of the calls
+        made to the method by the host, including the requests made by any
+        bridge methods it called. If *method* is specified return the usage
+        of that method only.
 
-        version = session.create('AssetVersion', {
-            'asset_id':asset.getId(),
-            'task_id': taskId
-        })
+        Usage of calls made with a manager state is also totalled in the
+        usage attribute of the state. Usage is only recorded if accounting
+        was enabled for the bridge.
 
-        session.commit()
+        '''
+        return self._accounting.getUsage(method)
 
-        thumbnailPath = specification.getField('thumbnailPath', None)
-        if thumbnailPath:
-            version.create_thumbnail(
-                thumbnailPath
-            )
+    def resetUsage(self):
+        '''Discard server usage recorded so far.'''
+        self._accounting.reset()
 
-        location = session.pick_location()
+    def flushThumbnails(self, timeout=None):
+        '''Wait until queued thumbnails have been uploaded.
 
-        mainComponent = version.create_component(
-            path, data={'name': component}, location=location
-        )
+        If *timeout* is specified wait at most that many seconds. Return
+        whether all thumbnails have been uploaded.
 
-        if assetType == 'img':
-            mainComponent['metadata']['img_main'] = True
+        '''
+        return self._thumbnailQueue.flush(timeout=timeout)
 
-        # Make readOnly so that it cannot be overwritten by anyone else.
-        if readOnly and os.path.isfile(path):
-            # TODO: Re-consider this when locations is merged. This is here
-            # for now to stop accidents.
-            ftrack_connect_foundry.locker.lockFile(path)
+    def _uploadThumbnail(self, path, targets, thumbnailId=None):
+        '''Set thumbnail at *path* on *targets* and return its identifier.
 
+        Called on thumbnail worker threads. *targets* is a list of
+        (schemaType, identifier) tuples. If *thumbnailId* is specified that
+        previously uploaded thumbnail component is reused instead of
+        uploading *path* again.
 
-        # Return a reference to the main component as it is a unique address
-        # when an asset contains multiple components.
-        return (
-            'ftrack://{0}?entityType=component'.format(
-                mainComponent.get('id')
+        '''
+        session = self._getSession()
+        if thumbnailId is None:
+            location = session.get(
+                'Location', ftrack_api.symbol.SERVER_LOCATION_ID
             )
-        )
+            component = session.create_component(
+                path, data={'name': 'thumbnail'}, location=location
+            )
+            thumbnailId = component['id']
 
-    def _getTaskId(self, entity, specification, context):
-        '''Return task reference for *entity*.'''
-        taskType, taskName = self.getTaskTypeAndName(
-            specification, entity, context
-        )
+        try:
+            for schemaType, identifier in targets:
+                entity = session.get(schemaType, identifier)
+                entity['thumbnail_id'] = thumbnailId
 
-        if (
-            hasattr(entity, 'getObjectType')
-            and entity.getObjectType() in ['Shot', 'Sequence']
-        ):
-            ftrackTasks = entity.getTasks(taskTypes=[taskType, ])
-            if len(ftrackTasks) > 0:
-                task = ftrackTasks[0]
-                reference = task.getEntityRef()
-            else:
-                taskTypeEntity = ftrack.TaskType(taskType)
-                task = entity.createTask(taskName, taskTypeEntity)
-                reference = task.getEntityRef()
+            session.commit()
 
-        else:
-            reference = entity.getEntityRef()
+        except Exception:
+            session.rollback()
+            raise
 
-        return reference
+        return thumbnailId
 
     def thumbnailSpecification(self, specification, context, options):
         '''Return whether a thumbnail should be prepared.'''
@@ -1022,6 +3979,102 @@ class Bridge(object):
     # Additional interface.
     #
 
+    def _getSession(self):
+        '''Return ftrack_api session to use for queries.
+
+        The main thread uses the session passed to the bridge or the shared
+        session from :py:mod:`ftrack_connect`. Sessions are not thread safe
+        so every other thread, such as host worker threads and the bridge's
+        own pools, is given a session of its own. It is created with the
+        session factory on first use and released when the thread exits.
+
+        '''
+        if not isinstance(threading.current_thread(), threading._MainThread):
+            return self._getThreadSession()
+
+        session = self._session
+        if session is None:
+            session = ftrack_connect.session.get_shared_session()
+
+        self._accounting.instrumentSession(session)
+
+        if (
+            self._eventSource is None
+            and session is not self._subscribedSession
+        ):
+            self._subscribedSession = session
+            self._subscribe(
+                ftrack_connect_foundry.event_source.SessionEventSource(session)
+            )
+
+        return session
+
+    def _subscribe(self, eventSource):
+        '''Subscribe to events that invalidate cached data on *eventSource*.
+
+        Failures are logged rather than raised as the bridge works without
+        events, only keeping cached data until it is evicted or flushed.
+
+        '''
+        for topic, callback in (
+            (
+                ftrack_api.symbol.COMPONENT_ADDED_TO_LOCATION_TOPIC,
+                self._onComponentLocationChanged
+            ),
+            (
+                ftrack_api.symbol.COMPONENT_REMOVED_FROM_LOCATION_TOPIC,
+                self._onComponentLocationChanged
+            ),
+            ('ftrack.update', self._onEntitiesUpdated)
+        ):
+            try:
+                eventSource.subscribe(topic, callback)
+            except Exception, error:
+                FnAssetAPI.logging.log(
+                    'Unable to subscribe to {0}: {1}'.format(topic, error),
+                    FnAssetAPI.logging.kWarning
+                )
+
+    def _isPoolThread(self):
+        '''Return whether the current thread belongs to a bridge pool.'''
+        return getattr(self._threadSessions, 'pooled', False)
+
+    def _getThreadSession(self):
+        '''Return ftrack_api session owned by the current thread.'''
+        session = getattr(self._threadSessions, 'session', None)
+        if session is None:
+            session = self._sessionFactory()
+            self._threadSessions.session = session
+
+        self._accounting.instrumentSession(session)
+        return session
+
+    def _parseEntityReference(self, entityReference):
+        '''Return (identifier, entityType) for *entityReference*.
+
+        The entity type will be None if *entityReference* is a plain
+        identifier or does not specify an entity type.
+
+        '''
+        if 'ftrack://' not in entityReference:
+            return entityReference, None
+
+        url = urlparse.urlparse(entityReference)
+        query = urlparse.parse_qs(url.query)
+        return url.netloc, query.get('entityType', [None])[0]
+
+    def _cacheKey(self, namespace, identifier):
+        '''Return cache key for *identifier* within *namespace*.'''
+        return '{0}:{1}'.format(namespace, identifier)
+
+    def _discardCache(self, namespace, identifier):
+        '''Remove cached entry for *identifier* within *namespace*.'''
+        try:
+            self._cache.remove(self._cacheKey(namespace, identifier))
+        except KeyError:
+            pass
+
+    @ftrack_connect_foundry.accounting.accounted
     def getEntityById(self, identifier, throw=True):
         '''Return an entity represented by the given *identifier*.
 
@@ -1029,19 +4082,31 @@ class Bridge(object):
         :py:exc:`FnAssetAPI.exceptions.InvalidEntityReference` if no entity can
         be found, otherwise return None.
 
+        Concurrent calls for the same *identifier* share a single lookup.
+
+        '''
+        return self._singleFlight.do(
+            ('getEntityById', identifier, throw), self._getEntityById,
+            identifier, throw
+        )
+
+    def _getEntityById(self, identifier, throw):
+        '''Return an entity represented by the given *identifier*.
+
+        See :py:meth:`getEntityById`.
+
         '''
         entity = None
+        entityType = None
 
         if identifier != '':
             if 'ftrack://' in identifier:
-                url = urlparse.urlparse(identifier)
-                query = urlparse.parse_qs(url.query)
-                entityType = query.get('entityType')[0]
-
-                identifier = url.netloc
+                identifier, entityType = self._parseEntityReference(
+                    identifier
+                )
 
                 try:
-                    return self._memoiser.cache.get(identifier)
+                    return self._cache.get(self._cacheKey('entity', identifier))
                 except KeyError:
                     pass
 
@@ -1075,16 +4140,31 @@ class Bridge(object):
                 ]
 
                 try:
-                    return self._memoiser.cache.get(identifier)
+                    return self._cache.get(self._cacheKey('entity', identifier))
                 except KeyError:
                     pass
 
+                # Avoid probing each class when the type is already known.
+                entityType = self._getIndexedEntityType(identifier)
+                if entityType is not None:
+                    return self.getEntityById(
+                        'ftrack://{0}?entityType={1}'.format(
+                            identifier, entityType
+                        ),
+                        throw=throw
+                    )
+
+                referenceTypes = dict(
+                    (value, key) for key, value in self._legacyTypes.items()
+                )
+
                 for cls in ftrackObjectClasses:
                     try:
                         entity = cls(id=identifier)
+                        entityType = referenceTypes[cls.__name__]
                         break
 
-                    except ftrack.FTrackError as error:
+                    except ftrack.FTrackError, error:
                         if error.message.find('was not found') == -1:
                             raise
                         pass
@@ -1103,10 +4183,76 @@ class Bridge(object):
                 entityReference=identifier
             )
 
-        self._memoiser.cache.set(identifier, entity)
+        self._cache.set(
+            self._cacheKey('entity', identifier), entity, category=entityType
+        )
+
+        if entity and entityType is not None:
+            self._entityTypeIndex.set(identifier, entityType)
 
         return entity
 
+    @ftrack_connect_foundry.accounting.accounted
+    def getEntityReferenceTypes(self, identifiers):
+        '''Return mapping of *identifiers* to their reference entity type.
+
+        Reference entity types are those used in the entityType query
+        argument of references, such as 'task' or 'component'. Identifiers
+        not present in the process wide index are looked up with a single
+        request per :py:data:`~ftrack_connect_foundry.constant.
+        QUERY_BATCH_SIZE` identifiers. Identifiers that do not match any
+        entity are omitted.
+
+        '''
+        result = {}
+        unknown = []
+        for identifier in identifiers:
+            entityType = self._getIndexedEntityType(identifier)
+            if entityType is not None:
+                result[identifier] = entityType
+            elif identifier not in unknown:
+                unknown.append(identifier)
+
+        if not unknown:
+            return result
+
+        session = self._getSession()
+        batchSize = ftrack_connect_foundry.constant.QUERY_BATCH_SIZE
+        entityTypes = sorted(self._schemaTypes.keys())
+        expression = 'select id from {0} where id in ({1})'
+
+        for index in range(0, len(unknown), batchSize):
+            condition = ', '.join(
+                '"{0}"'.format(identifier)
+                for identifier in unknown[index:index + batchSize]
+            )
+
+            # Query every type in one call to the server.
+            responses = session.call([
+                {
+                    'action': 'query',
+                    'expression': expression.format(
+                        self._schemaTypes[entityType], condition
+                    )
+                }
+                for entityType in entityTypes
+            ])
+
+            for entityType, response in zip(entityTypes, responses):
+                for entity in response['data']:
+                    result[entity['id']] = entityType
+                    self._entityTypeIndex.set(entity['id'], entityType)
+
+        return result
+
+    def _getIndexedEntityType(self, identifier):
+        '''Return indexed reference entity type of *identifier* or None.'''
+        try:
+            return self._entityTypeIndex.get(identifier)
+        except KeyError:
+            return None
+
+    @ftrack_connect_foundry.accounting.accounted
     def getEntityType(self, entityReference):
         '''Return a string identifying type for *entityReference*.
 
@@ -1132,9 +4278,28 @@ class Bridge(object):
 
         return ''
 
+    @ftrack_connect_foundry.accounting.accounted
     def getEntityPath(self, entityReference, unders=False, slash=False,
                       includeAssettype=False):
         '''Return path to entity referenced by *entityReference*.'''
+        ancestry = self._getAncestry(entityReference)
+        if ancestry is not None:
+            pathSegments = []
+            for node in ancestry:
+                if node['entityType'] == 'asset' and includeAssettype:
+                    pathSegments.append(
+                        '{0}.{1}'.format(node['name'], node['assetType'])
+                    )
+                else:
+                    pathSegments.append(node['name'])
+
+            if unders:
+                return '_'.join(pathSegments)
+            elif slash:
+                return ' / '.join(pathSegments)
+            else:
+                return '.'.join(pathSegments)
+
         entity = self.getEntityById(entityReference)
 
         if entity.get('entityType') == 'show':
@@ -1167,6 +4332,138 @@ class Bridge(object):
 
             return path
 
+    def _getAncestry(self, entityReference):
+        '''Return hierarchy nodes from the project down to *entityReference*.
+
+        The first time an entity of a project is requested, the whole context
+        hierarchy of the project is loaded with a single request. Assets,
+        versions and components are loaded along with their parents up to
+        their context with a single query.
+
+        Return None if the entity could not be found.
+
+        '''
+        identifier, entityType = self._parseEntityReference(entityReference)
+
+        ancestry = self._hierarchy.getAncestry(identifier)
+        if ancestry is not None:
+            return ancestry
+
+        if entityType is None:
+            entityType = self.getEntityReferenceTypes([identifier]).get(
+                identifier
+            )
+
+        if entityType in ('component', 'asset_version', 'asset'):
+            contextId = self._loadAssetHierarchy(identifier, entityType)
+        elif entityType in ('task', 'show'):
+            contextId = identifier
+        else:
+            return None
+
+        if contextId is None:
+            return None
+
+        if self._hierarchy.getAncestry(contextId) is None:
+            projectId = contextId
+            context = self._getSession().query(
+                'select project_id from TypedContext where id is "{0}"'
+                .format(contextId)
+            ).first()
+            if context is not None:
+                projectId = context['project_id']
+
+            self._loadProjectHierarchy(projectId)
+
+        return self._hierarchy.getAncestry(identifier)
+
+    def _loadAssetHierarchy(self, identifier, entityType):
+        '''Add entity *identifier* and parents up to its asset to hierarchy.
+
+        *entityType* must be one of 'component', 'asset_version' or 'asset'.
+        Return identifier of the context of the asset or None if the entity
+        could not be found.
+
+        '''
+        projections = {
+            'component': [
+                'name', 'version_id', 'version.version', 'version.asset_id',
+                'version.asset.name', 'version.asset.type.short',
+                'version.asset.context_id'
+            ],
+            'asset_version': [
+                'version', 'asset_id', 'asset.name', 'asset.type.short',
+                'asset.context_id'
+            ],
+            'asset': ['name', 'type.short', 'context_id']
+        }[entityType]
+
+        entities = self._queryByIds(
+            self._schemaTypes[entityType], [identifier], projections
+        )
+        if not entities:
+            return None
+
+        entity = entities[0]
+        if entityType == 'component':
+            self._hierarchy.add(
+                entity['id'], entity['name'], entity['version_id'],
+                'component'
+            )
+            entity = entity['version']
+            entityType = 'asset_version'
+
+        if entityType == 'asset_version':
+            self._hierarchy.add(
+                entity['id'], 'v' + str(entity['version']).zfill(3),
+                entity['asset_id'], 'asset_version'
+            )
+            entity = entity['asset']
+
+        self._hierarchy.add(
+            entity['id'], entity['name'], entity['context_id'], 'asset',
+            assetType=entity['type']['short']
+        )
+
+        return entity['context_id']
+
+    def _loadProjectHierarchy(self, projectId):
+        '''Add project *projectId* and all of its contexts to hierarchy.
+
+        The project and its contexts are loaded with a single request.
+
+        '''
+        responses = self._getSession().call([
+            {
+                'action': 'query',
+                'expression': (
+                    'select id, name from Project where id is "{0}"'
+                    .format(projectId)
+                )
+            },
+            {
+                'action': 'query',
+                'expression': (
+                    'select id, name, parent_id from TypedContext '
+                    'where project_id is "{0}"'.format(projectId)
+                )
+            }
+        ])
+
+        projects, contexts = [response['data'] for response in responses]
+        if not projects:
+            return
+
+        self._hierarchy.add(projectId, projects[0]['name'], None, 'show')
+        self._entityTypeIndex.set(projectId, 'show')
+
+        for context in contexts:
+            self._hierarchy.add(
+                context['id'], context['name'], context['parent_id'], 'task'
+            )
+            self._entityTypeIndex.set(context['id'], 'task')
+
+    @ftrack_connect_foundry.accounting.accounted
     def getTaskTypeAndName(self, specification, entity=None, context=None):
         '''Return task type and name for *entity*.'''
         ## TODO: Is entity already a task?
@@ -1206,3 +4503,28 @@ class Bridge(object):
         )
 
         return taskType, taskName
+
+
+#: Weak references to bridges with a related reference pool. Their callbacks
+#: close the pool once the bridge is garbage collected.
+_poolReferences = set()
+
+
+def _closePoolOnCollect(bridge, pool):
+    '''Close thread *pool* once *bridge* is garbage collected.'''
+    def callback(reference):
+        '''Close pool of collected bridge.'''
+        _poolReferences.discard(reference)
+        pool.close()
+
+    _poolReferences.add(weakref.ref(bridge, callback))
+
+
+def _initialisePoolThread(threadSessions):
+    '''Mark current thread as belonging to a bridge thread pool.
+
+    *threadSessions* is the thread local storage of the bridge owning the
+    pool.
+
+    '''
+    threadSessions.pooled = True
@@ -0,0 +1,217 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 ftrack
+
+'''Caching of entity data.'''
+
+import sys
+import time
+import threading
+import collections
+
+
+class Cache(object):
+    '''Thread safe, size bounded cache with optional expiry of entries.
+
+    When the number of entries exceeds the maximum size the least recently
+    used entries are evicted. Entries can also be given a time to live based
+    on a category, such as the entity type they relate to.
+
+    '''
+
+    def __init__(self, maximumSize=None, timeToLive=None, clock=None):
+        '''Initialise cache.
+
+        *maximumSize* is the number of entries to retain before evicting least
+        recently used ones. If None then the cache is unbounded.
+
+        *timeToLive* may be a mapping of category to number of seconds that
+        entries set with that category remain valid for. Entries with a
+        category not in the mapping never expire.
+
+        *clock* should be a callable returning the current time in seconds. It
+        defaults to :py:func:`time.time`.
+
+        '''
+        super(Cache, self).__init__()
+        self._maximumSize = maximumSize
+        self._timeToLive = dict(timeToLive or {})
+        self._clock = clock or time.time
+
+        self._lock = threading.RLock()
+        self._entries = collections.OrderedDict()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._bytes = 0
+
+    def get(self, key):
+        '''Return value for *key*.
+
+        Raise :py:exc:`KeyError` if *key* is not present or has expired.
+
+        '''
+        with self._lock:
+            try:
+                value, expires, size = self._entries.pop(key)
+            except KeyError:
+                self._misses += 1
+                raise
+
+            if expires is not None and expires <= self._clock():
+                self._bytes -= size
+                self._expirations += 1
+                self._misses += 1
+                raise KeyError(key)
+
+            # Re-insert to mark as most recently used.
+            self._entries[key] = (value, expires, size)
+            self._hits += 1
+            return value
+
+    def set(self, key, value, category=None):
+        '''Set *key* to *value*.
+
+        *category* determines the time to live of the entry, if any.
+
+        '''
+        timeToLive = self._timeToLive.get(category)
+        expires = None
+        if timeToLive is not None:
+            expires = self._clock() + timeToLive
+
+        size = estimateSize(key) + estimateSize(value)
+
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (value, expires, size)
+            self._bytes += size
+
+            if self._maximumSize is not None:
+                while len(self._entries) > self._maximumSize:
+                    _, (_, _, evictedSize) = self._entries.popitem(last=False)
+                    self._bytes -= evictedSize
+                    self._evictions += 1
+
+    def remove(self, key):
+        '''Remove *key*.
+
+        Raise :py:exc:`KeyError` if *key* is not present.
+
+        '''
+        with self._lock:
+            if not self._discard(key):
+                raise KeyError(key)
+
+    def removeMatching(self, predicate):
+        '''Remove entries for which *predicate* returns True.
+
+        *predicate* is called with the key and value of each entry. Return the
+        number of entries removed.
+
+        '''
+        with self._lock:
+            keys = [
+                key for key, (value, _, _) in self._entries.iteritems()
+                if predicate(key, value)
+            ]
+
+            for key in keys:
+                self._discard(key)
+
+            return len(keys)
+
+    def _discard(self, key):
+        '''Remove *key* if present and return whether it was.'''
+        try:
+            _, _, size = self._entries.pop(key)
+        except KeyError:
+            return False
+
+        self._bytes -= size
+        return True
+
+    def keys(self):
+        '''Return list of keys currently in the cache.'''
+        with self._lock:
+            return self._entries.keys()
+
+    def items(self):
+        '''Return list of (key, value) tuples of unexpired entries.
+
+        Entries are ordered from least to most recently used. Unlike
+        :py:meth:`get` this does not affect recency or statistics.
+
+        '''
+        now = self._clock()
+        with self._lock:
+            return [
+                (key, value)
+                for key, (value, expires, _) in self._entries.iteritems()
+                if expires is None or expires > now
+            ]
+
+    def clear(self):
+        '''Remove all entries.'''
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def setTimeToLive(self, category, timeToLive):
+        '''Set *timeToLive* in seconds for entries of *category*.
+
+        Set *timeToLive* to None to stop entries of *category* from expiring.
+        Only affects entries set after the call.
+
+        '''
+        with self._lock:
+            if timeToLive is None:
+                self._timeToLive.pop(category, None)
+            else:
+                self._timeToLive[category] = timeToLive
+
+    def stats(self):
+        '''Return dictionary of cache statistics.
+
+        The following keys are included:
+
+            * size - Number of entries currently held.
+            * maximumSize - Maximum number of entries or None if unbounded.
+            * hits - Number of successful lookups.
+            * misses - Number of lookups of absent or expired entries.
+            * evictions - Number of entries evicted to respect maximum size.
+            * expirations - Number of entries found expired on lookup.
+            * bytes - Estimated memory used by keys and values.
+
+        '''
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maximumSize': self._maximumSize,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'bytes': self._bytes
+            }
+
+
+def estimateSize(value):
+    '''Return estimated size of *value* in bytes.
+
+    Built-in containers are measured recursively. Other objects only count
+    their own size as reported by :py:func:`sys.getsizeof`.
+
+    '''
+    size = sys.getsizeof(value, 0)
+
+    if isinstance(value, dict):
+        for key, item in value.iteritems():
+            size += estimateSize(key) + estimateSize(item)
+
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            size += estimateSize(item)
+
+    return size
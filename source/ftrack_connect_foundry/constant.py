@@ -23,3 +23,73 @@ TASK_TYPE_NAME_MAPPING = {
     COMPOSITING_TASK_TYPE: COMPOSITING_TASK_NAME,
     EDIT_TASK_TYPE: EDIT_TASK_NAME
 }
+
+#: Maximum number of identifiers to include in a single batched query.
+QUERY_BATCH_SIZE = 500
+
+#: Maximum number of entries held in the bridge entity cache.
+CACHE_MAXIMUM_SIZE = 50000
+
+#: Maximum number of entries held in the cache of a single manager state.
+STATE_CACHE_MAXIMUM_SIZE = 10000
+
+#: Environment variable specifying a directory to store the persistent
+#: resolve cache in. The cache is disabled if not set.
+RESOLVE_CACHE_DIRECTORY_ENV = 'FTRACK_CONNECT_FOUNDRY_RESOLVE_CACHE'
+
+#: Maximum number of seconds a path in the persistent resolve cache is used
+#: for after it was loaded from the server. This bounds how long processes
+#: that do not receive location events may use the path of a component that
+#: has moved since.
+RESOLVE_CACHE_MAXIMUM_AGE = 3600
+
+#: Maximum number of entries held in the process wide entity type index.
+ENTITY_TYPE_INDEX_MAXIMUM_SIZE = 200000
+
+#: Number of worker threads uploading thumbnails in the background.
+THUMBNAIL_UPLOAD_WORKERS = 2
+
+#: Number of times a failed thumbnail upload is retried.
+THUMBNAIL_UPLOAD_RETRIES = 3
+
+#: Maximum number of thumbnails waiting to be uploaded. Queuing further
+#: thumbnails waits for room for at most
+#: :py:data:`THUMBNAIL_QUEUE_PUT_TIMEOUT` seconds, after which they are
+#: discarded with a warning.
+THUMBNAIL_QUEUE_MAXIMUM_SIZE = 1000
+
+#: Maximum number of seconds to wait for room to queue a thumbnail.
+THUMBNAIL_QUEUE_PUT_TIMEOUT = 30
+
+#: Number of uploaded thumbnail components remembered to reuse for files
+#: with the same content.
+THUMBNAIL_UPLOADED_MAXIMUM_SIZE = 10000
+
+#: Maximum number of seconds to wait for queued thumbnails to be uploaded
+#: when the process exits.
+THUMBNAIL_EXIT_TIMEOUT = 30
+
+#: Default number of threads used to look up related references of many
+#: entities at once.
+RELATED_REFERENCE_WORKERS = 8
+
+#: Environment variable overriding the number of threads used to look up
+#: related references. A value of 1 disables concurrent lookups.
+RELATED_REFERENCE_WORKERS_ENV = 'FTRACK_CONNECT_FOUNDRY_RELATED_WORKERS'
+
+#: Maximum length in bytes of a frozen manager state. Cached data included
+#: in the state is reduced to fit.
+STATE_SNAPSHOT_MAXIMUM_SIZE = 256 * 1024
+
+#: Environment variable enabling accounting of the server usage of bridge
+#: calls when set to a value other than '0'. Accounting is disabled if not
+#: set.
+ACCOUNTING_ENV = 'FTRACK_CONNECT_FOUNDRY_ACCOUNTING'
+
+#: Environment variable specifying the path to a replica database to serve
+#: read-only lookups from. The replica is disabled if not set.
+REPLICA_PATH_ENV = 'FTRACK_CONNECT_FOUNDRY_REPLICA'
+
+#: Number of seconds before the most recent version loaded by a replica sync
+#: from which versions are loaded again by the next incremental sync.
+REPLICA_SYNC_OVERLAP = 3600
@@ -0,0 +1,104 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 ftrack
+
+'''Sources of server events used to keep cached data current.'''
+
+import abc
+import threading
+
+
+class EventSource(object):
+    '''Source of server events the bridge subscribes to.
+
+    Events are passed to subscribers as mappings with 'topic' and 'data'
+    keys, in the form published by the ftrack event hub.
+
+    '''
+
+    __metaclass__ = abc.ABCMeta
+
+    @abc.abstractmethod
+    def subscribe(self, topic, callback):
+        '''Call *callback* with each event published on *topic*.'''
+
+
+class SessionEventSource(EventSource):
+    '''Events received by the event hub of an ftrack_api session.
+
+    Events from the server are only delivered while the event hub is
+    connected and something processes received events by calling its wait
+    method, such as ftrack Connect does for its shared session. Pass *pump*
+    to do this on a background thread when nothing else does.
+
+    Component location events are published by the session that adds or
+    removes the component. They only reach other processes if that session
+    has a connected event hub. Otherwise paths in the persistent resolve
+    cache are not invalidated for other processes.
+
+    '''
+
+    def __init__(self, session, pump=False):
+        '''Initialise source receiving events through *session*.
+
+        If *pump* is True the event hub is connected if needed and received
+        events are processed on a daemon thread once subscribed to.
+
+        '''
+        super(SessionEventSource, self).__init__()
+        self._session = session
+        self._pump = pump
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic, callback):
+        '''Call *callback* with each event published on *topic*.'''
+        self._session.event_hub.subscribe(
+            'topic={0}'.format(topic), callback
+        )
+
+        if self._pump:
+            self._startPump()
+
+    def _startPump(self):
+        '''Start thread processing received events if not started.'''
+        with self._lock:
+            if self._thread is not None:
+                return
+
+            eventHub = self._session.event_hub
+            if not eventHub.connected:
+                eventHub.connect()
+
+            self._thread = threading.Thread(target=eventHub.wait)
+            self._thread.daemon = True
+            self._thread.start()
+
+
+class MemoryEventSource(EventSource):
+    '''Events published in process.
+
+    Events are delivered synchronously to subscribers when published with
+    :py:meth:`publish`, making it possible to drive cache invalidation
+    without a server, such as from a script replaying changes.
+
+    '''
+
+    def __init__(self):
+        '''Initialise source without subscribers.'''
+        super(MemoryEventSource, self).__init__()
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, topic, callback):
+        '''Call *callback* with each event published on *topic*.'''
+        with self._lock:
+            self._subscribers.setdefault(topic, []).append(callback)
+
+    def publish(self, topic, data):
+        '''Publish event with *data* on *topic* to subscribers.'''
+        with self._lock:
+            callbacks = list(self._subscribers.get(topic, []))
+
+        event = {'topic': topic, 'data': data}
+        for callback in callbacks:
+            callback(event)
@@ -0,0 +1,81 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 ftrack
+
+'''Index of entity names and parents.'''
+
+import threading
+
+
+class Hierarchy(object):
+    '''Thread safe index of entities by identifier with their parent.
+
+    Each entity is stored as a node dictionary with the following keys:
+
+        * id - Identifier of the entity.
+        * name - Name of the entity as returned by
+          :py:meth:`ftrack_connect_foundry.bridge.Bridge.getEntityName`.
+        * parentId - Identifier of the parent entity or None for a project.
+        * entityType - Reference entity type of the entity, such as 'task'.
+        * assetType - Short name of the asset type for assets, otherwise None.
+
+    '''
+
+    def __init__(self):
+        '''Initialise empty hierarchy.'''
+        super(Hierarchy, self).__init__()
+        self._lock = threading.RLock()
+        self._nodes = {}
+
+    def add(self, identifier, name, parentId, entityType, assetType=None):
+        '''Add or replace entity *identifier*.'''
+        with self._lock:
+            self._nodes[identifier] = {
+                'id': identifier,
+                'name': name,
+                'parentId': parentId,
+                'entityType': entityType,
+                'assetType': assetType
+            }
+
+    def get(self, identifier):
+        '''Return node for *identifier* or None if not present.'''
+        with self._lock:
+            return self._nodes.get(identifier)
+
+    def getNodes(self):
+        '''Return list of all nodes.'''
+        with self._lock:
+            return [dict(node) for node in self._nodes.values()]
+
+    def getAncestry(self, identifier):
+        '''Return list of nodes from the project down to *identifier*.
+
+        Return None if *identifier* or any of its ancestors is not present.
+
+        '''
+        ancestry = []
+        with self._lock:
+            while identifier is not None:
+                node = self._nodes.get(identifier)
+                if node is None:
+                    return None
+
+                ancestry.append(node)
+                identifier = node['parentId']
+
+        ancestry.reverse()
+        return ancestry
+
+    def remove(self, identifier):
+        '''Remove entity *identifier* if present.
+
+        Descendants are kept but have no ancestry until it is added again.
+
+        '''
+        with self._lock:
+            self._nodes.pop(identifier, None)
+
+    def clear(self):
+        '''Remove all entities.'''
+        with self._lock:
+            self._nodes.clear()
@@ -51,6 +51,10 @@ class ManagerInterface(FnAssetAPI.implementation.ManagerInterfaceBase):
         '''Clear any internal caches.'''
         self._bridge.flushCaches()
 
+    def prefetch(self, entityRefs, context):
+        '''Load data for *entityRefs* ahead of subsequent queries.'''
+        return self._bridge.prefetch(entityRefs, context)
+
     def isEntityReference(self, token, context):
         '''Return whether *token* appears to be an entity reference.
 
@@ -67,6 +71,10 @@ class ManagerInterface(FnAssetAPI.implementation.ManagerInterfaceBase):
         '''Resolve *entityRef* to a finalized string of data.'''
         return self._bridge.resolveEntityReference(entityRef, context)
 
+    def resolveEntityReferences(self, entityRefs, context):
+        '''Resolve *entityRefs* to a list of finalized strings of data.'''
+        return self._bridge.resolveEntityReferences(entityRefs, context)
+
     def containsEntityReference(self, string, context):
         '''Return whether *string* contains an entity reference.
 
@@ -116,12 +124,24 @@ class ManagerInterface(FnAssetAPI.implementation.ManagerInterfaceBase):
             maxResults=maxResults
         )
 
+    def getEntityVersionPage(self, entityRef, context, pageSize, cursor=None):
+        '''Return page of versions for *entityRef*, most recent first.'''
+        return self._bridge.getEntityVersionPage(
+            entityRef, context, pageSize, cursor=cursor
+        )
+
     def getFinalizedEntityVersion(self, entityRef, context, version=None):
         '''Return concrete entity reference for supplied *entityRef*.'''
         return self._bridge.getFinalizedEntityVersion(
             entityRef, context, version=version
         )
 
+    def getFinalizedEntityVersions(self, entityRefs, context, version=None):
+        '''Return concrete entity references for supplied *entityRefs*.'''
+        return self._bridge.getFinalizedEntityVersions(
+            entityRefs, context, version=version
+        )
+
     def getEntityMetadata(self, entityRef, context):
         '''Return metadata for entity referenced by *entityRef*.'''
         return self._bridge.getEntityMetadata(entityRef, context)
@@ -132,6 +152,17 @@ class ManagerInterface(FnAssetAPI.implementation.ManagerInterfaceBase):
             entityRef, data, context, merge=merge
         )
 
+    def getEntityMetadataMultiple(self, entityRefs, context):
+        '''Return list of metadata for entities referenced by *entityRefs*.'''
+        return self._bridge.getEntityMetadataMultiple(entityRefs, context)
+
+    def setEntityMetadataMultiple(self, entityRefs, data, context,
+                                  merge=True):
+        '''Set metadata for entities referenced by *entityRefs*.'''
+        return self._bridge.setEntityMetadataMultiple(
+            entityRefs, data, context, merge=merge
+        )
+
     def getEntityMetadataEntry(self, entityRef, key, context,
                                defaultValue=None):
         '''Return the value for the specified metadata *key*.'''
@@ -149,14 +180,51 @@ class ManagerInterface(FnAssetAPI.implementation.ManagerInterfaceBase):
         '''Prepare for work to be done to the referenced entity.'''
         return self._bridge.preflight(targetEntityRef, entitySpec, context)
 
+    def preflightMultiple(self, targetEntityRefs, entitySpecs, context):
+        '''Prepare for work to be done to each of *targetEntityRefs*.'''
+        return self._bridge.preflightMultiple(
+            targetEntityRefs, entitySpecs, context
+        )
+
     def register(self, stringData, targetEntityRef, entitySpec, context):
         '''Register entity with asset management system (a publish).'''
         return self._bridge.register(
             stringData, targetEntityRef, entitySpec, context
         )
 
+    def registerMultiple(self, strings, targetEntityRefs, entitySpecs,
+                         context):
+        '''Register each of *strings* with asset management system.'''
+        return self._bridge.registerMultiple(
+            strings, targetEntityRefs, entitySpecs, context
+        )
+
     def thumbnailSpecification(self, specification, context, options):
         '''Return whether a thumbnail should be prepared.'''
         return self._bridge.thumbnailSpecification(
             specification, context, options
         )
+
+    def createState(self, parentState=None):
+        '''Return new manager state, optionally derived from *parentState*.'''
+        return self._bridge.createState(parentState=parentState)
+
+    def startTransaction(self, state):
+        '''Start buffering registrations made with *state*.'''
+        return self._bridge.startTransaction(state)
+
+    def finishTransaction(self, state):
+        '''Commit registrations buffered in *state*.'''
+        return self._bridge.finishTransaction(state)
+
+    def cancelTransaction(self, state):
+        '''Discard registrations buffered in *state*.'''
+        return self._bridge.cancelTransaction(state)
+
+    def freezeState(self, state):
+        '''Return token encapsulating *state* and cached data.'''
+        return self._bridge.freezeState(state)
+
+    def thawState(self, token):
+        '''Return manager state restored from *token*.'''
+        return self._bridge.thawState(token)
@@ -0,0 +1,828 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 ftrack
+
+'''Local read-only copy of project data for offline lookups.'''
+
+import os
+import errno
+import sqlite3
+import datetime
+import threading
+
+import FnAssetAPI.logging
+
+import ftrack_connect_foundry.constant
+
+
+class Replica(object):
+    '''Contexts, assets, versions, components and locations stored in SQLite.
+
+    Farm and batch processes that only read data can resolve references,
+    list versions and look up related entities from the replica instead of
+    the server. A replica is filled for one or more projects with
+    :py:meth:`sync`, typically by a separate process before work is
+    dispatched, and is then opened by each process that needs it.
+
+    Every thread uses its own connection and the database is opened in
+    write-ahead logging mode where supported so that readers are not blocked
+    by a sync in progress. Failures to read the database are logged and
+    treated as the data not being present so that callers fall back to the
+    server.
+
+    '''
+
+    #: Version of the database schema. Databases with a different version
+    #: are recreated.
+    SCHEMA_VERSION = 2
+
+    def __init__(self, path, timeout=30.0):
+        '''Initialise replica stored in database file at *path*.
+
+        The directory of *path* is created if it does not exist. *timeout*
+        is the number of seconds to wait for another process holding a lock
+        on the database before giving up.
+
+        '''
+        super(Replica, self).__init__()
+        self._path = path
+        self._timeout = timeout
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            try:
+                os.makedirs(directory)
+            except OSError as error:
+                if error.errno != errno.EEXIST:
+                    raise
+
+    @property
+    def path(self):
+        '''Return path to database file.'''
+        return self._path
+
+    def _getConnection(self):
+        '''Return database connection for the current thread.'''
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self._path, timeout=self._timeout)
+
+            try:
+                connection.execute('PRAGMA journal_mode=WAL')
+            except sqlite3.Error:
+                # Not supported on some network filesystems. The default
+                # rollback journal is still safe, only less concurrent.
+                pass
+
+            with connection:
+                version = connection.execute(
+                    'PRAGMA user_version'
+                ).fetchone()[0]
+
+                if version != self.SCHEMA_VERSION:
+                    self._createTables(connection)
+
+            self._local.connection = connection
+
+        return connection
+
+    def _createTables(self, connection):
+        '''Recreate tables in *connection*, discarding existing data.'''
+        for table in (
+            'context', 'asset', 'version', 'component',
+            'component_location', 'location', 'sync'
+        ):
+            connection.execute('DROP TABLE IF EXISTS {0}'.format(table))
+
+        connection.execute(
+            'CREATE TABLE context ('
+            'id TEXT PRIMARY KEY, '
+            'project_id TEXT NOT NULL, '
+            'name TEXT NOT NULL, '
+            'parent_id TEXT, '
+            'object_type TEXT NOT NULL, '
+            'type_id TEXT)'
+        )
+        connection.execute(
+            'CREATE TABLE asset ('
+            'id TEXT PRIMARY KEY, '
+            'project_id TEXT NOT NULL, '
+            'name TEXT NOT NULL, '
+            'context_id TEXT NOT NULL, '
+            'type_short TEXT)'
+        )
+        connection.execute(
+            'CREATE TABLE version ('
+            'id TEXT PRIMARY KEY, '
+            'project_id TEXT NOT NULL, '
+            'asset_id TEXT NOT NULL, '
+            'version INTEGER NOT NULL, '
+            'task_id TEXT, '
+            'status TEXT)'
+        )
+        connection.execute(
+            'CREATE TABLE component ('
+            'id TEXT PRIMARY KEY, '
+            'version_id TEXT NOT NULL, '
+            'name TEXT NOT NULL, '
+            'file_type TEXT, '
+            'img_main INTEGER NOT NULL)'
+        )
+        connection.execute(
+            'CREATE TABLE component_location ('
+            'component_id TEXT NOT NULL, '
+            'location_id TEXT NOT NULL, '
+            'resource_identifier TEXT NOT NULL, '
+            'PRIMARY KEY (component_id, location_id))'
+        )
+        connection.execute(
+            'CREATE TABLE location ('
+            'id TEXT PRIMARY KEY, '
+            'name TEXT NOT NULL)'
+        )
+        connection.execute(
+            'CREATE TABLE sync ('
+            'project_id TEXT PRIMARY KEY, '
+            'timestamp TEXT NOT NULL)'
+        )
+
+        for table, column in (
+            ('context', 'parent_id'),
+            ('asset', 'context_id'),
+            ('version', 'asset_id'),
+            ('version', 'task_id'),
+            ('component', 'version_id')
+        ):
+            connection.execute(
+                'CREATE INDEX {0}_{1} ON {0} ({1})'.format(table, column)
+            )
+
+        connection.execute(
+            'PRAGMA user_version={0}'.format(self.SCHEMA_VERSION)
+        )
+
+    def _select(self, sql, parameters=()):
+        '''Return rows selected by *sql* or an empty list on failure.'''
+        try:
+            return self._getConnection().execute(sql, parameters).fetchall()
+        except sqlite3.Error as error:
+            FnAssetAPI.logging.debug(
+                'Unable to read replica {0}: {1}'.format(self._path, error)
+            )
+            return []
+
+    def sync(self, session, projectId, full=False):
+        '''Update replica with data of project *projectId* from *session*.
+
+        The first sync of a project loads all of its contexts, assets,
+        versions and components. Later syncs only load contexts and assets
+        not yet in the replica, and versions and their components published
+        since the most recent version loaded by the previous sync, as dated
+        by the server, with a margin of
+        :py:data:`~ftrack_connect_foundry.constant.REPLICA_SYNC_OVERLAP`
+        seconds to allow for versions committed while syncing. The
+        identifiers of all contexts, assets, versions and components of the
+        project are loaded to remove those deleted since.
+
+        The locations with an accessor in *session* are stored on every sync
+        so that processes reading the replica, which are expected to
+        configure the same locations, do not need to query them.
+
+        .. note::
+
+            ftrack does not record when a context, asset or version was last
+            modified, so renamed and moved contexts and assets, and changes
+            to the status or components of previously synced versions, are
+            only picked up when *full* is True, which reloads all of them.
+
+        Return the number of versions loaded.
+
+        '''
+        since = None
+        if not full:
+            rows = self._select(
+                'SELECT timestamp FROM sync WHERE project_id = ?',
+                (projectId,)
+            )
+            if rows:
+                since = self._parseTimestamp(rows[0][0])
+
+        project = session.query(
+            'select name from Project where id is {0}'.format(
+                self._quote(projectId)
+            )
+        ).one()
+
+        contextCondition = 'project_id is {0}'.format(self._quote(projectId))
+        assetCondition = (
+            '(parent.project_id is {0} or context_id is {0})'.format(
+                self._quote(projectId)
+            )
+        )
+
+        contextConditions = [contextCondition]
+        assetConditions = [assetCondition]
+        deletedContextIds = []
+        deletedAssetIds = []
+        if since is not None:
+            addedContextIds, deletedContextIds = self._getChanges(
+                session, 'TypedContext', contextCondition, 'context',
+                projectId
+            )
+            contextConditions = self._getBatchConditions(addedContextIds)
+
+            addedAssetIds, deletedAssetIds = self._getChanges(
+                session, 'Asset', assetCondition, 'asset', projectId
+            )
+            assetConditions = self._getBatchConditions(addedAssetIds)
+
+        # The project is stored as a context so that its name is refreshed
+        # on every sync.
+        contexts = [
+            (projectId, projectId, project['name'], None, 'Project', None)
+        ]
+        for condition in contextConditions:
+            for context in session.query(
+                'select name, parent_id, object_type.name, type_id '
+                'from TypedContext where {0}'.format(condition)
+            ).all():
+                contexts.append((
+                    context['id'], projectId, context['name'],
+                    context['parent_id'], context['object_type']['name'],
+                    context['type_id']
+                ))
+
+        assets = []
+        for condition in assetConditions:
+            for asset in session.query(
+                'select name, context_id, type.short from Asset '
+                'where {0}'.format(condition)
+            ).all():
+                assets.append((
+                    asset['id'], projectId, asset['name'],
+                    asset['context_id'], asset['type']['short']
+                ))
+
+        locations = [
+            (location['id'], location['name'])
+            for location in session.query('select name from Location').all()
+            if location.accessor
+        ]
+
+        versionCondition = (
+            '(asset.parent.project_id is {0} or asset.context_id is {0})'
+            .format(self._quote(projectId))
+        )
+
+        query = (
+            'select version, asset_id, task_id, status.name, date '
+            'from AssetVersion where {0}'.format(versionCondition)
+        )
+        if since is not None:
+            overlap = datetime.timedelta(
+                seconds=ftrack_connect_foundry.constant.REPLICA_SYNC_OVERLAP
+            )
+            query += ' and date >= {0}'.format(
+                self._quote(self._formatTimestamp(since - overlap))
+            )
+
+        latest = None
+        versions = []
+        for version in session.query(query).all():
+            status = version['status']
+            versions.append((
+                version['id'], projectId, version['asset_id'],
+                version['version'], version['task_id'],
+                status['name'] if status else None
+            ))
+
+            date = self._toUtc(version['date'])
+            if date is not None and (latest is None or date > latest):
+                latest = date
+
+        existingVersionIds = None
+        existingComponentIds = None
+        if since is not None:
+            existingVersionIds = set(
+                version['id'] for version in session.query(
+                    'select id from AssetVersion where {0}'.format(
+                        versionCondition
+                    )
+                ).all()
+            )
+            existingComponentIds = set(
+                component['id'] for component in session.query(
+                    'select id from Component where '
+                    '(version.asset.parent.project_id is {0} '
+                    'or version.asset.context_id is {0})'.format(
+                        self._quote(projectId)
+                    )
+                ).all()
+            )
+
+        versionIds = [version[0] for version in versions]
+        components = []
+        componentLocations = []
+        batchSize = ftrack_connect_foundry.constant.QUERY_BATCH_SIZE
+        for index in range(0, len(versionIds), batchSize):
+            batch = versionIds[index:index + batchSize]
+            condition = ', '.join(
+                '"{0}"'.format(identifier) for identifier in batch
+            )
+            for component in session.query(
+                'select name, version_id, file_type, metadata, '
+                'component_locations.location_id, '
+                'component_locations.resource_identifier '
+                'from Component where version_id in ({0})'.format(condition)
+            ).all():
+                components.append((
+                    component['id'], component['version_id'],
+                    component['name'], component['file_type'],
+                    int(bool(component['metadata'].get('img_main')))
+                ))
+                for componentLocation in component['component_locations']:
+                    componentLocations.append((
+                        component['id'], componentLocation['location_id'],
+                        componentLocation['resource_identifier']
+                    ))
+
+        # Versions are dated by the server so the next sync continues from
+        # the most recent version loaded rather than the local time.
+        timestamp = latest or since
+        if timestamp is not None:
+            timestamp = self._formatTimestamp(timestamp)
+
+        connection = self._getConnection()
+        with connection:
+            if since is None:
+                connection.execute(
+                    'DELETE FROM context WHERE project_id = ?', (projectId,)
+                )
+                connection.execute(
+                    'DELETE FROM asset WHERE project_id = ?', (projectId,)
+                )
+
+            else:
+                connection.executemany(
+                    'DELETE FROM context WHERE id = ?',
+                    [(identifier,) for identifier in deletedContextIds]
+                )
+                connection.executemany(
+                    'DELETE FROM asset WHERE id = ?',
+                    [(identifier,) for identifier in deletedAssetIds]
+                )
+
+            connection.executemany(
+                'INSERT OR REPLACE INTO context VALUES (?, ?, ?, ?, ?, ?)',
+                contexts
+            )
+            connection.executemany(
+                'INSERT OR REPLACE INTO asset VALUES (?, ?, ?, ?, ?)', assets
+            )
+            connection.execute('DELETE FROM location')
+            connection.executemany(
+                'INSERT INTO location VALUES (?, ?)', locations
+            )
+
+            if since is None:
+                connection.execute(
+                    'DELETE FROM component_location WHERE component_id IN ('
+                    'SELECT component.id FROM component JOIN version '
+                    'ON component.version_id = version.id '
+                    'WHERE version.project_id = ?)', (projectId,)
+                )
+                connection.execute(
+                    'DELETE FROM component WHERE version_id IN ('
+                    'SELECT id FROM version WHERE project_id = ?)',
+                    (projectId,)
+                )
+                connection.execute(
+                    'DELETE FROM version WHERE project_id = ?', (projectId,)
+                )
+
+            else:
+                for version in versions:
+                    connection.execute(
+                        'DELETE FROM component_location WHERE component_id '
+                        'IN (SELECT id FROM component WHERE version_id = ?)',
+                        (version[0],)
+                    )
+                    connection.execute(
+                        'DELETE FROM component WHERE version_id = ?',
+                        (version[0],)
+                    )
+
+                self._prune(
+                    connection, projectId, existingVersionIds,
+                    existingComponentIds
+                )
+
+            connection.executemany(
+                'INSERT OR REPLACE INTO version VALUES (?, ?, ?, ?, ?, ?)',
+                versions
+            )
+            connection.executemany(
+                'INSERT OR REPLACE INTO component VALUES (?, ?, ?, ?, ?)',
+                components
+            )
+            connection.executemany(
+                'INSERT OR REPLACE INTO component_location VALUES (?, ?, ?)',
+                componentLocations
+            )
+            if timestamp is None:
+                connection.execute(
+                    'DELETE FROM sync WHERE project_id = ?', (projectId,)
+                )
+            else:
+                connection.execute(
+                    'INSERT OR REPLACE INTO sync VALUES (?, ?)',
+                    (projectId, timestamp)
+                )
+
+        FnAssetAPI.logging.debug(
+            'Synced replica {0} for project {1}: {2} contexts, {3} assets, '
+            '{4} versions, {5} components.'.format(
+                self._path, projectId, len(contexts), len(assets),
+                len(versions), len(components)
+            )
+        )
+
+        return len(versions)
+
+    def _getChanges(self, session, entityType, condition, table, projectId):
+        '''Return (added, deleted) identifiers of entities of *projectId*.
+
+        The identifiers of entities of *entityType* matching *condition* on
+        the server are compared with those of the project in *table*.
+
+        '''
+        identifiers = set(
+            entity['id'] for entity in session.query(
+                'select id from {0} where {1}'.format(entityType, condition)
+            ).all()
+        )
+
+        stored = set(
+            row[0] for row in self._select(
+                'SELECT id FROM {0} WHERE project_id = ?'.format(table),
+                (projectId,)
+            )
+        )
+        stored.discard(projectId)
+
+        return sorted(identifiers - stored), sorted(stored - identifiers)
+
+    def _getBatchConditions(self, identifiers):
+        '''Return query conditions selecting *identifiers* in batches.'''
+        batchSize = ftrack_connect_foundry.constant.QUERY_BATCH_SIZE
+        return [
+            'id in ({0})'.format(', '.join(
+                self._quote(identifier)
+                for identifier in identifiers[index:index + batchSize]
+            ))
+            for index in range(0, len(identifiers), batchSize)
+        ]
+
+    def _prune(self, connection, projectId, versionIds, componentIds):
+        '''Remove versions and components of *projectId* deleted on server.
+
+        *versionIds* and *componentIds* are the identifiers of all versions
+        and components of the project on the server.
+
+        '''
+        deletedVersions = [
+            (row[0],) for row in connection.execute(
+                'SELECT id FROM version WHERE project_id = ?', (projectId,)
+            ).fetchall()
+            if row[0] not in versionIds
+        ]
+        deletedComponents = [
+            (row[0],) for row in connection.execute(
+                'SELECT component.id FROM component JOIN version '
+                'ON component.version_id = version.id '
+                'WHERE version.project_id = ?', (projectId,)
+            ).fetchall()
+            if row[0] not in componentIds
+        ]
+        deletedComponents.extend(
+            (row[0],) for versionId, in deletedVersions
+            for row in connection.execute(
+                'SELECT id FROM component WHERE version_id = ?', (versionId,)
+            ).fetchall()
+        )
+
+        connection.executemany(
+            'DELETE FROM component_location WHERE component_id = ?',
+            deletedComponents
+        )
+        connection.executemany(
+            'DELETE FROM component WHERE id = ?', deletedComponents
+        )
+        connection.executemany(
+            'DELETE FROM version WHERE id = ?', deletedVersions
+        )
+
+    def _quote(self, value):
+        '''Return *value* quoted for use in an ftrack query expression.'''
+        return u'"{0}"'.format(
+            unicode(value).replace('\\', '\\\\').replace('"', '\\"')
+        )
+
+    def _toUtc(self, value):
+        '''Return date *value* loaded from the server as naive UTC or None.'''
+        value = getattr(value, 'datetime', value)
+        if not isinstance(value, datetime.datetime):
+            return None
+
+        if value.tzinfo is not None:
+            value = (value - value.utcoffset()).replace(tzinfo=None)
+
+        return value
+
+    def _formatTimestamp(self, value):
+        '''Return naive UTC datetime *value* as stored in the sync table.'''
+        return value.strftime('%Y-%m-%dT%H:%M:%S')
+
+    def _parseTimestamp(self, value):
+        '''Return datetime stored as *value* in the sync table or None.'''
+        try:
+            return datetime.datetime.strptime(value, '%Y-%m-%dT%H:%M:%S')
+        except (TypeError, ValueError):
+            return None
+
+    def getLocationIds(self):
+        '''Return identifiers of the locations stored by the last sync.'''
+        return [
+            row[0] for row in self._select('SELECT id FROM location')
+        ]
+
+    def getEntityType(self, identifier):
+        '''Return reference entity type of *identifier* or None.
+
+        The type is one of 'show', 'task', 'asset', 'asset_version' or
+        'component'. None is returned if *identifier* is not present.
+
+        '''
+        for table, entityType in (
+            ('component', 'component'),
+            ('version', 'asset_version'),
+            ('asset', 'asset'),
+            ('context', None)
+        ):
+            rows = self._select(
+                'SELECT {0} FROM {1} WHERE id = ?'.format(
+                    'object_type' if entityType is None else 'id', table
+                ),
+                (identifier,)
+            )
+            if rows:
+                if entityType is None:
+                    entityType = 'show' if rows[0][0] == 'Project' else 'task'
+
+                return entityType
+
+        return None
+
+    def getName(self, identifier):
+        '''Return name of entity *identifier* or None if not present.
+
+        Versions are named by their number, such as 'v003'.
+
+        '''
+        for sql in (
+            'SELECT name FROM component WHERE id = ?',
+            'SELECT name FROM context WHERE id = ?',
+            'SELECT name FROM asset WHERE id = ?'
+        ):
+            rows = self._select(sql, (identifier,))
+            if rows:
+                return rows[0][0]
+
+        rows = self._select(
+            'SELECT version FROM version WHERE id = ?', (identifier,)
+        )
+        if rows:
+            return 'v' + str(rows[0][0]).zfill(3)
+
+        return None
+
+    def getContext(self, identifier):
+        '''Return context *identifier* as a dictionary or None.
+
+        The dictionary has 'id', 'name', 'parent_id' and 'object_type' keys.
+
+        '''
+        rows = self._select(
+            'SELECT id, name, parent_id, object_type FROM context '
+            'WHERE id = ?', (identifier,)
+        )
+        if not rows:
+            return None
+
+        return self._contextFromRow(rows[0])
+
+    def getChildren(self, identifier):
+        '''Return list of child contexts of context *identifier*.'''
+        return [
+            self._contextFromRow(row)
+            for row in self._select(
+                'SELECT id, name, parent_id, object_type FROM context '
+                'WHERE parent_id = ? ORDER BY name', (identifier,)
+            )
+        ]
+
+    def _contextFromRow(self, row):
+        '''Return context dictionary for database *row*.'''
+        return dict(zip(('id', 'name', 'parent_id', 'object_type'), row))
+
+    def getAssetContextId(self, identifier):
+        '''Return context of the asset of entity *identifier* or None.
+
+        *identifier* may reference an asset, version or component.
+
+        '''
+        for sql in (
+            'SELECT context_id FROM asset WHERE id = ?',
+            'SELECT asset.context_id FROM version JOIN asset '
+            'ON version.asset_id = asset.id WHERE version.id = ?',
+            'SELECT asset.context_id FROM component '
+            'JOIN version ON component.version_id = version.id '
+            'JOIN asset ON version.asset_id = asset.id '
+            'WHERE component.id = ?'
+        ):
+            rows = self._select(sql, (identifier,))
+            if rows:
+                return rows[0][0]
+
+        return None
+
+    def getComponents(self, identifiers):
+        '''Return list of components matching *identifiers*.
+
+        Each component is a dictionary with 'id', 'name', 'version_id' and
+        'component_locations' keys in the form returned by ftrack_api
+        queries, suitable for computing paths. Components not present are
+        omitted.
+
+        '''
+        components = {}
+        batchSize = ftrack_connect_foundry.constant.QUERY_BATCH_SIZE
+        for index in range(0, len(identifiers), batchSize):
+            batch = identifiers[index:index + batchSize]
+            placeholders = ', '.join('?' * len(batch))
+
+            for identifier, name, versionId in self._select(
+                'SELECT id, name, version_id FROM component '
+                'WHERE id IN ({0})'.format(placeholders), batch
+            ):
+                components[identifier] = {
+                    'id': identifier,
+                    'name': name,
+                    'version_id': versionId,
+                    'component_locations': []
+                }
+
+            for identifier, locationId, resourceIdentifier in self._select(
+                'SELECT component_id, location_id, resource_identifier '
+                'FROM component_location WHERE component_id IN ({0})'.format(
+                    placeholders
+                ), batch
+            ):
+                components[identifier]['component_locations'].append({
+                    'location_id': locationId,
+                    'resource_identifier': resourceIdentifier
+                })
+
+        return [
+            components[identifier] for identifier in identifiers
+            if identifier in components
+        ]
+
+    def getVersions(self, identifier):
+        '''Return versions relevant to entity *identifier* or None.
+
+        Versions are returned in the same way as the bridge lists them, for
+        the component with the same name as *identifier* if it is a
+        component, otherwise the 'main' component. Each version is a
+        (version number, component identifier, status name) tuple and the
+        list is ordered by version number. The component identifier is None
+        for versions without such a component.
+
+        None is returned if *identifier* is not an asset, version or
+        component present in the replica.
+
+        '''
+        name = 'main'
+        rows = self._select(
+            'SELECT component.name, version.asset_id FROM component '
+            'JOIN version ON component.version_id = version.id '
+            'WHERE component.id = ?', (identifier,)
+        )
+        if rows:
+            name, assetId = rows[0]
+
+        else:
+            rows = self._select(
+                'SELECT asset_id FROM version WHERE id = ? '
+                'UNION SELECT id FROM asset WHERE id = ?',
+                (identifier, identifier)
+            )
+            if not rows:
+                return None
+
+            assetId = rows[0][0]
+
+        return [
+            tuple(row) for row in self._select(
+                'SELECT version.version, component.id, version.status '
+                'FROM version LEFT JOIN component '
+                'ON component.version_id = version.id AND component.name = ? '
+                'WHERE version.asset_id = ? '
+                'ORDER BY version.version', (name, assetId)
+            )
+        ]
+
+    def hasContexts(self, identifiers):
+        '''Return whether all contexts *identifiers* are present.'''
+        identifiers = set(identifiers)
+        found = set()
+        batchSize = ftrack_connect_foundry.constant.QUERY_BATCH_SIZE
+        batches = sorted(identifiers)
+        for index in range(0, len(batches), batchSize):
+            batch = batches[index:index + batchSize]
+            found.update(
+                row[0] for row in self._select(
+                    'SELECT id FROM context WHERE id IN ({0})'.format(
+                        ', '.join('?' * len(batch))
+                    ), batch
+                )
+            )
+
+        return found == identifiers
+
+    def getWorkflowVersions(self, contextIds, taskTypeId):
+        '''Return workflow candidate versions for *contextIds*.
+
+        Versions of 'img' and 'comp' assets that have a version published
+        from a task of type *taskTypeId* directly below one of *contextIds*
+        are returned in the form the bridge loads them from the server, as
+        dictionaries with 'version', 'asset_id', 'task_id', 'task', 'status'
+        and 'components' keys.
+
+        '''
+        placeholders = ', '.join('?' * len(contextIds))
+        rows = self._select(
+            'SELECT version.id, version.version, version.asset_id, '
+            'version.task_id, task.parent_id, task.type_id, version.status '
+            'FROM version JOIN asset ON version.asset_id = asset.id '
+            'LEFT JOIN context AS task ON version.task_id = task.id '
+            "WHERE asset.type_short IN ('img', 'comp') "
+            'AND asset.id IN ('
+            'SELECT source.asset_id FROM version AS source '
+            'JOIN context AS sourceTask ON source.task_id = sourceTask.id '
+            'WHERE sourceTask.parent_id IN ({0}) '
+            'AND sourceTask.type_id = ?)'.format(placeholders),
+            list(contextIds) + [taskTypeId]
+        )
+
+        versions = {}
+        result = []
+        for (
+            identifier, number, assetId, taskId, parentId, typeId, status
+        ) in rows:
+            task = None
+            if taskId is not None and parentId is not None:
+                task = {'parent_id': parentId, 'type_id': typeId}
+
+            version = versions[identifier] = {
+                'id': identifier,
+                'version': number,
+                'asset_id': assetId,
+                'task_id': taskId,
+                'task': task,
+                'status': {'name': status} if status else None,
+                'components': []
+            }
+            result.append(version)
+
+        identifiers = versions.keys()
+        batchSize = ftrack_connect_foundry.constant.QUERY_BATCH_SIZE
+        for index in range(0, len(identifiers), batchSize):
+            batch = identifiers[index:index + batchSize]
+            for identifier, versionId, name, fileType, imgMain in self._select(
+                'SELECT id, version_id, name, file_type, img_main '
+                'FROM component WHERE version_id IN ({0}) '
+                'ORDER BY rowid'.format(', '.join('?' * len(batch))), batch
+            ):
+                component = {
+                    'id': identifier,
+                    'name': name,
+                    'file_type': fileType,
+                    'metadata': {}
+                }
+                if imgMain:
+                    component['metadata']['img_main'] = True
+
+                versions[versionId]['components'].append(component)
+
+        return result
@@ -0,0 +1,254 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 ftrack
+
+'''Persistent cache of resolved component paths shared between processes.'''
+
+import os
+import time
+import errno
+import sqlite3
+import threading
+
+import FnAssetAPI.logging
+
+
+class ResolveCache(object):
+    '''Component paths stored in an SQLite database on disk.
+
+    Paths are stored per component and location so that many processes, such
+    as render farm nodes, can resolve the same references without each
+    contacting the server. Every thread uses its own connection and the
+    database is opened in write-ahead logging mode where supported so that
+    concurrent readers and writers do not block each other.
+
+    Paths are stored under a scope, such as the server and user of the
+    session that loaded them, and only returned for the same scope.
+
+    As not every process sharing the database receives the events that
+    invalidate paths, paths are only returned for *maximumAge* seconds after
+    they were loaded from the server. Invalidations are recorded in the
+    database so that a path loaded by one process before another invalidated
+    it is not stored afterwards.
+
+    Failures to read or write the database are logged and treated as cache
+    misses, so the cache can never prevent resolution.
+
+    '''
+
+    #: Version of the database schema. Databases with a different version
+    #: are recreated.
+    SCHEMA_VERSION = 2
+
+    #: Number of seconds invalidations are recorded for. Paths loaded longer
+    #: ago than this before being stored may overwrite an invalidation.
+    INVALIDATION_RETENTION = 3600
+
+    def __init__(self, directory, filename='resolve_cache.sqlite',
+                 timeout=30.0, maximumAge=None):
+        '''Initialise cache storing database *filename* in *directory*.
+
+        *directory* is created if it does not exist. *timeout* is the number
+        of seconds to wait for another process holding a lock on the database
+        before giving up. *maximumAge* is the number of seconds a path is
+        returned for after it was loaded, or None to return paths until they
+        are invalidated.
+
+        '''
+        super(ResolveCache, self).__init__()
+        self._path = os.path.join(directory, filename)
+        self._timeout = timeout
+        self._maximumAge = maximumAge
+        self._local = threading.local()
+
+        try:
+            os.makedirs(directory)
+        except OSError as error:
+            if error.errno != errno.EEXIST:
+                raise
+
+    @property
+    def path(self):
+        '''Return path to database file.'''
+        return self._path
+
+    def _getConnection(self):
+        '''Return database connection for the current thread.'''
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self._path, timeout=self._timeout)
+
+            try:
+                connection.execute('PRAGMA journal_mode=WAL')
+            except sqlite3.Error:
+                # Not supported on some network filesystems. The default
+                # rollback journal is still safe, only less concurrent.
+                pass
+
+            # Check the schema holding a write lock so that processes
+            # opening a new database at once do not recreate tables the
+            # other has already written to. Statements are executed without
+            # the implicit commit the sqlite3 module makes before DDL.
+            connection.isolation_level = None
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                version = connection.execute(
+                    'PRAGMA user_version'
+                ).fetchone()[0]
+
+                if version != self.SCHEMA_VERSION:
+                    connection.execute('DROP TABLE IF EXISTS component_path')
+                    connection.execute('DROP TABLE IF EXISTS invalidation')
+                    connection.execute(
+                        'CREATE TABLE component_path ('
+                        'scope TEXT NOT NULL, '
+                        'component_id TEXT NOT NULL, '
+                        'location_id TEXT NOT NULL, '
+                        'priority REAL NOT NULL, '
+                        'path TEXT NOT NULL, '
+                        'loaded REAL NOT NULL, '
+                        'PRIMARY KEY (scope, component_id, location_id))'
+                    )
+                    connection.execute(
+                        'CREATE TABLE invalidation ('
+                        'component_id TEXT PRIMARY KEY, '
+                        'invalidated REAL NOT NULL)'
+                    )
+                    connection.execute(
+                        'PRAGMA user_version={0}'.format(self.SCHEMA_VERSION)
+                    )
+
+            except sqlite3.Error:
+                connection.execute('ROLLBACK')
+                raise
+
+            connection.execute('COMMIT')
+            connection.isolation_level = ''
+
+            self._local.connection = connection
+
+        return connection
+
+    def get(self, componentId, scope=''):
+        '''Return path of *componentId* in *scope* or None if not cached.
+
+        When the component is cached for several locations the path for the
+        location with the highest priority (lowest value) is returned. Paths
+        loaded more than the maximum age ago are not returned.
+
+        '''
+        loadedAfter = 0
+        if self._maximumAge is not None:
+            loadedAfter = time.time() - self._maximumAge
+
+        try:
+            row = self._getConnection().execute(
+                'SELECT path FROM component_path WHERE scope = ? '
+                'AND component_id = ? AND loaded > ? '
+                'ORDER BY priority LIMIT 1',
+                (scope, componentId, loadedAfter)
+            ).fetchone()
+        except sqlite3.Error as error:
+            FnAssetAPI.logging.debug(
+                'Unable to read resolve cache {0}: {1}'.format(
+                    self._path, error
+                )
+            )
+            return None
+
+        if row is None:
+            return None
+
+        return row[0]
+
+    def set(self, componentId, locationId, priority, path, scope='',
+            loaded=None):
+        '''Set *path* of *componentId* in location *locationId*.
+
+        *priority* is the priority of the location. Paths cached in *scope*
+        for other locations of the component are removed as they reflect an
+        earlier state of where the component resides.
+
+        *loaded* is the time the path was loaded from the server, defaulting
+        to now. The path is not stored if the component has been invalidated
+        since.
+
+        '''
+        if loaded is None:
+            loaded = time.time()
+
+        self._execute([
+            (
+                'DELETE FROM component_path WHERE scope = ? '
+                'AND component_id = ? AND location_id != ? '
+                'AND NOT EXISTS (SELECT 1 FROM invalidation '
+                'WHERE component_id = ? AND invalidated >= ?)',
+                (scope, componentId, locationId, componentId, loaded)
+            ),
+            (
+                'INSERT OR REPLACE INTO component_path '
+                '(scope, component_id, location_id, priority, path, loaded) '
+                'SELECT ?, ?, ?, ?, ?, ? WHERE NOT EXISTS ('
+                'SELECT 1 FROM invalidation '
+                'WHERE component_id = ? AND invalidated >= ?)',
+                (
+                    scope, componentId, locationId, priority, path, loaded,
+                    componentId, loaded
+                )
+            )
+        ])
+
+    def invalidate(self, componentId, locationId=None):
+        '''Remove cached paths of *componentId* in every scope.
+
+        If *locationId* is specified only remove paths in that location.
+        Paths of the component loaded before now are no longer stored.
+
+        '''
+        invalidated = time.time()
+        if locationId is None:
+            statement = (
+                'DELETE FROM component_path WHERE component_id = ?',
+                (componentId,)
+            )
+        else:
+            statement = (
+                'DELETE FROM component_path WHERE component_id = ? '
+                'AND location_id = ?',
+                (componentId, locationId)
+            )
+
+        self._execute([
+            statement,
+            (
+                'INSERT OR REPLACE INTO invalidation '
+                '(component_id, invalidated) VALUES (?, ?)',
+                (componentId, invalidated)
+            ),
+            (
+                'DELETE FROM invalidation WHERE invalidated < ?',
+                (invalidated - self.INVALIDATION_RETENTION,)
+            )
+        ])
+
+    def clear(self):
+        '''Remove all cached paths.'''
+        self._execute([('DELETE FROM component_path', ())])
+
+    def _execute(self, statements):
+        '''Execute *statements* in a single transaction.
+
+        *statements* should be a list of (sql, parameters) tuples.
+
+        '''
+        try:
+            connection = self._getConnection()
+            with connection:
+                for sql, parameters in statements:
+                    connection.execute(sql, parameters)
+
+        except sqlite3.Error as error:
+            FnAssetAPI.logging.debug(
+                'Unable to write resolve cache {0}: {1}'.format(
+                    self._path, error
+                )
+            )
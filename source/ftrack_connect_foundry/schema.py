@@ -0,0 +1,147 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 ftrack
+
+'''Cached access to schema objects such as task types.'''
+
+import threading
+
+import ftrack
+
+
+class Schema(object):
+    '''Thread safe cache of task statuses, task types and asset types.
+
+    Schema objects rarely change during a session so each list is loaded
+    once and then looked up by identifier or name without contacting the
+    server. Task statuses and task types may be scoped to a project, in which
+    case only those allowed by the schema of the project are returned. Call
+    :py:meth:`refresh` to reload lists after the schema has changed.
+
+    '''
+
+    def __init__(self):
+        '''Initialise empty schema cache.'''
+        super(Schema, self).__init__()
+        self._lock = threading.RLock()
+        self._collections = {}
+
+        self._loaders = {
+            'taskStatus': self._loadTaskStatuses,
+            'taskType': self._loadTaskTypes,
+            'assetType': self._loadAssetTypes
+        }
+
+    def getTaskStatuses(self, projectId=None):
+        '''Return list of task statuses.
+
+        If *projectId* is specified only return statuses available to that
+        project.
+
+        '''
+        return list(self._getCollection('taskStatus', projectId)['items'])
+
+    def getTaskStatus(self, key, projectId=None):
+        '''Return task status with identifier or name *key* or None.'''
+        return self._getCollection('taskStatus', projectId)['index'].get(key)
+
+    def getTaskTypes(self, projectId=None):
+        '''Return list of task types.
+
+        If *projectId* is specified only return types available to that
+        project.
+
+        '''
+        return list(self._getCollection('taskType', projectId)['items'])
+
+    def getTaskType(self, key, projectId=None):
+        '''Return task type with identifier or name *key* or None.'''
+        return self._getCollection('taskType', projectId)['index'].get(key)
+
+    def getAssetTypes(self):
+        '''Return list of asset types.'''
+        return list(self._getCollection('assetType', None)['items'])
+
+    def getAssetType(self, key):
+        '''Return asset type with identifier, short name or name *key*.
+
+        Return None if no asset type matches.
+
+        '''
+        return self._getCollection('assetType', None)['index'].get(key)
+
+    def refresh(self, projectId=None):
+        '''Discard loaded lists so that they are reloaded on next access.
+
+        If *projectId* is specified only discard lists scoped to that
+        project.
+
+        '''
+        with self._lock:
+            if projectId is None:
+                self._collections.clear()
+                return
+
+            for key in self._collections.keys():
+                if key[1] == projectId:
+                    del self._collections[key]
+
+    def _getCollection(self, kind, projectId):
+        '''Return collection of *kind* scoped to *projectId*.
+
+        A collection is a dictionary with the loaded 'items' and an 'index'
+        mapping identifiers and names to items. It is loaded on first access.
+
+        '''
+        key = (kind, projectId)
+        with self._lock:
+            collection = self._collections.get(key)
+            if collection is None:
+                items = self._loaders[kind](projectId)
+
+                index = {}
+                for item in items:
+                    names = [item.getName()]
+                    if kind == 'assetType':
+                        names.insert(0, item.getShort())
+
+                    for name in names:
+                        index.setdefault(name, item)
+
+                    index[item.getId()] = item
+
+                collection = {'items': items, 'index': index}
+                self._collections[key] = collection
+
+            return collection
+
+    def _loadTaskStatuses(self, projectId):
+        '''Return task statuses available to *projectId*.'''
+        if projectId is None:
+            return ftrack.getTaskStatuses()
+
+        return ftrack.Project(projectId).getTaskStatuses()
+
+    def _loadTaskTypes(self, projectId):
+        '''Return task types available to *projectId*.'''
+        if projectId is None:
+            return ftrack.getTaskTypes()
+
+        return ftrack.Project(projectId).getTaskTypes()
+
+    def _loadAssetTypes(self, projectId):
+        '''Return all asset types.'''
+        return ftrack.getAssetTypes()
+
+
+_shared = None
+_sharedLock = threading.Lock()
+
+
+def getSharedSchema():
+    '''Return :py:class:`Schema` shared by the whole process.'''
+    global _shared
+    with _sharedLock:
+        if _shared is None:
+            _shared = Schema()
+
+        return _shared
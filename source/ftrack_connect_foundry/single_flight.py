@@ -0,0 +1,75 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 ftrack
+
+'''Coalescing of concurrent identical calls.'''
+
+import sys
+import threading
+
+
+class _Flight(object):
+    '''Call in progress for a key.'''
+
+    def __init__(self):
+        '''Initialise flight started by the current thread.'''
+        super(_Flight, self).__init__()
+        self.thread = threading.current_thread()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    '''Run at most one call per key at a time.
+
+    When several threads request the same data at once, such as the browser
+    and the detail view reacting to the same selection, only the first call
+    for a key is run. The other callers wait for it to finish and receive
+    the same result, or exception, instead of issuing identical requests.
+
+    '''
+
+    def __init__(self):
+        '''Initialise with no calls in progress.'''
+        super(SingleFlight, self).__init__()
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def do(self, key, function, *args, **kwargs):
+        '''Return result of calling *function* with *args* and *kwargs*.
+
+        If a call for *key* is already in progress in another thread wait for
+        it and return its result instead. Calls for *key* made by the thread
+        running it, such as from within *function*, are run directly.
+
+        '''
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            if flight.thread is threading.current_thread():
+                return function(*args, **kwargs)
+
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error[0], flight.error[1], flight.error[2]
+
+            return flight.result
+
+        try:
+            flight.result = function(*args, **kwargs)
+        except:
+            flight.error = sys.exc_info()
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+
+            flight.done.set()
+
+        return flight.result
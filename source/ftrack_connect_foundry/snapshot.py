@@ -0,0 +1,87 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 ftrack
+
+'''Compact serialisation of cached data for frozen manager states.'''
+
+import json
+import zlib
+import base64
+
+import FnAssetAPI.logging
+
+
+#: Version of the snapshot format. Snapshots of other versions are ignored
+#: when thawing.
+VERSION = 3
+
+
+def encode(data, entries, maximumSize=None):
+    '''Return ASCII token encoding *data* and cache *entries*.
+
+    *data* should be a JSON serialisable dictionary and *entries* a list of
+    (key, value) tuples ordered from most to least important. The token is
+    compressed and prefixed with :py:data:`VERSION`.
+
+    If *maximumSize* is specified and the token would be longer, entries are
+    dropped from the end of *entries* until it fits. Raise
+    :py:exc:`ValueError` if *data* alone does not fit.
+
+    '''
+    count = len(entries)
+    while True:
+        payload = dict(data, entries=entries[:count])
+        token = '{0}:{1}'.format(
+            VERSION,
+            base64.b64encode(
+                zlib.compress(
+                    json.dumps(payload, separators=(',', ':')), 9
+                )
+            )
+        )
+
+        if maximumSize is None or len(token) <= maximumSize:
+            break
+
+        if count == 0:
+            raise ValueError(
+                'Snapshot exceeds maximum size of {0} bytes.'.format(
+                    maximumSize
+                )
+            )
+
+        # Estimate the number of entries that fit from the current size.
+        count = min(count - 1, count * maximumSize // len(token))
+
+    if count < len(entries):
+        FnAssetAPI.logging.debug(
+            'Snapshot limited to {0} of {1} entries to fit in {2} bytes.'
+            .format(count, len(entries), maximumSize)
+        )
+
+    return token
+
+
+def decode(token):
+    '''Return (data, entries) decoded from *token*.
+
+    Return None if *token* was encoded with a different :py:data:`VERSION`.
+    Raise :py:exc:`ValueError` if *token* is not a valid snapshot.
+
+    '''
+    version, separator, encoded = token.partition(':')
+    if not separator or not version.isdigit():
+        raise ValueError('Invalid snapshot token.')
+
+    if int(version) != VERSION:
+        return None
+
+    try:
+        payload = json.loads(zlib.decompress(base64.b64decode(encoded)))
+    except (TypeError, zlib.error) as error:
+        raise ValueError('Invalid snapshot token: {0}'.format(error))
+
+    if not isinstance(payload, dict):
+        raise ValueError('Invalid snapshot token.')
+
+    entries = [tuple(entry) for entry in payload.pop('entries', [])]
+    return payload, entries
@@ -0,0 +1,47 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 ftrack
+
+'''Manager state.'''
+
+import threading
+
+import ftrack_connect_foundry.cache
+import ftrack_connect_foundry.constant
+import ftrack_connect_foundry.accounting
+
+
+class State(object):
+    '''State shared by manager calls made with the same context.
+
+    A new state is created whenever a context is made by a FnAssetAPI session.
+    Data that is only valid for the duration of a host action, such as
+    relationship results, is cached against the state. Registrations made
+    while an action group is open are buffered in its :py:attr:`transaction`.
+
+    '''
+
+    def __init__(self, parent=None):
+        '''Initialise state.
+
+        If *parent* is specified the new state shares its cache. Open
+        transactions are never shared.
+
+        '''
+        super(State, self).__init__()
+        self.transaction = None
+
+        # Server usage of calls made with this state.
+        self.usage = ftrack_connect_foundry.accounting.Usage()
+
+        # Guards opening and closing of the transaction as hosts may use a
+        # context from several threads.
+        self.lock = threading.RLock()
+
+        if parent is not None:
+            self.cache = parent.cache
+        else:
+            self.cache = ftrack_connect_foundry.cache.Cache(
+                maximumSize=(
+                    ftrack_connect_foundry.constant.STATE_CACHE_MAXIMUM_SIZE
+                )
+            )
@@ -0,0 +1,288 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 ftrack
+
+'''Background upload of thumbnails.'''
+
+import time
+import atexit
+import weakref
+import hashlib
+import threading
+import collections
+
+import FnAssetAPI.logging
+
+import ftrack_connect_foundry.constant
+import ftrack_connect_foundry.cache
+
+
+#: Queues of the process, flushed when it exits.
+_queues = weakref.WeakSet()
+
+
+class ThumbnailQueue(object):
+    '''Upload thumbnails on a bounded number of worker threads.
+
+    Thumbnails are not needed to complete a registration so they are queued
+    and uploaded in the background. Files are identified by a hash of their
+    content so that an image is only uploaded once however many entities it
+    is set on, as long as its thumbnail component is among the most recently
+    uploaded. Failed uploads are retried with an increasing delay before
+    being logged and discarded.
+
+    Queued thumbnails are uploaded when the process exits, waiting at most
+    :py:data:`~ftrack_connect_foundry.constant.THUMBNAIL_EXIT_TIMEOUT`
+    seconds for all queues.
+
+    '''
+
+    def __init__(self, upload, workers=2, retries=3, retryDelay=1.0,
+                 maximumSize=None, putTimeout=0.0, idleTimeout=10.0,
+                 uploadedMaximumSize=10000):
+        '''Initialise queue calling *upload* to upload thumbnails.
+
+        *upload* is called on a worker thread with the path to upload, a list
+        of (schemaType, identifier) tuples to set the thumbnail on and the
+        identifier of a previously uploaded thumbnail component with the same
+        content or None. It should return the identifier of the thumbnail
+        component.
+
+        *workers* is the maximum number of worker threads. Threads are started
+        as thumbnails are queued. *retries* is the number of times to retry a
+        failed upload, waiting *retryDelay* seconds multiplied by the attempt
+        number between each.
+
+        *maximumSize* is the maximum number of thumbnails waiting to be
+        uploaded. Queuing a thumbnail while it is reached waits at most
+        *putTimeout* seconds for room before discarding the thumbnail with a
+        warning. If not specified the queue is unbounded.
+
+        Worker threads exit after *idleTimeout* seconds without thumbnails to
+        upload so that they do not keep the queue alive.
+
+        *uploadedMaximumSize* is the number of uploaded thumbnail components
+        remembered to reuse for files with the same content.
+
+        '''
+        super(ThumbnailQueue, self).__init__()
+        self._upload = upload
+        self._workers = workers
+        self._retries = retries
+        self._retryDelay = retryDelay
+        self._maximumSize = maximumSize
+        self._idleTimeout = idleTimeout
+
+        self._condition = threading.Condition()
+        self._threads = []
+
+        # Hashes waiting to be uploaded, in order, and the targets for each.
+        self._hashes = collections.deque()
+        self._pending = {}
+        self._paths = {}
+
+        # Number of hashes queued or being uploaded and the hashes being
+        # uploaded. A hash queued again while uploading waits for the upload
+        # so that its thumbnail component can be reused.
+        self._outstanding = 0
+        self._active = set()
+
+        self._putTimeout = putTimeout
+
+        # Thumbnail component identifiers of uploaded hashes, least recently
+        # used evicted first.
+        self._uploaded = ftrack_connect_foundry.cache.Cache(
+            maximumSize=uploadedMaximumSize
+        )
+
+        _queues.add(self)
+
+    def put(self, path, schemaType, identifier):
+        '''Queue thumbnail at *path* to be set on entity *identifier*.
+
+        *schemaType* is the ftrack_api schema of the entity, such as
+        'AssetVersion' or 'Shot'. If the queue is full wait for room as
+        configured by the put timeout.
+
+        '''
+        try:
+            digest = self._hash(path)
+        except (IOError, OSError) as error:
+            FnAssetAPI.logging.log(
+                'Unable to read thumbnail {0}: {1}'.format(path, error),
+                FnAssetAPI.logging.kWarning
+            )
+            return
+
+        with self._condition:
+            end = time.time() + self._putTimeout
+            targets = self._pending.get(digest)
+            while targets is None and self._isFull():
+                remaining = end - time.time()
+                if remaining <= 0:
+                    break
+
+                self._condition.wait(remaining)
+                targets = self._pending.get(digest)
+
+            if targets is None:
+                if self._isFull():
+                    FnAssetAPI.logging.log(
+                        'Discarding thumbnail {0} as {1} thumbnails are '
+                        'waiting to be uploaded.'.format(
+                            path, len(self._hashes)
+                        ),
+                        FnAssetAPI.logging.kWarning
+                    )
+                    return
+
+                targets = self._pending[digest] = []
+                self._paths[digest] = path
+                self._hashes.append(digest)
+                self._outstanding += 1
+
+            if (schemaType, identifier) not in targets:
+                targets.append((schemaType, identifier))
+
+            if (
+                len(self._threads) < self._workers
+                and len(self._threads) < self._outstanding
+            ):
+                thread = threading.Thread(target=self._work)
+                thread.daemon = True
+                self._threads.append(thread)
+                thread.start()
+
+            self._condition.notify_all()
+
+    def _isFull(self):
+        '''Return whether the maximum number of thumbnails is waiting.'''
+        return (
+            self._maximumSize is not None
+            and len(self._hashes) >= self._maximumSize
+        )
+
+    def flush(self, timeout=None):
+        '''Wait until all queued thumbnails have been uploaded.
+
+        If *timeout* is specified wait at most that many seconds. Return
+        whether the queue is empty.
+
+        '''
+        end = None
+        if timeout is not None:
+            end = time.time() + timeout
+
+        with self._condition:
+            while self._outstanding:
+                remaining = None
+                if end is not None:
+                    remaining = end - time.time()
+                    if remaining <= 0:
+                        break
+
+                self._condition.wait(remaining)
+
+            return self._outstanding == 0
+
+    def _hash(self, path):
+        '''Return hash of the content of file at *path*.'''
+        digest = hashlib.sha1()
+        with open(path, 'rb') as stream:
+            for chunk in iter(lambda: stream.read(65536), ''):
+                digest.update(chunk)
+
+        return digest.hexdigest()
+
+    def _work(self):
+        '''Upload queued thumbnails until idle for the idle timeout.'''
+        while True:
+            with self._condition:
+                idleSince = time.time()
+                while True:
+                    digest = next(
+                        (
+                            digest for digest in self._hashes
+                            if digest not in self._active
+                        ),
+                        None
+                    )
+                    if digest is not None:
+                        break
+
+                    remaining = self._idleTimeout - (time.time() - idleSince)
+                    if remaining <= 0:
+                        self._threads.remove(threading.current_thread())
+                        return
+
+                    self._condition.wait(remaining)
+
+                self._hashes.remove(digest)
+                self._active.add(digest)
+                targets = self._pending.pop(digest)
+                path = self._paths.pop(digest)
+                try:
+                    thumbnailId = self._uploaded.get(digest)
+                except KeyError:
+                    thumbnailId = None
+
+                # Wake threads waiting for room in the queue.
+                self._condition.notify_all()
+
+            try:
+                thumbnailId = self._uploadWithRetries(
+                    path, targets, thumbnailId
+                )
+
+            finally:
+                with self._condition:
+                    if thumbnailId is not None:
+                        self._uploaded.set(digest, thumbnailId)
+
+                    self._active.discard(digest)
+                    self._outstanding -= 1
+                    self._condition.notify_all()
+
+    def _uploadWithRetries(self, path, targets, thumbnailId):
+        '''Upload *path* to *targets* and return thumbnail identifier.
+
+        Return None if all attempts failed.
+
+        '''
+        attempt = 0
+        while True:
+            try:
+                return self._upload(path, targets, thumbnailId)
+
+            except Exception as error:
+                if attempt >= self._retries:
+                    FnAssetAPI.logging.log(
+                        'Unable to upload thumbnail {0}: {1}'.format(
+                            path, error
+                        ),
+                        FnAssetAPI.logging.kError
+                    )
+                    return None
+
+                attempt += 1
+                time.sleep(self._retryDelay * attempt)
+
+
+def _flushQueues():
+    '''Wait for thumbnails queued in the process to be uploaded.
+
+    All queues are given at most
+    :py:data:`~ftrack_connect_foundry.constant.THUMBNAIL_EXIT_TIMEOUT`
+    seconds in total.
+
+    '''
+    end = time.time() + ftrack_connect_foundry.constant.THUMBNAIL_EXIT_TIMEOUT
+    for queue in list(_queues):
+        if not queue.flush(timeout=max(end - time.time(), 0)):
+            FnAssetAPI.logging.log(
+                'Exiting before all thumbnails were uploaded.',
+                FnAssetAPI.logging.kWarning
+            )
+            return
+
+
+atexit.register(_flushQueues)
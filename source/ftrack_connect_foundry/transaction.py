@@ -0,0 +1,76 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 ftrack
+
+'''Buffering of writes for the duration of an action group.'''
+
+import threading
+import collections
+
+
+class Transaction(object):
+    '''Registrations buffered until an action group finishes.
+
+    Each registration is a dictionary describing the AssetVersion and
+    Component to create, keyed by the identifier reserved for the component.
+    The identifier is returned to hosts straight away so that references can
+    be used before the transaction is committed. Registrations may be added
+    from several threads.
+
+    Assets and tasks that registrations need but that do not exist yet are
+    reserved with :py:meth:`addAsset` and :py:meth:`addTask` so that further
+    registrations share them. They are created with the registrations on
+    commit, so are not created at all if the transaction is cancelled.
+
+    '''
+
+    def __init__(self):
+        '''Initialise empty transaction.'''
+        super(Transaction, self).__init__()
+        self._lock = threading.Lock()
+        self._registrations = collections.OrderedDict()
+        self._assets = {}
+        self._tasks = {}
+
+    def addRegistration(self, registration):
+        '''Add *registration* keyed by its 'componentId'.'''
+        with self._lock:
+            self._registrations[registration['componentId']] = registration
+
+    def getRegistration(self, componentId):
+        '''Return registration for *componentId* or None if not pending.'''
+        with self._lock:
+            return self._registrations.get(componentId)
+
+    def getRegistrations(self):
+        '''Return list of pending registrations in the order added.'''
+        with self._lock:
+            return self._registrations.values()
+
+    def addAsset(self, asset):
+        '''Add reserved *asset* keyed by context, type and name.'''
+        with self._lock:
+            self._assets[
+                (asset['contextId'], asset['assetType'], asset['name'])
+            ] = asset
+
+    def getAsset(self, contextId, assetType, name):
+        '''Return asset reserved under *contextId* or None.'''
+        with self._lock:
+            return self._assets.get((contextId, assetType, name))
+
+    def addTask(self, task):
+        '''Add reserved *task* keyed by context and task type.'''
+        with self._lock:
+            self._tasks[(task['contextId'], task['taskType'])] = task
+
+    def getTask(self, contextId, taskType):
+        '''Return task of *taskType* reserved under *contextId* or None.'''
+        with self._lock:
+            return self._tasks.get((contextId, taskType))
+
+    def clear(self):
+        '''Discard all pending registrations and reserved entities.'''
+        with self._lock:
+            self._registrations.clear()
+            self._assets.clear()
+            self._tasks.clear()
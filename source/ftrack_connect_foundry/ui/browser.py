@@ -17,6 +17,7 @@ import FnAssetAPI.logging
 import ftrack
 import ftrack_connect.ui.widget.header
 
+import ftrack_connect_foundry.schema
 import ftrack_connect_foundry.ui.detail_view
 
 
@@ -931,7 +932,8 @@ class CreateDialog(QtWidgets.QDialog):
         if hasattr(entity, 'createTask'):
             self._objectSelector.addItem('Task', 'task')
 
-        taskTypes = ftrack.getTaskTypes()
+        schema = ftrack_connect_foundry.schema.getSharedSchema()
+        taskTypes = schema.getTaskTypes()
         for taskType in taskTypes:
             self._typeSelector.addItem(
                 taskType.getName(), taskType.getEntityRef()
@@ -5,7 +5,7 @@ from FnAssetAPI.ui.toolkit import QtGui, QtCore, QtWidgets
 import FnAssetAPI
 import FnAssetAPI.ui.widgets
 
-import ftrack
+import ftrack_connect_foundry.schema
 
 
 class WorkflowRelationship(
@@ -37,7 +37,8 @@ class _WorkflowRelationshipWidget(QtWidgets.QWidget):
         self.ui.versionCombo.addItem('Latest', 'latest')
         self.ui.versionCombo.addItem('Latest Approved', 'latestapproved')
 
-        taskTypes = ftrack.getTaskTypes()
+        schema = ftrack_connect_foundry.schema.getSharedSchema()
+        taskTypes = schema.getTaskTypes()
 
         session = FnAssetAPI.SessionManager.currentSession()
         host = session.getHost()
@@ -0,0 +1,238 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 ftrack
+
+import pytest
+import FnAssetAPI
+import FnAssetAPI.specifications
+
+import fake_ftrack
+import ftrack_connect_foundry.bridge
+
+
+#: Number of shots in the benchmarked productions.
+SIZES = [10, 1000, 10000]
+
+#: Number of timed rounds for each production size.
+ROUNDS = {10: 20, 1000: 5, 10000: 1}
+
+
+class Production(object):
+    '''Production of shots on a fake server.
+
+    Each shot has a compositing task and a plate asset with a single version
+    published from that task, whose main component is an image. The first
+    shot also has a script asset with a version for every shot in the
+    production.
+
+    '''
+
+    def __init__(self, server, size):
+        '''Initialise production of *size* shots on *server*.'''
+        super(Production, self).__init__()
+        self.server = server
+        self.size = size
+        self.taskTypeId = server.find('Type', name='Compositing')
+
+        projectId = server.addProject('benchmark')
+        sequenceId = server.addContext('Sequence', 'sq010', projectId)
+
+        self.shotIds = []
+        self.componentIds = []
+        for index in range(size):
+            shotId = server.addContext(
+                'Shot', 'sh{0:05d}'.format(index * 10), sequenceId
+            )
+            taskId = server.addContext(
+                'Task', 'compositing', shotId, taskType='Compositing'
+            )
+            versionId = server.addVersion(
+                server.addAsset('plate', shotId), taskId=taskId
+            )
+            self.shotIds.append(shotId)
+            self.componentIds.append(
+                server.addComponent(versionId, metadata={'img_main': 'True'})
+            )
+
+        scriptId = server.addAsset('script', self.shotIds[0], 'comp')
+        for index in range(size):
+            componentId = server.addComponent(
+                server.addVersion(scriptId), fileType='.nk'
+            )
+
+        self.scriptComponentId = componentId
+
+    def getReferences(self, identifiers, entityType):
+        '''Return references of *identifiers* of *entityType*.'''
+        return [
+            'ftrack://{0}?entityType={1}'.format(identifier, entityType)
+            for identifier in identifiers
+        ]
+
+
+@pytest.fixture(scope='module', params=SIZES, ids=lambda size: str(size))
+def production(request):
+    '''Return production of each benchmarked size.'''
+    return Production(
+        fake_ftrack.Server(latency=request.config.getoption('latency')),
+        request.param
+    )
+
+
+@pytest.fixture()
+def server(production, useServer):
+    '''Return server of *production* with counts reset.'''
+    production.server.reset()
+    return useServer(production.server)
+
+
+def run(benchmark, server, production, function, access=None,
+        workers=None):
+    '''Benchmark *function* called with a new bridge and context each round.
+
+    *function* is called with the bridge and an asset API context of
+    *access*. The bridge is new for each round so that nothing is cached
+    between rounds and uses *workers* threads for related reference lookups.
+    The server requests made by the last round are recorded as 'requests' in
+    the extra information of the benchmark.
+
+    '''
+    if access is None:
+        access = FnAssetAPI.Context.kRead
+
+    bridges = []
+
+    def setup():
+        '''Return arguments for a round.'''
+        ftrack_connect_foundry.bridge.Bridge._entityTypeIndex.clear()
+        bridge = ftrack_connect_foundry.bridge.Bridge(
+            session=server.createSession(),
+            sessionFactory=server.createSession,
+            relatedReferenceWorkers=workers
+        )
+        bridges.append(bridge)
+
+        context = FnAssetAPI.Context(access=access)
+        context.managerInterfaceState = bridge.createState()
+        server.reset()
+        return (bridge, context), {}
+
+    try:
+        result = benchmark.pedantic(
+            function, setup=setup, rounds=ROUNDS[production.size]
+        )
+    finally:
+        for bridge in bridges:
+            bridge.close()
+
+    benchmark.extra_info['requests'] = server.requests
+    return result
+
+
+def test_resolve(benchmark, server, production):
+    '''Benchmark resolving a component of every shot.'''
+    references = production.getReferences(
+        production.componentIds, 'component'
+    )
+
+    paths = run(
+        benchmark, server, production,
+        lambda bridge, context: bridge.resolveEntityReferences(
+            references, context
+        )
+    )
+    assert len(paths) == production.size
+    assert all(path.startswith('/mnt/studio/') for path in paths)
+
+
+def test_register(benchmark, server, production, host):
+    '''Benchmark registering an image against every shot.'''
+    references = production.getReferences(production.shotIds, 'task')
+    paths = [
+        '/renders/{0}.exr'.format(index) for index in range(production.size)
+    ]
+    specifications = (
+        [FnAssetAPI.specifications.ImageSpecification()] * production.size
+    )
+
+    registered = run(
+        benchmark, server, production,
+        lambda bridge, context: bridge.registerMultiple(
+            paths, references, specifications, context
+        ),
+        access=FnAssetAPI.Context.kWrite
+    )
+    assert len(registered) == production.size
+
+
+@pytest.mark.parametrize('workers', [1, 8])
+@pytest.mark.parametrize('specification', [
+    'workflow', 'parent', 'shot'
+])
+def test_get_related_references(benchmark, server, production,
+                                specification, workers):
+    '''Benchmark looking up references related to every component.
+
+    Lookups are made with one and several workers. Run with ``--latency`` to
+    compare how long each takes on a slow connection.
+
+    '''
+    if specification == 'workflow':
+        specification = FnAssetAPI.specifications.WorkflowRelationship()
+        specification.criteria = (
+            'latest,ftrack://{0}?entityType=tasktype,False'.format(
+                production.taskTypeId
+            )
+        )
+    elif specification == 'parent':
+        specification = (
+            FnAssetAPI.specifications.ParentGroupingRelationship()
+        )
+    else:
+        specification = FnAssetAPI.specifications.ShotSpecification()
+
+    references = production.getReferences(
+        production.componentIds, 'component'
+    )
+
+    related = run(
+        benchmark, server, production,
+        lambda bridge, context: bridge.getRelatedReferences(
+            references, [specification], context
+        ),
+        workers=workers
+    )
+    assert len(related) == production.size
+    assert all(related)
+
+
+def test_get_entity_versions(benchmark, server, production):
+    '''Benchmark listing the versions of an asset with a version per shot.'''
+    reference, = production.getReferences(
+        [production.scriptComponentId], 'component'
+    )
+
+    versions = run(
+        benchmark, server, production,
+        lambda bridge, context: bridge.getEntityVersions(reference, context)
+    )
+    assert len(versions) == production.size
+
+
+def test_get_entity_display_name(benchmark, server, production):
+    '''Benchmark naming a component of every shot.'''
+    references = production.getReferences(
+        production.componentIds, 'component'
+    )
+
+    names = run(
+        benchmark, server, production,
+        lambda bridge, context: [
+            bridge.getEntityDisplayName(reference, context)
+            for reference in references
+        ]
+    )
+    assert names[-1] == (
+        'benchmark / sq010 / sh{0:05d} / plate / v001 / main'.format(
+            (production.size - 1) * 10
+        )
+    )
@@ -0,0 +1,94 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 ftrack
+
+import ftrack
+import pytest
+import FnAssetAPI
+
+import fake_ftrack
+import ftrack_connect_foundry.bridge
+import ftrack_connect_foundry.schema
+
+
+def pytest_addoption(parser):
+    '''Add options to configure the fake server.'''
+    parser.addoption(
+        '--latency', type=float, default=0.0,
+        help='Seconds to delay each request to the fake ftrack server by.'
+    )
+
+
+class Host(FnAssetAPI.Host):
+    '''Host reporting itself as Nuke.'''
+
+    def getIdentifier(self):
+        '''Return identifier.'''
+        return 'uk.co.foundry.nuke'
+
+    def getDisplayName(self):
+        '''Return display name.'''
+        return 'Nuke'
+
+    def getDocumentReference(self):
+        '''Return reference of the open document.'''
+        return ''
+
+    def getKnownEntityReferences(self, specification=None):
+        '''Return references used in the open document.'''
+        return []
+
+    def log(self, message, severity):
+        '''Discard *message*.'''
+
+
+@pytest.fixture()
+def useServer(monkeypatch):
+    '''Return function making both APIs use a fake server.
+
+    Caches shared by all bridges are cleared so that requests made by each
+    test are counted from scratch.
+
+    '''
+    def use(server):
+        '''Make requests against *server* and return it.'''
+        for name, value in server.getLegacyApi().items():
+            monkeypatch.setattr(ftrack, name, value, raising=False)
+
+        ftrack_connect_foundry.bridge.Bridge._entityTypeIndex.clear()
+        ftrack_connect_foundry.schema.getSharedSchema().refresh()
+        return server
+
+    return use
+
+
+@pytest.fixture()
+def server(request, useServer):
+    '''Return empty fake ftrack server used by both APIs.'''
+    return useServer(
+        fake_ftrack.Server(latency=request.config.getoption('latency'))
+    )
+
+
+@pytest.fixture()
+def session(server):
+    '''Return session of *server* for the main thread.'''
+    return server.createSession()
+
+
+@pytest.fixture()
+def bridge(server, session):
+    '''Return bridge connected to *server*.'''
+    bridge = ftrack_connect_foundry.bridge.Bridge(
+        session=session, sessionFactory=server.createSession
+    )
+    yield bridge
+    bridge.close()
+
+
+@pytest.fixture()
+def host(monkeypatch):
+    '''Start asset API session for a Nuke host.'''
+    monkeypatch.setattr(
+        FnAssetAPI.SessionManager, '_instance', None
+    )
+    return FnAssetAPI.SessionManager.startSession(Host())
@@ -0,0 +1,2251 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 ftrack
+
+'''In memory ftrack server used by tests and benchmarks.
+
+A :py:class:`Server` stores entities and answers requests from the sessions
+created with :py:meth:`Server.createSession`, which stand in for
+:py:class:`ftrack_api.Session`, and from the legacy API classes returned by
+:py:meth:`Server.getLegacyApi`. Every round trip is counted in
+:py:attr:`Server.requests` and can be delayed by :py:attr:`Server.latency`
+seconds to simulate a remote server.
+
+Only the parts of both APIs used by the bridge are implemented. Queries
+support the select, where, order by and limit clauses with the is, is_not,
+in, not_in, like and comparison operators, and, or, not and the any and has
+relationship operators. Projections are ignored and all attributes of the
+matched entities are returned.
+
+'''
+
+import re
+import time
+import uuid
+import Queue
+import datetime
+import posixpath
+import threading
+import collections
+
+import ftrack
+import ftrack_api.symbol
+import ftrack_api.exception
+
+
+#: Entity types matched when querying a base schema.
+SCHEMAS = {
+    'TypedContext': ('Sequence', 'Shot', 'Task', 'Folder'),
+    'Context': ('Project', 'Sequence', 'Shot', 'Task', 'Folder')
+}
+
+#: Relationships of each entity type as a mapping of attribute to the schema
+#: of the related entity, the attribute holding the identifier and whether
+#: the relationship is a collection of entities referencing this one.
+_CONTEXT_RELATIONS = {
+    'parent': ('Context', 'parent_id', False),
+    'project': ('Project', 'project_id', False),
+    'object_type': ('ObjectType', 'object_type_id', False),
+    'type': ('Type', 'type_id', False),
+    'status': ('Status', 'status_id', False),
+    'children': ('TypedContext', 'parent_id', True),
+    'assets': ('Asset', 'context_id', True)
+}
+
+RELATIONS = {
+    'Project': {
+        'children': ('TypedContext', 'parent_id', True),
+        'assets': ('Asset', 'context_id', True)
+    },
+    'Asset': {
+        'parent': ('Context', 'context_id', False),
+        'type': ('AssetType', 'type_id', False),
+        'versions': ('AssetVersion', 'asset_id', True)
+    },
+    'AssetVersion': {
+        'asset': ('Asset', 'asset_id', False),
+        'task': ('TypedContext', 'task_id', False),
+        'status': ('Status', 'status_id', False),
+        'components': ('Component', 'version_id', True)
+    },
+    'Component': {
+        'version': ('AssetVersion', 'version_id', False),
+        'component_locations': ('ComponentLocation', 'component_id', True)
+    },
+    'ComponentLocation': {
+        'component': ('Component', 'component_id', False),
+        'location': ('Location', 'location_id', False)
+    }
+}
+
+for _entityType in SCHEMAS['TypedContext']:
+    RELATIONS[_entityType] = _CONTEXT_RELATIONS
+
+#: Entity types reported by update events for each entity type.
+EVENT_ENTITY_TYPES = {
+    'Project': 'show',
+    'Asset': 'asset',
+    'AssetVersion': 'assetversion',
+    'Component': 'filecomponent',
+    'Location': 'location'
+}
+
+for _entityType in SCHEMAS['TypedContext']:
+    EVENT_ENTITY_TYPES[_entityType] = 'task'
+
+#: Format of dates in query expressions.
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+def _getRelations(schema):
+    '''Return relationships of *schema*.'''
+    if schema in SCHEMAS:
+        return _CONTEXT_RELATIONS
+
+    return RELATIONS.get(schema, {})
+
+
+def _matches(entityType, schema):
+    '''Return whether *entityType* is queried by *schema*.'''
+    return entityType == schema or entityType in SCHEMAS.get(schema, ())
+
+
+class Server(object):
+    '''In memory ftrack server.
+
+    Entities are stored as dictionaries of attributes, with relationships
+    stored as the identifiers of the related entities as on the server.
+    Helpers such as :py:meth:`addContext` and :py:meth:`addComponent` add
+    entities without counting a request, to set up data for a test.
+
+    '''
+
+    def __init__(self, latency=0.0):
+        '''Initialise server with a default schema and locations.
+
+        *latency* is the number of seconds each request is delayed by.
+
+        '''
+        super(Server, self).__init__()
+        self.latency = latency
+
+        #: Number of round trips made by sessions and the legacy API.
+        self.requests = 0
+
+        #: List of (action, detail) tuples of the operations requested, such
+        #: as ('query', expression) or ('legacy', method name).
+        self.operations = []
+
+        #: Exception raised by the next commit if set. It is reset once
+        #: raised.
+        self.commitError = None
+
+        self._lock = threading.RLock()
+        self._records = {}
+        self._types = collections.defaultdict(collections.OrderedDict)
+        self._index = collections.defaultdict(collections.OrderedDict)
+        self._hubs = []
+        self._queries = {}
+        self._locations = {}
+        self._versionNumbers = {}
+        self._positions = {}
+
+        self._createSchema()
+        self._legacyApi = _createLegacyApi(self)
+
+    def _createSchema(self):
+        '''Add object types, types, statuses, asset types and locations.'''
+        for name in SCHEMAS['TypedContext']:
+            self.add('ObjectType', name=name)
+
+        for name in ('Compositing', 'Editing', 'Animation', 'Lighting'):
+            self.add('Type', name=name)
+
+        for name in ('Not started', 'In progress', 'Pending Review',
+                     'Approved'):
+            self.add('Status', name=name)
+
+        for short, name in (
+            ('img', 'Image'), ('comp', 'Compositing'), ('edit', 'Editorial'),
+            ('file', 'File'), ('geo', 'Geometry')
+        ):
+            self.add('AssetType', short=short, name=name)
+
+        self.addLocation(
+            'ftrack.origin', identifier=ftrack_api.symbol.ORIGIN_LOCATION_ID,
+            priority=100
+        )
+        self.addLocation(
+            'ftrack.server', identifier=ftrack_api.symbol.SERVER_LOCATION_ID,
+            priority=1000
+        )
+        self.addLocation('studio.disk', prefix='/mnt/studio', priority=10)
+
+    # Setting up data.
+    #
+
+    def add(self, entityType, **attributes):
+        '''Add entity of *entityType* with *attributes* and return identifier.
+
+        Attributes not specified are given the defaults the server would set,
+        and derived attributes such as the project of a context are set.
+
+        '''
+        with self._lock:
+            record = self._prepare(entityType, attributes)
+            if entityType == 'AssetVersion' and record['version'] is None:
+                record['version'] = self._nextVersion(record['asset_id'])
+
+            self._insert(record)
+            return record['id']
+
+    def addLocation(self, name, identifier=None, prefix=None, priority=50):
+        '''Add location called *name* and return its identifier.
+
+        Components in the location are stored below the directory *prefix*.
+        Locations without a *prefix* have no accessor.
+
+        '''
+        identifier = self.add('Location', id=identifier, name=name)
+        self._locations[identifier] = (prefix, priority)
+        return identifier
+
+    def addProject(self, name):
+        '''Add project called *name* and return its identifier.'''
+        return self.add('Project', name=name, full_name=name)
+
+    def addContext(self, objectType, name, parentId, taskType=None):
+        '''Add context of *objectType* called *name* under *parentId*.
+
+        *taskType* is the name of the type of a task. Return the identifier
+        of the context.
+
+        '''
+        attributes = {'name': name, 'parent_id': parentId}
+        if taskType is not None:
+            attributes['type_id'] = self.find('Type', name=taskType)
+
+        return self.add(objectType, **attributes)
+
+    def addAsset(self, name, contextId, assetType='img'):
+        '''Add asset called *name* of *assetType* under *contextId*.'''
+        return self.add(
+            'Asset', name=name, context_id=contextId,
+            type_id=self.find('AssetType', short=assetType)
+        )
+
+    def addVersion(self, assetId, taskId=None, status=None, version=None,
+                   date=None):
+        '''Add version of *assetId* and return its identifier.
+
+        *status* is the name of the status of the version. The next version
+        number of the asset is used if *version* is not specified.
+
+        '''
+        attributes = {'asset_id': assetId, 'task_id': taskId}
+        if status is not None:
+            attributes['status_id'] = self.find('Status', name=status)
+
+        if version is not None:
+            attributes['version'] = version
+
+        if date is not None:
+            attributes['date'] = date
+
+        return self.add('AssetVersion', **attributes)
+
+    def addComponent(self, versionId, name='main', fileType='.exr',
+                     metadata=None, locationId=None):
+        '''Add component called *name* of *versionId* and return identifier.
+
+        The component is added to the location *locationId*, or the studio
+        disk location if not specified, with a resource identifier derived
+        from its identifier.
+
+        '''
+        identifier = self.add(
+            'Component', name=name, version_id=versionId, file_type=fileType,
+            metadata=dict(metadata or {})
+        )
+
+        if locationId is None:
+            locationId = self.find('Location', name='studio.disk')
+
+        self.add(
+            'ComponentLocation', component_id=identifier,
+            location_id=locationId,
+            resource_identifier='{0}/{1}{2}'.format(
+                versionId, identifier, fileType
+            )
+        )
+        return identifier
+
+    def update(self, identifier, **attributes):
+        '''Set *attributes* of entity *identifier*.'''
+        with self._lock:
+            record = self._records[identifier]
+            self._unindex(record)
+            record.update(attributes)
+            self._indexRecord(record)
+
+    def remove(self, identifier):
+        '''Remove entity *identifier*.'''
+        with self._lock:
+            record = self._records.pop(identifier)
+            self._unindex(record)
+            del self._types[record['__entity_type__']][identifier]
+
+    def get(self, identifier):
+        '''Return copy of attributes of entity *identifier* or None.'''
+        with self._lock:
+            record = self._records.get(identifier)
+            if record is None:
+                return None
+
+            return _copyRecord(record)
+
+    def find(self, schema, **attributes):
+        '''Return identifier of first entity of *schema* with *attributes*.'''
+        with self._lock:
+            for record in self._iterate(schema):
+                if all(
+                    record.get(key) == value
+                    for key, value in attributes.items()
+                ):
+                    return record['id']
+
+        return None
+
+    def count(self, action=None):
+        '''Return number of operations of *action* requested.
+
+        Return the number of all operations if *action* is None.
+
+        '''
+        with self._lock:
+            return sum(
+                1 for operationAction, _ in self.operations
+                if action is None or operationAction == action
+            )
+
+    def reset(self):
+        '''Discard request counts.'''
+        with self._lock:
+            self.requests = 0
+            del self.operations[:]
+
+    # Sessions and the legacy API.
+    #
+
+    def createSession(self, **kwargs):
+        '''Return new :py:class:`Session` connected to the server.'''
+        return Session(self)
+
+    def getLegacyApi(self):
+        '''Return mapping of legacy API module attributes to fakes.
+
+        Set the attributes on the :py:mod:`ftrack` module, for example with
+        pytest's monkeypatch fixture, to make legacy API calls against the
+        server.
+
+        '''
+        return dict(self._legacyApi)
+
+    def publish(self, topic, data):
+        '''Publish event on *topic* with *data* to connected event hubs.'''
+        event = {'topic': topic, 'data': data}
+        with self._lock:
+            hubs = list(self._hubs)
+
+        for hub in hubs:
+            hub._receive(event)
+
+    # Handling requests.
+    #
+
+    def call(self, operations):
+        '''Return responses to *operations* made in a single request.
+
+        Query responses contain copies of the matched entities. Create,
+        update and delete operations are applied together and fail together,
+        raising :py:exc:`ftrack_api.exception.ServerError`.
+
+        '''
+        self._delay()
+
+        responses = []
+        changes = []
+        with self._lock:
+            self.requests += 1
+
+            changing = [
+                operation for operation in operations
+                if operation['action'] in ('create', 'update', 'delete')
+            ]
+            if changing:
+                self.operations.append(('commit', len(changing)))
+                error = self.commitError
+                self.commitError = None
+                if error is not None:
+                    raise error
+
+                changes = self._apply(changing)
+
+            for operation in operations:
+                action = operation['action']
+                if action == 'query':
+                    self.operations.append(('query', operation['expression']))
+                    responses.append({
+                        'action': 'query',
+                        'data': [
+                            _copyRecord(record)
+                            for record in self._query(operation['expression'])
+                        ],
+                        'metadata': {}
+                    })
+
+                else:
+                    responses.append({'action': action, 'data': {}})
+
+        if changes:
+            self.publish('ftrack.update', {'entities': changes})
+
+        return responses
+
+    def legacy(self, method, identifier=None):
+        '''Record legacy API request of *method* for *identifier*.'''
+        self._delay()
+        with self._lock:
+            self.requests += 1
+            self.operations.append(('legacy', method))
+
+    def _delay(self):
+        '''Wait for the configured latency.'''
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _apply(self, operations):
+        '''Apply change *operations* and return update event entries.
+
+        Raise :py:exc:`ftrack_api.exception.ServerError` without applying
+        any operation if one of them is invalid.
+
+        '''
+        created = []
+        for operation in operations:
+            entityKey = operation['entity_key']
+            if operation['action'] == 'create':
+                if entityKey in self._records:
+                    raise ftrack_api.exception.ServerError(
+                        'Duplicate entity {0}.'.format(entityKey)
+                    )
+
+                created.append(self._prepare(
+                    operation['entity_type'],
+                    dict(operation['entity_data'], id=entityKey)
+                ))
+
+            elif entityKey not in self._records:
+                raise ftrack_api.exception.ServerError(
+                    'Entity {0} not found.'.format(entityKey)
+                )
+
+        known = set(record['id'] for record in created)
+        for record in created:
+            for key, value in record.items():
+                if (
+                    key.endswith('_id') and value is not None
+                    and value not in self._records and value not in known
+                ):
+                    raise ftrack_api.exception.ServerError(
+                        'Unknown {0} {1}.'.format(key, value)
+                    )
+
+        changes = []
+        created = iter(created)
+        for operation in operations:
+            action = operation['action']
+            if action == 'create':
+                record = next(created)
+                if (
+                    record['__entity_type__'] == 'AssetVersion'
+                    and record.get('version') is None
+                ):
+                    record['version'] = self._nextVersion(record['asset_id'])
+
+                self._insert(record)
+                changes.append(self._describeChange(record, 'add', {}))
+
+            elif action == 'update':
+                record = self._records[operation['entity_key']]
+                self._unindex(record)
+                values = {}
+                for key, value in operation['entity_data'].items():
+                    values[key] = {'old': record.get(key), 'new': value}
+                    record[key] = _copyValue(value)
+
+                self._indexRecord(record)
+                changes.append(self._describeChange(record, 'update', values))
+
+            else:
+                record = self._records[operation['entity_key']]
+                changes.append(self._describeChange(record, 'remove', {}))
+                self.remove(record['id'])
+
+        return changes
+
+    def _describeChange(self, record, action, values):
+        '''Return update event entry for *action* applied to *record*.'''
+        parents = []
+        parent = self._getParent(record)
+        while parent is not None:
+            parents.append({
+                'entityId': parent['id'],
+                'entityType': EVENT_ENTITY_TYPES.get(
+                    parent['__entity_type__'], ''
+                )
+            })
+            parent = self._getParent(parent)
+
+        return {
+            'entityId': record['id'],
+            'entityType': EVENT_ENTITY_TYPES.get(
+                record['__entity_type__'], ''
+            ),
+            'action': action,
+            'parentId': parents[0]['entityId'] if parents else None,
+            'parents': parents,
+            'changes': values
+        }
+
+    def _getParent(self, record):
+        '''Return record of the parent of *record* or None.'''
+        for key in ('version_id', 'asset_id', 'context_id', 'parent_id'):
+            if record.get(key) is not None:
+                return self._records.get(record[key])
+
+        return None
+
+    def _nextVersion(self, assetId):
+        '''Return next version number of *assetId*.'''
+        return self._versionNumbers.get(assetId, 0) + 1
+
+    def _prepare(self, entityType, attributes):
+        '''Return record of *entityType* with *attributes* and defaults.'''
+        record = {
+            '__entity_type__': entityType,
+            'id': attributes.get('id') or str(uuid.uuid4())
+        }
+
+        # The legacy API also stores metadata on task types.
+        if entityType in RELATIONS or entityType in ('Project', 'Type'):
+            record['metadata'] = {}
+
+        if entityType in SCHEMAS['Context']:
+            record['custom_attributes'] = {}
+
+        if entityType in SCHEMAS['TypedContext']:
+            record['object_type_id'] = self.find('ObjectType', name=entityType)
+            record['type_id'] = None
+            parent = self._records.get(attributes.get('parent_id'))
+            if parent is not None:
+                record['project_id'] = parent.get('project_id', parent['id'])
+
+        elif entityType == 'AssetVersion':
+            record.update(
+                version=None, status_id=None, task_id=None, comment='',
+                date=datetime.datetime.utcnow().replace(microsecond=0),
+                thumbnail_id=None
+            )
+
+        elif entityType == 'Project':
+            record.update(start_date=None, end_date=None, thumbnail_id=None)
+
+        for key, value in attributes.items():
+            if key != 'id':
+                record[key] = _copyValue(value)
+
+        return record
+
+    def _insert(self, record):
+        '''Store *record* and index it.'''
+        self._records[record['id']] = record
+        self._positions.setdefault(record['id'], len(self._positions))
+        self._types[record['__entity_type__']][record['id']] = True
+        self._indexRecord(record)
+
+        if record['__entity_type__'] == 'AssetVersion':
+            self._versionNumbers[record['asset_id']] = max(
+                self._versionNumbers.get(record['asset_id'], 0),
+                record['version'] or 0
+            )
+
+    def _indexRecord(self, record):
+        '''Index identifiers referenced by *record*.'''
+        for key, value in record.items():
+            if key.endswith('_id') and value is not None:
+                self._index[(key, value)][record['id']] = True
+
+    def _unindex(self, record):
+        '''Remove *record* from the index.'''
+        for key, value in record.items():
+            if key.endswith('_id') and value is not None:
+                self._index[(key, value)].pop(record['id'], None)
+
+    def _iterate(self, schema):
+        '''Yield records queried by *schema*.'''
+        for entityType in (schema,) + SCHEMAS.get(schema, ()):
+            for identifier in list(self._types.get(entityType, ())):
+                yield self._records[identifier]
+
+    def _query(self, expression):
+        '''Return records matched by query *expression*.'''
+        query = self._queries.get(expression)
+        if query is None:
+            query = self._queries[expression] = _Query(expression)
+
+        candidates = None
+        if query.condition is not None:
+            candidates = query.condition.candidates(self, query.schema)
+
+        if candidates is None:
+            records = self._iterate(query.schema)
+        else:
+            # Return records in the order they were added, as when all
+            # records are iterated.
+            records = [
+                self._records[identifier] for identifier in sorted(
+                    (
+                        identifier for identifier in candidates
+                        if identifier in self._records
+                    ),
+                    key=self._positions.get
+                )
+            ]
+
+        memo = {}
+        matched = [
+            record for record in records
+            if _matches(record['__entity_type__'], query.schema)
+            and (
+                query.condition is None
+                or query.condition.evaluate(self, record, memo)
+            )
+        ]
+
+        if query.order is not None:
+            attribute, descending = query.order
+            matched.sort(
+                key=lambda record: self.resolve(record, attribute),
+                reverse=descending
+            )
+
+        if query.offset:
+            matched = matched[query.offset:]
+
+        if query.limit is not None:
+            matched = matched[:query.limit]
+
+        return matched
+
+    def follow(self, schema, path):
+        '''Return schema of entities at relationship *path* of *schema*.
+
+        Return None if *path* is not a relationship.
+
+        '''
+        for attribute in path.split('.') if path else []:
+            relation = _getRelations(schema).get(attribute)
+            if relation is None:
+                return None
+
+            schema = relation[0]
+
+        return schema
+
+    def reverse(self, schema, path, identifiers):
+        '''Return identifiers of records of *schema* related by *path*.
+
+        *identifiers* are those of the entities at the end of relationship
+        *path*. Return None if *path* is not a relationship. The result may
+        include records that are not of *schema*.
+
+        '''
+        if not path:
+            return identifiers
+
+        relations = []
+        for attribute in path.split('.'):
+            relation = _getRelations(schema).get(attribute)
+            if relation is None:
+                return None
+
+            relations.append(relation)
+            schema = relation[0]
+
+        for _, key, collection in reversed(relations):
+            sources = set()
+            for identifier in identifiers:
+                if collection:
+                    record = self._records.get(identifier)
+                    if record is not None and record.get(key) is not None:
+                        sources.add(record[key])
+                else:
+                    sources.update(self._index.get((key, identifier), ()))
+
+            identifiers = sources
+
+        return identifiers
+
+    def resolve(self, record, path):
+        '''Return value of attribute *path* of *record*.
+
+        *path* may follow relationships, such as 'version.asset.name'. A
+        relationship, or a collection, is returned as records. None is
+        returned if a relationship along the path is not set.
+
+        '''
+        value = record
+        for attribute in path.split('.'):
+            if value is None:
+                return None
+
+            relation = RELATIONS.get(value['__entity_type__'], {}).get(
+                attribute
+            )
+            if relation is None:
+                value = value.get(attribute)
+                continue
+
+            _, key, collection = relation
+            if collection:
+                value = [
+                    self._records[identifier]
+                    for identifier in self._index[(key, value['id'])]
+                    if _matches(
+                        self._records[identifier]['__entity_type__'],
+                        relation[0]
+                    )
+                ]
+            else:
+                value = self._records.get(value.get(key))
+
+        return value
+
+
+def _copyValue(value):
+    '''Return copy of attribute *value* safe to modify.'''
+    if isinstance(value, dict):
+        return dict(value)
+
+    return value
+
+
+def _copyRecord(record):
+    '''Return copy of *record* safe to modify.'''
+    return dict(
+        (key, _copyValue(value)) for key, value in record.items()
+    )
+
+
+class _Comparison(object):
+    '''Comparison of an attribute path with a value in a query.'''
+
+    def __init__(self, path, operator, value):
+        '''Initialise comparison of *path* to *value* with *operator*.'''
+        super(_Comparison, self).__init__()
+        self.path = path
+        self.operator = operator
+        self.value = value
+
+        # Lists of values are compared by membership when possible so that
+        # conditions on many identifiers stay cheap.
+        self._values = None
+        if operator in ('in', 'not_in'):
+            self._values = frozenset(value)
+
+    def candidates(self, server, schema):
+        '''Return identifiers of records of *schema* that may match or None.
+
+        Only comparisons of identifiers, optionally of related entities such
+        as 'task.parent_id', can be answered from the index.
+
+        '''
+        path, _, attribute = self.path.rpartition('.')
+        if (
+            self.operator not in ('is', 'in')
+            or not (attribute == 'id' or attribute.endswith('_id'))
+        ):
+            return None
+
+        values = self.value if self.operator == 'in' else [self.value]
+        if attribute == 'id':
+            identifiers = set(values)
+        else:
+            identifiers = set()
+            for value in values:
+                identifiers.update(server._index.get((attribute, value), ()))
+
+        return server.reverse(schema, path, identifiers)
+
+    def evaluate(self, server, record, memo):
+        '''Return whether *record* matches.
+
+        *memo* holds results shared by all records evaluated for a query.
+
+        '''
+        left = server.resolve(record, self.path)
+        if isinstance(left, dict):
+            left = left['id']
+
+        operator = self.operator
+        if operator in ('in', 'not_in'):
+            if isinstance(left, datetime.datetime):
+                result = any(
+                    _compare(left, '=', value) for value in self.value
+                )
+            else:
+                result = left in self._values
+
+            return result if operator == 'in' else not result
+
+        if operator in ('like', 'not_like'):
+            pattern = '^{0}$'.format(
+                '.*'.join(re.escape(part) for part in self.value.split('%'))
+            )
+            result = left is not None and re.match(
+                pattern, unicode(left)
+            ) is not None
+            return result if operator == 'like' else not result
+
+        if operator == 'is':
+            return _compare(left, '=', self.value)
+
+        if operator == 'is_not':
+            return not _compare(left, '=', self.value)
+
+        return _compare(left, operator, self.value)
+
+
+def _compare(left, operator, right):
+    '''Return result of comparing *left* to *right* with *operator*.'''
+    if isinstance(left, datetime.datetime) and isinstance(right, basestring):
+        right = datetime.datetime.strptime(right, DATE_FORMAT)
+
+    if operator in ('=', 'is'):
+        return left == right
+
+    if operator == '!=':
+        return left != right
+
+    if left is None or right is None:
+        return False
+
+    return {
+        '<': left < right,
+        '<=': left <= right,
+        '>': left > right,
+        '>=': left >= right
+    }[operator]
+
+
+class _Relation(object):
+    '''Condition on entities related to a record in a query.'''
+
+    def __init__(self, path, condition):
+        '''Initialise condition on entities at *path* matching *condition*.'''
+        super(_Relation, self).__init__()
+        self.path = path
+        self.condition = condition
+
+    def candidates(self, server, schema):
+        '''Return identifiers of records of *schema* that may match or None.'''
+        related = server.follow(schema, self.path)
+        if related is None:
+            return None
+
+        identifiers = self.condition.candidates(server, related)
+        if identifiers is None:
+            return None
+
+        return server.reverse(schema, self.path, identifiers)
+
+    def evaluate(self, server, record, memo):
+        '''Return whether any related entity matches.
+
+        The result is stored in *memo* for the entity owning the related
+        entities, as many records of a query often share it.
+
+        '''
+        path, _, attribute = self.path.rpartition('.')
+        owner = record
+        if path:
+            owner = server.resolve(record, path)
+            if owner is None:
+                return False
+
+        key = (id(self), owner['id'])
+        if key not in memo:
+            related = server.resolve(owner, attribute)
+            if related is None:
+                related = []
+
+            elif isinstance(related, dict):
+                related = [related]
+
+            memo[key] = any(
+                self.condition.evaluate(server, entity, memo)
+                for entity in related
+            )
+
+        return memo[key]
+
+
+class _Boolean(object):
+    '''Combination of conditions in a query.'''
+
+    def __init__(self, operator, conditions):
+        '''Initialise combination of *conditions* with *operator*.'''
+        super(_Boolean, self).__init__()
+        self.operator = operator
+        self.conditions = conditions
+
+    def candidates(self, server, schema):
+        '''Return identifiers of records of *schema* that may match or None.'''
+        if self.operator == 'not':
+            return None
+
+        if self.operator == 'and':
+            for condition in self.conditions:
+                identifiers = condition.candidates(server, schema)
+                if identifiers is not None:
+                    return identifiers
+
+            return None
+
+        identifiers = set()
+        for condition in self.conditions:
+            candidates = condition.candidates(server, schema)
+            if candidates is None:
+                return None
+
+            identifiers.update(candidates)
+
+        return identifiers
+
+    def evaluate(self, server, record, memo):
+        '''Return whether *record* matches.'''
+        if self.operator == 'not':
+            return not self.conditions[0].evaluate(server, record, memo)
+
+        if self.operator == 'and':
+            return all(
+                condition.evaluate(server, record, memo)
+                for condition in self.conditions
+            )
+
+        return any(
+            condition.evaluate(server, record, memo)
+            for condition in self.conditions
+        )
+
+
+class _Query(object):
+    '''Parsed query expression.'''
+
+    _tokenPattern = re.compile(
+        r'\s*(?:"((?:[^"\\]|\\.)*)"|(-?\d+(?:\.\d+)?)(?![\w.])'
+        r'|(<=|>=|!=|<|>|=|\(|\)|,)|([\w.]+))'
+    )
+
+    def __init__(self, expression):
+        '''Parse *expression*.
+
+        Raise :py:exc:`ValueError` if *expression* is not supported.
+
+        '''
+        super(_Query, self).__init__()
+        self._expression = expression
+        self._tokens = self._tokenise(expression)
+        self._position = 0
+
+        if self._accept('select'):
+            while not self._accept('from'):
+                self._next()
+
+        self.schema = self._next()[1]
+        self.condition = None
+        self.order = None
+        self.offset = 0
+        self.limit = None
+
+        if self._accept('where'):
+            self.condition = self._parseOr()
+
+        if self._accept('order'):
+            self._expect('by')
+            attribute = self._next()[1]
+            descending = False
+            if self._accept('descending'):
+                descending = True
+            else:
+                self._accept('ascending')
+
+            self.order = (attribute, descending)
+
+        while self._position < len(self._tokens):
+            if self._accept('offset'):
+                self.offset = int(self._next()[1])
+            elif self._accept('limit'):
+                self.limit = int(self._next()[1])
+            else:
+                self._fail()
+
+    def _tokenise(self, expression):
+        '''Return list of (kind, value) tokens of *expression*.'''
+        tokens = []
+        position = 0
+        expression = expression.strip()
+        while position < len(expression):
+            match = self._tokenPattern.match(expression, position)
+            if match is None or match.end() == position:
+                raise ValueError(
+                    'Unable to parse query: {0}'.format(expression)
+                )
+
+            string, number, symbol, name = match.groups()
+            if string is not None:
+                tokens.append((
+                    'value',
+                    re.sub(r'\\(.)', r'\1', string)
+                ))
+            elif number is not None:
+                tokens.append((
+                    'value', float(number) if '.' in number else int(number)
+                ))
+            elif symbol is not None:
+                tokens.append(('symbol', symbol))
+            else:
+                tokens.append(('name', name))
+
+            position = match.end()
+
+        return tokens
+
+    def _fail(self):
+        '''Raise error for unexpected token.'''
+        raise ValueError(
+            'Unexpected token {0} in query: {1}'.format(
+                self._position, self._expression
+            )
+        )
+
+    def _peek(self):
+        '''Return next token or None.'''
+        if self._position < len(self._tokens):
+            return self._tokens[self._position]
+
+        return None
+
+    def _next(self):
+        '''Return next token and advance.'''
+        token = self._peek()
+        if token is None:
+            self._fail()
+
+        self._position += 1
+        return token
+
+    def _accept(self, value):
+        '''Advance and return True if the next token is *value*.'''
+        token = self._peek()
+        if (
+            token is not None and token[0] in ('name', 'symbol')
+            and token[1].lower() == value
+        ):
+            self._position += 1
+            return True
+
+        return False
+
+    def _expect(self, value):
+        '''Advance past *value* or raise :py:exc:`ValueError`.'''
+        if not self._accept(value):
+            self._fail()
+
+    def _parseOr(self):
+        '''Return condition of alternatives.'''
+        conditions = [self._parseAnd()]
+        while self._accept('or'):
+            conditions.append(self._parseAnd())
+
+        if len(conditions) == 1:
+            return conditions[0]
+
+        return _Boolean('or', conditions)
+
+    def _parseAnd(self):
+        '''Return condition of conjunctions.'''
+        conditions = [self._parseNot()]
+        while self._accept('and'):
+            conditions.append(self._parseNot())
+
+        if len(conditions) == 1:
+            return conditions[0]
+
+        return _Boolean('and', conditions)
+
+    def _parseNot(self):
+        '''Return negated or plain condition.'''
+        if self._accept('not'):
+            return _Boolean('not', [self._parseNot()])
+
+        if self._accept('('):
+            condition = self._parseOr()
+            self._expect(')')
+            return condition
+
+        kind, path = self._next()
+        if kind != 'name':
+            self._fail()
+
+        if self._accept('any') or self._accept('has'):
+            self._expect('(')
+            condition = self._parseOr()
+            self._expect(')')
+            return _Relation(path, condition)
+
+        kind, operator = self._next()
+        operator = operator.lower()
+        if operator in ('in', 'not_in'):
+            self._expect('(')
+            values = [self._parseValue()]
+            while self._accept(','):
+                values.append(self._parseValue())
+
+            self._expect(')')
+            return _Comparison(path, operator, values)
+
+        if operator not in (
+            'is', 'is_not', 'like', 'not_like', '=', '!=', '<', '<=', '>',
+            '>='
+        ):
+            self._fail()
+
+        return _Comparison(path, operator, self._parseValue())
+
+    def _parseValue(self):
+        '''Return literal value.'''
+        kind, value = self._next()
+        if kind == 'value':
+            return value
+
+        if kind == 'name' and value.lower() in ('none', 'null'):
+            return None
+
+        if kind == 'name' and value.lower() in ('true', 'false'):
+            return value.lower() == 'true'
+
+        self._fail()
+
+
+class _TrackedDict(dict):
+    '''Dictionary attribute marking its entity modified when changed.'''
+
+    def __init__(self, entity, values):
+        '''Initialise with *values* of attribute of *entity*.'''
+        super(_TrackedDict, self).__init__(values)
+        self._entity = entity
+
+    def __setitem__(self, key, value):
+        '''Set *key* to *value*.'''
+        super(_TrackedDict, self).__setitem__(key, value)
+        self._entity._modified()
+
+    def __delitem__(self, key):
+        '''Remove *key*.'''
+        super(_TrackedDict, self).__delitem__(key)
+        self._entity._modified()
+
+    def update(self, *args, **kwargs):
+        '''Update with items of *args* and *kwargs*.'''
+        super(_TrackedDict, self).update(*args, **kwargs)
+        self._entity._modified()
+
+
+class Entity(object):
+    '''Entity loaded by a :py:class:`Session`.
+
+    Attributes are read and set by key. Relationships are followed without
+    further requests, as if they had been projected when loading.
+
+    '''
+
+    def __init__(self, session, entityType, data):
+        '''Initialise entity of *entityType* with *data* from *session*.'''
+        super(Entity, self).__init__()
+        self.session = session
+        self.entity_type = entityType
+        self._data = {}
+        self._merge(data)
+
+    def __repr__(self):
+        '''Return representation.'''
+        return '<{0} {1}>'.format(self.entity_type, self._data['id'])
+
+    def _merge(self, data):
+        '''Replace attributes with *data*.'''
+        self._data = dict(
+            (
+                key,
+                _TrackedDict(self, value) if isinstance(value, dict)
+                else value
+            )
+            for key, value in data.items()
+            if key != '__entity_type__'
+        )
+
+    def _modified(self):
+        '''Mark entity as modified in its session.'''
+        self.session._modify(self)
+
+    def __getitem__(self, key):
+        '''Return value of attribute or relationship *key*.'''
+        relation = RELATIONS.get(self.entity_type, {}).get(key)
+        if relation is None:
+            return self._data[key]
+
+        return self.session._getRelated(self, key)
+
+    def __setitem__(self, key, value):
+        '''Set attribute or relationship *key* to *value*.'''
+        relation = RELATIONS.get(self.entity_type, {}).get(key)
+        if relation is not None:
+            key = relation[1]
+            value = value['id'] if value is not None else None
+
+        if isinstance(value, dict):
+            value = _TrackedDict(self, value)
+
+        self._data[key] = value
+        self._modified()
+
+    def get(self, key, default=None):
+        '''Return value of *key* or *default*.'''
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        '''Return attribute names.'''
+        return self._data.keys()
+
+
+class AssetVersion(Entity):
+    '''Asset version loaded by a :py:class:`Session`.'''
+
+    def create_component(self, path, data=None, location='auto'):
+        '''Create component of version with *path* and return it.'''
+        data = dict(data or {})
+        data['version'] = self
+        return self.session.create_component(path, data, location=location)
+
+
+class Accessor(object):
+    '''Accessor of files below a directory.'''
+
+    def __init__(self, prefix):
+        '''Initialise accessor of files below *prefix*.'''
+        super(Accessor, self).__init__()
+        self.prefix = prefix
+
+    def get_filesystem_path(self, resourceIdentifier):
+        '''Return filesystem path of *resourceIdentifier*.'''
+        return posixpath.join(self.prefix, resourceIdentifier)
+
+
+class Location(Entity):
+    '''Location loaded by a :py:class:`Session`.'''
+
+    def __init__(self, session, entityType, data):
+        '''Initialise location with *data* from *session*.'''
+        super(Location, self).__init__(session, entityType, data)
+        prefix, self.priority = session._server._locations.get(
+            data['id'], (None, 50)
+        )
+        self.accessor = Accessor(prefix) if prefix else None
+        self.resource_identifier_transformer = None
+
+    def get_resource_identifier(self, component):
+        '''Return resource identifier of *component* in location.'''
+        componentLocation = self.session.query(
+            'select resource_identifier from ComponentLocation where '
+            'component_id is "{0}" and location_id is "{1}"'.format(
+                component['id'], self['id']
+            )
+        ).first()
+        if componentLocation is None:
+            raise ftrack_api.exception.ComponentNotInLocationError(
+                [component['id']], self['name']
+            )
+
+        return componentLocation['resource_identifier']
+
+    def get_filesystem_path(self, component):
+        '''Return filesystem path of *component* in location.'''
+        return self.accessor.get_filesystem_path(
+            self.get_resource_identifier(component)
+        )
+
+    def add_component(self, component, source):
+        '''Add *component* to location from *source*.'''
+        self.add_components([component], source)
+
+    def add_components(self, components, sources):
+        '''Add *components* to location from *sources* and commit.
+
+        *sources* may be a single location or a list matching *components*.
+        As with :py:mod:`ftrack_api`, the session is committed to register
+        the components in the location, which also creates any entities
+        still pending in the session. Component added events are published
+        on the session event hub.
+
+        '''
+        if not isinstance(sources, list):
+            sources = [sources] * len(components)
+
+        for component, source in zip(components, sources):
+            if source['id'] == ftrack_api.symbol.ORIGIN_LOCATION_ID:
+                resourceIdentifier = self.session._originPaths[
+                    component['id']
+                ].lstrip('/')
+            else:
+                resourceIdentifier = source.get_resource_identifier(component)
+
+            self.session.create('ComponentLocation', {
+                'component': component,
+                'location': self,
+                'resource_identifier': resourceIdentifier
+            })
+
+        self.session.commit()
+
+        topic = ftrack_api.symbol.COMPONENT_ADDED_TO_LOCATION_TOPIC
+        for component in components:
+            self.session.event_hub.publish(
+                {
+                    'topic': topic,
+                    'data': {
+                        'component_id': component['id'],
+                        'location_id': self['id']
+                    }
+                },
+                on_error='ignore'
+            )
+
+
+class QueryResult(object):
+    '''Result of a query, loaded when first accessed.'''
+
+    def __init__(self, session, expression):
+        '''Initialise result of *expression* made with *session*.'''
+        super(QueryResult, self).__init__()
+        self._session = session
+        self._expression = expression
+        self._entities = None
+
+    def all(self):
+        '''Return list of all matching entities.'''
+        if self._entities is None:
+            self._entities = self._session._query(self._expression)
+
+        return list(self._entities)
+
+    def __iter__(self):
+        '''Iterate over matching entities.'''
+        return iter(self.all())
+
+    def first(self):
+        '''Return first matching entity or None.'''
+        entities = self._session._query(self._expression + ' limit 1')
+        if entities:
+            return entities[0]
+
+        return None
+
+    def one(self):
+        '''Return single matching entity.
+
+        Raise :py:exc:`ftrack_api.exception.NoResultFoundError` or
+        :py:exc:`ftrack_api.exception.MultipleResultsFoundError` unless
+        exactly one entity matches.
+
+        '''
+        entities = self.all()
+        if not entities:
+            raise ftrack_api.exception.NoResultFoundError()
+
+        if len(entities) > 1:
+            raise ftrack_api.exception.MultipleResultsFoundError()
+
+        return entities[0]
+
+
+class EventHub(object):
+    '''Event hub of a :py:class:`Session`.
+
+    Events are only exchanged with the server while connected. Received
+    events are delivered to subscribers when :py:meth:`wait` is called.
+
+    '''
+
+    def __init__(self, server):
+        '''Initialise disconnected hub of *server*.'''
+        super(EventHub, self).__init__()
+        self._server = server
+        self._subscribers = []
+        self._queue = Queue.Queue()
+        self.connected = False
+
+    def connect(self):
+        '''Connect to the server.'''
+        with self._server._lock:
+            self.connected = True
+            self._server._hubs.append(self)
+
+    def disconnect(self):
+        '''Disconnect from the server.'''
+        with self._server._lock:
+            self.connected = False
+            self._server._hubs.remove(self)
+
+    def subscribe(self, subscription, callback):
+        '''Call *callback* with events matching 'topic=' *subscription*.'''
+        name, _, topic = subscription.partition('=')
+        if name.strip() != 'topic':
+            raise ValueError(
+                'Unsupported subscription: {0}'.format(subscription)
+            )
+
+        self._subscribers.append((topic.strip(), callback))
+
+    def publish(self, event, on_error='raise'):
+        '''Publish *event* through the server.
+
+        Raise :py:exc:`ftrack_api.exception.EventHubConnectionError` if not
+        connected unless *on_error* is 'ignore'.
+
+        '''
+        if not self.connected:
+            if on_error == 'ignore':
+                return
+
+            raise ftrack_api.exception.EventHubConnectionError(
+                'Event hub is not connected.'
+            )
+
+        self._server.publish(event['topic'], event['data'])
+
+    def wait(self, duration=None):
+        '''Deliver received events for *duration* seconds or forever.'''
+        started = time.time()
+        while True:
+            timeout = None
+            if duration is not None:
+                timeout = duration - (time.time() - started)
+                if timeout <= 0:
+                    return
+
+            try:
+                event = self._queue.get(timeout=timeout)
+            except Queue.Empty:
+                return
+
+            self._handle(event)
+
+    def _receive(self, event):
+        '''Queue *event* received from the server.'''
+        self._queue.put(event)
+
+    def _handle(self, event):
+        '''Deliver *event* to matching subscribers.'''
+        for topic, callback in list(self._subscribers):
+            if topic == event['topic']:
+                callback(event)
+
+
+class Session(object):
+    '''Session making requests to a :py:class:`Server`.
+
+    Created and modified entities are sent to the server with
+    :py:meth:`commit`. Entities are held by identifier so that loading an
+    entity again returns the same object. Locations with an accessor are
+    held from the start, as location plugins configure them when an
+    :py:class:`ftrack_api.Session` is created.
+
+    '''
+
+    server_url = 'https://ftrack.example.com'
+    api_key = 'fake-api-key'
+    api_user = 'fake-user'
+
+    def __init__(self, server):
+        '''Initialise session of *server*.'''
+        super(Session, self).__init__()
+        self._server = server
+        self._entities = {}
+        self._created = collections.OrderedDict()
+        self._changed = collections.OrderedDict()
+        self._originPaths = {}
+        self._locations = None
+        self.event_hub = EventHub(server)
+
+        for identifier, (prefix, _) in server._locations.items():
+            if prefix:
+                self._load(server.get(identifier))
+
+    def call(self, data):
+        '''Make request of operations *data* and return responses.'''
+        responses = self._server.call(data)
+        for response in responses:
+            if response['action'] == 'query':
+                response['data'] = [
+                    self._load(record) for record in response['data']
+                ]
+
+        return responses
+
+    def query(self, expression):
+        '''Return :py:class:`QueryResult` of *expression*.'''
+        return QueryResult(self, expression)
+
+    def _query(self, expression):
+        '''Return entities matching *expression* with one request.'''
+        return self.call([{'action': 'query', 'expression': expression}])[0][
+            'data'
+        ]
+
+    def get(self, entityType, identifier):
+        '''Return entity *identifier* of *entityType* or None.
+
+        Entities already loaded by the session are returned without a
+        request.
+
+        '''
+        entity = self._entities.get(identifier)
+        if entity is not None:
+            return entity
+
+        return self.query(
+            'select id from {0} where id is "{1}"'.format(
+                entityType, identifier
+            )
+        ).first()
+
+    def create(self, entityType, data=None):
+        '''Return new entity of *entityType* with *data*.
+
+        The entity is created on the server by the next :py:meth:`commit`.
+
+        '''
+        attributes = {}
+        for key, value in (data or {}).items():
+            relation = RELATIONS.get(entityType, {}).get(key)
+            if relation is not None:
+                key = relation[1]
+                value = value['id'] if value is not None else None
+
+            attributes[key] = value
+
+        with self._server._lock:
+            record = self._server._prepare(entityType, attributes)
+
+        entity = self._createEntity(record)
+        self._entities[entity['id']] = entity
+        self._created[entity['id']] = entity
+        return entity
+
+    def create_component(self, path, data=None, location='auto'):
+        '''Return new component for file at *path*.
+
+        The component is created in the origin location at *path*. If
+        *location* is specified the component is added to it, which commits
+        the session.
+
+        '''
+        data = dict(data or {})
+        data.setdefault('name', 'main')
+        data.setdefault('file_type', posixpath.splitext(path)[1])
+        component = self.create('Component', data)
+        self._originPaths[component['id']] = path
+
+        if location == 'auto':
+            location = self.pick_location()
+
+        if location is not None:
+            location.add_component(
+                component,
+                self.get('Location', ftrack_api.symbol.ORIGIN_LOCATION_ID)
+            )
+
+        return component
+
+    def commit(self):
+        '''Send created and modified entities to the server.
+
+        Raise :py:exc:`ftrack_api.exception.ServerError` if the server
+        rejects the changes, in which case they remain pending until
+        committed again or discarded with :py:meth:`rollback`.
+
+        '''
+        operations = []
+        for identifier, entity in self._created.items():
+            data = dict(
+                (key, value) for key, value in entity._data.items()
+                if key != 'id'
+            )
+            operations.append({
+                'action': 'create',
+                'entity_type': entity.entity_type,
+                'entity_key': identifier,
+                'entity_data': data
+            })
+
+        for identifier, entity in self._changed.items():
+            if identifier in self._created:
+                continue
+
+            record = self._server.get(identifier) or {}
+            values = dict(
+                (key, value) for key, value in entity._data.items()
+                if record.get(key) != value
+            )
+            if values:
+                operations.append({
+                    'action': 'update',
+                    'entity_type': entity.entity_type,
+                    'entity_key': identifier,
+                    'entity_data': values
+                })
+
+        if not operations:
+            return
+
+        self.call(operations)
+
+        committed = self._created.keys() + self._changed.keys()
+        self._created.clear()
+        self._changed.clear()
+        for identifier in committed:
+            record = self._server.get(identifier)
+            if record is not None:
+                self._entities[identifier]._merge(record)
+
+    def rollback(self):
+        '''Discard created and modified entities not yet committed.'''
+        for identifier in self._created:
+            self._entities.pop(identifier, None)
+
+        for identifier, entity in self._changed.items():
+            record = self._server.get(identifier)
+            if record is not None:
+                entity._merge(record)
+
+        self._created.clear()
+        self._changed.clear()
+
+    def pick_location(self, component=None):
+        '''Return location with an accessor and the highest priority.
+
+        If *component* is specified only locations containing it are
+        considered, which takes a request. Return None if there is no such
+        location.
+
+        '''
+        locations = self._getLocations()
+        if component is not None:
+            locationIds = set(
+                componentLocation['location_id']
+                for componentLocation in self.query(
+                    'select location_id from ComponentLocation '
+                    'where component_id is "{0}"'.format(component['id'])
+                ).all()
+            )
+            locations = [
+                location for location in locations
+                if location['id'] in locationIds
+            ]
+
+        if locations:
+            return locations[0]
+
+        return None
+
+    def _getLocations(self):
+        '''Return locations with an accessor by priority, loading once.'''
+        if self._locations is None:
+            locations = [
+                location for location in self.query('Location').all()
+                if location.accessor
+            ]
+            locations.sort(key=lambda location: location.priority)
+            self._locations = locations
+
+        return self._locations
+
+    def _load(self, record):
+        '''Return entity of *record*, merging into a loaded one.'''
+        entity = self._entities.get(record['id'])
+        if entity is None:
+            entity = self._entities[record['id']] = self._createEntity(record)
+
+        elif (
+            record['id'] not in self._changed
+            and record['id'] not in self._created
+        ):
+            entity._merge(record)
+
+        return entity
+
+    def _createEntity(self, record):
+        '''Return new entity for *record*.'''
+        entityType = record['__entity_type__']
+        cls = {'AssetVersion': AssetVersion, 'Location': Location}.get(
+            entityType, Entity
+        )
+        return cls(self, entityType, record)
+
+    def _getRelated(self, entity, attribute):
+        '''Return entity or entities related to *entity* by *attribute*.
+
+        Related entities are loaded without a request.
+
+        '''
+        schema, key, collection = RELATIONS[entity.entity_type][attribute]
+        if not collection:
+            identifier = entity._data.get(key)
+            if identifier is None:
+                return None
+
+            related = self._entities.get(identifier)
+            if related is not None:
+                return related
+
+            record = self._server.get(identifier)
+            if record is None:
+                return None
+
+            return self._load(record)
+
+        with self._server._lock:
+            records = [
+                _copyRecord(self._server._records[identifier])
+                for identifier in self._server._index[(key, entity['id'])]
+                if _matches(
+                    self._server._records[identifier]['__entity_type__'],
+                    schema
+                )
+            ]
+
+        related = [self._load(record) for record in records]
+        related.extend(
+            created for created in self._created.values()
+            if _matches(created.entity_type, schema)
+            and created._data.get(key) == entity['id']
+        )
+        return related
+
+    def _modify(self, entity):
+        '''Record modification of *entity*.'''
+        if entity['id'] not in self._created:
+            self._changed[entity['id']] = entity
+
+
+class _LegacyList(list):
+    '''List of legacy entities.'''
+
+    def find(self, key, value):
+        '''Return first entity with attribute *key* equal to *value*.'''
+        for entity in self:
+            if entity.get(key) == value:
+                return entity
+
+        return None
+
+
+class LegacyEntity(object):
+    '''Entity of the legacy API.
+
+    Entities are loaded with a request when constructed and every method
+    contacting the server makes a further request.
+
+    '''
+
+    #: Server the entity is loaded from, set on subclasses created by
+    #: :py:meth:`Server.getLegacyApi`.
+    _server = None
+
+    #: Schema of the server entities the class represents.
+    _schema = None
+
+    #: Entity type used in references.
+    _referenceType = None
+
+    #: Mapping of legacy attribute names to server attributes.
+    _attributes = {}
+
+    def __init__(self, id=None, data=None):
+        '''Initialise entity *id*, loading it from the server.
+
+        Raise :py:exc:`ftrack.FTrackError` if no such entity exists.
+
+        '''
+        super(LegacyEntity, self).__init__()
+        if data is None:
+            data = self._request('get', id)
+            if data is None or not _matches(
+                data['__entity_type__'], self._schema
+            ):
+                raise ftrack.FTrackError(
+                    '{0} with id {1} was not found'.format(
+                        self.__class__.__name__, id
+                    )
+                )
+
+        self._data = data
+
+    def __repr__(self):
+        '''Return representation.'''
+        return '<{0} {1}>'.format(self.__class__.__name__, self.getId())
+
+    @classmethod
+    def _request(cls, method, identifier=None):
+        '''Make request of *method* and return data of *identifier*.
+
+        The request is made through :py:data:`ftrack.xmlServer` so that it
+        is counted by anything wrapping it.
+
+        '''
+        ftrack.xmlServer.action(method, {'id': identifier})
+        if identifier is None:
+            return None
+
+        return cls._server.get(identifier)
+
+    @classmethod
+    def _wrap(cls, data):
+        '''Return legacy entity for server *data*.'''
+        classes = cls._server._legacyApi
+        entityType = data['__entity_type__']
+        if entityType in SCHEMAS['TypedContext']:
+            entityType = 'Task'
+
+        return classes[{'Type': 'TaskType', 'Status': 'TaskStatus'}.get(
+            entityType, entityType
+        )](data=data)
+
+    def getId(self):
+        '''Return identifier.'''
+        return self._data['id']
+
+    def getName(self):
+        '''Return name.'''
+        return self._data['name']
+
+    def getEntityRef(self):
+        '''Return entity reference.'''
+        return 'ftrack://{0}?entityType={1}'.format(
+            self.getId(), self._referenceType
+        )
+
+    def get(self, key):
+        '''Return value of attribute *key*.'''
+        if key == 'entityType':
+            return self._referenceType
+
+        attribute = self._attributes.get(key, key)
+        if attribute in self._data:
+            return self._data[attribute]
+
+        return self._data.get('custom_attributes', {}).get(key)
+
+    def set(self, key, value):
+        '''Set attribute *key* to *value* on the server.'''
+        self._request('set', self.getId())
+        if hasattr(value, 'getId'):
+            value = value.getId()
+
+        attribute = self._attributes.get(key, key)
+        if attribute in self._data:
+            self._server.update(self.getId(), **{attribute: value})
+            self._data[attribute] = value
+        else:
+            customAttributes = dict(self._data.get('custom_attributes', {}))
+            customAttributes[key] = value
+            self._server.update(
+                self.getId(), custom_attributes=customAttributes
+            )
+            self._data['custom_attributes'] = customAttributes
+
+    def getMeta(self, key=None):
+        '''Return metadata or the value of metadata *key*.'''
+        metadata = dict(self._request('getMeta', self.getId())['metadata'])
+        if key is not None:
+            return metadata.get(key)
+
+        return metadata
+
+    def setMeta(self, data, value=None):
+        '''Set metadata *data* or metadata key *data* to *value*.'''
+        if not isinstance(data, dict):
+            data = {data: value}
+
+        metadata = dict(self._request('setMeta', self.getId())['metadata'])
+        metadata.update(
+            (key, value if isinstance(value, basestring) else str(value))
+            for key, value in data.items()
+        )
+        self._server.update(self.getId(), metadata=metadata)
+
+    def getParent(self):
+        '''Return parent entity.'''
+        parent = self._server._getParent(
+            self._request('getParent', self.getId())
+        )
+        return self._wrap(self._server.get(parent['id']))
+
+    def getParents(self):
+        '''Return list of parents, nearest first.'''
+        self._request('getParents')
+        parents = []
+        with self._server._lock:
+            record = self._server._getParent(self._server._records[
+                self.getId()
+            ])
+            while record is not None:
+                parents.append(_copyRecord(record))
+                record = self._server._getParent(record)
+
+        return [self._wrap(parent) for parent in parents]
+
+
+class LegacyContext(LegacyEntity):
+    '''Project or context of the legacy API.'''
+
+    def getChildren(self):
+        '''Return list of child contexts.'''
+        self._request('getChildren', self.getId())
+        return _LegacyList(
+            self._wrap(self._server.get(identifier))
+            for identifier in list(
+                self._server._index[('parent_id', self.getId())]
+            )
+        )
+
+    def getAssets(self, assetTypes=None, names=None):
+        '''Return assets of *assetTypes* called *names* in context.'''
+        self._request('getAssets', self.getId())
+        assets = []
+        for identifier in list(
+            self._server._index[('context_id', self.getId())]
+        ):
+            data = self._server.get(identifier)
+            if data['__entity_type__'] != 'Asset':
+                continue
+
+            short = self._server.get(data['type_id'])['short']
+            if (
+                (assetTypes is None or short in assetTypes)
+                and (names is None or data['name'] in names)
+            ):
+                assets.append(self._wrap(data))
+
+        return assets
+
+
+class LegacyProject(LegacyContext):
+    '''Project of the legacy API.'''
+
+    _schema = 'Project'
+    _referenceType = 'show'
+    _attributes = {
+        'fullname': 'full_name',
+        'startdate': 'start_date',
+        'enddate': 'end_date'
+    }
+
+    def getParents(self):
+        '''Return empty list as a project has no parents.'''
+        return []
+
+    def getTaskTypes(self):
+        '''Return task types available to the project.'''
+        return self._server._legacyApi['getTaskTypes']()
+
+    def getTaskStatuses(self):
+        '''Return task statuses available to the project.'''
+        return self._server._legacyApi['getTaskStatuses']()
+
+
+class LegacyTask(LegacyContext):
+    '''Context of the legacy API, such as a shot or task.'''
+
+    _schema = 'TypedContext'
+    _referenceType = 'task'
+
+    def getObjectType(self):
+        '''Return name of object type, such as 'Shot'.'''
+        return self._data['__entity_type__']
+
+    def getTasks(self, taskTypes=None):
+        '''Return child tasks of *taskTypes*.
+
+        *taskTypes* may contain task type names or task type entities.
+
+        '''
+        self._request('getTasks', self.getId())
+        if taskTypes is not None:
+            taskTypes = [
+                taskType.getName() if hasattr(taskType, 'getName')
+                else taskType
+                for taskType in taskTypes
+            ]
+
+        tasks = []
+        for identifier in list(
+            self._server._index[('parent_id', self.getId())]
+        ):
+            data = self._server.get(identifier)
+            if data['__entity_type__'] != 'Task':
+                continue
+
+            taskType = self._server.get(data['type_id'])['name']
+            if taskTypes is None or taskType in taskTypes:
+                tasks.append(self._wrap(data))
+
+        return tasks
+
+    def getAssets(self, assetTypes=None, names=None):
+        '''Return assets of *assetTypes* called *names* of context.
+
+        The assets of a task are those with a version published from it.
+
+        '''
+        if self.getObjectType() != 'Task':
+            return super(LegacyTask, self).getAssets(
+                assetTypes=assetTypes, names=names
+            )
+
+        self._request('getAssets', self.getId())
+        assetIds = []
+        for identifier in list(self._server._index[('task_id', self.getId())]):
+            assetId = self._server.get(identifier)['asset_id']
+            if assetId not in assetIds:
+                assetIds.append(assetId)
+
+        assets = []
+        for assetId in assetIds:
+            data = self._server.get(assetId)
+            short = self._server.get(data['type_id'])['short']
+            if (
+                (assetTypes is None or short in assetTypes)
+                and (names is None or data['name'] in names)
+            ):
+                assets.append(self._wrap(data))
+
+        return assets
+
+    def createTask(self, name, taskType):
+        '''Create task called *name* of *taskType* and return it.'''
+        self._request('createTask', self.getId())
+        identifier = self._server.add(
+            'Task', name=name, parent_id=self.getId(),
+            type_id=taskType.getId()
+        )
+        return self._wrap(self._server.get(identifier))
+
+
+class LegacyAsset(LegacyEntity):
+    '''Asset of the legacy API.'''
+
+    _schema = 'Asset'
+    _referenceType = 'asset'
+
+    def getParent(self):
+        '''Return context of asset.'''
+        self._request('getParent', self.getId())
+        return self._wrap(self._server.get(self._data['context_id']))
+
+    def getVersions(self):
+        '''Return versions ordered by version number.'''
+        self._request('getVersions', self.getId())
+        versions = [
+            self._server.get(identifier)
+            for identifier in list(
+                self._server._index[('asset_id', self.getId())]
+            )
+        ]
+        versions.sort(key=lambda version: version['version'])
+        return [self._wrap(version) for version in versions]
+
+    def getType(self):
+        '''Return asset type.'''
+        self._request('getType', self._data['type_id'])
+        return self._wrap(self._server.get(self._data['type_id']))
+
+
+class LegacyAssetVersion(LegacyEntity):
+    '''Asset version of the legacy API.'''
+
+    _schema = 'AssetVersion'
+    _referenceType = 'asset_version'
+    _attributes = {'taskid': 'task_id'}
+
+    def getName(self):
+        '''Return name of the asset of the version.'''
+        return self._server.get(self._data['asset_id'])['name']
+
+    def getVersion(self):
+        '''Return version number.'''
+        return self._data['version']
+
+    def getAsset(self):
+        '''Return asset of version.'''
+        return self.getParent()
+
+    def getStatus(self):
+        '''Return status of version.'''
+        self._request('getStatus', self.getId())
+        return self._wrap(self._server.get(self._data['status_id']))
+
+    def getComponents(self):
+        '''Return components of version.'''
+        self._request('getComponents', self.getId())
+        return [
+            self._wrap(self._server.get(identifier))
+            for identifier in list(
+                self._server._index[('version_id', self.getId())]
+            )
+            if self._server.get(identifier)['__entity_type__'] == 'Component'
+        ]
+
+
+class LegacyComponent(LegacyEntity):
+    '''Component of the legacy API.'''
+
+    _schema = 'Component'
+    _referenceType = 'component'
+    _attributes = {'filetype': 'file_type'}
+
+    def getVersion(self):
+        '''Return version of component.'''
+        return self.getParent()
+
+
+class LegacyTaskType(LegacyEntity):
+    '''Task type of the legacy API, loaded by identifier or name.'''
+
+    _schema = 'Type'
+    _referenceType = 'tasktype'
+
+    def __init__(self, id=None, data=None):
+        '''Initialise task type with identifier or name *id*.'''
+        if data is None and id is not None and self._server.get(id) is None:
+            identifier = self._server.find('Type', name=id)
+            if identifier is not None:
+                id = identifier
+
+        super(LegacyTaskType, self).__init__(id=id, data=data)
+
+
+class LegacyTaskStatus(LegacyEntity):
+    '''Task status of the legacy API.'''
+
+    _schema = 'Status'
+
+
+class LegacyAssetType(LegacyEntity):
+    '''Asset type of the legacy API.'''
+
+    _schema = 'AssetType'
+
+    def getShort(self):
+        '''Return short name.'''
+        return self._data['short']
+
+
+class LegacyProjectScheme(object):
+    '''Project scheme of the legacy API.'''
+
+    def getId(self):
+        '''Return identifier.'''
+        return 'default'
+
+
+class LegacyXmlServer(object):
+    '''Client through which all legacy API requests are made.'''
+
+    def __init__(self, server):
+        '''Initialise client making requests to *server*.'''
+        super(LegacyXmlServer, self).__init__()
+        self._server = server
+
+    def action(self, method, data=None):
+        '''Make request of *method* with *data*.'''
+        self._server.legacy(method)
+
+
+def _createLegacyApi(server):
+    '''Return mapping of legacy API module attributes bound to *server*.'''
+    api = {'xmlServer': LegacyXmlServer(server)}
+
+    for name, base in (
+        ('Project', LegacyProject),
+        ('Task', LegacyTask),
+        ('Asset', LegacyAsset),
+        ('AssetVersion', LegacyAssetVersion),
+        ('Component', LegacyComponent),
+        ('TaskType', LegacyTaskType),
+        ('TaskStatus', LegacyTaskStatus),
+        ('AssetType', LegacyAssetType)
+    ):
+        api[name] = type(name, (base,), {'_server': server})
+
+    def listFunction(method, schema, className):
+        '''Return function listing entities of *schema* with a request.'''
+        def function():
+            '''Return list of all entities.'''
+            ftrack.xmlServer.action(method)
+            with server._lock:
+                records = [
+                    _copyRecord(record) for record in server._iterate(schema)
+                ]
+
+            return [api[className](data=record) for record in records]
+
+        function.__name__ = method
+        return function
+
+    api['getTaskTypes'] = listFunction('getTaskTypes', 'Type', 'TaskType')
+    api['getTaskStatuses'] = listFunction(
+        'getTaskStatuses', 'Status', 'TaskStatus'
+    )
+    api['getAssetTypes'] = listFunction(
+        'getAssetTypes', 'AssetType', 'AssetType'
+    )
+
+    def getProjectSchemes():
+        '''Return project schemes.'''
+        ftrack.xmlServer.action('getProjectSchemes')
+        return [LegacyProjectScheme()]
+
+    def createProject(name, fullName, scheme=None):
+        '''Create project called *name* and return it.'''
+        ftrack.xmlServer.action('createProject')
+        identifier = server.add('Project', name=name, full_name=fullName)
+        return api['Project'](data=server.get(identifier))
+
+    api['getProjectSchemes'] = getProjectSchemes
+    api['createProject'] = createProject
+
+    return api
@@ -0,0 +1,252 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 ftrack
+
+import threading
+
+import ftrack
+import FnAssetAPI
+
+import ftrack_connect_foundry.accounting
+import ftrack_connect_foundry.bridge
+
+
+def test_usage_add():
+    '''Add counts of other usage.'''
+    usage = ftrack_connect_foundry.accounting.Usage()
+    other = ftrack_connect_foundry.accounting.Usage()
+    other.calls = 1
+    other.queries = 2
+    other.commits = 3
+    other.requests = 4
+    other.duration = 0.5
+
+    usage.add(other)
+    usage.add(other)
+    copy = usage.copy()
+    usage.add(other)
+
+    assert (
+        copy.calls, copy.queries, copy.commits, copy.requests, copy.duration
+    ) == (2, 4, 6, 8, 1.0)
+    assert usage.calls == 3
+    assert repr(copy) == (
+        '<Usage calls=2 queries=4 commits=6 requests=8 duration=1.000s>'
+    )
+
+
+def test_track():
+    '''Total the usage of tracked calls per method.'''
+    accounting = ftrack_connect_foundry.accounting.Accounting()
+
+    def call():
+        '''Record a query.'''
+        accounting.record(queries=1, requests=1)
+        return 'result'
+
+    assert accounting.track('resolve', call) == 'result'
+    accounting.track('resolve', call)
+
+    usage = accounting.getUsage('resolve')
+    assert (usage.calls, usage.queries, usage.requests) == (2, 2, 2)
+    assert usage.duration >= 0
+    assert accounting.getUsage().keys() == ['resolve']
+    assert accounting.getUsage('other').calls == 0
+
+    accounting.reset()
+    assert accounting.getUsage() == {}
+
+
+def test_record_untracked():
+    '''Ignore requests made outside tracked calls.'''
+    accounting = ftrack_connect_foundry.accounting.Accounting()
+    accounting.record(queries=1)
+
+    assert accounting.current() is None
+    assert accounting.getUsage() == {}
+
+
+def test_nested_calls():
+    '''Record nested calls against the outer call only.'''
+    accounting = ftrack_connect_foundry.accounting.Accounting()
+
+    def inner():
+        '''Record a commit.'''
+        accounting.record(commits=1, requests=1)
+
+    def outer():
+        '''Record a query and call inner.'''
+        accounting.record(queries=1, requests=1)
+        accounting.track('inner', inner)
+
+    target = ftrack_connect_foundry.accounting.Usage()
+    accounting.track('outer', outer, targets=[target])
+
+    usage = accounting.getUsage('outer')
+    assert (usage.calls, usage.queries, usage.commits, usage.requests) == (
+        1, 1, 1, 2
+    )
+    assert accounting.getUsage('inner').calls == 0
+    assert (target.calls, target.requests) == (1, 2)
+
+
+def test_attach_thread():
+    '''Record requests of threads working for a tracked call.'''
+    accounting = ftrack_connect_foundry.accounting.Accounting()
+
+    def work(usage):
+        '''Record a query against *usage*.'''
+        accounting.attach(usage, accounting.record, queries=1)
+        accounting.record(queries=1)
+
+    def call():
+        '''Make queries from several threads.'''
+        threads = [
+            threading.Thread(target=work, args=(accounting.current(),))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+    accounting.track('lookup', call)
+    assert accounting.getUsage('lookup').queries == 4
+
+
+def test_instrument_session(server):
+    '''Count queries, commits and requests made with a session.'''
+    accounting = ftrack_connect_foundry.accounting.Accounting()
+    session = server.createSession()
+    accounting.instrumentSession(session)
+    accounting.instrumentSession(session)
+
+    def call():
+        '''Query twice in one request and commit.'''
+        session.call([
+            {'action': 'query', 'expression': 'select id from Project'},
+            {'action': 'query', 'expression': 'select id from Location'}
+        ])
+        session.create('Project', {'name': 'test', 'full_name': 'Test'})
+        session.commit()
+
+    accounting.track('publish', call)
+
+    usage = accounting.getUsage('publish')
+    assert (usage.queries, usage.commits, usage.requests) == (2, 1, 2)
+    assert usage.requests == server.requests
+
+
+def test_instrument_legacy(server):
+    '''Count each legacy request as a query.'''
+    accounting = ftrack_connect_foundry.accounting.Accounting()
+    accounting.instrumentLegacy(ftrack)
+    accounting.instrumentLegacy(ftrack)
+
+    projectId = server.addProject('test')
+    accounting.track('load', lambda: ftrack.Project(projectId).getTaskTypes())
+
+    usage = accounting.getUsage('load')
+    assert (usage.queries, usage.requests) == (2, 2)
+    assert usage.requests == server.requests
+
+
+def test_release(server):
+    '''Restore instrumented methods once no accounting records them.'''
+    session = server.createSession()
+    action = ftrack.xmlServer.action
+    first = ftrack_connect_foundry.accounting.Accounting()
+    second = ftrack_connect_foundry.accounting.Accounting()
+    for accounting in (first, second):
+        accounting.instrumentSession(session)
+        accounting.instrumentLegacy(ftrack)
+
+    first.release()
+    second.track('load', lambda: ftrack.Project(server.addProject('test')))
+    session.commit()
+    assert second.getUsage('load').requests == 1
+    assert first.getUsage() == {}
+
+    second.release()
+    assert ftrack.xmlServer.action == action
+    assert 'action' not in vars(ftrack.xmlServer)
+    assert 'call' not in vars(session)
+    assert 'commit' not in vars(session)
+
+
+def test_disabled(server):
+    '''Record and instrument nothing unless enabled.'''
+    accounting = ftrack_connect_foundry.accounting.Accounting(enabled=False)
+    session = server.createSession()
+    accounting.instrumentSession(session)
+    accounting.instrumentLegacy(ftrack)
+
+    assert 'call' not in vars(session)
+    assert 'action' not in vars(ftrack.xmlServer)
+
+    assert accounting.track('load', lambda: 'result') == 'result'
+    assert accounting.getUsage() == {}
+
+
+def test_bridge_accounting_disabled(server, bridge):
+    '''Leave sessions and the legacy API alone by default.'''
+    projectId = server.addProject('test')
+    bridge.getEntityName(
+        'ftrack://{0}?entityType=show'.format(projectId), None
+    )
+
+    assert bridge.getUsage() == {}
+    assert 'action' not in vars(ftrack.xmlServer)
+    assert 'call' not in vars(bridge._getSession())
+
+
+def test_bridge_accounting_environment(server, session, monkeypatch):
+    '''Enable accounting with an environment variable.'''
+    monkeypatch.setenv('FTRACK_CONNECT_FOUNDRY_ACCOUNTING', '1')
+    bridge = ftrack_connect_foundry.bridge.Bridge(
+        session=session, sessionFactory=server.createSession
+    )
+    assert 'action' in vars(ftrack.xmlServer)
+
+    bridge.close()
+    assert 'action' not in vars(ftrack.xmlServer)
+
+
+def test_bridge_usage(server, session):
+    '''Report server usage per bridge method called by the host.'''
+    bridge = ftrack_connect_foundry.bridge.Bridge(
+        session=session, sessionFactory=server.createSession,
+        accounting=True
+    )
+    projectId = server.addProject('test')
+    assetId = server.addAsset('plate', projectId)
+    references = [
+        'ftrack://{0}?entityType=component'.format(
+            server.addComponent(server.addVersion(assetId))
+        )
+        for _ in range(3)
+    ]
+    context = FnAssetAPI.Context()
+    context.managerInterfaceState = bridge.createState()
+
+    server.reset()
+    bridge.resolveEntityReferences(references, context)
+    resolveRequests = server.requests
+    assert resolveRequests > 0
+
+    bridge.getEntityName(references[0], context)
+
+    usage = bridge.getUsage()
+    assert sorted(usage) == ['getEntityName', 'resolveEntityReferences']
+    assert usage['resolveEntityReferences'].calls == 1
+    assert usage['resolveEntityReferences'].requests == resolveRequests
+    assert usage['getEntityName'].requests == 0
+    assert (
+        context.managerInterfaceState.usage.requests == server.requests
+    )
+
+    bridge.resetUsage()
+    assert bridge.getUsage() == {}
+
+    bridge.close()
+    assert 'call' not in vars(session)
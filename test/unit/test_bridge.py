@@ -0,0 +1,1365 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 ftrack
+
+import threading
+
+import ftrack
+import pytest
+import ftrack_api.exception
+import FnAssetAPI
+import FnAssetAPI.specifications
+
+import fake_ftrack
+import ftrack_connect_foundry.bridge
+import ftrack_connect_foundry.constant
+import ftrack_connect_foundry.manager
+import ftrack_connect_foundry.schema
+
+
+def createShots(server, count):
+    '''Return identifiers of *count* published shots on *server*.
+
+    Each shot has a compositing task and a plate asset with one version
+    published from the task. The result is a list of dictionaries with
+    'shot', 'task', 'asset', 'version' and 'component' keys.
+
+    '''
+    projectId = server.addProject('test')
+    sequenceId = server.addContext('Sequence', 'sq010', projectId)
+
+    shots = []
+    for index in range(count):
+        shot = {
+            'shot': server.addContext(
+                'Shot', 'sh{0:03d}'.format(index * 10), sequenceId
+            )
+        }
+        shot['task'] = server.addContext(
+            'Task', 'compositing', shot['shot'], taskType='Compositing'
+        )
+        shot['asset'] = server.addAsset('plate', shot['shot'])
+        shot['version'] = server.addVersion(
+            shot['asset'], taskId=shot['task']
+        )
+        shot['component'] = server.addComponent(
+            shot['version'], metadata={'img_main': 'True'}
+        )
+        shots.append(shot)
+
+    return shots
+
+
+def countVersions(server):
+    '''Return number of versions on *server*.'''
+    return len(
+        server.createSession().query('select id from AssetVersion').all()
+    )
+
+
+def reference(identifier, entityType):
+    '''Return entity reference of *identifier* of *entityType*.'''
+    return 'ftrack://{0}?entityType={1}'.format(identifier, entityType)
+
+
+@pytest.fixture()
+def context(bridge):
+    '''Return read context with a manager state of *bridge*.'''
+    context = FnAssetAPI.Context()
+    context.managerInterfaceState = bridge.createState()
+    return context
+
+
+@pytest.mark.parametrize('count', [1, 10, 100])
+def test_prefetch_query_count(server, bridge, context, count):
+    '''Prefetch references of each type with one query per type.'''
+    shots = createShots(server, count)
+    references = []
+    for shot in shots:
+        references.extend([
+            reference(shot['component'], 'component'),
+            reference(shot['version'], 'asset_version'),
+            reference(shot['asset'], 'asset'),
+            reference(shot['shot'], 'task')
+        ])
+
+    server.reset()
+    bridge.prefetch(references, context)
+
+    # One query per entity type and one for the locations used to resolve
+    # component paths.
+    assert server.count('query') == 5
+    assert server.count('legacy') == 0
+
+    server.reset()
+    for shot in shots:
+        assert bridge.getEntityName(
+            reference(shot['component'], 'component'), context
+        ) == 'main'
+        assert bridge.getEntityName(
+            reference(shot['version'], 'asset_version'), context
+        ) == 'v001'
+        assert bridge.resolveEntityReference(
+            reference(shot['component'], 'component'), context
+        ).startswith('/mnt/studio/')
+
+    assert server.requests == 0
+
+
+def test_prefetch_skips_cached_references(server, bridge, context):
+    '''Do not query references already loaded by a previous prefetch.'''
+    shots = createShots(server, 3)
+    references = [reference(shot['component'], 'component') for shot in shots]
+    bridge.prefetch(references, context)
+
+    server.reset()
+    bridge.prefetch(references, context)
+    assert server.requests == 0
+
+
+@pytest.mark.parametrize('count', [1, 10, 100])
+def test_resolve_query_count(server, bridge, context, count):
+    '''Resolve components with a handful of queries.'''
+    shots = createShots(server, count)
+    references = [reference(shot['component'], 'component') for shot in shots]
+
+    server.reset()
+    paths = bridge.resolveEntityReferences(references, context)
+
+    # One query for the components and one for the locations.
+    assert server.count('query') == 2
+    assert server.count('legacy') == 0
+    assert server.requests == 2
+    assert all(path.startswith('/mnt/studio/') for path in paths)
+
+
+@pytest.mark.parametrize('count', [1, 10, 100])
+def test_entity_reference_types_query_count(server, bridge, count):
+    '''Look up types of untyped identifiers with one request per batch.'''
+    shots = createShots(server, count)
+    expected = {server.find('Type', name='Compositing'): 'tasktype'}
+    for shot in shots:
+        expected.update({
+            shot['shot']: 'task',
+            shot['task']: 'task',
+            shot['asset']: 'asset',
+            shot['version']: 'asset_version',
+            shot['component']: 'component'
+        })
+
+    projectId = server.get(shots[0]['shot'])['project_id']
+    expected[projectId] = 'show'
+
+    server.reset()
+    assert bridge.getEntityReferenceTypes(
+        expected.keys() + ['missing']
+    ) == expected
+
+    # Every entity type is queried in one call to the server per batch.
+    batchSize = ftrack_connect_foundry.constant.QUERY_BATCH_SIZE
+    assert server.requests == (len(expected) + batchSize) // batchSize
+    assert server.count('legacy') == 0
+
+    server.reset()
+    assert bridge.getEntityReferenceTypes(expected.keys()) == expected
+    assert server.requests == 0
+
+
+@pytest.mark.parametrize('count', [1, 10, 100])
+def test_display_name_query_count(server, bridge, context, count):
+    '''Load the hierarchy of a project in one call.'''
+    shots = createShots(server, count)
+
+    server.reset()
+    names = [
+        bridge.getEntityDisplayName(reference(shot['shot'], 'task'), context)
+        for shot in shots
+    ]
+
+    # One query for the project of the first shot and one call loading the
+    # project and all of its contexts.
+    assert server.requests == 2
+    assert server.count('legacy') == 0
+    assert names[-1] == 'test / sq010 / sh{0:03d}'.format((count - 1) * 10)
+
+    # Assets, versions and components are loaded up to their context with
+    # one query each.
+    server.reset()
+    for shot in shots:
+        entityReference = reference(shot['component'], 'component')
+        assert bridge.getEntityDisplayName(
+            entityReference, context
+        ).endswith(' / plate / v001 / main')
+        assert bridge.getEntityPath(
+            entityReference, context
+        ).endswith('_plate_v001_main')
+
+    assert server.requests == count
+    assert server.count('legacy') == 0
+
+
+def test_registered_groupings_added_to_hierarchy(server, bridge, context,
+                                                 host):
+    '''Name registered shots without loading the hierarchy again.'''
+    shot, = createShots(server, 1)
+    bridge.getEntityDisplayName(reference(shot['shot'], 'task'), context)
+
+    sequenceId = server.get(shot['shot'])['parent_id']
+    references = bridge.registerMultiple(
+        ['sh100', 'sh110'], [reference(sequenceId, 'task')] * 2,
+        [FnAssetAPI.specifications.ShotSpecification()] * 2, None
+    )
+
+    server.reset()
+    assert [
+        bridge.getEntityDisplayName(entityReference, context)
+        for entityReference in references
+    ] == ['test / sq010 / sh100', 'test / sq010 / sh110']
+    assert server.requests == 0
+
+
+def test_related_references_cached_per_state(server, bridge, context):
+    '''Reuse related references within a manager state only.'''
+    shot, = createShots(server, 1)
+    references = [reference(shot['component'], 'component')]
+    specification = FnAssetAPI.specifications.ParentGroupingRelationship()
+
+    expected = [[reference(shot['shot'], 'task')]]
+    assert bridge.getRelatedReferences(
+        references, [specification], context
+    ) == expected
+
+    server.reset()
+    assert bridge.getRelatedReferences(
+        references, [specification], context
+    ) == expected
+    assert server.requests == 0
+
+    other = FnAssetAPI.Context()
+    other.managerInterfaceState = bridge.createState()
+    assert bridge.getRelatedReferences(
+        references, [specification], other
+    ) == expected
+    assert server.requests > 0
+
+
+def test_related_references_without_state(server, bridge):
+    '''Look up related references again for calls without a state.'''
+    shot, = createShots(server, 1)
+    references = [reference(shot['component'], 'component')]
+    specification = FnAssetAPI.specifications.ParentGroupingRelationship()
+
+    bridge.getRelatedReferences(references, [specification], None)
+
+    server.reset()
+    bridge.getRelatedReferences(references, [specification], None)
+    assert server.requests > 0
+
+
+def test_related_references_keep_bridge_cache(server, bridge, context):
+    '''Do not flush cached entity data when looking up relationships.'''
+    shot, = createShots(server, 1)
+    componentReference = reference(shot['component'], 'component')
+    bridge.prefetch([componentReference], context)
+
+    bridge.getRelatedReferences(
+        [componentReference],
+        [FnAssetAPI.specifications.ParentGroupingRelationship()], context
+    )
+
+    server.reset()
+    assert bridge.getEntityName(componentReference, context) == 'main'
+    assert server.requests == 0
+
+
+@pytest.fixture()
+def writeContext(bridge, host):
+    '''Return write context with a manager state of *bridge*.'''
+    context = FnAssetAPI.Context(access=FnAssetAPI.Context.kWrite)
+    context.managerInterfaceState = bridge.createState()
+    return context
+
+
+@pytest.mark.parametrize('count', [1, 10, 50])
+def test_register_multiple_commits_once(server, bridge, context,
+                                        writeContext, count):
+    '''Register all images with a single commit.'''
+    shots = createShots(server, count)
+
+    server.reset()
+    references = bridge.registerMultiple(
+        ['/renders/{0}.exr'.format(index) for index in range(count)],
+        [reference(shot['shot'], 'task') for shot in shots],
+        [FnAssetAPI.specifications.ImageSpecification()] * count,
+        writeContext
+    )
+
+    assert server.count('commit') == 1
+    assert countVersions(server) == count * 2
+    assert [
+        bridge.resolveEntityReference(entityReference, context)
+        for entityReference in references
+    ] == [
+        '/mnt/studio/renders/{0}.exr'.format(index) for index in range(count)
+    ]
+
+
+def createRegistrationTargets(shots):
+    '''Return targets and specifications registering against *shots*.
+
+    An image is registered against the shot, task, asset and component of
+    each shot and a new shot is created under the sequence of the first.
+
+    '''
+    targets = []
+    for shot in shots:
+        targets.extend([
+            reference(shot['shot'], 'task'),
+            reference(shot['task'], 'task'),
+            reference(shot['asset'], 'asset'),
+            reference(shot['component'], 'component')
+        ])
+
+    specifications = (
+        [FnAssetAPI.specifications.ImageSpecification()] * len(targets)
+    )
+    strings = [
+        '/renders/{0}.exr'.format(index) for index in range(len(targets))
+    ]
+
+    return strings, targets, specifications
+
+
+@pytest.mark.parametrize('count', [1, 10, 50])
+def test_register_multiple_without_state(server, bridge, context, host,
+                                         count):
+    '''Prepare and commit mixed registrations together without a state.'''
+    shots = createShots(server, count)
+    strings, targets, specifications = createRegistrationTargets(shots)
+
+    sequenceId = server.get(shots[0]['shot'])['parent_id']
+    strings.insert(0, 'sh999')
+    targets.insert(0, reference(sequenceId, 'task'))
+    specifications.insert(0, FnAssetAPI.specifications.ShotSpecification())
+
+    # Load task and asset types beforehand as they are loaded once only.
+    schema = ftrack_connect_foundry.schema.getSharedSchema()
+    schema.getTaskTypes()
+    schema.getAssetTypes()
+
+    server.reset()
+    references = bridge.registerMultiple(
+        strings, targets, specifications, None
+    )
+
+    # One query for the sequence and one commit creating the shot, then a
+    # query per kind of entity needed to prepare the images, one for the
+    # location and one commit creating them.
+    assert server.count('query') == 8
+    assert server.count('commit') == 2
+    assert server.count('legacy') == 0
+    assert countVersions(server) == count * 5
+
+    shot = server.find('Shot', name='sh999')
+    assert references[0] == reference(shot, 'task')
+    assert [
+        bridge.resolveEntityReference(entityReference, context)
+        for entityReference in references[1:]
+    ] == ['/mnt/studio' + path for path in strings[1:]]
+
+    # Images against a shot or its task share the compositing task of the
+    # shot and a new asset, images against an asset or component are added to
+    # the existing asset and its task.
+    for index, shot in enumerate(shots):
+        versions = []
+        for entityReference in references[index * 4 + 1:index * 4 + 5]:
+            identifier = entityReference[len('ftrack://'):].partition('?')[0]
+            versions.append(server.get(server.get(identifier)['version_id']))
+
+        assert set(version['task_id'] for version in versions) == set([
+            shot['task']
+        ])
+        assert versions[0]['asset_id'] == versions[1]['asset_id']
+        assert versions[0]['asset_id'] != shot['asset']
+        assert versions[2]['asset_id'] == shot['asset']
+        assert versions[3]['asset_id'] == shot['asset']
+
+
+def test_register_multiple_failure_keeps_no_transaction(server, bridge,
+                                                        writeContext):
+    '''Discard the transaction of a failed registerMultiple.'''
+    shots = createShots(server, 2)
+    strings, targets, specifications = createRegistrationTargets(shots)
+    state = writeContext.managerInterfaceState
+
+    server.commitError = ftrack_api.exception.ServerError('Unavailable')
+    with pytest.raises(FnAssetAPI.exceptions.RegistrationError):
+        bridge.registerMultiple(
+            strings, targets, specifications, writeContext
+        )
+
+    assert state.transaction is None
+    assert countVersions(server) == 2
+
+
+@pytest.mark.parametrize('count', [1, 10, 100])
+def test_preflight_multiple_query_count(server, bridge, context, count):
+    '''Check existence of targets with one query per entity type.'''
+    shots = createShots(server, count)
+    _, targets, specifications = createRegistrationTargets(shots)
+
+    server.reset()
+    assert bridge.preflightMultiple(
+        targets, specifications, context
+    ) == targets
+
+    # One query per entity type and one for the locations used to resolve
+    # component paths.
+    assert server.count('query') == 4
+    assert server.count('legacy') == 0
+
+
+def test_preflight_multiple_missing_target(server, bridge, context):
+    '''Raise for a target that does not exist.'''
+    shots = createShots(server, 1)
+    _, targets, specifications = createRegistrationTargets(shots)
+    server.remove(shots[0]['asset'])
+
+    with pytest.raises(FnAssetAPI.exceptions.PreflightError):
+        bridge.preflightMultiple(targets, specifications, context)
+
+
+@pytest.mark.parametrize('count', [1, 10, 100])
+def test_register_groupings_commits_once(server, bridge, host, count):
+    '''Create shots, sequences and their tasks with a single commit.'''
+    projectId = server.addProject('test')
+    sequenceId = server.addContext('Sequence', 'sq010', projectId)
+    names = ['sh{0:03d}'.format(index * 10) for index in range(count)]
+
+    schema = ftrack_connect_foundry.schema.getSharedSchema()
+    schema.getTaskTypes()
+
+    server.reset()
+    references = bridge.registerMultiple(
+        names + ['sq020'],
+        [reference(sequenceId, 'task')] * count
+        + [reference(projectId, 'show')],
+        [FnAssetAPI.specifications.ShotSpecification()] * count
+        + [FnAssetAPI.specifications.GroupingSpecification()],
+        None
+    )
+
+    # One query per type of parent and one commit.
+    assert server.count('query') == 2
+    assert server.count('commit') == 1
+    assert server.count('legacy') == 0
+
+    assert countEntities(server, 'Shot') == count
+    assert countEntities(server, 'Task') == (count + 1) * 2
+    for name, entityReference in zip(names + ['sq020'], references):
+        identifier = entityReference[len('ftrack://'):].partition('?')[0]
+        assert server.get(identifier)['name'] == name
+
+
+def test_transaction_buffers_registrations(server, bridge, context,
+                                           writeContext):
+    '''Commit registrations made in a transaction once it finishes.'''
+    shots = createShots(server, 3)
+    state = writeContext.managerInterfaceState
+
+    bridge.startTransaction(state)
+    references = [
+        bridge.register(
+            '/renders/{0}.exr'.format(index),
+            reference(shot['shot'], 'task'),
+            FnAssetAPI.specifications.ImageSpecification(), writeContext
+        )
+        for index, shot in enumerate(shots)
+    ]
+
+    assert server.count('commit') == 0
+
+    # Pending registrations resolve through states sharing the transaction.
+    context.managerInterfaceState = state
+    assert bridge.resolveEntityReference(
+        references[0], context
+    ) == '/renders/0.exr'
+
+    bridge.finishTransaction(state)
+    assert server.count('commit') == 1
+    assert countVersions(server) == 6
+
+
+def test_cancel_transaction(server, bridge, writeContext):
+    '''Discard registrations of a cancelled transaction.'''
+    shot, = createShots(server, 1)
+    state = writeContext.managerInterfaceState
+
+    bridge.startTransaction(state)
+    bridge.register(
+        '/renders/0.exr', reference(shot['shot'], 'task'),
+        FnAssetAPI.specifications.ImageSpecification(), writeContext
+    )
+
+    assert bridge.cancelTransaction(state) is True
+    assert bridge.cancelTransaction(state) is False
+    assert server.count('commit') == 0
+    assert countVersions(server) == 1
+
+
+def test_failed_commit_keeps_transaction(server, bridge, writeContext):
+    '''Keep the transaction open to retry after a failed commit.'''
+    shot, = createShots(server, 1)
+    state = writeContext.managerInterfaceState
+
+    bridge.startTransaction(state)
+    bridge.register(
+        '/renders/0.exr', reference(shot['shot'], 'task'),
+        FnAssetAPI.specifications.ImageSpecification(), writeContext
+    )
+
+    server.commitError = ftrack_api.exception.ServerError('Unavailable')
+    with pytest.raises(FnAssetAPI.exceptions.StateError):
+        bridge.finishTransaction(state)
+
+    assert countVersions(server) == 1
+
+    bridge.finishTransaction(state)
+    assert countVersions(server) == 2
+
+
+def countEntities(server, schema):
+    '''Return number of entities of *schema* on *server*.'''
+    return len(
+        server.createSession().query('select id from {0}'.format(schema)).all()
+    )
+
+
+def createEmptyShot(server):
+    '''Return identifier of a shot without tasks or assets on *server*.'''
+    projectId = server.addProject('test')
+    sequenceId = server.addContext('Sequence', 'sq010', projectId)
+    return server.addContext('Shot', 'sh010', sequenceId)
+
+
+def test_transaction_reserves_tasks(server, bridge, context, writeContext):
+    '''Create missing tasks with the registrations that need them.'''
+    shotId = createEmptyShot(server)
+    state = writeContext.managerInterfaceState
+
+    bridge.startTransaction(state)
+    references = [
+        bridge.register(
+            '/renders/{0}.exr'.format(name), reference(shotId, 'task'),
+            FnAssetAPI.specifications.ImageSpecification(), writeContext
+        )
+        for name in ('first', 'second')
+    ]
+    assert server.count('commit') == 0
+    assert countEntities(server, 'Task') == 0
+
+    bridge.finishTransaction(state)
+    assert server.count('commit') == 1
+
+    task, = server.createSession().query(
+        'select id, name from Task where parent_id is "{0}"'.format(shotId)
+    ).all()
+    assert task['name'] == 'compositing'
+    for entityReference in references:
+        identifier = entityReference[len('ftrack://'):].partition('?')[0]
+        versionId = server.get(identifier)['version_id']
+        assert server.get(versionId)['task_id'] == task['id']
+
+
+def test_cancel_transaction_discards_reserved_tasks(server, bridge,
+                                                    writeContext):
+    '''Leave no tasks behind when cancelling a transaction.'''
+    shotId = createEmptyShot(server)
+    state = writeContext.managerInterfaceState
+
+    bridge.startTransaction(state)
+    bridge.register(
+        '/renders/0.exr', reference(shotId, 'task'),
+        FnAssetAPI.specifications.ImageSpecification(), writeContext
+    )
+    bridge.cancelTransaction(state)
+
+    assert server.count('commit') == 0
+    assert countEntities(server, 'Task') == 0
+    assert countEntities(server, 'Asset') == 0
+
+
+def test_failed_location_add_creates_nothing(server, bridge, context, host,
+                                             monkeypatch):
+    '''Create nothing if adding components to the location fails.'''
+    shotId = createEmptyShot(server)
+
+    addComponents = fake_ftrack.Location.add_components
+    failures = [IOError('Unable to transfer file.')]
+
+    def add(location, components, sources):
+        '''Fail once as if the file could not be transferred.'''
+        if failures:
+            raise failures.pop()
+
+        return addComponents(location, components, sources)
+
+    monkeypatch.setattr(fake_ftrack.Location, 'add_components', add)
+    with pytest.raises(FnAssetAPI.exceptions.RegistrationError):
+        bridge.register(
+            '/renders/0.exr', reference(shotId, 'task'),
+            FnAssetAPI.specifications.ImageSpecification(), None
+        )
+
+    assert server.count('commit') == 0
+    for schema in ('Task', 'Asset', 'AssetVersion', 'Component'):
+        assert countEntities(server, schema) == 0
+
+    entityReference = bridge.register(
+        '/renders/0.exr', reference(shotId, 'task'),
+        FnAssetAPI.specifications.ImageSpecification(), None
+    )
+    assert server.count('commit') == 1
+    assert bridge.resolveEntityReference(
+        entityReference, context
+    ) == '/mnt/studio/renders/0.exr'
+
+
+def getShotMetadata(index):
+    '''Return frame range metadata of shot *index* with handles of 5.'''
+    start = 1001 + index * 100
+    return {
+        FnAssetAPI.constants.kField_FrameStart: start,
+        FnAssetAPI.constants.kField_FrameEnd: start + 99,
+        FnAssetAPI.constants.kField_FrameIn: start + 5
+    }
+
+
+@pytest.mark.parametrize('count', [1, 10, 100])
+def test_set_entity_metadata_multiple_query_count(server, bridge, count):
+    '''Set metadata with one query per entity type and one commit.'''
+    shots = createShots(server, count)
+    references = []
+    data = []
+    for index, shot in enumerate(shots):
+        references.extend([
+            reference(shot['shot'], 'task'),
+            reference(shot['component'], 'component')
+        ])
+        data.extend([getShotMetadata(index), {'colour': 'red'}])
+
+    server.reset()
+    bridge.setEntityMetadataMultiple(references, data, None)
+
+    assert server.count('query') == 2
+    assert server.count('commit') == 1
+    assert server.count('legacy') == 0
+
+    for index, shot in enumerate(shots):
+        start = 1001 + index * 100
+        assert server.get(shot['shot'])['custom_attributes'] == {
+            'fstart': start, 'fend': start + 99, 'handles': 5
+        }
+        assert server.get(shot['component'])['metadata']['colour'] == 'red'
+
+
+def test_set_entity_metadata_multiple_missing_reference(server, bridge):
+    '''Change nothing if a reference cannot be found.'''
+    shot, = createShots(server, 1)
+    missing = createShots(server, 1)[0]['shot']
+    server.remove(missing)
+
+    server.reset()
+    with pytest.raises(FnAssetAPI.exceptions.InvalidEntityReference):
+        bridge.setEntityMetadataMultiple(
+            [reference(shot['shot'], 'task'), reference(missing, 'task')],
+            [getShotMetadata(0), getShotMetadata(1)], None
+        )
+
+    assert server.count('commit') == 0
+    assert server.get(shot['shot'])['custom_attributes'] == {}
+
+
+def test_set_entity_metadata_multiple_failed_commit(server, bridge):
+    '''Roll back all changes if the commit fails.'''
+    shots = createShots(server, 2)
+    references = [reference(shot['shot'], 'task') for shot in shots]
+
+    server.commitError = ftrack_api.exception.ServerError('Unavailable')
+    with pytest.raises(ftrack_api.exception.ServerError):
+        bridge.setEntityMetadataMultiple(
+            references, [getShotMetadata(0), getShotMetadata(1)], None
+        )
+
+    # Only the changes of the next call are committed.
+    bridge.setEntityMetadataMultiple(
+        references[:1], [{'colour': 'red'}], None
+    )
+    assert server.get(shots[0]['shot'])['custom_attributes'] == {}
+    assert server.get(shots[0]['shot'])['metadata'] == {'colour': 'red'}
+    assert server.get(shots[1]['shot'])['custom_attributes'] == {}
+
+
+def test_set_entity_metadata_multiple_serial_fallback(server, bridge):
+    '''Set handles of non tasks and task type metadata one at a time.'''
+    shot, = createShots(server, 1)
+    taskTypeId = server.find('Type', name='Compositing')
+
+    server.reset()
+    bridge.setEntityMetadataMultiple(
+        [
+            reference(shot['shot'], 'task'),
+            reference(shot['component'], 'component'),
+            reference(taskTypeId, 'tasktype')
+        ],
+        [getShotMetadata(0), getShotMetadata(0), {'colour': 'blue'}], None
+    )
+
+    # The shot is still set with a query and a commit of its own.
+    assert server.count('commit') == 1
+    assert server.count('legacy') > 0
+    assert server.get(shot['shot'])['custom_attributes']['handles'] == 5
+    assert server.get(shot['component'])['metadata'][
+        FnAssetAPI.constants.kField_FrameIn
+    ] == '1006'
+    assert server.get(taskTypeId)['metadata'] == {'colour': 'blue'}
+
+
+def getLegacyWorkflowReferences(entity, version, taskType,
+                                preferNukeScript):
+    '''Return workflow references of *entity* as originally looked up.
+
+    This follows the implementation the batched lookup replaced, walking
+    tasks, assets, versions and components with the legacy API.
+
+    '''
+    if isinstance(entity, ftrack.Component):
+        entity = entity.getVersion().getAsset().getParent()
+
+    relatedClips = []
+    relatedNukeScripts = []
+    for task in entity.getTasks(taskTypes=[taskType]):
+        for asset in task.getAssets(assetTypes=['img', 'comp']):
+            assetVersions = asset.getVersions()
+            if not assetVersions:
+                continue
+
+            if version == 'latest':
+                targetVersion = assetVersions[-1]
+            else:
+                for candidate in reversed(assetVersions):
+                    if candidate.getStatus().getName() == 'Approved':
+                        targetVersion = candidate
+                        break
+
+            components = targetVersion.getComponents()
+            for component in components:
+                if component.get('filetype') == '.nk':
+                    relatedNukeScripts.append(component.getEntityRef())
+
+            for component in components:
+                if component.getMeta('img_main'):
+                    relatedClips.append(component.getEntityRef())
+
+    if preferNukeScript and relatedNukeScripts:
+        return relatedNukeScripts
+
+    return relatedClips
+
+
+def createWorkflowShots(server):
+    '''Return component identifiers of shots with varied publishes.
+
+    Every asset has an approved version so that all of them have a target
+    version whichever criteria are used.
+
+    '''
+    projectId = server.addProject('test')
+    sequenceId = server.addContext('Sequence', 'sq010', projectId)
+
+    components = []
+    for index in range(4):
+        shotId = server.addContext(
+            'Shot', 'sh{0:03d}'.format(index * 10), sequenceId
+        )
+        compositing = server.addContext(
+            'Task', 'compositing', shotId, taskType='Compositing'
+        )
+        lighting = server.addContext(
+            'Task', 'lighting', shotId, taskType='Lighting'
+        )
+
+        plateId = server.addAsset('plate', shotId)
+        for status in ('Approved', 'Pending Review')[:index % 2 + 1]:
+            versionId = server.addVersion(
+                plateId, taskId=compositing, status=status
+            )
+            components.append(server.addComponent(
+                versionId, metadata={'img_main': 'True'}
+            ))
+            server.addComponent(versionId, name='proxy', fileType='.jpg')
+
+        if index % 2:
+            scriptId = server.addAsset('script', shotId, 'comp')
+            for status in ('Pending Review', 'Approved'):
+                server.addComponent(
+                    server.addVersion(
+                        scriptId, taskId=compositing, status=status
+                    ),
+                    fileType='.nk'
+                )
+
+        # Published from another task type or of another asset type.
+        server.addComponent(
+            server.addVersion(
+                server.addAsset('beauty', shotId), taskId=lighting,
+                status='Approved'
+            ),
+            metadata={'img_main': 'True'}
+        )
+        server.addComponent(
+            server.addVersion(
+                server.addAsset('model', shotId, 'geo'), taskId=compositing,
+                status='Approved'
+            ),
+            metadata={'img_main': 'True'}
+        )
+
+    return components
+
+
+@pytest.mark.parametrize('version', ['latest', 'latestapproved'])
+@pytest.mark.parametrize(
+    'preferNukeScript', [False, True], ids=['clips', 'scripts']
+)
+def test_workflow_references_match_legacy_lookup(server, bridge, context,
+                                                 version, preferNukeScript):
+    '''Relate the same references as the original legacy lookup.'''
+    componentIds = createWorkflowShots(server)
+    taskType = ftrack.TaskType('Compositing')
+
+    specification = FnAssetAPI.specifications.WorkflowRelationship()
+    specification.criteria = '{0},{1},{2}'.format(
+        version, taskType.getEntityRef(), preferNukeScript
+    )
+
+    expected = [
+        getLegacyWorkflowReferences(
+            ftrack.Component(componentId), version, taskType,
+            preferNukeScript
+        )
+        for componentId in componentIds
+    ]
+    assert any(expected)
+
+    server.reset()
+    related = bridge.getRelatedReferences(
+        [reference(componentId, 'component') for componentId in componentIds],
+        [specification], context
+    )
+
+    assert related == expected
+
+    # One query for the contexts of the components and one for the
+    # candidate versions of all of them.
+    assert server.count('query') == 2
+    assert server.count('legacy') == 0
+
+
+@pytest.mark.parametrize('count', [1, 10, 100])
+def test_workflow_query_count(server, bridge, context, count):
+    '''Look up workflow references of any number of shots in two queries.'''
+    shots = createShots(server, count)
+    specification = FnAssetAPI.specifications.WorkflowRelationship()
+    specification.criteria = 'latest,{0},False'.format(
+        reference(server.find('Type', name='Compositing'), 'tasktype')
+    )
+
+    server.reset()
+    related = bridge.getRelatedReferences(
+        [reference(shot['component'], 'component') for shot in shots],
+        [specification], context
+    )
+
+    assert related == [
+        [reference(shot['component'], 'component')] for shot in shots
+    ]
+    assert server.count('query') == 2
+    assert server.count('legacy') == 0
+
+
+def test_workflow_references_of_missing_component(server, bridge, context):
+    '''Raise for references to components that do not exist.'''
+    specification = FnAssetAPI.specifications.WorkflowRelationship()
+    specification.criteria = 'latest,{0},False'.format(
+        reference(server.find('Type', name='Compositing'), 'tasktype')
+    )
+
+    with pytest.raises(FnAssetAPI.exceptions.InvalidEntityReference):
+        bridge.getRelatedReferences(
+            [reference('00000000-0000-0000-0000-000000000000', 'component')],
+            [specification], context
+        )
+
+
+def createVersions(server, count, approved=()):
+    '''Return component identifiers of *count* versions of one asset.
+
+    Each version has a 'main' and a 'proxy' component and the identifiers
+    of the 'main' components are returned in version order. Versions whose
+    index is in *approved* are approved.
+
+    '''
+    shot, = createShots(server, 1)
+    assetId = server.addAsset('script', shot['shot'], 'comp')
+
+    components = []
+    for index in range(count):
+        versionId = server.addVersion(
+            assetId, status='Approved' if index in approved else None
+        )
+        components.append(server.addComponent(versionId, fileType='.nk'))
+        server.addComponent(versionId, name='proxy', fileType='.jpg')
+
+    return components
+
+
+@pytest.mark.parametrize('count', [1, 10, 200])
+def test_entity_versions_query_count(server, bridge, context, count):
+    '''List versions with a constant number of requests.'''
+    componentIds = createVersions(server, count)
+
+    server.reset()
+    versions = bridge.getEntityVersions(
+        reference(componentIds[0], 'component'), context
+    )
+
+    assert versions == dict(
+        (str(index + 1), reference(componentId, 'component'))
+        for index, componentId in enumerate(componentIds)
+    )
+
+    # One legacy request loading the component and one query each for its
+    # asset and the components of the asset's versions.
+    assert server.count('legacy') == 1
+    assert server.count('query') == 2
+
+
+def test_entity_versions_of_component_name(server, bridge, context):
+    '''List the versions of components with the same name only.'''
+    createVersions(server, 3)
+    proxyId = server.find('Component', name='proxy')
+
+    versions = bridge.getEntityVersions(
+        reference(proxyId, 'component'), context, maxResults=2
+    )
+
+    assert sorted(versions) == ['2', '3']
+    for entityReference in versions.values():
+        assert bridge.getEntityName(entityReference, context) == 'proxy'
+
+
+def test_entity_versions_include_meta_versions(server, bridge, context):
+    '''Include the latest and latest approved versions.'''
+    componentIds = createVersions(server, 4, approved=[1])
+
+    versions = bridge.getEntityVersions(
+        reference(componentIds[0], 'component'), context,
+        includeMetaVersions=True
+    )
+
+    assert versions['latest'] == reference(componentIds[3], 'component')
+    assert versions['latestapproved'] == reference(
+        componentIds[1], 'component'
+    )
+
+
+def test_entity_version_page(server, bridge, context):
+    '''Page through versions, most recent first, with a cursor.'''
+    componentIds = createVersions(server, 5)
+    references = [
+        reference(componentId, 'component') for componentId in componentIds
+    ]
+
+    page, cursor = bridge.getEntityVersionPage(references[0], context, 2)
+    assert page == [('5', references[4]), ('4', references[3])]
+    assert cursor is not None
+
+    server.reset()
+    page, cursor = bridge.getEntityVersionPage(
+        references[0], context, 2, cursor=cursor
+    )
+    assert page == [('3', references[2]), ('2', references[1])]
+    assert cursor is not None
+
+    # Only the page is loaded, with the asset of the component.
+    assert server.count('legacy') == 0
+    assert server.count('query') == 2
+
+    page, cursor = bridge.getEntityVersionPage(
+        references[0], context, 2, cursor=cursor
+    )
+    assert page == [('1', references[0])]
+    assert cursor is None
+
+
+def test_entity_version_page_ends_on_full_page(server, bridge, context):
+    '''Return no cursor when the last page is full.'''
+    componentIds = createVersions(server, 4)
+    interface = ftrack_connect_foundry.manager.ManagerInterface(bridge)
+    entityReference = reference(componentIds[0], 'component')
+
+    page, cursor = interface.getEntityVersionPage(entityReference, context, 2)
+    assert [versionName for versionName, _ in page] == ['4', '3']
+
+    page, cursor = interface.getEntityVersionPage(
+        entityReference, context, 2, cursor=cursor
+    )
+    assert [versionName for versionName, _ in page] == ['2', '1']
+    assert cursor is None
+
+
+def createAssets(server, count):
+    '''Return 'main' component identifiers of *count* assets.
+
+    Each asset has three versions of which the second is approved. The
+    result is a list of (first, approved, latest) tuples.
+
+    '''
+    projectId = server.addProject('test')
+    taskId = server.addContext(
+        'Task', 'compositing', projectId, taskType='Compositing'
+    )
+
+    assets = []
+    for index in range(count):
+        assetId = server.addAsset('plate{0}'.format(index), projectId)
+        components = []
+        for status in (None, 'Approved', None):
+            versionId = server.addVersion(
+                assetId, taskId=taskId, status=status
+            )
+            components.append(server.addComponent(versionId))
+
+        assets.append(tuple(components))
+
+    return assets
+
+
+@pytest.mark.parametrize('count', [1, 10, 100])
+def test_finalized_entity_versions_query_count(server, bridge, context,
+                                              count):
+    '''Finalize many references with one query per batch of assets.'''
+    assets = createAssets(server, count)
+    references = [reference(first, 'component') for first, _, _ in assets]
+
+    server.reset()
+    assert bridge.getFinalizedEntityVersions(
+        references, context, 'latest'
+    ) == [reference(latest, 'component') for _, _, latest in assets]
+
+    # One query for the assets of the components and one for the versions
+    # of the assets.
+    assert server.count('legacy') == 0
+    assert server.count('query') == 2
+
+    server.reset()
+    assert bridge.getFinalizedEntityVersions(
+        references, context, 'latestapproved'
+    ) == [reference(approved, 'component') for _, approved, _ in assets]
+    assert server.requests == 0
+
+
+def test_finalized_entity_versions_without_match(server, bridge, context):
+    '''Raise if a reference has no version matching the meta-version.'''
+    (first, _, _), = createAssets(server, 1)
+
+    with pytest.raises(FnAssetAPI.exceptions.EntityResolutionError):
+        bridge.getFinalizedEntityVersions(
+            [reference(first, 'component')], context, 'latestrejected'
+        )
+
+
+def test_finalized_entity_versions_of_concrete_version(server, bridge,
+                                                       context):
+    '''Return references as they are when not asking for a meta-version.'''
+    (first, _, latest), = createAssets(server, 1)
+    references = [
+        reference(first, 'component'), reference(latest, 'component')
+    ]
+
+    assert bridge.getFinalizedEntityVersions(
+        references, context
+    ) == references
+
+
+def test_manager_finalized_entity_versions(server, bridge, context):
+    '''Finalize references through the manager interface.'''
+    assets = createAssets(server, 2)
+    interface = ftrack_connect_foundry.manager.ManagerInterface(bridge)
+
+    assert interface.getFinalizedEntityVersions(
+        [reference(first, 'component') for first, _, _ in assets], context,
+        version='latest'
+    ) == [reference(latest, 'component') for _, _, latest in assets]
+
+
+def test_registration_updates_latest_version(server, bridge, context, host):
+    '''Finalize to registered versions without loading versions again.'''
+    (first, _, latest), = createAssets(server, 1)
+    componentReference = reference(first, 'component')
+    assert bridge.getFinalizedEntityVersions(
+        [componentReference], context, 'latest'
+    ) == [reference(latest, 'component')]
+
+    registered = bridge.register(
+        '/renders/plate.exr', componentReference,
+        FnAssetAPI.specifications.ImageSpecification(), None
+    )
+
+    # Registered against the task of the latest version.
+    identifier = registered[len('ftrack://'):].partition('?')[0]
+    version = server.get(server.get(identifier)['version_id'])
+    assert version['task_id'] == server.get(
+        server.get(latest)['version_id']
+    )['task_id']
+
+    server.reset()
+    assert bridge.getFinalizedEntityVersions(
+        [componentReference], context, 'latest'
+    ) == [registered]
+    assert server.requests == 0
+
+    # The status of the new version is not known so statuses are loaded
+    # again.
+    bridge.getFinalizedEntityVersions(
+        [componentReference], context, 'latestapproved'
+    )
+    assert server.count('query') == 1
+
+
+def test_entity_version_name_of_asset(server, bridge, context):
+    '''Name the latest version of assets from the meta-version index.'''
+    (first, _, latest), = createAssets(server, 1)
+    assetId = server.get(server.get(first)['version_id'])['asset_id']
+    bridge.getFinalizedEntityVersions(
+        [reference(first, 'component')], context, 'latest'
+    )
+
+    server.reset()
+    assert bridge.getEntityVersionName(
+        reference(assetId, 'asset'), context
+    ) == '3'
+    assert server.count('query') == 0
+
+
+def getRelatedFixture(server):
+    '''Return (references, specifications) relating shots in several ways.'''
+    shots = createShots(server, 12)
+    workflow = FnAssetAPI.specifications.WorkflowRelationship()
+    workflow.criteria = 'latest,{0},False'.format(
+        reference(server.find('Type', name='Compositing'), 'tasktype')
+    )
+    specifications = [
+        workflow,
+        FnAssetAPI.specifications.ParentGroupingRelationship(),
+        FnAssetAPI.specifications.ShotSpecification()
+    ]
+
+    references = []
+    for shot in shots:
+        references.extend([
+            reference(shot['component'], 'component'),
+            reference(shot['version'], 'asset_version'),
+            reference(shot['asset'], 'asset')
+        ])
+
+    return references, specifications * len(shots)
+
+
+@pytest.mark.parametrize('workers', [2, 8])
+def test_concurrent_related_references_match_sequential(server, session,
+                                                        workers):
+    '''Return the same results in order whatever the number of workers.'''
+    references, specifications = getRelatedFixture(server)
+
+    results = []
+    for count in (1, workers):
+        bridge = ftrack_connect_foundry.bridge.Bridge(
+            session=session, sessionFactory=server.createSession,
+            relatedReferenceWorkers=count
+        )
+        try:
+            results.append(
+                bridge.getRelatedReferences(references, specifications, None)
+            )
+        finally:
+            bridge.close()
+
+    sequential, concurrent = results
+    assert concurrent == sequential
+    assert len(sequential) == len(references)
+    assert all(sequential)
+
+
+def test_legacy_related_references_not_pooled(server, session):
+    '''Look up legacy relationships without the thread pool.'''
+    references, specifications = getRelatedFixture(server)
+    specifications = [
+        specification for specification in specifications
+        if not specification.isOfType('workflow')
+    ]
+    bridge = ftrack_connect_foundry.bridge.Bridge(
+        session=session, sessionFactory=server.createSession,
+        relatedReferenceWorkers=4
+    )
+    try:
+        assert all(
+            bridge.getRelatedReferences(references, specifications, None)
+        )
+        assert bridge._relatedReferencePool is None
+
+    finally:
+        bridge.close()
+
+
+def test_concurrent_related_references_keep_session(server, monkeypatch):
+    '''Only use the session of the bridge from the calling thread.'''
+    session = server.createSession()
+    threads = set()
+    call = session.call
+
+    def recordingCall(operations):
+        '''Record calling thread and make call.'''
+        threads.add(threading.current_thread())
+        return call(operations)
+
+    monkeypatch.setattr(session, 'call', recordingCall)
+
+    references, specifications = getRelatedFixture(server)
+    bridge = ftrack_connect_foundry.bridge.Bridge(
+        session=session, sessionFactory=server.createSession,
+        relatedReferenceWorkers=4
+    )
+    try:
+        assert all(
+            bridge.getRelatedReferences(references, specifications, None)
+        )
+
+        # The pool is restarted after closing.
+        bridge.close()
+        assert all(
+            bridge.getRelatedReferences(references, specifications, None)
+        )
+
+    finally:
+        bridge.close()
+
+    assert threads == set([threading.current_thread()])
+
+
+def test_concurrent_related_references_raise(server, bridge, context):
+    '''Raise errors of lookups made by workers.'''
+    references, specifications = getRelatedFixture(server)
+    references[5] = reference(
+        '00000000-0000-0000-0000-000000000000', 'component'
+    )
+
+    with pytest.raises(FnAssetAPI.exceptions.InvalidEntityReference):
+        bridge.getRelatedReferences(references, specifications, context)
+
+
+def test_stress_threads(server, host):
+    '''Resolve and register consistently from many threads at once.'''
+    threadCount = 16
+    iterations = 5
+    shots = createShots(server, threadCount)
+
+    session = server.createSession()
+    location = session.pick_location()
+    expected = dict(
+        (
+            reference(shot['component'], 'component'),
+            location.get_filesystem_path(
+                session.get('Component', shot['component'])
+            )
+        )
+        for shot in shots
+    )
+
+    owners = {}
+
+    def createSession():
+        '''Return new session recording the threads making calls.'''
+        session = server.createSession()
+        call = session.call
+
+        def recordingCall(operations):
+            '''Record calling thread and make call.'''
+            owners.setdefault(session, set()).add(
+                threading.current_thread()
+            )
+            return call(operations)
+
+        session.call = recordingCall
+        return session
+
+    bridge = ftrack_connect_foundry.bridge.Bridge(
+        session=createSession(), sessionFactory=createSession
+    )
+    readContext = FnAssetAPI.Context()
+    writeContext = FnAssetAPI.Context(access=FnAssetAPI.Context.kWrite)
+
+    registered = {}
+    errors = []
+
+    def work(shot):
+        '''Resolve all plates and register renders against *shot*.'''
+        try:
+            for iteration in range(iterations):
+                for entityReference, path in expected.items():
+                    assert bridge.resolveEntityReference(
+                        entityReference, readContext
+                    ) == path
+
+                path = '/renders/{0}/{1}.exr'.format(shot['shot'], iteration)
+                entityReference = bridge.register(
+                    path, reference(shot['shot'], 'task'),
+                    FnAssetAPI.specifications.ImageSpecification(),
+                    writeContext
+                )
+                registered[entityReference] = bridge.resolveEntityReference(
+                    entityReference, readContext
+                )
+
+        except Exception, error:
+            errors.append(error)
+
+    threads = [
+        threading.Thread(target=work, args=(shot,)) for shot in shots
+    ]
+    try:
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+    finally:
+        bridge.close()
+
+    assert errors == []
+    assert len(registered) == threadCount * iterations
+    assert countVersions(server) == threadCount * (iterations + 1)
+
+    # Sessions are never shared between threads.
+    assert all(len(users) == 1 for users in owners.values())
+
+    # Paths resolved by the threads were cached for everyone.
+    server.reset()
+    for entityReference, path in registered.items():
+        assert path.endswith('.exr')
+        assert bridge.resolveEntityReference(
+            entityReference, readContext
+        ) == path
+
+    assert server.requests == 0
@@ -0,0 +1,174 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 ftrack
+
+import pytest
+
+import ftrack_connect_foundry.cache
+
+
+class Clock(object):
+    '''Clock only advancing when told to.'''
+
+    def __init__(self):
+        '''Initialise clock at time zero.'''
+        super(Clock, self).__init__()
+        self.now = 0.0
+
+    def __call__(self):
+        '''Return current time.'''
+        return self.now
+
+    def advance(self, seconds):
+        '''Move time forward by *seconds*.'''
+        self.now += seconds
+
+
+@pytest.fixture()
+def clock():
+    '''Return controllable clock.'''
+    return Clock()
+
+
+def test_get_missing():
+    '''Raise KeyError for missing keys and count the miss.'''
+    cache = ftrack_connect_foundry.cache.Cache()
+    with pytest.raises(KeyError):
+        cache.get('missing')
+
+    assert cache.stats()['misses'] == 1
+
+
+def test_evict_least_recently_used():
+    '''Evict entries least recently used first once full.'''
+    cache = ftrack_connect_foundry.cache.Cache(maximumSize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+
+    # Reading a makes b the least recently used entry.
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+
+    assert sorted(cache.keys()) == ['a', 'c']
+    assert cache.stats()['evictions'] == 1
+
+
+def test_replace_does_not_evict():
+    '''Setting an existing key does not count towards the maximum size.'''
+    cache = ftrack_connect_foundry.cache.Cache(maximumSize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.set('a', 3)
+
+    assert cache.get('a') == 3
+    assert cache.get('b') == 2
+    assert cache.stats()['evictions'] == 0
+
+
+def test_expire_by_category(clock):
+    '''Expire entries once the time to live of their category passes.'''
+    cache = ftrack_connect_foundry.cache.Cache(
+        timeToLive={'asset_version': 10}, clock=clock
+    )
+    cache.set('version', 'v001', category='asset_version')
+    cache.set('project', 'test', category='show')
+
+    clock.advance(9.9)
+    assert cache.get('version') == 'v001'
+
+    clock.advance(0.1)
+    with pytest.raises(KeyError):
+        cache.get('version')
+
+    # Categories without a time to live never expire.
+    clock.advance(1000)
+    assert cache.get('project') == 'test'
+
+    stats = cache.stats()
+    assert stats['expirations'] == 1
+    assert stats['size'] == 1
+
+
+def test_set_time_to_live(clock):
+    '''Only apply changed time to live to entries set afterwards.'''
+    cache = ftrack_connect_foundry.cache.Cache(clock=clock)
+    cache.set('before', 1, category='task')
+
+    cache.setTimeToLive('task', 5)
+    cache.set('after', 2, category='task')
+
+    clock.advance(5)
+    assert cache.get('before') == 1
+    with pytest.raises(KeyError):
+        cache.get('after')
+
+    cache.setTimeToLive('task', None)
+    cache.set('after', 2, category='task')
+    clock.advance(5)
+    assert cache.get('after') == 2
+
+
+def test_items_skip_expired_without_affecting_stats(clock):
+    '''List unexpired entries from least to most recently used.'''
+    cache = ftrack_connect_foundry.cache.Cache(
+        timeToLive={'short': 1}, clock=clock
+    )
+    cache.set('a', 1)
+    cache.set('b', 2, category='short')
+    cache.set('c', 3)
+    cache.get('a')
+
+    clock.advance(1)
+    assert cache.items() == [('c', 3), ('a', 1)]
+
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 0
+
+
+def test_remove_matching():
+    '''Remove entries matched by key and value.'''
+    cache = ftrack_connect_foundry.cache.Cache()
+    cache.set(('name', 'a'), 'shot')
+    cache.set(('name', 'b'), 'task')
+    cache.set(('path', 'a'), '/path')
+
+    removed = cache.removeMatching(
+        lambda key, value: key[1] == 'a' or value == 'task'
+    )
+
+    assert removed == 3
+    assert cache.keys() == []
+
+
+def test_remove():
+    '''Remove single entries and raise for missing ones.'''
+    cache = ftrack_connect_foundry.cache.Cache()
+    cache.set('a', 1)
+    cache.remove('a')
+
+    with pytest.raises(KeyError):
+        cache.remove('a')
+
+
+def test_bytes_follow_entries():
+    '''Track the estimated size of held entries.'''
+    cache = ftrack_connect_foundry.cache.Cache(maximumSize=1)
+    cache.set('a', ['x' * 100])
+    size = cache.stats()['bytes']
+    assert size >= ftrack_connect_foundry.cache.estimateSize(['x' * 100])
+
+    cache.set('b', 'y')
+    assert 0 < cache.stats()['bytes'] < size
+
+    cache.clear()
+    assert cache.stats()['bytes'] == 0
+    assert cache.stats()['size'] == 0
+
+
+def test_estimate_size_of_containers():
+    '''Include the contents of built-in containers.'''
+    value = 'x' * 1000
+    assert (
+        ftrack_connect_foundry.cache.estimateSize({'key': [value]})
+        > ftrack_connect_foundry.cache.estimateSize(value)
+    )
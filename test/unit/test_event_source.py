@@ -0,0 +1,267 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 ftrack
+
+import threading
+
+import pytest
+import ftrack_api.symbol
+import FnAssetAPI
+import FnAssetAPI.specifications
+
+import ftrack_connect_foundry.bridge
+import ftrack_connect_foundry.event_source
+
+
+def test_abstract_event_source():
+    '''Require event sources to implement subscribe.'''
+    with pytest.raises(TypeError):
+        ftrack_connect_foundry.event_source.EventSource()
+
+
+def test_memory_publish():
+    '''Deliver published events to subscribers of the topic at once.'''
+    source = ftrack_connect_foundry.event_source.MemoryEventSource()
+    received = []
+    source.subscribe('ftrack.update', received.append)
+    source.subscribe('ftrack.update', received.append)
+    source.subscribe('other', lambda event: received.append(None))
+
+    source.publish('ftrack.update', {'entities': []})
+
+    assert received == [
+        {'topic': 'ftrack.update', 'data': {'entities': []}}
+    ] * 2
+
+
+def test_memory_subscribe_while_publishing():
+    '''Only deliver later events to subscribers added while publishing.'''
+    source = ftrack_connect_foundry.event_source.MemoryEventSource()
+    received = []
+
+    def subscribe(event):
+        '''Subscribe another callback.'''
+        source.subscribe('topic', received.append)
+
+    source.subscribe('topic', subscribe)
+    source.publish('topic', {'index': 1})
+    assert received == []
+
+    source.publish('topic', {'index': 2})
+    assert received == [{'topic': 'topic', 'data': {'index': 2}}]
+
+
+def test_session_events(server, session):
+    '''Deliver events received by the event hub of a session.'''
+    source = ftrack_connect_foundry.event_source.SessionEventSource(session)
+    received = []
+    source.subscribe('ftrack.update', received.append)
+
+    session.event_hub.connect()
+    server.publish('ftrack.update', {'entities': []})
+    server.publish('other', {})
+    session.event_hub.wait(0.01)
+
+    assert received == [{'topic': 'ftrack.update', 'data': {'entities': []}}]
+
+
+def test_session_events_pumped(server, session):
+    '''Connect and process events on a background thread.'''
+    source = ftrack_connect_foundry.event_source.SessionEventSource(
+        session, pump=True
+    )
+    delivered = threading.Event()
+    source.subscribe('ftrack.update', lambda event: delivered.set())
+
+    assert session.event_hub.connected
+    server.publish('ftrack.update', {'entities': []})
+    assert delivered.wait(5)
+
+
+@pytest.fixture()
+def source():
+    '''Return in-process event source.'''
+    return ftrack_connect_foundry.event_source.MemoryEventSource()
+
+
+@pytest.fixture()
+def bridge(server, session, source):
+    '''Return bridge invalidating its cache with events of *source*.'''
+    bridge = ftrack_connect_foundry.bridge.Bridge(
+        session=session, sessionFactory=server.createSession,
+        eventSource=source
+    )
+    yield bridge
+    bridge.close()
+
+
+@pytest.fixture()
+def shots(server):
+    '''Return identifiers of two shots each with a published plate.'''
+    projectId = server.addProject('test')
+    shots = []
+    for name in ('sh010', 'sh020'):
+        shotId = server.addContext('Shot', name, projectId)
+        assetId = server.addAsset('plate', shotId)
+        versionId = server.addVersion(assetId)
+        shots.append({
+            'shot': shotId,
+            'asset': assetId,
+            'version': versionId,
+            'component': server.addComponent(versionId)
+        })
+
+    return shots
+
+
+def publishUpdate(source, entityId, entityType, parentId=None,
+                  action='update'):
+    '''Publish update event for *entityId* on *source*.'''
+    source.publish('ftrack.update', {
+        'entities': [{
+            'entityId': entityId,
+            'entityType': entityType,
+            'action': action,
+            'parentId': parentId,
+            'parents': [{'entityId': parentId}] if parentId else [],
+            'changes': {}
+        }]
+    })
+
+
+def getReference(identifier, entityType):
+    '''Return reference to *identifier* of *entityType*.'''
+    return 'ftrack://{0}?entityType={1}'.format(identifier, entityType)
+
+
+def test_update_discards_changed_entity(server, bridge, source, shots):
+    '''Load changed entities again while keeping others cached.'''
+    first, second = [getReference(shot['shot'], 'task') for shot in shots]
+    assert bridge.getEntityName(first, None) == 'sh010'
+    assert bridge.getEntityName(second, None) == 'sh020'
+
+    server.update(shots[0]['shot'], name='sh011')
+    server.reset()
+    assert bridge.getEntityName(first, None) == 'sh010'
+    assert server.requests == 0
+
+    publishUpdate(source, shots[0]['shot'], 'task')
+    assert bridge.getEntityName(first, None) == 'sh011'
+    assert server.requests > 0
+
+    server.reset()
+    assert bridge.getEntityName(second, None) == 'sh020'
+    assert server.requests == 0
+
+
+def test_component_location_change_discards_path(server, bridge, source,
+                                                  shots):
+    '''Resolve components again once their locations change.'''
+    first, second = [
+        getReference(shot['component'], 'component') for shot in shots
+    ]
+    bridge.resolveEntityReferences([first, second], None)
+
+    source.publish(
+        ftrack_api.symbol.COMPONENT_REMOVED_FROM_LOCATION_TOPIC,
+        {'component_id': shots[0]['component']}
+    )
+
+    server.reset()
+    bridge.resolveEntityReference(second, None)
+    assert server.requests == 0
+
+    bridge.resolveEntityReference(first, None)
+    assert server.requests > 0
+
+
+def test_new_version_discards_version_list(server, bridge, source, shots):
+    '''List versions again once a version of the asset is published.'''
+    reference = getReference(shots[0]['component'], 'component')
+    assert sorted(bridge.getEntityVersions(reference, None)) == ['1']
+
+    versionId = server.addVersion(shots[0]['asset'])
+    server.addComponent(versionId)
+    publishUpdate(
+        source, versionId, 'assetversion', parentId=shots[0]['asset'],
+        action='add'
+    )
+
+    assert sorted(bridge.getEntityVersions(reference, None)) == ['1', '2']
+
+
+def test_new_version_discards_related_references(server, bridge, source,
+                                                  shots):
+    '''Look up workflow relationships of a shot again after a publish.'''
+    context = FnAssetAPI.Context()
+    context.managerInterfaceState = bridge.createState()
+    reference = getReference(shots[0]['component'], 'component')
+    specification = FnAssetAPI.specifications.WorkflowRelationship()
+    specification.criteria = 'latest,{0},False'.format(
+        getReference(server.find('Type', name='Compositing'), 'tasktype')
+    )
+
+    assert bridge.getRelatedReferences(
+        [reference], [specification], context
+    ) == [[]]
+
+    taskId = server.addContext(
+        'Task', 'compositing', shots[0]['shot'], taskType='Compositing'
+    )
+    assetId = server.addAsset('comp', shots[0]['shot'])
+    versionId = server.addVersion(assetId, taskId=taskId)
+    componentId = server.addComponent(
+        versionId, metadata={'img_main': 'True'}
+    )
+
+    server.reset()
+    assert bridge.getRelatedReferences(
+        [reference], [specification], context
+    ) == [[]]
+    assert server.requests == 0
+
+    publishUpdate(
+        source, versionId, 'assetversion', parentId=assetId, action='add'
+    )
+    publishUpdate(
+        source, assetId, 'asset', parentId=shots[0]['shot'], action='add'
+    )
+    assert bridge.getRelatedReferences(
+        [reference], [specification], context
+    ) == [[getReference(componentId, 'component')]]
+
+
+def test_session_events_not_used(server, session, bridge, shots):
+    '''Only subscribe to the event source passed to the bridge.'''
+    bridge.getEntityName(getReference(shots[0]['shot'], 'task'), None)
+    assert session.event_hub._subscribers == []
+
+
+class FailingEventSource(ftrack_connect_foundry.event_source.EventSource):
+    '''Event source unable to subscribe.'''
+
+    def subscribe(self, topic, callback):
+        '''Raise as if the event hub was unreachable.'''
+        raise RuntimeError('Event hub is unreachable.')
+
+
+def test_subscription_failure(server, session, shots, monkeypatch):
+    '''Log subscription failures and keep working without events.'''
+    logged = []
+    monkeypatch.setattr(
+        FnAssetAPI.logging, 'log',
+        lambda message, severity: logged.append(message)
+    )
+
+    bridge = ftrack_connect_foundry.bridge.Bridge(
+        session=session, sessionFactory=server.createSession,
+        eventSource=FailingEventSource()
+    )
+    try:
+        assert bridge.getEntityName(
+            getReference(shots[0]['shot'], 'task'), None
+        ) == 'sh010'
+    finally:
+        bridge.close()
+
+    assert len(logged) == 3
+    assert all('Event hub is unreachable.' in message for message in logged)
@@ -0,0 +1,281 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 ftrack
+
+import datetime
+
+import pytest
+import FnAssetAPI
+import FnAssetAPI.specifications
+
+import ftrack_connect_foundry.bridge
+import ftrack_connect_foundry.replica
+
+
+#: Date versions of the project are published from.
+START = datetime.datetime(2014, 1, 1)
+
+
+@pytest.fixture()
+def project(server):
+    '''Return identifiers of a project with two shots on *server*.
+
+    The first shot has a plate asset with three versions published a day
+    apart from its compositing task, each with a 'main' and a 'proxy'
+    component. The second shot has no assets.
+
+    '''
+    projectId = server.addProject('test')
+    sequenceId = server.addContext('Sequence', 'sq010', projectId)
+    shotId = server.addContext('Shot', 'sh010', sequenceId)
+    taskId = server.addContext(
+        'Task', 'compositing', shotId, taskType='Compositing'
+    )
+    assetId = server.addAsset('plate', shotId)
+
+    identifiers = {
+        'project': projectId,
+        'sequence': sequenceId,
+        'shot': shotId,
+        'emptyShot': server.addContext('Shot', 'sh020', sequenceId),
+        'task': taskId,
+        'asset': assetId,
+        'versions': [],
+        'components': []
+    }
+    for day, status in enumerate(['Approved', 'Approved', 'Pending Review']):
+        versionId = server.addVersion(
+            assetId, taskId=taskId, status=status,
+            date=START + datetime.timedelta(days=day)
+        )
+        identifiers['versions'].append(versionId)
+        identifiers['components'].append(server.addComponent(
+            versionId, metadata={'img_main': 'True'}
+        ))
+        server.addComponent(versionId, name='proxy', fileType='.jpg')
+
+    return identifiers
+
+
+@pytest.fixture()
+def replica(tmpdir):
+    '''Return empty replica in a temporary directory.'''
+    return ftrack_connect_foundry.replica.Replica(
+        str(tmpdir.join('replica', 'data.db'))
+    )
+
+
+def test_sync(session, project, replica):
+    '''Store contexts, assets, versions and components of a project.'''
+    assert replica.sync(session, project['project']) == 3
+
+    assert replica.getEntityType(project['project']) == 'show'
+    assert replica.getEntityType(project['shot']) == 'task'
+    assert replica.getEntityType(project['asset']) == 'asset'
+    assert replica.getEntityType(project['versions'][0]) == 'asset_version'
+    assert replica.getEntityType(project['components'][0]) == 'component'
+    assert replica.getEntityType('missing') is None
+
+    assert replica.getName(project['shot']) == 'sh010'
+    assert replica.getName(project['versions'][1]) == 'v002'
+    assert replica.getContext(project['shot']) == {
+        'id': project['shot'],
+        'name': 'sh010',
+        'parent_id': project['sequence'],
+        'object_type': 'Shot'
+    }
+    assert [
+        child['name'] for child in replica.getChildren(project['sequence'])
+    ] == ['sh010', 'sh020']
+    assert replica.getAssetContextId(
+        project['components'][2]
+    ) == project['shot']
+    assert replica.hasContexts([project['shot'], project['emptyShot']])
+    assert not replica.hasContexts([project['shot'], 'missing'])
+
+
+def test_get_versions(session, project, replica):
+    '''List versions of the component with the same name.'''
+    replica.sync(session, project['project'])
+
+    assert replica.getVersions(project['components'][0]) == [
+        (1, project['components'][0], 'Approved'),
+        (2, project['components'][1], 'Approved'),
+        (3, project['components'][2], 'Pending Review')
+    ]
+    assert [
+        number for number, _, _ in replica.getVersions(project['asset'])
+    ] == [1, 2, 3]
+    assert replica.getVersions(project['shot']) is None
+
+
+def test_get_components(session, project, replica):
+    '''Return components with their locations in the form of queries.'''
+    replica.sync(session, project['project'])
+
+    component, = replica.getComponents([project['components'][0], 'missing'])
+    assert component['name'] == 'main'
+    assert component['version_id'] == project['versions'][0]
+
+    locationId, = [
+        componentLocation['location_id']
+        for componentLocation in component['component_locations']
+    ]
+    assert session.get('Location', locationId)['name'] == 'studio.disk'
+
+
+def test_incremental_sync(server, session, project, replica):
+    '''Only load versions published since the previous sync.'''
+    replica.sync(session, project['project'])
+    server.addContext('Shot', 'sh030', project['sequence'])
+    versionId = server.addVersion(
+        project['asset'], taskId=project['task'],
+        date=START + datetime.timedelta(days=10)
+    )
+    server.addComponent(versionId)
+
+    # Only the new version and the one published at the time of the
+    # previous sync, being within the overlap, are loaded again.
+    assert replica.sync(session, project['project']) == 2
+
+    assert replica.getName(versionId) == 'v004'
+    assert len(replica.getVersions(project['asset'])) == 4
+    assert len(replica.getChildren(project['sequence'])) == 3
+
+
+def test_incremental_sync_prunes_deleted(server, session, project, replica):
+    '''Remove versions and components deleted since the previous sync.'''
+    replica.sync(session, project['project'])
+
+    server.remove(project['components'][0])
+    for identifier in server.createSession().query(
+        'select id from Component where version_id is "{0}"'.format(
+            project['versions'][1]
+        )
+    ).all():
+        server.remove(identifier['id'])
+
+    server.remove(project['versions'][1])
+
+    replica.sync(session, project['project'])
+
+    assert replica.getEntityType(project['components'][0]) is None
+    assert replica.getEntityType(project['versions'][1]) is None
+    assert replica.getEntityType(project['components'][1]) is None
+    assert replica.getVersions(project['components'][2]) == [
+        (1, None, 'Approved'),
+        (3, project['components'][2], 'Pending Review')
+    ]
+
+
+def test_incremental_sync_contexts_and_assets(server, session, project,
+                                              replica):
+    '''Only load contexts and assets added since the previous sync.'''
+    replica.sync(session, project['project'])
+    shotId = server.addContext('Shot', 'sh030', project['sequence'])
+    assetId = server.addAsset('plate', shotId)
+    server.remove(project['emptyShot'])
+    server.update(project['sequence'], name='sq020')
+
+    server.reset()
+    replica.sync(session, project['project'])
+
+    loaded = [
+        expression for action, expression in server.operations
+        if action == 'query' and (
+            ' from TypedContext ' in expression or ' from Asset ' in expression
+        )
+        and not expression.startswith('select id ')
+    ]
+    assert len(loaded) == 2
+    assert all(' where id in (' in expression for expression in loaded)
+
+    assert replica.getContext(shotId)['name'] == 'sh030'
+    assert replica.getAssetContextId(assetId) == shotId
+    assert replica.getEntityType(project['emptyShot']) is None
+    assert [
+        child['name'] for child in replica.getChildren(project['sequence'])
+    ] == ['sh010', 'sh030']
+
+    # Renamed contexts are only reloaded by a full sync.
+    assert replica.getName(project['sequence']) == 'sq010'
+    replica.sync(session, project['project'], full=True)
+    assert replica.getName(project['sequence']) == 'sq020'
+
+
+def test_sync_locations(session, project, replica):
+    '''Store the locations with an accessor.'''
+    assert replica.getLocationIds() == []
+    replica.sync(session, project['project'])
+
+    locationId, = replica.getLocationIds()
+    assert session.get('Location', locationId)['name'] == 'studio.disk'
+
+
+def test_full_sync(server, session, project, replica):
+    '''Reload changes to previously synced versions on a full sync.'''
+    replica.sync(session, project['project'])
+    server.update(
+        project['versions'][0],
+        status_id=server.find('Status', name='In progress')
+    )
+
+    replica.sync(session, project['project'])
+    assert replica.getVersions(project['asset'])[0][2] == 'Approved'
+
+    assert replica.sync(session, project['project'], full=True) == 3
+    assert replica.getVersions(project['asset'])[0][2] == 'In progress'
+
+
+def test_bridge_reads_replica(server, session, project, replica):
+    '''Look up synced entities without loading them from the server.'''
+    bridge = ftrack_connect_foundry.bridge.Bridge(
+        session=session, sessionFactory=server.createSession,
+        replica=replica
+    )
+    try:
+        assert bridge.syncReplica(project['project']) == 3
+
+        context = FnAssetAPI.Context()
+        context.managerInterfaceState = bridge.createState()
+        references = [
+            'ftrack://{0}?entityType=component'.format(identifier)
+            for identifier in project['components']
+        ]
+        workflow = FnAssetAPI.specifications.WorkflowRelationship()
+        workflow.criteria = 'latestapproved,{0},False'.format(
+            'ftrack://{0}?entityType=tasktype'.format(
+                server.find('Type', name='Compositing')
+            )
+        )
+
+        server.reset()
+        paths = bridge.resolveEntityReferences(references, context)
+        names = [
+            bridge.getEntityName(reference, context)
+            for reference in references
+        ]
+        versions = bridge.getEntityVersions(references[0], context)
+        related = bridge.getRelatedReferences(
+            references,
+            [workflow, FnAssetAPI.specifications.ParentGroupingRelationship()],
+            context
+        )
+
+    finally:
+        bridge.close()
+
+    assert all(path.startswith('/mnt/studio/') for path in paths)
+    assert names == ['main'] * 3
+    assert sorted(versions) == ['1', '2', '3']
+    # The last specification applies to the remaining references.
+    shotReference = 'ftrack://{0}?entityType=task'.format(project['shot'])
+    assert related == [[references[1]], [shotReference], [shotReference]]
+
+    # Locations are stored in the replica too.
+    assert server.operations == []
+
+
+def test_bridge_without_replica(bridge):
+    '''Raise when syncing without a replica.'''
+    with pytest.raises(ValueError):
+        bridge.syncReplica('project')
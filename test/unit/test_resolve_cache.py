@@ -0,0 +1,218 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 ftrack
+
+import time
+import threading
+import multiprocessing
+
+import pytest
+
+import ftrack_connect_foundry.bridge
+import ftrack_connect_foundry.resolve_cache
+
+
+@pytest.fixture()
+def directory(tmpdir):
+    '''Return directory to store resolve cache databases in.'''
+    return str(tmpdir)
+
+
+def createCache(directory, **kwargs):
+    '''Return resolve cache storing its database in *directory*.'''
+    return ftrack_connect_foundry.resolve_cache.ResolveCache(
+        directory, **kwargs
+    )
+
+
+def test_get_highest_priority_path(directory):
+    '''Return the path of the location with the highest priority.'''
+    cache = createCache(directory)
+    cache.set('component', 'unmanaged', 10, '/unmanaged/plate.exr')
+    assert cache.get('component') == '/unmanaged/plate.exr'
+
+    # Paths in other locations reflect an earlier state so are replaced.
+    cache.set('component', 'studio', 1, '/mnt/studio/plate.exr')
+    cache.invalidate('component', 'studio')
+    assert cache.get('component') is None
+    assert cache.get('other') is None
+
+
+def test_scope(directory):
+    '''Only return paths stored in the same scope.'''
+    cache = createCache(directory)
+    cache.set('component', 'studio', 1, '/mnt/a/plate.exr', scope='a')
+    cache.set('component', 'studio', 1, '/mnt/b/plate.exr', scope='b')
+
+    assert cache.get('component', scope='a') == '/mnt/a/plate.exr'
+    assert cache.get('component', scope='b') == '/mnt/b/plate.exr'
+    assert cache.get('component') is None
+
+    cache.invalidate('component')
+    assert cache.get('component', scope='a') is None
+    assert cache.get('component', scope='b') is None
+
+
+def test_invalidate_shared(directory):
+    '''Invalidate paths for every cache sharing the database.'''
+    first = createCache(directory)
+    second = createCache(directory)
+    first.set('component', 'studio', 1, '/mnt/studio/plate.exr')
+    assert second.get('component') == '/mnt/studio/plate.exr'
+
+    second.invalidate('component')
+    assert first.get('component') is None
+
+
+def test_set_after_invalidation(directory):
+    '''Do not store paths loaded before the component was invalidated.'''
+    cache = createCache(directory)
+    loaded = time.time() - 1
+    cache.set('component', 'studio', 1, '/mnt/studio/old.exr')
+
+    # Another process invalidates the component while the path is loaded.
+    createCache(directory).invalidate('component')
+
+    cache.set('component', 'studio', 1, '/mnt/studio/old.exr', loaded=loaded)
+    assert cache.get('component') is None
+
+    cache.set('component', 'studio', 1, '/mnt/studio/new.exr')
+    assert cache.get('component') == '/mnt/studio/new.exr'
+
+
+def test_maximum_age(directory):
+    '''Only return paths loaded within the maximum age.'''
+    cache = createCache(directory, maximumAge=60)
+    cache.set(
+        'old', 'studio', 1, '/mnt/studio/old.exr', loaded=time.time() - 120
+    )
+    cache.set('new', 'studio', 1, '/mnt/studio/new.exr')
+
+    assert cache.get('old') is None
+    assert cache.get('new') == '/mnt/studio/new.exr'
+    assert createCache(directory).get('old') == '/mnt/studio/old.exr'
+
+
+def work(directory, worker, workers, iterations, errors):
+    '''Write, read and invalidate paths as *worker* of *workers*.
+
+    Paths of the components of every worker are read, each of which must be
+    missing or the path stored by that worker. Unexpected results are put on
+    *errors*.
+
+    '''
+    cache = createCache(directory, timeout=60.0)
+    for iteration in range(iterations):
+        componentId = '{0}-{1}'.format(worker, iteration % 10)
+        path = '/mnt/studio/{0}.exr'.format(componentId)
+        cache.set(componentId, 'studio', 1, path)
+        if cache.get(componentId) != path:
+            errors.put('{0} not stored'.format(componentId))
+
+        for other in range(workers):
+            otherId = '{0}-{1}'.format(other, iteration % 10)
+            otherPath = cache.get(otherId)
+            if otherPath not in (None, '/mnt/studio/{0}.exr'.format(otherId)):
+                errors.put('{0} resolved to {1}'.format(otherId, otherPath))
+
+        if iteration % 3 == 0:
+            cache.invalidate(componentId)
+            if cache.get(componentId) is not None:
+                errors.put('{0} not invalidated'.format(componentId))
+
+
+def test_concurrent_processes(directory):
+    '''Read and write the database from several processes at once.'''
+    errors = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(
+            target=work, args=(directory, worker, 4, 50, errors)
+        )
+        for worker in range(4)
+    ]
+    for process in processes:
+        process.start()
+
+    for process in processes:
+        process.join(60)
+
+    assert [process.exitcode for process in processes] == [0] * 4
+
+    reported = []
+    while not errors.empty():
+        reported.append(errors.get())
+
+    assert reported == []
+
+
+def test_concurrent_threads(directory):
+    '''Read and write the database from several threads at once.'''
+    errors = multiprocessing.Queue()
+    threads = [
+        threading.Thread(
+            target=work, args=(directory, worker, 4, 50, errors)
+        )
+        for worker in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    reported = []
+    while not errors.empty():
+        reported.append(errors.get())
+
+    assert reported == []
+
+
+@pytest.fixture()
+def component(server):
+    '''Return identifier of a published component on *server*.'''
+    projectId = server.addProject('test')
+    assetId = server.addAsset('plate', projectId)
+    return server.addComponent(server.addVersion(assetId))
+
+
+def createBridge(server, directory):
+    '''Return bridge with an empty memory cache sharing *directory*.'''
+    return ftrack_connect_foundry.bridge.Bridge(
+        session=server.createSession(), sessionFactory=server.createSession,
+        resolveCache=createCache(directory)
+    )
+
+
+def test_bridges_share_paths(server, directory, component):
+    '''Resolve paths stored by another bridge without requests.'''
+    reference = 'ftrack://{0}?entityType=component'.format(component)
+    first = createBridge(server, directory)
+    path = first.resolveEntityReference(reference, None)
+
+    server.reset()
+    second = createBridge(server, directory)
+    assert second.resolveEntityReference(reference, None) == path
+    assert server.requests == 0
+
+    # Sessions of another user do not share paths.
+    session = server.createSession()
+    session.api_user = 'other-user'
+    other = ftrack_connect_foundry.bridge.Bridge(
+        session=session, sessionFactory=server.createSession,
+        resolveCache=createCache(directory)
+    )
+    assert other.resolveEntityReference(reference, None) == path
+    assert server.requests > 0
+
+
+def test_bridge_invalidates_shared_paths(server, directory, component):
+    '''Discard paths of components moved for every bridge.'''
+    reference = 'ftrack://{0}?entityType=component'.format(component)
+    first = createBridge(server, directory)
+    first.resolveEntityReference(reference, None)
+
+    first._onComponentLocationChanged({'data': {'component_id': component}})
+
+    server.reset()
+    second = createBridge(server, directory)
+    second.resolveEntityReference(reference, None)
+    assert server.requests > 0
@@ -0,0 +1,146 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 ftrack
+
+import threading
+
+import pytest
+import FnAssetAPI
+import FnAssetAPI.specifications
+
+import ftrack_connect_foundry.schema
+
+
+@pytest.fixture()
+def schema(server):
+    '''Return empty schema cache loading from *server*.'''
+    return ftrack_connect_foundry.schema.Schema()
+
+
+def getMethods(server):
+    '''Return names of legacy methods requested from *server*.'''
+    return [
+        detail for action, detail in server.operations if action == 'legacy'
+    ]
+
+
+def test_load_once(server, schema):
+    '''Load each list with a single request.'''
+    for _ in range(3):
+        assert 'Compositing' in [
+            taskType.getName() for taskType in schema.getTaskTypes()
+        ]
+        assert schema.getTaskStatus('Approved').getName() == 'Approved'
+        assert schema.getAssetType('img').getShort() == 'img'
+
+    assert sorted(getMethods(server)) == [
+        'getAssetTypes', 'getTaskStatuses', 'getTaskTypes'
+    ]
+
+
+def test_lookup_by_identifier_and_name(server, schema):
+    '''Look up items by identifier or name from the same request.'''
+    taskTypeId = server.find('Type', name='Lighting')
+    assetTypeId = server.find('AssetType', short='geo')
+
+    assert schema.getTaskType(taskTypeId).getName() == 'Lighting'
+    assert schema.getTaskType('Lighting').getId() == taskTypeId
+    assert schema.getAssetType(assetTypeId).getShort() == 'geo'
+    assert schema.getAssetType('missing') is None
+
+    assert getMethods(server) == ['getTaskTypes', 'getAssetTypes']
+
+
+def test_returned_lists_are_copies(server, schema):
+    '''Do not let callers modify cached lists.'''
+    schema.getTaskTypes().pop()
+    assert len(schema.getTaskTypes()) == 4
+
+
+def test_project_scope(server, schema):
+    '''Cache lists scoped to a project separately.'''
+    projectId = server.addProject('test')
+
+    schema.getTaskTypes()
+    server.reset()
+
+    assert len(schema.getTaskTypes(projectId)) == 4
+    assert schema.getTaskType('Editing', projectId).getName() == 'Editing'
+
+    # One request loading the project and one listing its task types.
+    assert server.requests == 2
+
+
+def test_refresh(server, schema):
+    '''Reload all lists on next access after a refresh.'''
+    schema.getTaskTypes()
+    schema.getAssetTypes()
+    server.add('Type', name='Roto')
+
+    assert schema.getTaskType('Roto') is None
+
+    schema.refresh()
+    server.reset()
+
+    assert schema.getTaskType('Roto').getName() == 'Roto'
+    assert getMethods(server) == ['getTaskTypes']
+
+
+def test_refresh_project(server, schema):
+    '''Only reload lists of a refreshed project.'''
+    projectId = server.addProject('test')
+    schema.getTaskStatuses()
+    schema.getTaskStatuses(projectId)
+
+    schema.refresh(projectId)
+    server.reset()
+
+    schema.getTaskStatuses()
+    assert server.requests == 0
+
+    schema.getTaskStatuses(projectId)
+    assert getMethods(server) == ['get', 'getTaskStatuses']
+
+
+def test_concurrent_access(server, schema):
+    '''Load each list once however many threads access it.'''
+    results = []
+
+    def lookup():
+        '''Look up a task type.'''
+        results.append(schema.getTaskType('Compositing').getName())
+
+    threads = [threading.Thread(target=lookup) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert results == ['Compositing'] * 16
+    assert getMethods(server) == ['getTaskTypes']
+
+
+def test_shared_schema():
+    '''Return the same schema cache for the whole process.'''
+    assert (
+        ftrack_connect_foundry.schema.getSharedSchema()
+        is ftrack_connect_foundry.schema.getSharedSchema()
+    )
+
+
+
+def test_bridge_resolves_asset_types_once(server, bridge, host):
+    '''Resolve asset types of registrations with the shared schema.'''
+    projectId = server.addProject('test')
+    shotId = server.addContext('Shot', 'sh010', projectId)
+    server.addContext('Task', 'compositing', shotId, taskType='Compositing')
+
+    context = FnAssetAPI.Context(access=FnAssetAPI.Context.kWrite)
+    for index in range(3):
+        bridge.register(
+            '/renders/{0}.exr'.format(index),
+            'ftrack://{0}?entityType=task'.format(shotId),
+            FnAssetAPI.specifications.ImageSpecification(), context
+        )
+
+    assert getMethods(server).count('getAssetTypes') == 1
@@ -0,0 +1,176 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 ftrack
+
+import threading
+import time
+
+import fake_ftrack
+import ftrack_connect_foundry.bridge
+import ftrack_connect_foundry.single_flight
+
+
+def runConcurrently(count, function):
+    '''Call *function* from *count* threads and return their results.
+
+    Results, or raised exceptions, are returned in the order of the threads.
+
+    '''
+    results = [None] * count
+
+    def run(index):
+        '''Store result of calling function.'''
+        try:
+            results[index] = function()
+        except Exception, error:
+            results[index] = error
+
+    threads = [
+        threading.Thread(target=run, args=(index,)) for index in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    return results
+
+
+class Call(object):
+    '''Callable blocking until released and counting its calls.'''
+
+    def __init__(self, result=None, error=None):
+        '''Initialise to return *result* or raise *error* once released.'''
+        super(Call, self).__init__()
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.started = threading.Event()
+        self.released = threading.Event()
+
+    def __call__(self):
+        '''Wait for release and return result.'''
+        self.calls += 1
+        self.started.set()
+        self.released.wait()
+        if self.error is not None:
+            raise self.error
+
+        return self.result
+
+    def releaseLater(self, delay=0.1):
+        '''Release call after *delay* seconds once it has started.
+
+        The delay gives other threads time to wait for the call.
+
+        '''
+        def release():
+            '''Release once started.'''
+            self.started.wait()
+            time.sleep(delay)
+            self.released.set()
+
+        thread = threading.Thread(target=release)
+        thread.start()
+        return thread
+
+
+def test_share_result():
+    '''Run concurrent calls for a key once and share the result.'''
+    singleFlight = ftrack_connect_foundry.single_flight.SingleFlight()
+    call = Call(result=['path'])
+    call.releaseLater()
+
+    results = runConcurrently(8, lambda: singleFlight.do('key', call))
+
+    assert call.calls == 1
+    assert results == [['path']] * 8
+    assert all(result is results[0] for result in results)
+
+
+def test_share_error():
+    '''Raise the error of a shared call in every caller.'''
+    singleFlight = ftrack_connect_foundry.single_flight.SingleFlight()
+    error = ValueError('Unable to resolve.')
+    call = Call(error=error)
+    call.releaseLater()
+
+    results = runConcurrently(4, lambda: singleFlight.do('key', call))
+
+    assert call.calls == 1
+    assert results == [error] * 4
+
+
+def test_separate_keys():
+    '''Run calls for different keys independently.'''
+    singleFlight = ftrack_connect_foundry.single_flight.SingleFlight()
+    first = Call(result=1)
+    second = Call(result=2)
+
+    thread = threading.Thread(target=singleFlight.do, args=('first', first))
+    thread.start()
+    first.started.wait()
+
+    # Would block forever if waiting for the first call.
+    second.released.set()
+    assert singleFlight.do('second', second) == 2
+
+    first.released.set()
+    thread.join()
+
+
+def test_run_again_once_finished():
+    '''Call again for a key once the previous call has finished.'''
+    singleFlight = ftrack_connect_foundry.single_flight.SingleFlight()
+    results = iter([1, 2])
+
+    assert singleFlight.do('key', lambda: next(results)) == 1
+    assert singleFlight.do('key', lambda: next(results)) == 2
+
+
+def test_reentrant_call():
+    '''Run nested calls for the same key directly.'''
+    singleFlight = ftrack_connect_foundry.single_flight.SingleFlight()
+
+    def outer():
+        '''Return nested result.'''
+        return singleFlight.do('key', lambda: 'inner') + ' from outer'
+
+    assert singleFlight.do('key', outer) == 'inner from outer'
+
+
+def test_arguments():
+    '''Pass arguments to the called function.'''
+    singleFlight = ftrack_connect_foundry.single_flight.SingleFlight()
+    assert singleFlight.do(
+        'key', lambda first, second=None: (first, second), 1, second=2
+    ) == (1, 2)
+
+
+def test_bridge_resolves_once(useServer):
+    '''Resolve a reference requested by many threads at once only once.'''
+    server = useServer(fake_ftrack.Server(latency=0.05))
+    projectId = server.addProject('test')
+    assetId = server.addAsset('plate', projectId)
+    componentId = server.addComponent(server.addVersion(assetId))
+    reference = 'ftrack://{0}?entityType=component'.format(componentId)
+
+    bridge = ftrack_connect_foundry.bridge.Bridge(
+        session=server.createSession(), sessionFactory=server.createSession
+    )
+    try:
+        results = runConcurrently(
+            50, lambda: bridge.resolveEntityReference(reference, None)
+        )
+    finally:
+        bridge.close()
+
+    assert len(set(results)) == 1
+    assert results[0].startswith('/mnt/studio/')
+
+    # Each request of a single resolution is made once only.
+    assert server.count('legacy') == 1
+    queries = [
+        detail for action, detail in server.operations if action == 'query'
+    ]
+    assert len(queries) == len(set(queries))
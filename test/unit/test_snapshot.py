@@ -0,0 +1,209 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 ftrack
+
+import base64
+import json
+import zlib
+
+import pytest
+import FnAssetAPI
+import FnAssetAPI.specifications
+
+import ftrack_connect_foundry.bridge
+import ftrack_connect_foundry.snapshot
+
+
+def test_round_trip():
+    '''Decode data and entries as encoded.'''
+    entries = [
+        ('path:a', u'/mnt/studio/été.exr'),
+        ('versiontarget:b', ['c', 2]),
+        ('hierarchy:d', {'name': 'sh010', 'parentId': None})
+    ]
+
+    token = ftrack_connect_foundry.snapshot.encode(
+        {'transaction': None}, entries
+    )
+    assert token.startswith(
+        '{0}:'.format(ftrack_connect_foundry.snapshot.VERSION)
+    )
+    assert all(ord(character) < 128 for character in token)
+
+    data, decoded = ftrack_connect_foundry.snapshot.decode(token)
+    assert data == {'transaction': None}
+    assert decoded == [
+        ('path:a', u'/mnt/studio/été.exr'),
+        ('versiontarget:b', ['c', 2]),
+        ('hierarchy:d', {'name': 'sh010', 'parentId': None})
+    ]
+
+
+def test_compress():
+    '''Encode repetitive entries to a fraction of their size.'''
+    entries = [
+        (
+            'path:{0:05d}'.format(index),
+            '/mnt/studio/sq010/sh{0:05d}.exr'.format(index)
+        )
+        for index in range(1000)
+    ]
+
+    token = ftrack_connect_foundry.snapshot.encode({}, entries)
+    assert len(token) < len(json.dumps(entries)) / 4
+
+
+def test_limit_size():
+    '''Drop the least important entries to fit in the maximum size.'''
+    entries = [
+        ('path:{0}'.format(index), base64.b64encode(str(index) * 50))
+        for index in range(500)
+    ]
+
+    token = ftrack_connect_foundry.snapshot.encode(
+        {'transaction': []}, entries, maximumSize=2000
+    )
+    assert len(token) <= 2000
+
+    data, decoded = ftrack_connect_foundry.snapshot.decode(token)
+    assert data == {'transaction': []}
+    assert 0 < len(decoded) < len(entries)
+    assert decoded == entries[:len(decoded)]
+
+
+def test_data_exceeding_size():
+    '''Raise if data alone does not fit in the maximum size.'''
+    data = {
+        'transaction': [
+            base64.b64encode(str(index) * 50) for index in range(100)
+        ]
+    }
+
+    with pytest.raises(ValueError):
+        ftrack_connect_foundry.snapshot.encode(data, [], maximumSize=100)
+
+
+def test_other_version():
+    '''Ignore tokens of other versions.'''
+    token = ftrack_connect_foundry.snapshot.encode({}, [('path:a', 'b')])
+    version = ftrack_connect_foundry.snapshot.VERSION
+    token = '{0}:{1}'.format(version + 1, token.partition(':')[2])
+
+    assert ftrack_connect_foundry.snapshot.decode(token) is None
+
+
+@pytest.mark.parametrize('token', [
+    'nonsense',
+    'v2:abc',
+    '{0}:not base64'.format(ftrack_connect_foundry.snapshot.VERSION),
+    '{0}:{1}'.format(
+        ftrack_connect_foundry.snapshot.VERSION,
+        base64.b64encode('not compressed')
+    ),
+    '{0}:{1}'.format(
+        ftrack_connect_foundry.snapshot.VERSION,
+        base64.b64encode(zlib.compress('[1, 2]'))
+    )
+], ids=['separator', 'version', 'base64', 'compression', 'payload'])
+def test_invalid_token(token):
+    '''Raise for tokens that are not snapshots.'''
+    with pytest.raises(ValueError):
+        ftrack_connect_foundry.snapshot.decode(token)
+
+
+def createPlates(server, count):
+    '''Return references of components of *count* plates on *server*.'''
+    projectId = server.addProject('test')
+    references = []
+    for index in range(count):
+        shotId = server.addContext(
+            'Shot', 'sh{0:03d}'.format(index), projectId
+        )
+        versionId = server.addVersion(server.addAsset('plate', shotId))
+        references.append('ftrack://{0}?entityType=component'.format(
+            server.addComponent(versionId)
+        ))
+
+    return references
+
+
+def thaw(server, token):
+    '''Return new bridge and the state it thawed from *token*.
+
+    The bridge is as if created by another process.
+
+    '''
+    ftrack_connect_foundry.bridge.Bridge._entityTypeIndex.clear()
+    bridge = ftrack_connect_foundry.bridge.Bridge(
+        session=server.createSession(), sessionFactory=server.createSession
+    )
+    return bridge, bridge.thawState(token)
+
+
+def test_thawed_state_avoids_requests(server, bridge):
+    '''Resolve references cached by a frozen state without requests.'''
+    references = createPlates(server, 20)
+    context = FnAssetAPI.Context()
+    context.managerInterfaceState = bridge.createState()
+    paths = bridge.resolveEntityReferences(references, context)
+    names = [
+        bridge.getEntityDisplayName(reference, context)
+        for reference in references
+    ]
+
+    token = bridge.freezeState(context.managerInterfaceState)
+
+    server.reset()
+    thawed, context.managerInterfaceState = thaw(server, token)
+    try:
+        assert thawed.resolveEntityReferences(references, context) == paths
+        assert [
+            thawed.getEntityDisplayName(reference, context)
+            for reference in references
+        ] == names
+    finally:
+        thawed.close()
+
+    assert server.requests == 0
+
+
+def test_thaw_open_transaction(server, bridge, host):
+    '''Continue a transaction open when freezing.'''
+    projectId = server.addProject('test')
+    shotId = server.addContext('Shot', 'sh010', projectId)
+    server.addContext('Task', 'compositing', shotId, taskType='Compositing')
+
+    state = bridge.createState()
+    context = FnAssetAPI.Context(access=FnAssetAPI.Context.kWrite)
+    context.managerInterfaceState = state
+    bridge.startTransaction(state)
+    reference = bridge.register(
+        '/renders/sh010.exr', 'ftrack://{0}?entityType=task'.format(shotId),
+        FnAssetAPI.specifications.ImageSpecification(), context
+    )
+
+    token = bridge.freezeState(state)
+    bridge.cancelTransaction(state)
+
+    thawed, state = thaw(server, token)
+    try:
+        context = FnAssetAPI.Context()
+        context.managerInterfaceState = state
+        assert thawed.resolveEntityReference(
+            reference, context
+        ) == '/renders/sh010.exr'
+        assert server.count('commit') == 0
+
+        thawed.finishTransaction(state)
+    finally:
+        thawed.close()
+
+    identifier = reference[len('ftrack://'):].partition('?')[0]
+    assert server.get(identifier) is not None
+
+
+def test_thaw_invalid_token(server, bridge):
+    '''Raise for invalid tokens and ignore empty ones.'''
+    with pytest.raises(FnAssetAPI.exceptions.StateError):
+        bridge.thawState('nonsense')
+
+    assert bridge.thawState('') is not None
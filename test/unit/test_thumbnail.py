@@ -0,0 +1,229 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2014 ftrack
+
+import time
+import threading
+
+import pytest
+import FnAssetAPI
+
+import ftrack_connect_foundry.constant
+import ftrack_connect_foundry.thumbnail
+
+
+class Uploader(object):
+    '''Record uploads, optionally failing or waiting to be released.'''
+
+    def __init__(self, failures=0, blocked=False):
+        '''Initialise uploader failing the first *failures* uploads.
+
+        If *blocked* is True uploads wait until :py:meth:`release` is called.
+
+        '''
+        super(Uploader, self).__init__()
+        self.failures = failures
+        self.calls = []
+        self.released = threading.Event()
+        if not blocked:
+            self.released.set()
+
+    def __call__(self, path, targets, thumbnailId):
+        '''Record upload of *path* to *targets* and return its identifier.'''
+        self.released.wait()
+        self.calls.append((path, list(targets), thumbnailId))
+        if self.failures:
+            self.failures -= 1
+            raise IOError('Upload failed.')
+
+        return thumbnailId or 'thumbnail-{0}'.format(len(self.calls))
+
+    def release(self):
+        '''Let waiting and further uploads proceed.'''
+        self.released.set()
+
+
+@pytest.fixture()
+def files(tmpdir):
+    '''Return function creating a thumbnail file with *content*.'''
+    def create(name, content):
+        '''Return path of file *name* holding *content*.'''
+        path = tmpdir.join(name)
+        path.write(content)
+        return str(path)
+
+    return create
+
+
+@pytest.fixture()
+def logged(monkeypatch):
+    '''Return list of messages logged.'''
+    messages = []
+    monkeypatch.setattr(
+        FnAssetAPI.logging, 'log',
+        lambda message, severity: messages.append(message)
+    )
+    return messages
+
+
+def createQueue(upload, **kwargs):
+    '''Return queue calling *upload* without waiting between retries.'''
+    kwargs.setdefault('retryDelay', 0)
+    kwargs.setdefault('idleTimeout', 0.1)
+    return ftrack_connect_foundry.thumbnail.ThumbnailQueue(upload, **kwargs)
+
+
+def test_retry(files):
+    '''Retry failed uploads.'''
+    upload = Uploader(failures=2)
+    queue = createQueue(upload, retries=2)
+    queue.put(files('a.png', 'a'), 'Shot', 'sh010')
+
+    assert queue.flush(timeout=5)
+    assert len(upload.calls) == 3
+
+
+def test_retries_exhausted(files, logged):
+    '''Log and discard uploads failing every attempt.'''
+    upload = Uploader(failures=3)
+    queue = createQueue(upload, retries=2)
+    path = files('a.png', 'a')
+    queue.put(path, 'Shot', 'sh010')
+
+    assert queue.flush(timeout=5)
+    assert len(upload.calls) == 3
+    assert logged == [
+        'Unable to upload thumbnail {0}: Upload failed.'.format(path)
+    ]
+
+    # A failed upload is not reused.
+    upload.failures = 0
+    queue.put(path, 'Shot', 'sh020')
+    assert queue.flush(timeout=5)
+    assert upload.calls[-1][2] is None
+
+
+def test_deduplicate(files):
+    '''Upload files with the same content once.'''
+    upload = Uploader(blocked=True)
+    queue = createQueue(upload, workers=1)
+
+    # The first upload holds the worker so the others wait together.
+    queue.put(files('other.png', 'other'), 'Shot', 'sh000')
+    queue.put(files('a.png', 'same'), 'Shot', 'sh010')
+    queue.put(files('b.png', 'same'), 'Shot', 'sh020')
+    queue.put(files('b.png', 'same'), 'Shot', 'sh020')
+    upload.release()
+    assert queue.flush(timeout=5)
+
+    assert len(upload.calls) == 2
+    path, targets, thumbnailId = upload.calls[1]
+    assert targets == [('Shot', 'sh010'), ('Shot', 'sh020')]
+    assert thumbnailId is None
+
+    # Later uploads of the same content reuse the thumbnail component.
+    queue.put(files('c.png', 'same'), 'AssetVersion', 'v001')
+    assert queue.flush(timeout=5)
+    assert upload.calls[-1] == (
+        files('c.png', 'same'), [('AssetVersion', 'v001')], 'thumbnail-2'
+    )
+
+
+def test_uploaded_bounded(files):
+    '''Only remember the most recently uploaded thumbnail components.'''
+    upload = Uploader()
+    queue = createQueue(upload, uploadedMaximumSize=2)
+    for content in ('a', 'b', 'c'):
+        queue.put(files(content + '.png', content), 'Shot', content)
+        assert queue.flush(timeout=5)
+
+    queue.put(files('a.png', 'a'), 'Shot', 'a2')
+    queue.put(files('c.png', 'c'), 'Shot', 'c2')
+    assert queue.flush(timeout=5)
+
+    assert [call[2] for call in upload.calls[3:]] == [None, 'thumbnail-3']
+
+
+def test_bounded_queue_waits(files):
+    '''Wait for room to queue thumbnails while the queue is full.'''
+    upload = Uploader(blocked=True)
+    queue = createQueue(upload, workers=1, maximumSize=1, putTimeout=5)
+    queue.put(files('a.png', 'a'), 'Shot', 'a')
+
+    # Wait for the worker to take the first thumbnail.
+    while not queue._active:
+        time.sleep(0.01)
+
+    queue.put(files('b.png', 'b'), 'Shot', 'b')
+
+    thread = threading.Thread(
+        target=queue.put, args=(files('c.png', 'c'), 'Shot', 'c')
+    )
+    thread.start()
+    thread.join(0.1)
+    assert thread.is_alive()
+
+    upload.release()
+    thread.join(5)
+    assert not thread.is_alive()
+
+    assert queue.flush(timeout=5)
+    assert [call[1] for call in upload.calls] == [
+        [('Shot', 'a')], [('Shot', 'b')], [('Shot', 'c')]
+    ]
+
+
+def test_bounded_queue_discards(files, logged):
+    '''Discard thumbnails if the queue stays full for the put timeout.'''
+    upload = Uploader(blocked=True)
+    queue = createQueue(upload, workers=1, maximumSize=1, putTimeout=0.05)
+    queue.put(files('a.png', 'a'), 'Shot', 'a')
+    while not queue._active:
+        time.sleep(0.01)
+
+    queue.put(files('b.png', 'b'), 'Shot', 'b')
+    queue.put(files('c.png', 'c'), 'Shot', 'c')
+    assert len(logged) == 1
+    assert 'Discarding thumbnail' in logged[0]
+
+    # Further targets of a waiting thumbnail are still added.
+    queue.put(files('b.png', 'b'), 'Shot', 'b2')
+
+    upload.release()
+    assert queue.flush(timeout=5)
+    assert [call[1] for call in upload.calls] == [
+        [('Shot', 'a')], [('Shot', 'b'), ('Shot', 'b2')]
+    ]
+
+
+def test_flush_timeout(files):
+    '''Stop waiting for uploads after the flush timeout.'''
+    upload = Uploader(blocked=True)
+    queue = createQueue(upload)
+    queue.put(files('a.png', 'a'), 'Shot', 'a')
+
+    started = time.time()
+    assert queue.flush(timeout=0.1) is False
+    assert time.time() - started < 1
+
+    upload.release()
+    assert queue.flush(timeout=5)
+
+
+def test_exit_budget(files, logged, monkeypatch):
+    '''Give all queues the exit timeout in total when the process exits.'''
+    monkeypatch.setattr(
+        ftrack_connect_foundry.constant, 'THUMBNAIL_EXIT_TIMEOUT', 0.2
+    )
+    uploads = [Uploader(blocked=True) for _ in range(3)]
+    queues = [createQueue(upload) for upload in uploads]
+    for index, queue in enumerate(queues):
+        queue.put(files('{0}.png'.format(index), str(index)), 'Shot', index)
+
+    started = time.time()
+    ftrack_connect_foundry.thumbnail._flushQueues()
+    assert time.time() - started < 1
+    assert logged == ['Exiting before all thumbnails were uploaded.']
+
+    for upload, queue in zip(uploads, queues):
+        upload.release()
+        assert queue.flush(timeout=5)